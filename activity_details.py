@@ -0,0 +1,186 @@
+"""Per-activity Strava details (stream summaries, laps), fetched off the request path.
+
+A rerun only asks for the details it's missing and reads what has been fetched so far.
+One process-wide DetailFetcher does the fetching, on a few worker threads:
+- within its own rate budget (`rate` requests per WINDOW), and paused until Strava's
+  window resets after a 429;
+- laps (for the weeks on screen) ahead of the stream backlog, newest activities first;
+- failures are remembered per activity and retried with exponential backoff, RETRY_MIN
+  doubling up to RETRY_MAX, so a bad id isn't requested again on every rerun.
+
+Results go to the activity store, so each activity is fetched once, even across
+restarts. In memory they're kept per (athlete, kind) as read-only maps that are replaced,
+not mutated, when a result lands, so a session can read one while workers add to it.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import date
+from types import MappingProxyType
+
+WINDOW = 15 * 60          # Strava's short rate-limit window
+RETRY_MIN = 60            # first retry after a failed fetch, doubling per failure
+RETRY_MAX = 6 * 3600
+PRIORITY = dict(laps=0, streams=1)
+_EMPTY = MappingProxyType({})
+
+
+class RateLimited(Exception):
+    """A fetch got HTTP 429: every fetch waits for the next window."""
+
+
+class DetailFetcher:
+    """Background fetches of per-activity details, shared by every session.
+
+    fetch(kind, activity_id, day, token) returns the JSON-able detail, raises RateLimited
+    on a 429 and anything else on failure. threads=0 starts no workers; run_pending() then
+    does the work in the caller's thread.
+    """
+
+    def __init__(self, store, fetch, rate=30, threads=2, clock=time.monotonic):
+        self.store = store
+        self.fetch = fetch
+        self.rate = rate
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._heap = []               # (priority, -day ordinal, seq, key)
+        self._seq = itertools.count()
+        self._queued = {}             # key → day, for keys waiting in the heap
+        self._tokens = {}             # athlete id → latest token a session passed in
+        self._failed = {}             # key → (retry at, failures so far)
+        self._sent = deque()          # clock() of each fetch in the current window
+        self._paused_until = 0.0
+        self._index = {}              # (athlete id, kind) → read-only {activity id: data}
+        self.fetched = self.failures = 0
+        for _ in range(threads):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    # ── sessions ──
+    def index(self, athlete_id, kind):
+        """Read-only {activity id: data} fetched so far for the athlete."""
+        with self._lock:
+            return self._known(athlete_id, kind)
+
+    def request(self, athlete_id, kind, items, token):
+        """Queue fetches for [(day, activity id)] not fetched, queued or backing off yet.
+        Returns how many were queued. Never waits on Strava."""
+        queued = 0
+        with self._lock:
+            self._tokens[athlete_id] = token
+            known, now = self._known(athlete_id, kind), self.clock()
+            for day, aid in items:
+                key = (athlete_id, kind, aid)
+                if aid in known or key in self._queued or self._failed.get(key, (0,))[0] > now:
+                    continue
+                self._queued[key] = day
+                heapq.heappush(self._heap, (PRIORITY[kind], -date.fromisoformat(day[:10]).toordinal(),
+                                            next(self._seq), key))
+                queued += 1
+            if queued:
+                self._changed.notify_all()
+        return queued
+
+    def wait(self, athlete_id, kind, activity_ids, timeout):
+        """Wait up to timeout seconds for queued fetches of these ids to finish."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while any((athlete_id, kind, aid) in self._queued for aid in activity_ids):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._changed.wait(left)
+            return True
+
+    def forget(self, athlete_id):
+        """Drop an athlete who disconnected (their stored details go with unregister)."""
+        with self._lock:
+            self._tokens.pop(athlete_id, None)
+            for d in (self._index, self._queued, self._failed):
+                for key in [k for k in d if k[0] == athlete_id]:
+                    del d[key]
+
+    def backing_off(self, athlete_id, kind):
+        """{activity id: seconds until retry} for failed fetches."""
+        with self._lock:
+            now = self.clock()
+            return {k[2]: at - now for k, (at, _) in self._failed.items()
+                    if k[:2] == (athlete_id, kind) and at > now}
+
+    # ── workers ──
+    def _known(self, athlete_id, kind):
+        key = (athlete_id, kind)
+        if key not in self._index:
+            self._index[key] = MappingProxyType(self.store.details(athlete_id, kind)) if athlete_id else _EMPTY
+        return self._index[key]
+
+    def _used(self, now):
+        while self._sent and now - self._sent[0] > WINDOW:
+            self._sent.popleft()
+        return len(self._sent)
+
+    def _take(self):
+        """(key, day, None) for the next fetch the budget allows, else (None, None, seconds
+        to wait or None when nothing is queued). Called with the lock held."""
+        while self._heap and self._heap[0][3] not in self._queued:
+            heapq.heappop(self._heap)           # forgotten since it was queued
+        if not self._heap:
+            return None, None, None
+        now = self.clock()
+        if self._paused_until > now:
+            return None, None, self._paused_until - now
+        if self._used(now) >= self.rate:
+            return None, None, self._sent[0] + WINDOW - now
+        key = heapq.heappop(self._heap)[3]
+        self._sent.append(now)
+        return key, self._queued[key], None
+
+    def _run(self, key, day):
+        athlete_id, kind, aid = key
+        try:
+            data = self.fetch(kind, aid, day, self._tokens.get(athlete_id))
+            self.store.save_detail(athlete_id, aid, kind, data)
+        except RateLimited:
+            with self._lock:
+                # Strava's windows start on the quarter hour; this one stays queued
+                self._paused_until = self.clock() + WINDOW - time.time() % WINDOW + 1
+                heapq.heappush(self._heap, (PRIORITY[kind], -date.fromisoformat(day[:10]).toordinal(),
+                                            next(self._seq), key))
+            return
+        except Exception:                       # network, auth, gone: back off, retry later
+            with self._lock:
+                n = self._failed.get(key, (0, 0))[1] + 1
+                self._failed[key] = (self.clock() + min(RETRY_MIN * 2 ** (n - 1), RETRY_MAX), n)
+                self._queued.pop(key, None)
+                self.failures += 1
+                self._changed.notify_all()
+            return
+        with self._lock:
+            if self._queued.pop(key, None) is not None:
+                known = self._known(athlete_id, kind)
+                self._index[(athlete_id, kind)] = MappingProxyType({**known, aid: data})
+                self._failed.pop(key, None)
+                self.fetched += 1
+            self._changed.notify_all()
+
+    def run_pending(self):
+        """Fetch whatever is queued and within budget, in this thread; returns how many."""
+        done = 0
+        while True:
+            with self._lock:
+                key, day, _ = self._take()
+            if key is None:
+                return done
+            self._run(key, day)
+            done += 1
+
+    def _work(self):
+        while True:
+            with self._lock:
+                key, day, wait = self._take()
+                if key is None:
+                    self._changed.wait(wait)
+                    continue
+            self._run(key, day)
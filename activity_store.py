@@ -0,0 +1,206 @@
+"""Shared activity store: Strava tokens and compact runs for every synced athlete.
+
+sync_daemon.py writes here in the background, and the app reads from here instead of
+calling Strava on the request path. Runs are stored in the runs_by_date shape the rest
+of the app consumes, one row per activity, so incremental syncs just upsert. A sync also
+says which days it covered in full, so runs deleted on Strava (or edited into another
+sport) within them are dropped too.
+
+One SQLite file in WAL mode, so app processes can read while the daemon commits.
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def run_from_activity(a):
+    """One Strava activity payload → the compact run dict the app uses."""
+    return dict(
+        id=a.get("id"), name=a.get("name", "Run"), miles=a["distance"] / 1609.34,
+        moving_time=a.get("moving_time", 0),
+        pace=a.get("moving_time", 0) / (a["distance"] / 1609.34),
+        hr=a.get("average_heartrate"), start=a.get("start_date_local"),
+        elev=round((a.get("total_elevation_gain") or 0) * 3.28084))
+
+
+def runs_by_date(acts):
+    """Strava activity payloads → {date: [run dict]} (the shape everything else consumes)."""
+    rm = {}
+    for a in acts:
+        k = (a.get("start_date_local") or "")[:10]
+        if not k or not a.get("distance"): continue
+        rm.setdefault(k, []).append(run_from_activity(a))
+    return rm
+
+
+def is_run(a):
+    return a.get("type") == "Run" or a.get("sport_type") == "Run"
+
+
+class ActivityStore:
+    """Athletes' tokens and sync progress, plus their runs. Safe to share across threads."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS athletes (athlete_id INTEGER PRIMARY KEY, "
+                               "access_token TEXT, refresh_token TEXT, expires_at REAL, added REAL, "
+                               "synced REAL, newest REAL, backfilled INTEGER DEFAULT 0, error TEXT)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS runs (athlete_id INTEGER, activity_id INTEGER, "
+                               "day TEXT, run TEXT, PRIMARY KEY (athlete_id, activity_id))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_by_day ON runs (athlete_id, day)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS details (athlete_id INTEGER, activity_id INTEGER, "
+                               "kind TEXT, data TEXT, PRIMARY KEY (athlete_id, kind, activity_id))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS summaries (athlete_id INTEGER PRIMARY KEY, "
+                               "key TEXT, row TEXT, built REAL)")
+
+    # ── tokens ──
+    def register(self, athlete_id, access_token, refresh_token, expires_at):
+        """Add or update an athlete's tokens. Whichever side refreshed last wins."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO athletes (athlete_id, access_token, refresh_token, expires_at, added) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (athlete_id) DO UPDATE SET "
+                "access_token = excluded.access_token, refresh_token = excluded.refresh_token, "
+                "expires_at = excluded.expires_at, error = NULL WHERE excluded.expires_at >= athletes.expires_at "
+                "OR athletes.expires_at IS NULL",
+                (athlete_id, access_token, refresh_token, expires_at, time.time()))
+
+    def tokens(self, athlete_id):
+        """dict(access_token, refresh_token, expires_at), or None for an unknown athlete."""
+        with self._lock:
+            row = self._conn.execute("SELECT access_token, refresh_token, expires_at FROM athletes "
+                                     "WHERE athlete_id = ?", (athlete_id,)).fetchone()
+        return dict(zip(("access_token", "refresh_token", "expires_at"), row)) if row else None
+
+    def unregister(self, athlete_id):
+        """Forget an athlete who disconnected: tokens, runs, activity details and their coach
+        summary row all go."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM runs WHERE athlete_id = ?", (athlete_id,))
+            self._conn.execute("DELETE FROM details WHERE athlete_id = ?", (athlete_id,))
+            self._conn.execute("DELETE FROM summaries WHERE athlete_id = ?", (athlete_id,))
+            self._conn.execute("DELETE FROM athletes WHERE athlete_id = ?", (athlete_id,))
+            self._conn.execute("COMMIT")
+
+    def athletes(self):
+        """[dict] per registered athlete: id, token expiry and sync progress."""
+        cols = ("athlete_id", "expires_at", "added", "synced", "newest", "backfilled", "error")
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(cols)} FROM athletes").fetchall()
+        return [dict(zip(cols, r)) for r in rows]
+
+    # ── sync progress ──
+    def sync_info(self, athlete_id):
+        """dict(synced, newest, backfilled) once the athlete has synced at least once, else None."""
+        with self._lock:
+            row = self._conn.execute("SELECT synced, newest, backfilled FROM athletes WHERE athlete_id = ?",
+                                     (athlete_id,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return dict(synced=row[0], newest=row[1], backfilled=bool(row[2]))
+
+    def save_runs(self, athlete_id, acts, synced_at, backfilled=False, since=None):
+        """Upsert run activities from Strava payloads and record a completed sync.
+
+        With since (a local date), acts are every run from that day on: stored runs from
+        then on that aren't among them, and their details, are deleted. Returns
+        (runs saved, runs deleted).
+        """
+        rows, newest = [], None
+        for a in acts:
+            day = (a.get("start_date_local") or "")[:10]
+            if not is_run(a) or not day or not a.get("distance"):
+                continue
+            rows.append((athlete_id, a["id"], day, json.dumps(run_from_activity(a))))
+            ts = a.get("start_date") or a.get("start_date_local")     # UTC; local is close enough
+            t = datetime.fromisoformat(ts[:19]).replace(tzinfo=timezone.utc).timestamp()
+            newest = t if newest is None else max(newest, t)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT INTO runs VALUES (?, ?, ?, ?) ON CONFLICT (athlete_id, activity_id) "
+                                       "DO UPDATE SET day = excluded.day, run = excluded.run", rows)
+                gone = []
+                if since is not None:
+                    kept = {r[1] for r in rows}
+                    gone = [(athlete_id, aid) for (aid,) in self._conn.execute(
+                        "SELECT activity_id FROM runs WHERE athlete_id = ? AND day >= ?", (athlete_id, since))
+                        if aid not in kept]
+                    self._conn.executemany("DELETE FROM runs WHERE athlete_id = ? AND activity_id = ?", gone)
+                    self._conn.executemany("DELETE FROM details WHERE athlete_id = ? AND activity_id = ?", gone)
+                self._conn.execute("UPDATE athletes SET synced = ?, newest = max(coalesce(newest, 0), ?), "
+                                   "backfilled = backfilled OR ?, error = NULL WHERE athlete_id = ?",
+                                   (synced_at, newest or 0, int(backfilled), athlete_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows), len(gone)
+
+    def mark_error(self, athlete_id, message):
+        with self._lock:
+            self._conn.execute("UPDATE athletes SET error = ? WHERE athlete_id = ?", (message, athlete_id))
+
+    # ── reads ──
+    def runs_by_date(self, athlete_id, since=None):
+        """{date: [run dict]} for the athlete, optionally from the `since` date on."""
+        q = "SELECT day, run FROM runs WHERE athlete_id = ?"
+        args = [athlete_id]
+        if since:
+            q += " AND day >= ?"
+            args.append(since)
+        with self._lock:
+            rows = self._conn.execute(q + " ORDER BY day, activity_id", args).fetchall()
+        rm = {}
+        for day, run in rows:
+            rm.setdefault(day, []).append(json.loads(run))
+        for runs in rm.values():
+            runs.sort(key=lambda r: r.get("start") or "")
+        return rm
+
+    # ── per-activity details (stream summaries, laps) ──
+    def save_detail(self, athlete_id, activity_id, kind, data):
+        with self._lock:
+            self._conn.execute("INSERT INTO details VALUES (?, ?, ?, ?) ON CONFLICT (athlete_id, kind, activity_id) "
+                               "DO UPDATE SET data = excluded.data", (athlete_id, activity_id, kind, json.dumps(data)))
+
+    def details(self, athlete_id, kind):
+        """{activity id: data} of one kind for the athlete."""
+        with self._lock:
+            rows = self._conn.execute("SELECT activity_id, data FROM details WHERE athlete_id = ? AND kind = ?",
+                                      (athlete_id, kind)).fetchall()
+        return {aid: json.loads(data) for aid, data in rows}
+
+    # ── coach summary rows (built by the sync daemon, read by the dashboard) ──
+    def summary_keys(self):
+        """{athlete id: key} the stored summary rows were built from."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT athlete_id, key FROM summaries"))
+
+    def save_summaries(self, rows):
+        """Add or replace summary rows [(athlete id, key, row)]."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO summaries VALUES (?, ?, ?, ?) ON CONFLICT (athlete_id) DO UPDATE "
+                                   "SET key = excluded.key, row = excluded.row, built = excluded.built",
+                                   [(aid, key, json.dumps(row), now) for aid, key, row in rows])
+            self._conn.execute("COMMIT")
+
+    def summaries(self, athlete_ids):
+        """{athlete id: (row, built at)} for those of athlete_ids that have a row (None for
+        an athlete without a plan)."""
+        ids = list(athlete_ids)
+        if not ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(f"SELECT athlete_id, row, built FROM summaries WHERE athlete_id IN "
+                                      f"({', '.join('?' * len(ids))})", ids).fetchall()
+        return {aid: (json.loads(row), built) for aid, row, built in rows}
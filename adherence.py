@@ -0,0 +1,147 @@
+"""Whole-plan adherence: per-week grades, completion and missed counts.
+
+Day-level facts (planned miles, actual miles, planned / done flags) are held in NumPy
+arrays covering the plan from its first Monday to race week. Week figures are a reshape
+to (weeks, 7) and a sum, so every week of the plan is graded in one pass. When a swap
+or new activity changes a few days, only those days are rewritten and only their weeks
+are re-summed.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+
+def completion_color(dist_pct):
+    """Smooth green→red gradient. Generous — 80%+ is solidly green."""
+    # Clamp to 0–100, map 80–100% → green, 0–50% → red, interpolate between
+    pct = max(0, min(dist_pct, 100))
+    # Normalize: 100% = 1.0, 50% = 0.0 (below 50 is all red)
+    t = max(0.0, (pct - 50) / 50)
+    # Ease the curve so 80%+ looks green
+    t = t ** 0.6
+    # green: #5DCAA5  red: #e05757
+    r = round(0x5D + (0xe0 - 0x5D) * (1 - t))
+    g = round(0xCA + (0x57 - 0xCA) * (1 - t))
+    b = round(0xA5 + (0x57 - 0xA5) * (1 - t))
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def week_effective_pct(plan_mi, act_mi, planned_days, missed_days):
+    pct = act_mi / plan_mi * 100 if plan_mi else 0
+    miss_rate = missed_days / planned_days if planned_days else 0
+    # Penalize missed days slightly
+    return pct * (1 - miss_rate * 0.3)
+
+
+def week_grade(plan_mi, act_mi, planned_days, completed_days, missed_days):
+    """Letter grade + gradient color matching completion_color logic."""
+    if plan_mi == 0:
+        return None, None
+    effective_pct = week_effective_pct(plan_mi, act_mi, planned_days, missed_days)
+    color = completion_color(effective_pct)
+    if effective_pct >= 90:   grade = "A"
+    elif effective_pct >= 78: grade = "B"
+    elif effective_pct >= 63: grade = "C"
+    elif effective_pct >= 48: grade = "D"
+    else:                     grade = "F"
+    return grade, color
+
+
+class PlanAdherence:
+    """Materialized adherence for one plan window, kept in sync with plan and activities."""
+
+    def __init__(self, plan_start_str, race_date_str):
+        self.start = date.fromisoformat(plan_start_str)
+        self.race_date_str = race_date_str
+        race = date.fromisoformat(race_date_str)
+        self.n_weeks = (race - self.start).days // 7 + 1
+        n = self.n_weeks * 7
+        self.plan_mi = np.zeros(n)
+        self.act_mi = np.zeros(n)
+        self.planned = np.zeros(n, dtype=bool)
+        self.done = np.zeros(n, dtype=bool)
+        self._days = [(self.start + timedelta(days=i)).isoformat() for i in range(n)]
+        self._day_arr = np.array(self._days)
+        self._plan_src = [None] * n        # what each day was last built from
+        self._act_src = [None] * n
+        self._weeks = None                 # (weeks, 5) plan_mi, act_mi, planned, done, missed
+        self.today = None
+
+    def sync(self, planned_map, act_runs, today: date, matcher=None):
+        """Bring the arrays up to date; returns the number of days rewritten.
+
+        Each day's plan entry and run list are compared with what it was last built from,
+        so only days touched by a swap or a new activity are rewritten and re-summed. With
+        a PlanMatcher, a session counts as done when runs are matched to it (doubles and
+        shifted days included) rather than when its own date has a run.
+        """
+        changed = []
+        for i, ds in enumerate(self._days):
+            p, a = planned_map.get(ds), act_runs.get(ds)
+            done = bool(matcher.matched(ds)) if matcher is not None and p else bool(a)
+            if p != self._plan_src[i] or a != self._act_src[i] or done != self.done[i]:
+                self._plan_src[i], self._act_src[i] = p, a
+                self.plan_mi[i] = p["m"] if p else 0
+                self.planned[i] = bool(p)
+                self.act_mi[i] = sum(r["miles"] for r in a) if a else 0
+                self.done[i] = done
+                changed.append(i // 7)
+        if self._weeks is None or today != self.today:
+            self.today = today
+            self._summarize(range(self.n_weeks))
+        elif changed:
+            self._summarize(sorted(set(changed)))
+        return len(changed)
+
+    def _summarize(self, weeks):
+        if self._weeks is None:
+            self._weeks = np.zeros((self.n_weeks, 5))
+        past = self._day_arr < self.today.isoformat()
+        w = np.asarray(list(weeks), dtype=int)
+        if not len(w):
+            return
+        idx = (w[:, None] * 7 + np.arange(7)).ravel()
+        shape = (len(w), 7)
+        self._weeks[w, 0] = self.plan_mi[idx].reshape(shape).sum(1)
+        self._weeks[w, 1] = self.act_mi[idx].reshape(shape).sum(1)
+        self._weeks[w, 2] = self.planned[idx].reshape(shape).sum(1)
+        self._weeks[w, 3] = (self.planned & self.done)[idx].reshape(shape).sum(1)
+        self._weeks[w, 4] = (self.planned & ~self.done & past)[idx].reshape(shape).sum(1)
+
+    def week(self, ws: date):
+        """(plan_mi, act_mi, planned_days, completed_days, missed_days) for the week starting
+        ws, or None outside the plan."""
+        w = (ws - self.start).days // 7
+        if not 0 <= w < self.n_weeks:
+            return None
+        plan_mi, act_mi, planned, completed, missed = self._weeks[w]
+        return plan_mi, act_mi, int(planned), int(completed), int(missed)
+
+    def totals(self):
+        """(completed, missed) planned runs before today, across the whole plan."""
+        past = self._day_arr < self.today.isoformat()
+        return int((self.planned & self.done & past).sum()), int((self.planned & ~self.done & past).sum())
+
+    def past_weeks(self):
+        """Indices of fully past weeks that had planned mileage."""
+        this_week = (self.today - self.start).days // 7
+        return [w for w in range(min(max(this_week, 0), self.n_weeks)) if self._weeks[w, 0] > 0]
+
+    def effective(self, w):
+        plan_mi, act_mi, planned, _, missed = self._weeks[w]
+        return week_effective_pct(plan_mi, act_mi, planned, missed)
+
+    def grades(self):
+        """[(week_start, grade, color, effective_pct or None)] for every plan week; grade is
+        None for weeks not yet finished."""
+        past = set(self.past_weeks())
+        out = []
+        for w in range(self.n_weeks):
+            ws = self.start + timedelta(weeks=w)
+            if w in past:
+                plan_mi, act_mi, planned, completed, missed = self.week(ws)
+                grade, color = week_grade(plan_mi, act_mi, planned, completed, missed)
+                out.append((ws, grade, color, self.effective(w)))
+            else:
+                out.append((ws, None, None, None))
+        return out
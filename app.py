@@ -1,19 +1,55 @@
 import streamlit as st
 import requests
+import os
 import urllib.parse
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
 from datetime import date, timedelta, datetime
+from types import MappingProxyType
+
+from rollups import MileageRollups, weekly_planned_totals, planned_series, downsample, week_index
+from training_load import TrainingLoad
+from prediction import collect_efforts, predict_marathon
+from race_sim import simulate
+from best_efforts import activity_best_efforts, fivek_equivalent
+from compliance import QUALITY_TYPES, score_reps
+from adherence import PlanAdherence
+from matching import PlanMatcher
+from stream_analysis import summarize
+from overlay import SwapHistory
+from session_memory import SessionRegistry, measure
+from activity_store import ActivityStore, runs_by_date
+from activity_details import DetailFetcher, RateLimited
+from plan_builder import PLANS, apply_swaps, build_planned_map, fmt_hm, goal_pace_secs, goal_secs
+from calendar_view import WTYPE_SHORT, render_week, tooltip_css, workout_segments
+import state_codec
+import metrics
+import profiler
+import coach
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 st.set_page_config(page_title="Marathon Planner", page_icon="🏃", layout="wide")
 
 CLIENT_ID     = st.secrets["STRAVA_CLIENT_ID"]
 CLIENT_SECRET = st.secrets["STRAVA_CLIENT_SECRET"]
 REDIRECT_URI  = st.secrets["REDIRECT_URI"]
+# A local stand-in (bench/loadtest.py) can take Strava's place
+STRAVA_URL    = st.secrets.get("STRAVA_BASE_URL", "https://www.strava.com")
 
 # ── persistence layer ─────────────────────────────────────────
-# Abstract user storage so we can swap localStorage for Google OAuth/DB later
-# without touching the rest of the app. The interface is just load() / save() / clear().
+# Abstract user storage so backends can be swapped without touching the rest of the
+# app. The interface is just load() / save() / clear(); SQLiteStore adds flush().
 
+import hashlib
+import hmac
 import json as _json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import streamlit.components.v1 as components
 from streamlit_local_storage import LocalStorage
 
 # Keys we persist. Activities are intentionally NOT persisted — they're fetched fresh.
@@ -24,10 +60,12 @@ PERSIST_KEYS = [
     "long_dow", "quality_dow", "rest_dows",
     "swaps",
 ]
+# Identity and credentials: never taken from browser-held state, which nothing signs
+UNTRUSTED_LEGACY_KEYS = ("access_token", "refresh_token", "token_expires_at", "athlete")
 
 class UserStore:
     """Interface for persisting user state across sessions.
-    Swap implementations (LocalStorage → DB-backed) by replacing the singleton."""
+    Swap implementations (LocalStorage → DB-backed) in get_store()."""
     def load(self) -> dict: raise NotImplementedError
     def save(self, data: dict) -> None: raise NotImplementedError
     def clear(self) -> None: raise NotImplementedError
@@ -73,10 +111,226 @@ class LocalStorageStore(UserStore):
             pass
 
 
-# Singleton — swap this line later to use a different backend (e.g. GoogleAuthStore)
+class SQLiteStore(UserStore):
+    """Server-side store: one row per (athlete, key) in SQLite, so a plan follows the
+    athlete to any device they connect Strava on. Rows are in state_codec's format, with
+    one row per swapped day.
+
+    save() only records which keys changed (and returns at once when the snapshot hash
+    is unchanged); flush() writes them in one transaction at the end of the script run,
+    so a burst of persist_session() calls costs a single commit. Until attach() is called,
+    right after OAuth, there is no owner and nothing is written. The browser only holds
+    a device key in a signed cookie, written once at login, that maps to the athlete
+    server-side. The cookie arrives with the page request, so state is resolved before
+    the first render.
+    """
+    DEVICE_KEY = "marathon_planner_device"   # pre-cookie builds kept it in localStorage
+
+    def __init__(self, db, device=None):
+        self.db = db
+        self.device = device
+        self.owner = db.owner_for(device) if device else None
+        self._saved = {}      # row key → encoded value as last read / written
+        self._dirty = {}      # row key → encoded value (None = delete) awaiting flush
+        self._digest = None
+        self.cookie_pending = None   # cookie value to send to the browser, "" to expire it
+
+    @property
+    def athlete_id(self):
+        """The athlete this device was attached to at OAuth, or None."""
+        if self.owner and self.owner.startswith("athlete:"):
+            return int(self.owner.split(":", 1)[1])
+        return None
+
+    def load(self) -> dict:
+        if not self.owner: return {}
+        self._saved = self.db.read(self.owner)
+        return state_codec.from_rows(self._saved)
+
+    def attach(self, athlete_id) -> dict:
+        """Switch to the athlete's rows (e.g. right after OAuth) and return what they hold."""
+        if not self.device:
+            self.device = secrets.token_urlsafe(16)
+            self.cookie_pending = sign_device(self.device)
+        self.owner = f"athlete:{athlete_id}"
+        self.db.link(self.device, self.owner)
+        self._dirty, self._digest = {}, None
+        return self.load()
+
+    def save(self, data: dict) -> None:
+        encoded = state_codec.to_rows({k: data.get(k) for k in PERSIST_KEYS})
+        digest = hashlib.sha1("\x00".join(f"{k}={v}" for k, v in sorted(encoded.items())).encode()).hexdigest()
+        if digest == self._digest: return
+        self._digest = digest
+        for k in encoded.keys() | self._saved.keys():
+            if encoded.get(k) != self._saved.get(k):
+                self._dirty[k] = encoded.get(k)
+            else:
+                self._dirty.pop(k, None)
+
+    def flush(self) -> int:
+        if not self._dirty or not self.owner: return 0
+        dirty, self._dirty = self._dirty, {}
+        self.db.write(self.owner, dirty)
+        for k, v in dirty.items():
+            if v is None: self._saved.pop(k, None)
+            else: self._saved[k] = v
+        return len(dirty)
+
+    def clear(self) -> None:
+        # Disconnect drops this athlete's tokens and this device's link; plan settings stay
+        # for the athlete's other devices.
+        if self.owner:
+            self.db.write(self.owner, {k: None for k in ("access_token", "refresh_token", "token_expires_at")})
+        if self.device:
+            self.db.unlink(self.device)
+            self.cookie_pending = ""
+        self.device = self.owner = self._digest = None
+        self._saved, self._dirty = {}, {}
+
+
+class StateDB:
+    """Process-wide SQLite connection shared by every session. WAL mode lets reads
+    proceed while a write commits; a lock serialises writers on the one connection.
+    Recently used athletes' rows and device links are kept in memory, so hydrating a
+    returning session doesn't touch the disk."""
+    CACHE_OWNERS = 512
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()    # owner → {key: value}, LRU
+        self._devices = {}            # device → owner
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS state (owner TEXT, key TEXT, value TEXT, "
+                               "updated REAL, PRIMARY KEY (owner, key))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS devices (device TEXT PRIMARY KEY, owner TEXT, seen REAL)")
+
+    def read(self, owner):
+        with self._lock:
+            rows = self._rows.get(owner)
+            if rows is None:
+                rows = dict(self._conn.execute("SELECT key, value FROM state WHERE owner = ?", (owner,)))
+            self._remember(owner, rows)
+            return dict(rows)
+
+    def _remember(self, owner, rows):
+        self._rows[owner] = rows
+        self._rows.move_to_end(owner)
+        while len(self._rows) > self.CACHE_OWNERS:
+            self._rows.popitem(last=False)
+
+    def write(self, owner, changes):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for k, v in changes.items():
+                    if v is None:
+                        self._conn.execute("DELETE FROM state WHERE owner = ? AND key = ?", (owner, k))
+                    else:
+                        self._conn.execute("INSERT INTO state VALUES (?, ?, ?, ?) ON CONFLICT (owner, key) "
+                                           "DO UPDATE SET value = excluded.value, updated = excluded.updated",
+                                           (owner, k, v, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._rows.pop(owner, None)
+                raise
+            rows = self._rows.get(owner)
+            if rows is not None:
+                for k, v in changes.items():
+                    if v is None: rows.pop(k, None)
+                    else: rows[k] = v
+
+    def owner_for(self, device):
+        with self._lock:
+            if device not in self._devices:
+                row = self._conn.execute("SELECT owner FROM devices WHERE device = ?", (device,)).fetchone()
+                if not row: return None
+                self._devices[device] = row[0]
+            return self._devices[device]
+
+    def link(self, device, owner):
+        with self._lock:
+            self._conn.execute("INSERT INTO devices VALUES (?, ?, ?) ON CONFLICT (device) "
+                               "DO UPDATE SET owner = excluded.owner, seen = excluded.seen", (device, owner, time.time()))
+            self._devices[device] = owner
+
+    def unlink(self, device):
+        with self._lock:
+            self._conn.execute("DELETE FROM devices WHERE device = ?", (device,))
+            self._devices.pop(device, None)
+
+
 @st.cache_resource
+def get_state_db() -> StateDB:
+    return StateDB(st.secrets.get("STATE_DB_PATH", "planner_state.db"))
+
+@st.cache_resource
+def get_activity_store() -> ActivityStore:
+    """Runs kept current by sync_daemon.py; also where athletes' tokens are handed to it."""
+    return ActivityStore(st.secrets.get("ACTIVITY_DB_PATH", "activities.db"))
+
+def verified_athlete_id():
+    """The athlete Strava returned for this session's token, at OAuth or on the first load's
+    /athlete call; None until then. Process-wide caches, the activity store and the coach
+    view go by this id, never by ss["athlete"], which is restored from persisted state."""
+    return st.session_state.get("_verified_athlete")
+
+def register_athlete():
+    """Hand this athlete's tokens to the sync daemon (through the activity store)."""
+    ss = st.session_state
+    athlete_id = verified_athlete_id()
+    if athlete_id and ss.get("refresh_token"):
+        try:
+            get_activity_store().register(athlete_id, ss["access_token"], ss["refresh_token"],
+                                          ss.get("token_expires_at"))
+        except sqlite3.Error as e:
+            print(f"[activity_store] register failed: {e}")
+
+
+# ── device cookie ──
+# The device key travels as "<key>.<hmac>" so a forged or edited cookie can't claim
+# another athlete's rows.
+DEVICE_COOKIE = "planner_device"
+COOKIE_MAX_AGE = 400 * 86400   # browsers cap cookie lifetime at 400 days
+
+def _cookie_secret() -> bytes:
+    return st.secrets.get("COOKIE_SECRET", CLIENT_SECRET).encode()
+
+def sign_device(device: str) -> str:
+    sig = hmac.new(_cookie_secret(), device.encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{device}.{sig}"
+
+def verify_device(cookie):
+    if not isinstance(cookie, str): return None
+    device, _, sig = cookie.rpartition(".")
+    if device and hmac.compare_digest(sign_device(device), cookie):
+        return device
+    return None
+
+def write_device_cookie():
+    """Send a pending device cookie to the browser. Runs at the top of a script run, since
+    logins and disconnects set it just before st.rerun()."""
+    store = st.session_state.get("_store")
+    if store is None or store.cookie_pending is None: return
+    value, store.cookie_pending = store.cookie_pending, None
+    attrs = f"path=/; max-age={COOKIE_MAX_AGE if value else 0}; samesite=lax"
+    if REDIRECT_URI.startswith("https"):
+        attrs += "; secure"
+    components.html(f"<script>window.parent.document.cookie = {_json.dumps(f'{DEVICE_COOKIE}={value}; {attrs}')};</script>",
+                    height=0)
+
+
 def get_store() -> UserStore:
-    return LocalStorageStore()
+    """This session's store. Swap the class here to use a different backend."""
+    ss = st.session_state
+    if "_store" not in ss:
+        ss["_store"] = SQLiteStore(get_state_db(), verify_device(st.context.cookies.get(DEVICE_COOKIE)))
+    return ss["_store"]
 
 
 def hydrate_session_from_store():
@@ -84,6 +338,18 @@ def hydrate_session_from_store():
     if st.session_state.get("_hydrated"): return
     store = get_store()
     persisted = store.load()
+    if not store.device:
+        # No cookie: fall back to what older builds kept in localStorage (a device key,
+        # or the whole state). Costs the component round-trip, but only until the cookie
+        # is written. The legacy state blob is unsigned, so only its plan settings are
+        # kept: the athlete reconnects Strava, and OAuth attaches them to their own rows.
+        legacy = LocalStorage().getItem(SQLiteStore.DEVICE_KEY)
+        if legacy and store.db.owner_for(legacy):
+            store.device, store.owner = legacy, store.db.owner_for(legacy)
+            store.cookie_pending = sign_device(legacy)
+            persisted = store.load()
+        else:
+            persisted = {k: v for k, v in LocalStorageStore().load().items() if k not in UNTRUSTED_LEGACY_KEYS}
     for k, v in persisted.items():
         if k not in st.session_state:
             st.session_state[k] = v
@@ -91,1285 +357,35 @@ def hydrate_session_from_store():
 
 
 def persist_session():
-    """Save current session state to store. Call after any state change."""
+    """Record current session state in the store. Call after any state change; writes
+    are flushed once, at the end of the script run."""
     store = get_store()
     snapshot = {k: st.session_state.get(k) for k in PERSIST_KEYS if k in st.session_state}
     store.save(snapshot)
 
 
-PLANS = {
-    "pfitz-18-55":  dict(kind="pfitz", name="Pfitz 18/55", weeks=18, peak_mpw=55, desc="18-week, peaks at 55 mpw"),
-    "pfitz-18-70":  dict(kind="pfitz", name="Pfitz 18/70", weeks=18, peak_mpw=70, desc="18-week, peaks at 70 mpw"),
-    "pfitz-12-55":  dict(kind="pfitz", name="Pfitz 12/55", weeks=12, peak_mpw=55, desc="12-week, peaks at 55 mpw"),
-    "pfitz-12-70":  dict(kind="pfitz", name="Pfitz 12/70", weeks=12, peak_mpw=70, desc="12-week, peaks at 70 mpw"),
-    "me-gale-70":   dict(kind="me", me_plan="gale",    weeks=18, peak_mpw=70, name="ME Gale 70",    desc="Marathon Excellence — 18-week Gale, peaks at 70 mpw"),
-    "me-gale-80":   dict(kind="me", me_plan="gale",    weeks=18, peak_mpw=80, name="ME Gale 80",    desc="Marathon Excellence — 18-week Gale, peaks at 80 mpw"),
-    "me-tornado-85":dict(kind="me", me_plan="tornado", weeks=18, peak_mpw=85, name="ME Tornado 85", desc="Marathon Excellence — 18-week Tornado, peaks at 85 mpw"),
-    "me-tornado-95":dict(kind="me", me_plan="tornado", weeks=18, peak_mpw=95, name="ME Tornado 95", desc="Marathon Excellence — 18-week Tornado, peaks at 95 mpw"),
-}
-
-# ── Marathon Excellence plans (John Davis) ──────────────────
-# Each week: (primary_workout, secondary_workout_or_None, weekend_workout, gale_70_mi, gale_80_mi)
-# For Gale and Tornado, indexes 3 and 4 are the two mileage variants
-ME_GALE = [
-    ("6 mi Kenyan-style progression run",                            "8 × 3 min at 90–92% 5k w/ 1 min jog",             "9–10 × 2 min at 100% 5k w/ 1.5 min jog",                                  50, 55),
-    ("7 mi Kenyan-style progression run",                            "6 mi at 85% 5k",                                  "5 mi easy + 3 sets of: 1.5 mi at 88–90% 5k, 0.5 mi moderate",            55, 60),
-    ("4 × (3-2-1 min at 98-100-102% 5k w/ 1-1-2 min jog)",           "7 × 4 min at 90–92% 5k w/ 1 min jog",             "12–13 mi at 80% 5k through hills",                                        60, 65),
-    ("7 mi at 85% 5k",                                               None,                                              "14–15 mi easy through hills",                                             50, 55),
-    ("6 × 5 min at 90–92% 5k w/ 1 min jog",                          "8 × 1 km at 95% 5k w/ 2 min jog",                 "8 mi Kenyan-style progression w/ fast finish",                            60, 67),
-    ("8 mi at 85% 5k",                                               "8 × 800m at 100% 5k w/ 2–3 min walk/jog",         "14–15 mi at 80% 5k",                                                      64, 72),
-    ("5 × 1 mi at 95% 5k w/ 3 min jog",                              "6–7 × (1200m at 90–92% 5k, 400m at 80% 5k)",     "16–18 mi easy through hills",                                             68, 76),
-    ("9–10 mi at 100% MP",                                           None,                                              "4 × 2 km at 108–110% MP w/ 3–4 min jog",                                  55, 63),
-    ("5 × (1600m at 105–107% MP, 400m at 95–98% MP)",                None,                                              "16–18 mi at 90–92% MP",                                                   70, 80),
-    ("3 × (2 km at 108% MP, 2 min jog, 1 km at 110% MP, 5 min walk/jog)", None,                                         "10–11 mi at 100% MP",                                                     70, 80),
-    ("9–10 × (1 km at 105% MP, 1 km at 90% MP)",                     None,                                              "18–20 mi at 90–92% MP",                                                   70, 80),
-    ("3 × 3 km at 108–110% MP w/ 4–5 min walk/jog",                  None,                                              "8 × (2 km at 100% MP, 1 km at 90% MP)",                                   58, 68),
-    ("6–7 × (2 km at 105% MP, 1 km at 90% MP)",                      None,                                              "5 mi at 90%; 5 mi at 92%; 5 mi at 94%; 3–5 mi at 96% MP",                 70, 80),
-    ("12–15 × 500m at 108–110% MP w/ 30–45 sec walk",                None,                                              "6 × (3 km at 100% MP, 1 km at 90% MP)",                                   68, 73),
-    ("3.5–5.5 mi at 105% MP",                                        None,                                              "20–21 mi at 95% MP",                                                      63, 68),
-    ("8 mi Kenyan-style progression run",                            None,                                              "5 × (4 km at 100% MP, 1 km at 90% MP)",                                   63, 68),
-    ("7–8 × (1 km at 103–105% MP, 1 km at 92–94% MP)",               None,                                              "5–6 × 1200m at 107–110% MP w/ 2–3 min jog",                               55, 60),
-    ("5–6 × 4 min at 103–106% MP w/ 1 min jog",                      None,                                              "Marathon",                                                                26, 26),
-]
-
-ME_TORNADO = [
-    ("7 mi Kenyan-style progression run",                            "8–9 × 3 min at 90–92% 5k w/ 45 sec jog",          "7 mi easy + 5 mi progressing moderate to 90% 5k + 1 mi easy",            60, 65),
-    ("7 mi at 85% 5k",                                               "10 × 2 min at 100–102% 5k w/ 1.5 min jog",        "8 mi Kenyan-style progression run",                                      65, 70),
-    ("8 × 1 km at 95% 5k w/ 2 min jog",                              "8 mi at 85% 5k",                                  "13–14 mi at 80% 5k through rolling hills",                               70, 76),
-    ("2 sets of 4-3-2-1 min at 96-98-100-102% 5k w/ 1 min mod / 2–3 min jog", None,                                      "7–8 × 4 min at 90–92% 5k w/ 1 min jog",                                  60, 65),
-    ("5 × 1 mi at 95% 5k w/ 3 min jog",                              "9–10 mi at 85% 5k",                               "16–18 mi easy through rolling hills",                                    72, 78),
-    ("3-2-1-3-2-1 km at 86–88% 5k w/ 2 min walk",                    "7 × (1200m at 90–92% 5k, 400m at 80% 5k)",        "15–16 mi at 80% 5k through rolling hills",                               78, 84),
-    ("3 × (2 km at 108% MP, 2 min jog, 1 km at 110–112% MP, 4–5 min jog)", None,                                         "10–11 mi at 100% MP",                                                    83, 90),
-    ("6 × (1600m at 105–107% MP, 400m at 95–98% MP)",                None,                                              "4-1, 3-1, 2-1, 1-1 km at 101–103% / 105% MP w/ 2 min walk between all",  75, 82),
-    ("5 × 2 km at 108–110% MP w/ 4 min jog",                         None,                                              "17–19 mi at 90–92% MP through rolling hills",                            85, 95),
-    ("AM: 7 × 1 km at 103–106% MP w/ 1 min jog / PM: 12 × 500m at 108–110% MP w/ 30 sec walk", None,                     "12–13 mi at 100% MP",                                                    85, 95),
-    ("10 × (1 km at 105% MP, 1 km at 90–92% MP)",                    None,                                              "5-5-5-(3 to 5) mi at 90-92-94-96% MP",                                   85, 95),
-    ("AM: 5–6 × 2 km at 103% MP w/ 2 min walk / PM: 4 × 500m at 108–110% MP w/ 30 sec walk; 4 min rest; 3–5 km at 108–110% MP", None, "6 × (3 km at 100% MP, 1 km at 90% MP)",                                  80, 90),
-    ("4–5 × 3 km at 103–105% MP w/ 2–3 min walk",                    None,                                              "20–22 mi at 95% MP",                                                     74, 82),
-    ("AM: 3-2-1-1 km at 102–106% MP w/ 2 min walk / PM: 12–15 × 400m at 108–110% MP w/ 25 sec walk", None,               "6 × (4 km at 100% MP, 1 km at 90% MP)",                                  78, 83),
-    ("8–10 × 3 min at 104–107% MP w/ 30 sec jog",                    None,                                              "7-6-5-(2 to 4) mi at 92-94-96-98% MP",                                   73, 83),
-    ("12 × 500m at 108–110% MP w/ 30 sec walk",                      None,                                              "6-5-4-3-2-1 km at 98–102% w/ 1 km at 90% MP",                            70, 81),
-    ("8 × (1 km at 103–105% MP, 1 km at 92–94% MP)",                 None,                                              "2 × 2 km at 107% MP; 2–4 × 1 km at 108–110% MP w/ 3 min jog",            63, 70),
-    ("6–8 × 3 min at 105–107% MP w/ 45 sec jog",                     None,                                              "Marathon",                                                               26, 26),
-]
-
-ME_SCHEDULES = dict(gale=ME_GALE, tornado=ME_TORNADO)
-
-# Week-by-week template for Pfitz 18-week plans.
-# Each entry: (workout_type, long_run_mi, weekly_total_mi_for_55_plan)
-# - Workout type cycles through tempo/vo2/easy across the plan
-# - long_mi and weekly_total are the actual Pfitz 18/55 prescriptions
-# 70-mpw plans use a separate scaling factor so they ramp realistically
-PFITZ_18_TEMPLATE = [
-    # (workout, long, total_55)   # phase notes
-    ("tempo", 12,  33),  # wk 1  endurance build
-    ("vo2",   13,  37),  # wk 2
-    ("tempo", 15,  42),  # wk 3
-    ("easy",  12,  32),  # wk 4  recovery week (no quality)
-    ("tempo", 16,  44),  # wk 5
-    ("vo2",   15,  46),  # wk 6
-    ("tempo", 17,  48),  # wk 7
-    ("easy",  13,  37),  # wk 8  recovery
-    ("vo2",   18,  50),  # wk 9  LT/endurance phase
-    ("tempo", 18,  52),  # wk 10
-    ("vo2",   20,  55),  # wk 11 PEAK
-    ("tempo", 14,  44),  # wk 12 recovery
-    ("tempo", 20,  55),  # wk 13 race-prep
-    ("vo2",   18,  55),  # wk 14
-    ("tempo", 20,  55),  # wk 15
-    ("easy",  16,  43),  # wk 16 taper begins
-    ("tempo", 14,  39),  # wk 17
-    ("easy",   8,  26),  # wk 18 race week (8mi long is shake-out, race separate)
-]
-
-# Pfitz 70-plan totals (different from a simple scale of 55)
-# Source: Pfitz 18/70 published progression
-PFITZ_18_TOTAL_70 = [45, 48, 53, 42, 55, 58, 62, 50, 65, 67, 70, 55, 68, 70, 70, 55, 50, 30]
-
-def expand_pfitz_week(workout_type, long_mi, total_mi):
-    """Given a workout type, long run miles, and weekly total, distribute remaining miles
-    across easy days. Returns a list of run dicts (day numbering will be reassigned later).
-    Layout: long run + 1 quality + remaining easy days summing to (total - long - quality_mi).
-    """
-    # Quality session length scales with weekly total
-    if workout_type == "easy":
-        # Recovery week: no quality, use a medium-long instead
-        quality_mi = round(total_mi * 0.18)
-        runs = [
-            dict(d=0, t="long", m=long_mi),
-            dict(d=99, t="easy", m=quality_mi),  # placeholder day, redistributed later
-        ]
-    else:
-        quality_mi = max(7, round(total_mi * 0.18))
-        runs = [
-            dict(d=0, t="long", m=long_mi),
-            dict(d=99, t=workout_type, m=quality_mi),
-        ]
-    remaining = total_mi - long_mi - quality_mi
-    # Distribute remaining across 3 easy days for 5-day weeks (will become 4 for 6-day weeks
-    # via the auto-add-6th-day logic)
-    n_easy_days = 3
-    if n_easy_days > 0 and remaining > 0:
-        per_day = remaining / n_easy_days
-        # Vary slightly: shortest day before quality, medium-long mid-week, easy near rest
-        easy_mileages = [
-            max(3, round(per_day * 0.85)),
-            max(3, round(per_day * 1.15)),
-            max(3, round(per_day * 1.0)),
-        ]
-        # Fix rounding so total matches
-        delta = remaining - sum(easy_mileages)
-        easy_mileages[1] += delta
-        for em in easy_mileages:
-            if em > 0:
-                runs.append(dict(d=99, t="easy", m=em))
-    return runs
-
-# Generate BASE_18_55 from the template
-BASE_18_55 = []
-for i, (wo, long_mi, total) in enumerate(PFITZ_18_TEMPLATE):
-    runs = expand_pfitz_week(wo, long_mi, total)
-    BASE_18_55.append(dict(w=i+1, runs=runs))
-
-# Generate BASE_18_70 — same workout types and long-run progression but higher totals
-# Long runs in 70-plan are a bit longer too
-LONG_RUN_BUMP_70 = {12:13, 13:14, 14:15, 15:16, 16:17, 17:18, 18:19, 20:21}  # +1 to longer runs
-BASE_18_70 = []
-for i, (wo, long_mi, _) in enumerate(PFITZ_18_TEMPLATE):
-    long_70 = LONG_RUN_BUMP_70.get(long_mi, long_mi)
-    runs = expand_pfitz_week(wo, long_70, PFITZ_18_TOTAL_70[i])
-    BASE_18_70.append(dict(w=i+1, runs=runs))
-
-# 12-week Pfitz plans are authored separately — they assume runners have an existing base
-# (~75-80% of peak mileage). Source: Pfitz "Advanced Marathoning" describes 12-week as a
-# compressed program for runners coming off another marathon cycle.
-# Note: exact week-by-week numbers from the book aren't published online; these are
-# best-effort approximations matching the documented structure (build → peak → taper)
-# and the source noting "peak hit at week 5-6, several weeks in 60s" for 12/70.
-
-# (workout, long_mi, total_55, total_70)
-PFITZ_12_TEMPLATE = [
-    ("tempo", 14, 42, 52),  # wk 1  endurance build
-    ("vo2",   16, 46, 58),  # wk 2
-    ("tempo", 17, 48, 62),  # wk 3
-    ("easy",  13, 38, 48),  # wk 4  recovery/cutback
-    ("vo2",   18, 50, 65),  # wk 5  LT/endurance phase
-    ("tempo", 20, 55, 70),  # wk 6  PEAK
-    ("vo2",   18, 52, 67),  # wk 7
-    ("tempo", 20, 55, 70),  # wk 8  PEAK
-    ("easy",  16, 44, 55),  # wk 9  recovery/cutback before race-prep
-    ("tempo", 20, 55, 68),  # wk 10 race-prep peak
-    ("easy",  14, 39, 50),  # wk 11 taper
-    ("easy",   8, 26, 30),  # wk 12 race week
-]
-
-BASE_12_55 = []
-BASE_12_70 = []
-for i, (wo, long_mi, t55, t70) in enumerate(PFITZ_12_TEMPLATE):
-    BASE_12_55.append(dict(w=i+1, runs=expand_pfitz_week(wo, long_mi, t55)))
-    long_70 = LONG_RUN_BUMP_70.get(long_mi, long_mi)
-    BASE_12_70.append(dict(w=i+1, runs=expand_pfitz_week(wo, long_70, t70)))
-
-def redistribute_pfitz_days(week_runs, long_day=0, quality_day=3, rest_day=1):
-    """Reassign day numbers based on user-configured preferences.
-    Day convention: 0=Sun, 1=Mon, 2=Tue, 3=Wed, 4=Thu, 5=Fri, 6=Sat.
-
-    Defaults: long=Sun, quality=Wed, rest=Mon (standard Pfitz).
-    For 5-day weeks (55-mpw plans), a 2nd rest is placed to maximize spacing.
-    For 6-day weeks (70-mpw plans), only the user-selected rest day is used.
-    """
-    long_runs = [r for r in week_runs if r["t"] == "long"]
-    other     = [r for r in week_runs if r["t"] != "long"]
-    quality_types = {"tempo", "vo2", "race"}
-    qualities = [r for r in other if r["t"] in quality_types]
-    easies    = [r for r in other if r["t"] not in quality_types]
-
-    n_runs = len(other) + len(long_runs)
-
-    # All weekdays minus long_day and rest_day
-    all_days = [0, 1, 2, 3, 4, 5, 6]
-    available = [d for d in all_days if d not in {long_day, rest_day}]
-
-    # For 5-day weeks, add a second rest day spaced to maximize gap from long_day and rest_day
-    if n_runs == 5 and len(available) > 4:
-        # Find the day that maximizes minimum distance from long_day and rest_day
-        def min_dist(d):
-            def cyclic(a, b): return min((a-b) % 7, (b-a) % 7)
-            return min(cyclic(d, long_day), cyclic(d, rest_day), cyclic(d, quality_day))
-        # Pick the day with greatest minimum distance from both rest and long
-        # (excluding quality_day so we don't override the user's quality preference)
-        candidates = [d for d in available if d != quality_day]
-        if candidates:
-            second_rest = max(candidates, key=lambda d: min(
-                ((d - long_day) % 7, (long_day - d) % 7),
-                ((d - rest_day) % 7, (rest_day - d) % 7)
-            )[0])
-            available = [d for d in available if d != second_rest]
-
-    # Trim available to match run count (excluding long run, which goes on long_day)
-    needed = n_runs - len(long_runs)  # how many non-long slots we need
-    while len(available) > needed:
-        # Drop the day adjacent to quality_day or long_day (least useful for an easy run)
-        # Just drop from the end
-        available.pop()
-
-    placed = []
-    # Place qualities — first one goes on user's quality_day, additional ones spaced out
-    quality_slots = [quality_day]
-    if len(qualities) > 1:
-        # For multiple qualities, add a second slot far from the first
-        for d in [(quality_day + 3) % 7, (quality_day + 4) % 7, (quality_day + 2) % 7]:
-            if d in available and d != long_day and d != rest_day:
-                quality_slots.append(d)
-                break
-    for i, q in enumerate(qualities):
-        chosen = quality_slots[i] if i < len(quality_slots) else (available[0] if available else quality_day)
-        placed.append(dict(d=chosen, t=q["t"], m=q["m"], **({"note":q["note"]} if "note" in q else {})))
-        if chosen in available:
-            available.remove(chosen)
-
-    # Fill remaining with easies
-    easies_sorted = sorted(easies, key=lambda r: r["m"])
-    for e in easies_sorted:
-        if not available:
-            break
-        chosen = available[0]
-        placed.append(dict(d=chosen, t=e["t"], m=e["m"], **({"note":e["note"]} if "note" in e else {})))
-        available.remove(chosen)
-
-    # Add long run
-    for lr in long_runs:
-        placed.append(dict(d=long_day, t=lr["t"], m=lr["m"], **({"note":lr["note"]} if "note" in lr else {})))
-
-    # Sort by display order (Mon → Sun)
-    def display_order(d):
-        return 7 if d == 0 else d
-    return sorted(placed, key=lambda r: display_order(r["d"]))
-
-
-def build_schedule(plan_key, long_day=0, quality_day=3, rest_day=1):
-    p = PLANS[plan_key]
-    if p.get("kind") == "me":
-        return build_me_schedule(p)
-    # Pick the right pre-built base schedule (no scaling — each is authored to its peak mileage)
-    if p["weeks"] == 18 and p["peak_mpw"] == 55:   src = BASE_18_55
-    elif p["weeks"] == 18 and p["peak_mpw"] == 70: src = BASE_18_70
-    elif p["weeks"] == 12 and p["peak_mpw"] == 55: src = BASE_12_55
-    elif p["weeks"] == 12 and p["peak_mpw"] == 70: src = BASE_12_70
-    else:
-        # Fallback to 18/55 scaled if a non-standard plan slips through
-        scale = p["peak_mpw"] / 55
-        src = [dict(w=wk["w"], runs=[dict(**r, m=round(r["m"]*scale)) for r in wk["runs"]])
-               for wk in BASE_18_55]
-    weeks = []
-    is_high_volume = p["peak_mpw"] >= 70  # 70+ mpw plans run 6 days/week
-    for i, wk in enumerate(src):
-        runs = [dict(d=r["d"], t=r["t"], m=r["m"]) for r in wk["runs"]]
-        if is_high_volume:
-            # Add a 6th easy run for high-volume plans; mileage already targets the right total
-            # so this 6th run takes a small slice from existing easies (recompute distribution)
-            week_total = sum(r["m"] for r in runs)
-            if len(runs) < 6:
-                rec_mi = max(3, min(6, round(week_total * 0.08)))
-                # Reduce the largest easy run to make room
-                easies = [r for r in runs if r["t"] == "easy"]
-                if easies:
-                    biggest = max(easies, key=lambda r: r["m"])
-                    biggest["m"] = max(3, biggest["m"] - rec_mi)
-                runs.append(dict(d=99, t="easy", m=rec_mi))
-        # Reassign days so rest is on Mon (and Fri for 5-day weeks), quality is mid-week,
-        # and easies are spread across the rest of the week.
-        runs = redistribute_pfitz_days(runs, long_day=long_day, quality_day=quality_day, rest_day=rest_day)
-        weeks.append(dict(w=i+1, runs=runs))
-    return weeks
-
-def build_me_schedule(plan_meta):
-    """Build Marathon Excellence week structure.
-    Day convention: 0=Sun, 1=Mon, ..., 6=Sat. We use:
-      Mon (d=1): rest (no run)
-      Tue (d=2): primary workout
-      Wed (d=3): easy
-      Thu (d=4): secondary workout if present, else easy
-      Fri (d=5): easy
-      Sat (d=6): easy
-      Sun (d=0): weekend workout (long)
-    Easy miles are distributed to hit the weekly target.
-    """
-    sched_key = plan_meta["me_plan"]
-    variant = 0 if plan_meta["peak_mpw"] in (70, 85) else 1
-    raw = ME_SCHEDULES[sched_key]
-
-    # Estimate workout mileage from the prescription text.
-    # Approach: pull explicit mile ranges if present; otherwise use category defaults.
-    # Since ME plans specify mileage via the weekly total column, the workout-level
-    # estimates just need to be in the right ballpark so easy days get a sensible
-    # remainder.
-    def workout_miles(text, slot="primary"):
-        import re
-        if text is None: return 0
-        if "Marathon" == text.strip(): return 26.2
-
-        # Explicit mi pattern, e.g. "7 mi at 85%"  or  "16–18 mi easy"
-        mi = re.findall(r"(\d+(?:\.\d+)?)\s*(?:[-–]\s*(\d+(?:\.\d+)?))?\s*mi(?!n)", text)
-        if mi:
-            total = 0
-            for m in mi:
-                lo = float(m[0]); hi = float(m[1]) if m[1] else lo
-                total += (lo + hi) / 2
-            # Weekend workouts with explicit miles = full workout miles (incl WU/CD embedded)
-            return total
-
-        # km-based: estimate total from the listed intervals + add WU/CD
-        total_km = 0
-        rep = re.search(r"(\d+)\s*×\s*\(([^)]+)\)", text)
-        if rep:
-            n = int(rep.group(1))
-            inner_km = re.findall(r"(\d+(?:\.\d+)?)\s*km", rep.group(2))
-            inner_m_match = re.search(r"(\d+)\s*m(?!i)", rep.group(2))
-            total_km = n * sum(float(x) for x in inner_km)
-            if inner_m_match: total_km += n * int(inner_m_match.group(1)) / 1000
-        else:
-            km_matches = re.findall(r"(\d+(?:\.\d+)?)\s*(?:[-–]\s*(\d+(?:\.\d+)?))?\s*km", text)
-            for m in km_matches:
-                lo = float(m[0]); hi = float(m[1]) if m[1] else lo
-                total_km += (lo + hi) / 2
-            # treat "N × 500m" style too
-            m_rep = re.findall(r"(\d+)\s*×\s*(\d+)\s*m(?!i)", text)
-            for n, mm in m_rep:
-                total_km += int(n) * int(mm) / 1000
-        if total_km > 0:
-            total_km += 4   # WU + CD
-            return total_km * 0.621
-
-        # Pure time-based intervals, fallback by slot
-        defaults = dict(primary=7, secondary=7, weekend=9)
-        return defaults.get(slot, 7)
-
-    weeks = []
-    for wi, row in enumerate(raw):
-        primary, secondary, weekend, mi_a, mi_b = row
-        week_total = mi_a if variant == 0 else mi_b
-
-        is_race_week = (wi == len(raw) - 1)
-
-        # Assign workout miles
-        primary_mi   = round(workout_miles(primary,   slot="primary"), 1)
-        secondary_mi = round(workout_miles(secondary, slot="secondary"), 1) if secondary else 0
-        weekend_mi   = round(workout_miles(weekend,   slot="weekend"), 1)
-        # Floors so estimates stay sensible even when text parsing falls short
-        primary_mi   = max(primary_mi, 6)
-        if secondary: secondary_mi = max(secondary_mi, 6)
-        weekend_mi   = max(weekend_mi, 8 if not is_race_week else weekend_mi)
-
-        if is_race_week:
-            # Only schedule the marathon itself, plus light shake-outs in the week
-            runs = [
-                dict(d=2, t="easy_me",    m=5,   note=primary),
-                dict(d=4, t="easy",       m=4),
-                dict(d=6, t="easy",       m=3),
-                dict(d=0, t="race",       m=26, note="Marathon"),
-            ]
-            weeks.append(dict(w=wi+1, runs=runs))
-            continue
-
-        # Cap workout mileage at the week total to prevent overshoot
-        fixed_total = primary_mi + secondary_mi + weekend_mi
-        if fixed_total > week_total:
-            # scale down proportionally (rare — only if estimator overshoots)
-            scale = week_total / fixed_total
-            primary_mi   = round(primary_mi * scale, 1)
-            secondary_mi = round(secondary_mi * scale, 1)
-            weekend_mi   = round(weekend_mi * scale, 1)
-            fixed_total  = primary_mi + secondary_mi + weekend_mi
-
-        easy_budget = max(0, week_total - fixed_total)
-
-        # Distribute easy miles with realistic cadence:
-        #   Wed = recovery (after Tue primary) — shortest
-        #   Fri = medium-long if primary was AM+PM or big; else medium
-        #   Sat = recovery (before Sun long run) — shorter
-        #   Thu = easy if no secondary
-        # Absorb extra volume into Fri (medium-long day)
-        if secondary is None:
-            easy_days_idx = [3, 4, 5, 6]  # Wed, Thu, Fri, Sat
-            weights = [0.18, 0.22, 0.38, 0.22]
-        else:
-            easy_days_idx = [3, 5, 6]  # Wed, Fri, Sat
-            weights = [0.25, 0.50, 0.25]
-
-        easy_miles_list = [round(easy_budget * w * 2) / 2 for w in weights]
-        diff = round((easy_budget - sum(easy_miles_list)) * 2) / 2
-        max_idx = weights.index(max(weights))
-        easy_miles_list[max_idx] = max(0, easy_miles_list[max_idx] + diff)
-
-        # Iteratively cap any single easy day based on weekly volume.
-        # Higher-mileage weeks allow longer easy days (runners doing 90+ mpw
-        # often have one medium-long day around 14–16 mi).
-        if   week_total >= 90: EASY_CAP = 16
-        elif week_total >= 75: EASY_CAP = 14
-        elif week_total >= 60: EASY_CAP = 13
-        else:                  EASY_CAP = 11
-        for _ in range(5):
-            over_indices = [i for i,m in enumerate(easy_miles_list) if m > EASY_CAP]
-            if not over_indices: break
-            for i in over_indices:
-                overflow = easy_miles_list[i] - EASY_CAP
-                easy_miles_list[i] = EASY_CAP
-                # distribute only to days not already over cap
-                others = [j for j in range(len(easy_miles_list)) if j not in over_indices and easy_miles_list[j] < EASY_CAP]
-                if not others: break
-                per = overflow / len(others)
-                for j in others:
-                    easy_miles_list[j] = round((easy_miles_list[j] + per) * 2) / 2
-
-        runs = []
-        runs.append(dict(d=2, t="me_primary", m=primary_mi, note=primary))
-        if secondary:
-            runs.append(dict(d=4, t="me_secondary", m=secondary_mi, note=secondary))
-        for idx, em in zip(easy_days_idx, easy_miles_list):
-            if em > 0:
-                runs.append(dict(d=idx, t="easy", m=em))
-        runs.append(dict(d=0, t="me_weekend", m=weekend_mi, note=weekend))
-
-        weeks.append(dict(w=wi+1, runs=runs))
-
-    return weeks
-
-def goal_pace_secs(time_str):
-    parts = [int(x) for x in (time_str or "3:30:00").strip().split(":")]
-    total = parts[0]*3600 + parts[1]*60 + (parts[2] if len(parts)==3 else 0)
-    return round(total / 26.2)
-
-def fmt_pace(spm):
-    spm = max(1, round(spm))
-    m, s = divmod(spm, 60)
-    return f"{m}:{s:02d}/mi"
-
-def fmt_time(secs):
-    h, rem = divmod(int(secs), 3600)
-    m, s = divmod(rem, 60)
-    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-
-def build_planned_map(plan_key, race_date_str, long_day=0, quality_day=3, rest_day=1):
-    schedule = build_schedule(plan_key, long_day=long_day, quality_day=quality_day, rest_day=rest_day)
-    p = PLANS[plan_key]
-    race_date = date.fromisoformat(race_date_str)
+def flush_store():
+    store = st.session_state.get("_store")
+    if store is not None:
+        try:
+            store.flush()
+        except sqlite3.Error as e:
+            print(f"[store] flush failed: {e}")
 
-    # The schedule uses d=0 for Sunday, d=1..6 for Mon..Sat (Sun-first convention).
-    # We display weeks Mon-Sun. plan_start = Monday of the first week of the plan.
-    # Last week ends on race_date (a Sunday in the typical case). So:
-    #   plan_start = Monday of race week - (weeks-1) weeks
-    # "Monday of race week" = race_date - race_date.weekday()
-    race_week_mon = race_date - timedelta(days=race_date.weekday())
-    plan_start = race_week_mon - timedelta(weeks=p["weeks"]-1)
-
-    # Helper: convert schedule's Sun-first day number (0=Sun..6=Sat) to Mon-first offset (0=Mon..6=Sun)
-    def day_offset(d):
-        return 6 if d == 0 else d - 1
-
-    planned = {}
-    for wi, wk in enumerate(schedule):
-        for run in wk["runs"]:
-            d = plan_start + timedelta(days=wi*7 + day_offset(run["d"]))
-            ds = d.isoformat()
-            if ds != race_date_str and d < race_date:
-                planned[ds] = run
-    planned[race_date_str] = dict(t="race", m=26)
-    return planned, plan_start.isoformat()
-
-def apply_swaps(planned_map, swaps):
-    """Apply user day-swaps on top of the base planned map."""
-    result = dict(planned_map)
-    for ds, run in swaps.items():
-        if run is None:
-            result.pop(ds, None)
-        else:
-            result[ds] = run
-    return result
-
-# ── structured segments ───────────────────────────────────────
-def fmt_range(lo, hi):
-    """Format a pace range e.g. 7:40–8:15/mi"""
-    return f"{fmt_pace(lo)}–{fmt_pace(hi)}"
-
-# ── Marathon Excellence pace math ─────────────────────────────
-# 5K pace from marathon goal via Riegel (T2 = T1 * (D2/D1)^1.06)
-# Given marathon pace per mile, returns 5K pace per mile.
-def fivek_pace_secs(marathon_gps):
-    marathon_time_secs = marathon_gps * 26.2
-    fivek_time_secs = marathon_time_secs * (3.10686 / 26.2) ** 1.06
-    return fivek_time_secs / 3.10686
-
-def fmt_elapsed(secs):
-    """Short elapsed time format — 1:23 or 5:02 or 1:02:30"""
-    if secs < 60:
-        return f"{int(round(secs))}s"
-    if secs < 3600:
-        m, s = divmod(int(round(secs)), 60)
-        return f"{m}:{s:02d}"
-    h, rem = divmod(int(round(secs)), 3600)
-    m, s = divmod(rem, 60)
-    return f"{h}:{m:02d}:{s:02d}"
-
-def pace_for_pct(pct_lo, pct_hi, base_pace_secs):
-    """Given % of reference pace (5k or MP) and base pace sec/mi, return formatted range.
-       Higher % effort = faster pace = fewer seconds per mile.
-       % is effort relative to reference race pace, so 100% = base_pace, 108% MP = faster."""
-    # 108% of MP effort means running at a pace that's faster than MP.
-    # Convert: target pace secs = base_pace / (pct/100)
-    lo_pace = base_pace_secs / (pct_hi / 100)   # faster pace comes from higher %
-    hi_pace = base_pace_secs / (pct_lo / 100)
-    if abs(lo_pace - hi_pace) < 2:
-        return fmt_pace(lo_pace)
-    return f"{fmt_pace(lo_pace)}–{fmt_pace(hi_pace)}"
-
-def parse_me_segments(note, gps):
-    """Parse a Marathon Excellence workout description into structured segments.
-    Returns list of (label, distance_str, pace_str, detail).
-    Also includes a warmup and cooldown line.
-    """
-    import re
-    if not note:
-        return []
-
-    text = note
-    fivek_p = fivek_pace_secs(gps)  # 5K pace sec/mi
-    mp_p    = gps
-    segs    = []
-
-    # Always prefix with a warmup
-    segs.append(("Warmup", "~2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to get loose"))
-
-    # Helper to extract % ranges: "90–92% 5k" or "108% MP"
-    def find_pct_pace(s):
-        """Return (pct_lo, pct_hi, ref) or None. ref = '5k' or 'MP'."""
-        m = re.search(r"(\d+)(?:[-–](\d+))?\s*%\s*(5k|MP)", s, re.IGNORECASE)
-        if not m: return None
-        lo = int(m.group(1))
-        hi = int(m.group(2)) if m.group(2) else lo
-        return lo, hi, m.group(3).upper()
-
-    def pace_str_for(pct_info):
-        lo, hi, ref = pct_info
-        base = fivek_p if ref == "5K" else mp_p
-        return pace_for_pct(lo, hi, base)
-
-    def effort_for_pct(pct_lo, pct_hi, ref):
-        """Plain-English effort description based on intensity."""
-        avg = (pct_lo + pct_hi) / 2
-        if ref == "5K":
-            if avg >= 102: return "All-out — 1500m to 3K race effort. Hard, controlled breathing. Should not be sustainable past the rep duration."
-            if avg >= 98:  return "5K race effort. Hard but controlled. Heavy breathing, can only get out 1–2 words at a time."
-            if avg >= 92:  return "10K race effort. Comfortably hard — labored breathing, legs working but not redlining. You should finish each rep wanting one more."
-            if avg >= 86:  return "Half-marathon race effort. Steady, focused — breathing is elevated but rhythmic. Just below threshold."
-            if avg >= 80:  return "Steady aerobic effort. Conversational becomes hard but possible. Builds aerobic strength."
-            return         "Easy-to-moderate effort. Should still feel relaxed."
-        else:  # MP
-            if avg >= 108: return "Faster than marathon pace by ~30 sec/mi. Sharpens your top-end aerobic gear."
-            if avg >= 104: return "Slightly faster than goal MP. Should feel controlled but pointed — practice for late-race gear shifts."
-            if avg >= 100: return "Goal marathon pace. Feels comfortably hard — sustainable, but not relaxing. This is your race rhythm."
-            if avg >= 95:  return "Just below MP. Strong aerobic effort that builds confidence at race-adjacent paces."
-            if avg >= 88:  return "Marathon-specific endurance pace. Builds the engine without the recovery cost of true MP work."
-            return         "Steady aerobic — recovery between hard efforts."
-
-    # Handle each class of workout
-
-    # 1) Time-based rep: e.g. "8 × 3 min at 90–92% 5k w/ 1 min jog"
-    m = re.search(r"(\d+)(?:[-–](\d+))?\s*×\s*(\d+(?:\.\d+)?)\s*min\s*at\s*([^,w]+?)(?:\s*w/\s*(.+))?$", text, re.IGNORECASE)
-    if m:
-        reps_lo = int(m.group(1))
-        reps_hi = int(m.group(2)) if m.group(2) else reps_lo
-        rep_min = float(m.group(3))
-        pct = find_pct_pace(m.group(4))
-        jog = m.group(5) or "jog"
-        if pct:
-            reps_str = f"{reps_lo}" if reps_lo == reps_hi else f"{reps_lo}–{reps_hi}"
-            lo, hi, ref = pct
-            base = fivek_p if ref == "5K" else mp_p
-            rep_pace_lo = base / (hi / 100)
-            rep_pace_hi = base / (lo / 100)
-            # Distance covered per rep
-            dist_lo = rep_min * 60 / rep_pace_hi  # miles
-            dist_hi = rep_min * 60 / rep_pace_lo
-            avg_dist = (dist_lo + dist_hi) / 2
-            total_hard_mi = reps_lo * avg_dist
-            segs.append((
-                f"{reps_str} × {rep_min:g} min @ {lo}–{hi}% {ref}" if lo != hi else f"{reps_str} × {rep_min:g} min @ {lo}% {ref}",
-                f"~{total_hard_mi:.1f} mi",
-                pace_str_for(pct),
-                f"Each rep {fmt_elapsed(rep_min*60)} (~{avg_dist:.2f} mi). Recovery: {jog}"
-            ))
-            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog"))
-            return segs
-
-    # 2) Distance-based rep: "5 × 1 mi at 95% 5k w/ 3 min jog" or "8 × 1 km at 95% 5k"
-    m = re.search(r"(\d+)(?:[-–](\d+))?\s*×\s*(\d+(?:\.\d+)?)\s*(mi|km|m)\b\s*at\s*([^,w]+?)(?:\s*w/\s*(.+))?$", text, re.IGNORECASE)
-    if m:
-        reps_lo = int(m.group(1))
-        reps_hi = int(m.group(2)) if m.group(2) else reps_lo
-        rep_dist = float(m.group(3))
-        unit = m.group(4).lower()
-        pct = find_pct_pace(m.group(5))
-        jog = m.group(6) or "jog"
-        # Convert rep distance to miles
-        if unit == "km":
-            rep_mi = rep_dist * 0.621371
-            dist_label = f"{rep_dist:g} km"
-        elif unit == "m":
-            rep_mi = rep_dist / 1609.34
-            dist_label = f"{rep_dist:g}m"
-        else:
-            rep_mi = rep_dist
-            dist_label = f"{rep_dist:g} mi"
-        if pct:
-            reps_str = f"{reps_lo}" if reps_lo == reps_hi else f"{reps_lo}–{reps_hi}"
-            lo, hi, ref = pct
-            base = fivek_p if ref == "5K" else mp_p
-            rep_pace_lo = base / (hi / 100)
-            rep_pace_hi = base / (lo / 100)
-            rep_time_lo = rep_mi * rep_pace_lo
-            rep_time_hi = rep_mi * rep_pace_hi
-            total_hard_mi = reps_lo * rep_mi
-            time_str = (f"{fmt_elapsed(rep_time_lo)}" if abs(rep_time_hi - rep_time_lo) < 2
-                        else f"{fmt_elapsed(rep_time_lo)}–{fmt_elapsed(rep_time_hi)}")
-            pct_str = f"{lo}–{hi}% {ref}" if lo != hi else f"{lo}% {ref}"
-            segs.append((
-                f"{reps_str} × {dist_label} @ {pct_str}",
-                f"~{total_hard_mi:.1f} mi total",
-                pace_str_for(pct),
-                f"Each rep: {time_str}. Recovery: {jog}"
-            ))
-            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog"))
-            return segs
-
-    # 3) Continuous effort: e.g. "7 mi at 85% 5k" or "9–10 mi at 100% MP"
-    m = re.search(r"(\d+(?:\.\d+)?)(?:[-–](\d+(?:\.\d+)?))?\s*mi\s*at\s*([^,]+)$", text, re.IGNORECASE)
-    if m:
-        d_lo = float(m.group(1))
-        d_hi = float(m.group(2)) if m.group(2) else d_lo
-        pct = find_pct_pace(m.group(3))
-        if pct:
-            lo, hi, ref = pct
-            base = fivek_p if ref == "5K" else mp_p
-            pace_lo = base / (hi / 100)
-            pace_hi = base / (lo / 100)
-            total_time_lo = d_lo * pace_hi
-            total_time_hi = d_hi * pace_lo
-            d_str = f"{d_lo:g} mi" if d_lo == d_hi else f"{d_lo:g}–{d_hi:g} mi"
-            pct_str = f"{lo}–{hi}% {ref}" if lo != hi else f"{lo}% {ref}"
-            time_str = f"{fmt_elapsed(total_time_lo)}–{fmt_elapsed(total_time_hi)}"
-            segs = segs[:-1] if segs and segs[-1][0] == "Warmup" else segs  # keep warmup
-            segs.append((
-                f"Continuous @ {pct_str}",
-                d_str,
-                pace_str_for(pct),
-                f"Total elapsed: {time_str}"
-            ))
-            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog"))
-            return segs
-
-    # 4) Kenyan-style progression — describe the concept
-    if "Kenyan-style" in text or "kenyan-style" in text.lower():
-        d = re.search(r"(\d+(?:\.\d+)?)\s*mi", text)
-        dist = f"{d.group(1)} mi" if d else f"~{6} mi"
-        segs = []
-        segs.append((
-            "Kenyan-style progression",
-            dist,
-            fmt_range(gps + 30, gps + 75),
-            "Start at easy/long pace, progressively pick up to finish near or at MP"
-        ))
-        segs.append(("Finish effort (last ~1 mi)", "", fmt_pace(gps), "Should feel strong but controlled"))
-        return segs
-
-    # 5) Ladder / set patterns:
-    #    "2 sets of 4-3-2-1 min at 96-98-100-102% 5k w/ 1 min mod / 2-3 min jog"
-    #    "4 × (3-2-1 min at 98-100-102% 5k w/ 1-1-2 min jog)"
-    #    "3-2-1-3-2-1 km at 86–88% 5k w/ 2 min walk"
-    set_patterns = [
-        r"(\d+)\s*sets?\s*of\s*([\d-]+)\s*(min|km|m(?!i)|mi)\s*at\s*([\d-]+)\s*%\s*(5k|MP)(?:\s*w/\s*(.+))?",
-        r"(\d+)\s*×\s*\(\s*([\d-]+)\s*(min|km|m(?!i)|mi)\s*at\s*([\d-]+)\s*%\s*(5k|MP)(?:\s*w/\s*([^)]+))?\)",
-    ]
-    for pat in set_patterns:
-        m = re.search(pat, text, re.IGNORECASE)
-        if m:
-            n_sets = int(m.group(1))
-            durations = [float(x) for x in m.group(2).split("-")]
-            unit = m.group(3).lower()
-            pcts = [int(x) for x in m.group(4).split("-")]
-            ref = m.group(5).upper()
-            recovery = m.group(6) or "jog"
-
-            # If pcts shorter than durations, repeat pcts; if pcts longer, the prescription
-            # is a ladder where each duration has its own pct. Most ME workouts pair them 1-to-1.
-            # Pad pcts to match durations length.
-            if len(pcts) < len(durations):
-                # Same pct for all reps in ladder
-                pcts = [pcts[0]] * len(durations) if len(pcts) == 1 else pcts + [pcts[-1]] * (len(durations) - len(pcts))
-
-            base = fivek_p if ref == "5K" else mp_p
-
-            # Build the per-rep table with exact pace + time/distance
-            sets_to_show = 1 if n_sets > 3 else n_sets
-            for set_i in range(sets_to_show):
-                if n_sets > 1:
-                    segs.append((f"— Set {set_i+1} of {n_sets} —", "", "", ""))
-                for rep_i, dur in enumerate(durations):
-                    pct = pcts[rep_i] if rep_i < len(pcts) else pcts[-1]
-                    target_pace = base / (pct / 100)
-                    if unit == "min":
-                        dist_mi = dur * 60 / target_pace
-                        time_str = fmt_elapsed(dur * 60)
-                        label = f"Rep {rep_i+1}: {dur:g} min @ {pct}% {ref}"
-                        dist_str = f"{dist_mi:.2f} mi"
-                    elif unit == "km":
-                        dist_mi = dur * 0.621371
-                        time_secs = dist_mi * target_pace
-                        time_str = fmt_elapsed(time_secs)
-                        label = f"Rep {rep_i+1}: {dur:g} km @ {pct}% {ref}"
-                        dist_str = f"{dur:g} km"
-                    elif unit == "m":
-                        dist_mi = dur / 1609.34
-                        time_secs = dist_mi * target_pace
-                        time_str = fmt_elapsed(time_secs)
-                        label = f"Rep {rep_i+1}: {dur:g}m @ {pct}% {ref}"
-                        dist_str = f"{dur:g}m"
-                    else:  # mi
-                        dist_mi = dur
-                        time_secs = dist_mi * target_pace
-                        time_str = fmt_elapsed(time_secs)
-                        label = f"Rep {rep_i+1}: {dur:g} mi @ {pct}% {ref}"
-                        dist_str = f"{dur:g} mi"
-                    effort = effort_for_pct(pct, pct, ref)
-                    segs.append((label, dist_str, fmt_pace(target_pace),
-                                 f"Run for {time_str} at {fmt_pace(target_pace)}. {effort}"))
-
-            if n_sets > sets_to_show:
-                segs.append((f"↻ Repeat for {n_sets} total sets", "—", "—", f"Pattern above × {n_sets}."))
-            segs.append(("Recovery between reps", "—", "—", recovery.strip()))
-            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to flush the legs and bring HR down."))
-            return segs
-
-    # 6) Explicit alternating segments inside parens, e.g. "5 × (1600m at 105–107% MP, 400m at 95–98% MP)"
-    paren_alt = re.search(r"(\d+)\s*×\s*\((.+)\)", text)
-    if paren_alt:
-        n = int(paren_alt.group(1))
-        inner = paren_alt.group(2)
-        # Parse comma-separated segments
-        parts = [p.strip() for p in inner.split(",")]
-        parsed_parts = []
-        for p in parts:
-            # Try to extract distance/time + pct
-            d = re.search(r"(\d+(?:\.\d+)?)\s*(km|m(?!i)|mi|min)\s*at\s*(\d+)(?:[-–](\d+))?\s*%\s*(5k|MP)", p, re.IGNORECASE)
-            if d:
-                amt = float(d.group(1))
-                unit = d.group(2).lower()
-                pct_lo = int(d.group(3)); pct_hi = int(d.group(4)) if d.group(4) else pct_lo
-                ref = d.group(5).upper()
-                parsed_parts.append((amt, unit, pct_lo, pct_hi, ref))
-            else:
-                parsed_parts.append(("recovery", p))
-
-        if parsed_parts and isinstance(parsed_parts[0], tuple) and parsed_parts[0][0] != "recovery":
-            # For workouts with many sets, show only set 1 in detail + a note
-            sets_to_show = 1 if n > 3 else n
-            for set_i in range(sets_to_show):
-                if n > 1:
-                    segs.append((f"— Set {set_i+1} of {n} —", "", "", ""))
-                for rep_i, pp in enumerate(parsed_parts):
-                    if pp[0] == "recovery":
-                        segs.append(("Recovery", "—", "—", pp[1]))
-                        continue
-                    amt, unit, pct_lo, pct_hi, ref = pp
-                    base = fivek_p if ref == "5K" else mp_p
-                    pace_secs = base / (pct_hi / 100)  # use the faster end of range
-                    if unit == "km":
-                        dist_mi = amt * 0.621371
-                        dist_str = f"{amt:g} km"
-                        time_str = fmt_elapsed(dist_mi * pace_secs)
-                    elif unit == "m":
-                        dist_mi = amt / 1609.34
-                        dist_str = f"{amt:g}m"
-                        time_str = fmt_elapsed(dist_mi * pace_secs)
-                    elif unit == "mi":
-                        dist_mi = amt
-                        dist_str = f"{amt:g} mi"
-                        time_str = fmt_elapsed(dist_mi * pace_secs)
-                    else:  # min
-                        dist_mi = amt * 60 / pace_secs
-                        dist_str = f"~{dist_mi:.2f} mi"
-                        time_str = fmt_elapsed(amt * 60)
-                    pct_str = f"{pct_lo}–{pct_hi}% {ref}" if pct_lo != pct_hi else f"{pct_lo}% {ref}"
-                    pace_disp = pace_for_pct(pct_lo, pct_hi, base) if pct_lo != pct_hi else fmt_pace(pace_secs)
-                    effort = effort_for_pct(pct_lo, pct_hi, ref)
-                    segs.append((f"Segment {rep_i+1}: {pct_str}", dist_str, pace_disp,
-                                 f"Run for {time_str} at this pace. {effort}"))
-            if n > sets_to_show:
-                segs.append((f"↻ Repeat for {n} total sets", "—", "—", f"Pattern above × {n}. Recovery between sets as prescribed."))
-            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to flush the legs and bring HR down."))
-            return segs
-
-    # 7) Hyphenated ladder of distances at single pct, e.g. "3-2-1-3-2-1 km at 86–88% 5k w/ 2 min walk"
-    ladder = re.search(r"^([\d-]+)\s*(km|m(?!i)|mi)\s*at\s*(\d+)(?:[-–](\d+))?\s*%\s*(5k|MP)(?:\s*w/\s*(.+))?", text, re.IGNORECASE)
-    if ladder:
-        amounts = [float(x) for x in ladder.group(1).split("-")]
-        unit = ladder.group(2).lower()
-        pct_lo = int(ladder.group(3)); pct_hi = int(ladder.group(4)) if ladder.group(4) else pct_lo
-        ref = ladder.group(5).upper()
-        recovery = ladder.group(6) or "jog"
-        base = fivek_p if ref == "5K" else mp_p
-        pace_secs = base / (pct_hi / 100)
-        for rep_i, amt in enumerate(amounts):
-            if unit == "km":
-                dist_mi = amt * 0.621371
-                dist_str = f"{amt:g} km"
-            elif unit == "m":
-                dist_mi = amt / 1609.34
-                dist_str = f"{amt:g}m"
-            else:
-                dist_mi = amt
-                dist_str = f"{amt:g} mi"
-            time_str = fmt_elapsed(dist_mi * pace_secs)
-            pace_disp = pace_for_pct(pct_lo, pct_hi, base) if pct_lo != pct_hi else fmt_pace(pace_secs)
-            pct_str = f"{pct_lo}–{pct_hi}% {ref}" if pct_lo != pct_hi else f"{pct_lo}% {ref}"
-            effort = effort_for_pct(pct_lo, pct_hi, ref)
-            segs.append((f"Rep {rep_i+1}: {dist_str} @ {pct_str}", dist_str, pace_disp,
-                         f"Should take ~{time_str}. {effort}"))
-        segs.append(("Recovery between reps", "—", "—", recovery.strip()))
-        segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to flush the legs and bring HR down."))
-        return segs
-
-    # 8) Final fallback — show prescription verbatim with reference paces
-    segs.append((
-        "Full session",
-        "—",
-        "See prescription",
-        note
-    ))
-    segs.append(("Your 5K pace (est.)",  "—", fmt_pace(fivek_p), "From Riegel formula vs marathon goal"))
-    segs.append(("Your MP (goal)",       "—", fmt_pace(mp_p),    "Marathon goal pace"))
-    return segs
-
-def total_miles_placeholder_unused(): return 0  # avoid NameError in fallback branch
-
-def workout_segments(wtype, total_miles, gps, note=None):
-    easy_p  = fmt_range(gps + 60, gps + 90)   # 60–90 sec/mi slower than MP
-    long_p  = fmt_range(gps + 45, gps + 75)   # 45–75 sec/mi slower than MP
-    tempo_p = fmt_range(gps - 25, gps - 15)   # 15K to HM race pace (Pfitz LT)
-    vo2_p   = fmt_range(gps - 70, gps - 50)   # ~60 sec/mi faster than MP
-    mp_p    = fmt_pace(gps)
-    rec_p   = fmt_range(gps + 80, gps + 105)  # very easy recovery jog
-
-    # Marathon Excellence workouts: parse the verbatim note into structured segments
-    if wtype in ("me_primary", "me_secondary", "me_weekend"):
-        parsed = parse_me_segments(note, gps) if note else []
-        if parsed:
-            # Prepend verbatim prescription at the top for reference
-            header = [("Prescription", "—", "—", note)] if note else []
-            return header + parsed
-        return [("Session", f"~{total_miles} mi", "—", note or "See book")]
-
-    if wtype == "easy":
-        return [("Full run", f"{total_miles} mi", easy_p, "Conversational effort throughout — you should be able to speak full sentences")]
-
-    elif wtype == "long":
-        easy_m = round(total_miles * 0.75, 1)
-        mp_m   = round(total_miles - easy_m, 1)
-        return [
-            ("Easy portion", f"{easy_m} mi", long_p, "Relaxed aerobic effort"),
-            ("Final portion (optional)", f"{mp_m} mi", mp_p, "Finish at marathon pace only if feeling strong — skip if fatigued"),
-        ]
-
-    elif wtype == "tempo":
-        wu = min(2.0, round(total_miles * 0.20, 1))
-        cd = min(2.0, round(total_miles * 0.20, 1))
-        lt = round(total_miles - wu - cd, 1)
-        return [
-            ("Warmup", f"{wu} mi", easy_p, "Easy effort, gradually loosening up"),
-            ("Lactate threshold", f"{lt} mi", tempo_p, "Comfortably hard — labored breathing, few words. This is the key effort"),
-            ("Cooldown", f"{cd} mi", easy_p, "Easy effort, flush the legs"),
-        ]
-
-    elif wtype == "vo2":
-        wu = min(2.0, round(total_miles * 0.18, 1))
-        cd = min(2.0, round(total_miles * 0.18, 1))
-        interval_block = round(total_miles - wu - cd, 1)
-        if interval_block <= 3.5:
-            n_reps = 5; rep_m_per = 1000
-            rep_str = "5 × 1000m"
-        elif interval_block <= 5.0:
-            n_reps = 6; rep_m_per = 1000
-            rep_str = "6 × 1000m or 5 × 1200m"
-        elif interval_block <= 6.5:
-            n_reps = 6; rep_m_per = 1200
-            rep_str = "6 × 1200m"
-        else:
-            n_reps = 8; rep_m_per = 1200
-            rep_str = "8 × 1200m"
-        hard_m = round(n_reps * rep_m_per / 1609.34, 1)
-
-        # Per Pfitz: recovery jog duration ≈ equal to interval duration (not fixed 400m).
-        # Recovery pace = very easy, 90-120 sec/mi slower than MP (slower than easy runs).
-        # For a rep of rep_m_per meters at VO2 pace (gps - 60 sec/mi):
-        vo2_pace_spm = gps - 60  # approx center of VO2 range
-        rep_time_secs = (rep_m_per / 1609.34) * vo2_pace_spm
-        # Recovery pace: genuinely conversational — slower than easy runs
-        rec_pace_spm = gps + 100  # ~100 sec/mi slower than MP
-        rec_dist_per = round(rep_time_secs / rec_pace_spm, 2)  # miles of recovery per rep
-        rec_m = round((n_reps - 1) * rec_dist_per, 1)
-        rec_time_str = f"{int(rep_time_secs // 60)}:{int(rep_time_secs % 60):02d}"
-        rec_pace_fmt = fmt_pace(rec_pace_spm)
-
-        actual_subtotal = hard_m + rec_m + wu + cd
-        diff = total_miles - actual_subtotal
-        if abs(diff) > 0.3:
-            cd = max(1.0, round(cd + diff, 1))
-
-        return [
-            ("Warmup", f"{wu} mi", easy_p, "Easy jog — get loose, add 4-6 strides at the end"),
-            (f"Intervals ({rep_str})", f"{hard_m} mi", vo2_p, "5K race effort. Hard but controlled — not an all-out sprint"),
-            (f"Recovery jogs ({n_reps - 1} × ~{rec_time_str})", f"{rec_m} mi",
-             "jog / walk",
-             f"Jog or walk for ≈ the same duration as the rep (~{rec_time_str} each). "
-             f"No pace target — go as slow as you need. Don't start the next rep until breathing is fully under control."),
-            ("Cooldown", f"{cd} mi", easy_p, "Easy jog home — shake out the legs"),
-        ]
-
-    elif wtype == "race":
-        return [
-            ("Miles 1–13.1 (first half)", "13.1 mi", mp_p, "Disciplined and patient — resist the crowd and adrenaline"),
-            ("Miles 13.1–18 (second half, early)", "4.9 mi", mp_p, "Stay locked in. This stretch decides the race"),
-            ("Miles 18–22 (the wall zone)", "4 mi", mp_p, "Dig deep. Shorten stride, stay relaxed, keep turnover high"),
-            ("Miles 22–26.2 (finish)", "4.2 mi", fmt_pace(gps - 10), "Give what you have — controlled aggression"),
-        ]
-
-    return [("Full run", f"{total_miles} mi", fmt_pace(gps + 75), "")]
-
-# ── pill styles ───────────────────────────────────────────────
-PILL_STYLE = {
-    "easy":   ("rgba(93,202,165,0.15)",  "#085041", "#5DCAA5"),
-    "long":   ("rgba(155,143,232,0.15)", "#3C3489", "#9b8fe8"),
-    "tempo":  ("rgba(232,168,37,0.15)",  "#633806", "#e8a825"),
-    "vo2":    ("rgba(224,87,87,0.15)",   "#791F1F", "#e05757"),
-    "race":   ("#FC4C02",                "#ffffff", "#FC4C02"),
-    "actual": ("rgba(91,163,232,0.15)",  "#0C447C", "#5ba3e8"),
-    "both":   ("rgba(93,202,165,0.2)",   "#065f46", "#5DCAA5"),
-    "missed": ("rgba(224,87,87,0.12)",   "#991b1b", "#e05757"),
-}
-WTYPE_LABEL = dict(
-    easy="Easy run", long="Long run", tempo="Lactate threshold", vo2="VO2 max", race="Race day",
-    me_primary="Primary workout", me_secondary="Secondary workout", me_weekend="Weekend workout",
-)
-WTYPE_PURPOSE = dict(
-    easy="Aerobic base building and active recovery.",
-    long="Builds endurance, fat oxidation, and mental toughness. The most important run of the week.",
-    tempo="Raises lactate threshold — the pace you can sustain for extended periods.",
-    vo2="Increases maximal aerobic capacity. High stress, high reward.",
-    race="Your goal marathon. Patient first half — the race truly begins at mile 18.",
-    me_primary="Main quality session for the week. The most important workout.",
-    me_secondary="Second quality session of the week, usually lower intensity than the primary.",
-    me_weekend="Long run or marathon-specific session. Often the highest volume of the week.",
-)
-
-def seg_table(segments):
-    rows = ""
-    for name, dist, pace, note in segments:
-        # Prescription row has "—" for dist and pace - render it as a single full-width row
-        if name == "Prescription":
-            rows += f"""
-          <tr><td colspan="3" style="padding:6px 0;color:#fff;font-size:11px;font-weight:600;line-height:1.5;word-wrap:break-word;white-space:normal">{note}</td></tr>
-            """
-            continue
-        rows += f"""
-          <tr>
-            <td style="padding:5px 8px 5px 0;color:#ccc;font-size:11px;vertical-align:top;word-wrap:break-word;white-space:normal">{name}</td>
-            <td style="padding:5px 4px;color:#fff;font-family:monospace;font-size:11px;white-space:nowrap;vertical-align:top">{dist}</td>
-            <td style="padding:5px 0 5px 4px;color:#FC4C02;font-family:monospace;font-size:11px;white-space:nowrap;vertical-align:top;text-align:right">{pace}</td>
-          </tr>
-          {f'<tr><td colspan="3" style="padding:0 0 6px 0;color:#555;font-size:10px;font-style:italic;line-height:1.4;word-wrap:break-word;white-space:normal">{note}</td></tr>' if note else ''}
-        """
-    return f'''<table style="width:100%;border-collapse:collapse;table-layout:fixed">
-      <colgroup>
-        <col style="width:38%">
-        <col style="width:27%">
-        <col style="width:35%">
-      </colgroup>
-      {rows}
-    </table>'''
-
-def make_tooltip(mode, wtype, planned_miles, gps, actual=None, note=None):
-    label   = WTYPE_LABEL.get(wtype, "Run") if wtype else (actual or {}).get("name","Run")
-    purpose = WTYPE_PURPOSE.get(wtype, "")
-    status_map = dict(planned="#5ba3e8", both="#5DCAA5", missed="#e05757", actual="#5ba3e8")
-    status_lbl = dict(planned="Upcoming", both="Completed", missed="Missed", actual="Unplanned")
-    sc = status_map.get(mode, "#aaa")
-    sl = status_lbl.get(mode, "")
-
-    body = ""
-
-    if mode in ("planned", "both", "missed") and wtype:
-        segs = workout_segments(wtype, planned_miles, gps, note=note)
-        is_me = wtype in ("me_primary", "me_secondary", "me_weekend")
-        mi_prefix = "~" if is_me else ""
-        body += f"""
-        <div style="font-size:13px;color:#aaa;margin-bottom:10px">{mi_prefix}{planned_miles} mi planned</div>
-        <div style="font-size:10px;color:#555;margin-bottom:6px;text-transform:uppercase;letter-spacing:.06em">Workout structure</div>
-        {seg_table(segs)}"""
-
-    if mode == "both" and actual:
-        # Distance delta
-        dist_diff = actual["miles"] - planned_miles
-        dist_pct  = dist_diff / planned_miles * 100 if planned_miles else 0
-        if abs(dist_pct) < 5:
-            dist_verdict = ("✓ On target", "#5DCAA5")
-        elif dist_diff > 0:
-            dist_verdict = (f"+{dist_diff:.1f} mi over", "#5ba3e8")
-        else:
-            dist_verdict = (f"{dist_diff:.1f} mi short", "#e8a825")
-
-        # Pace delta vs target pace for this workout type
-        target_spm = gps + {"easy":75,"long":60,"tempo":-20,"vo2":-60,"race":0}.get(wtype, 75)
-        pace_diff  = actual["pace"] - target_spm  # positive = slower than target
-        if abs(pace_diff) < 15:
-            pace_verdict = ("✓ On pace", "#5DCAA5")
-        elif pace_diff > 0:
-            pace_verdict = (f"{abs(round(pace_diff))}s/mi too slow", "#e8a825")
-        else:
-            pace_verdict = (f"{abs(round(pace_diff))}s/mi too fast", "#e05757")
-
-        body += f"""
-        <div style="border-top:1px solid #2a2a2a;margin-top:10px;padding-top:10px">
-        <div style="font-size:10px;color:#555;margin-bottom:8px;text-transform:uppercase;letter-spacing:.06em">Your actual run</div>
-        <table style="width:100%;border-collapse:collapse">
-          <tr>
-            <td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Distance</td>
-            <td style="color:#fff;font-family:monospace;font-size:11px">{actual["miles"]:.2f} mi</td>
-            <td style="color:{dist_verdict[1]};font-size:10px;text-align:right;padding-left:6px">{dist_verdict[0]}</td>
-          </tr>
-          <tr>
-            <td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg pace</td>
-            <td style="color:#FC4C02;font-family:monospace;font-size:11px">{fmt_pace(actual["pace"])}</td>
-            <td style="color:{pace_verdict[1]};font-size:10px;text-align:right;padding-left:6px">{pace_verdict[0]}</td>
-          </tr>
-          {"" if not actual.get("hr") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg HR</td><td style="color:#fff;font-family:monospace;font-size:11px" colspan="2">{round(actual["hr"])} bpm</td></tr>'}
-          {"" if not actual.get("elev") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Elevation</td><td style="color:#fff;font-family:monospace;font-size:11px" colspan="2">{actual["elev"]} ft</td></tr>'}
-          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Time</td><td style="color:#fff;font-family:monospace;font-size:11px" colspan="2">{fmt_time(actual["moving_time"])}</td></tr>
-        </table></div>"""
-
-    if mode == "actual" and actual:
-        body += f"""
-        <table style="width:100%;border-collapse:collapse;margin-top:8px">
-          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Distance</td><td style="color:#fff;font-family:monospace;font-size:11px">{actual['miles']:.2f} mi</td></tr>
-          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg pace</td><td style="color:#FC4C02;font-family:monospace;font-size:11px">{fmt_pace(actual['pace'])}</td></tr>
-          {"" if not actual.get("hr") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg HR</td><td style="color:#fff;font-family:monospace;font-size:11px">{round(actual["hr"])} bpm</td></tr>'}
-          {"" if not actual.get("elev") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Elevation</td><td style="color:#fff;font-family:monospace;font-size:11px">{actual["elev"]} ft</td></tr>'}
-          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Time</td><td style="color:#fff;font-family:monospace;font-size:11px">{fmt_time(actual['moving_time'])}</td></tr>
-        </table>"""
-
-    html = f"""
-    <div style="background:#111;border:1px solid #2a2a2a;border-radius:10px;padding:14px 16px;width:290px;font-family:system-ui,sans-serif">
-      <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:6px">
-        <div style="font-size:15px;font-weight:600;color:#fff">{label}</div>
-        <div style="font-size:10px;color:{sc};background:{sc}22;padding:2px 8px;border-radius:20px;font-weight:600">{sl}</div>
-      </div>
-      <div style="font-size:11px;color:#555;line-height:1.5;margin-bottom:8px">{purpose if mode != "actual" else ""}</div>
-      {body}
-    </div>"""
-    return html
-
-def tooltip_css():
-    return """
-<style>
-.tip-wrap{position:relative;display:block}
-.tip-pill{font-size:10px;padding:2px 6px;border-radius:4px;font-weight:600;
-  white-space:nowrap;overflow:hidden;text-overflow:ellipsis;cursor:default;line-height:1.6;display:block}
-.tip-box{
-  display:none;
-  position:absolute;
-  z-index:9999;
-  top:calc(100% + 4px);
-  left:0;
-  width:320px;
-  max-width:320px;
-  max-height:420px;
-  overflow-y:auto;
-  pointer-events:auto;
-}
-/* On the left-side columns of the week grid, flip tooltip to align to pill's LEFT edge going right.
-   On the right-side columns, anchor to RIGHT edge going left.
-   This is handled per-day using data-col attribute below. */
-.tip-wrap[data-col="0"] .tip-box,
-.tip-wrap[data-col="1"] .tip-box,
-.tip-wrap[data-col="2"] .tip-box,
-.tip-wrap[data-col="3"] .tip-box{left:0;right:auto}
-.tip-wrap[data-col="4"] .tip-box,
-.tip-wrap[data-col="5"] .tip-box,
-.tip-wrap[data-col="6"] .tip-box{left:auto;right:0}
-.tip-wrap:hover .tip-box{display:block}
-/* Keep hover alive while moving mouse across the small gap */
-.tip-wrap::after{content:"";position:absolute;top:100%;left:-8px;right:-8px;height:8px}
-</style>"""
-
-def pill_html(label, bg, tooltip_html, fg=None, col=0):
-    # fg auto-selects based on bg lightness if not provided
-    light_bgs = {"#e5e7eb", "#dbeafe", "#f3f4f6"}
-    if fg is None:
-        fg = "#374151" if bg in light_bgs else "#fff"
-    return f'''
-<div class="tip-wrap" data-col="{col}">
-  <div class="tip-pill" style="background:{bg};color:{fg}">{label}</div>
-  <div class="tip-box">{tooltip_html}</div>
-</div>'''  
-
-WTYPE_SHORT = dict(
-    easy="Easy", long="Long", tempo="Tempo", vo2="VO2", race="Race",
-    me_primary="Primary", me_secondary="Secondary", me_weekend="Weekend",
-)
-
-def completion_color(dist_pct):
-    """Smooth green→red gradient. Generous — 80%+ is solidly green."""
-    # Clamp to 0–100, map 80–100% → green, 0–50% → red, interpolate between
-    pct = max(0, min(dist_pct, 100))
-    # Normalize: 100% = 1.0, 50% = 0.0 (below 50 is all red)
-    t = max(0.0, (pct - 50) / 50)
-    # Ease the curve so 80%+ looks green
-    t = t ** 0.6
-    # green: #5DCAA5  red: #e05757
-    r = round(0x5D + (0xe0 - 0x5D) * (1 - t))
-    g = round(0xCA + (0x57 - 0xCA) * (1 - t))
-    b = round(0xA5 + (0x57 - 0xA5) * (1 - t))
-    return f"#{r:02x}{g:02x}{b:02x}"
-
-def week_grade(plan_mi, act_mi, planned_days, completed_days, missed_days):
-    """Letter grade + gradient color matching completion_color logic."""
-    if plan_mi == 0:
-        return None, None
-    pct = act_mi / plan_mi * 100 if plan_mi else 0
-    miss_rate = missed_days / planned_days if planned_days else 0
-    # Penalize missed days slightly
-    effective_pct = pct * (1 - miss_rate * 0.3)
-    color = completion_color(effective_pct)
-    if effective_pct >= 90:   grade = "A"
-    elif effective_pct >= 78: grade = "B"
-    elif effective_pct >= 63: grade = "C"
-    elif effective_pct >= 48: grade = "D"
-    else:                     grade = "F"
-    return grade, color
-
-def day_cell(ds, planned, actuals, today_str, plan_start_str, gps, col=0):
-    is_today = ds == today_str
-    is_past  = ds < today_str
-    in_win   = ds >= plan_start_str
-    border   = "2px solid #FC4C02" if is_today else "1px solid #e5e7eb"
-    bg       = "#f9fafb" if (is_past and not actuals and not planned) else "#fff"
-    nc       = "#FC4C02" if is_today else "#9ca3af"
-    nw       = "600" if is_today else "400"
-    day_num  = int(ds.split("-")[2])
-
-    # Color palette per workout type — bg, text color
-    TYPE_COLORS = {
-        "easy":         ("#d1fae5", "#065f46"),  # light green
-        "long":         ("#dbeafe", "#1e40af"),  # blue
-        "tempo":        ("#fed7aa", "#7c2d12"),  # warm orange (LT)
-        "vo2":          ("#fecaca", "#991b1b"),  # hot red-orange (VO2 max)
-        "race":         ("#FC4C02", "#ffffff"),  # solid Strava orange
-        "me_primary":   ("#fecaca", "#991b1b"),  # ME primary = hard workout
-        "me_secondary": ("#fed7aa", "#7c2d12"),  # ME secondary = LT-ish
-        "me_weekend":   ("#dbeafe", "#1e40af"),  # ME weekend long
-    }
-
-    inner = f'<div style="font-size:10px;color:{nc};font-weight:{nw};margin-bottom:3px">{day_num}</div>'
-
-    if planned and actuals:
-        # Completed run with plan — show completion gradient (performance signal)
-        act = actuals[0]
-        dist_pct = (act["miles"] / planned["m"] * 100) if planned["m"] else 100
-        color = completion_color(dist_pct)
-        tip = make_tooltip("both", planned["t"], planned["m"], gps, actual=act, note=planned.get("note"))
-        short = WTYPE_SHORT.get(planned["t"], "Run")
-        inner += pill_html(f"{short} · {act['miles']:.1f}mi", color, tip, col=col)
-    elif planned and is_past and in_win:
-        # Missed planned run — red regardless of type
-        tip = make_tooltip("missed", planned["t"], planned["m"], gps, note=planned.get("note"))
-        short = WTYPE_SHORT.get(planned["t"], "Run")
-        inner += pill_html(f"{short} · missed", "#e05757", tip, col=col)
-    elif planned and not is_past:
-        # Upcoming planned — color by workout type
-        tip = make_tooltip("planned", planned["t"], planned["m"], gps, note=planned.get("note"))
-        short = WTYPE_SHORT.get(planned["t"], "Run")
-        lbl = "Race day" if planned["t"] == "race" else f"{short} · {planned['m']}mi"
-        bg_c, fg_c = TYPE_COLORS.get(planned["t"], ("#e5e7eb", "#374151"))
-        inner += pill_html(lbl, bg_c, tip, fg=fg_c, col=col)
-    elif actuals and not planned:
-        # Unplanned run — light blue
-        act = actuals[0]
-        tip = make_tooltip("actual", None, act["miles"], gps, actual=act)
-        inner += pill_html(f"Run · {act['miles']:.1f}mi", "#dbeafe", tip, fg="#1e40af", col=col)
-
-    return f'<div style="min-height:60px;border-radius:7px;padding:5px 6px;border:{border};background:{bg};overflow:visible">{inner}</div>'
-
-def render_week(ws, planned_map, act_runs, plan_start_str, gps, is_current):
-    today_str = date.today().isoformat()
-    today     = date.today()
-    DOWS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-    hbg  = "#fff8f5" if is_current else "#fff"
-    hbdr = "2px solid #FC4C02" if is_current else "1px solid #e5e7eb"
-    lbl  = f"Week of {ws.strftime('%b %-d')}" + (" · this week" if is_current else "")
-
-    week_dates = [(ws+timedelta(days=i)).isoformat() for i in range(7)]
-    plan_mi = sum(planned_map[ds]["m"] for ds in week_dates if ds in planned_map)
-    act_mi  = sum(sum(r["miles"] for r in act_runs.get(ds,[])) for ds in week_dates)
-
-    # Only grade fully past weeks (last day < today)
-    week_end = ws + timedelta(days=6)
-    is_past_week = week_end < today
-
-    grade_html = ""
-    if is_past_week and plan_mi > 0:
-        planned_days   = sum(1 for ds in week_dates if ds in planned_map and date.fromisoformat(ds) >= date.fromisoformat(plan_start_str))
-        completed_days = sum(1 for ds in week_dates if ds in act_runs and ds in planned_map)
-        missed_days    = sum(1 for ds in week_dates if ds in planned_map and ds not in act_runs and date.fromisoformat(ds) < today and date.fromisoformat(ds) >= date.fromisoformat(plan_start_str))
-        grade, gc = week_grade(plan_mi, act_mi, planned_days, completed_days, missed_days)
-        if grade:
-            pct = round(act_mi / plan_mi * 100) if plan_mi else 0
-            grade_html = (f'<div style="display:flex;align-items:center;gap:8px">' +
-                f'<div style="font-size:18px;font-weight:700;color:{gc}">{grade}</div>' +
-                f'<div style="font-size:11px;color:#9ca3af">{act_mi:.1f}/{plan_mi} mi ({pct}%)</div>' +
-                f'</div>')
-    elif plan_mi > 0:
-        plan_badge = f'<span style="color:#6b7280;font-size:12px">Planned <b style="color:#374151">{plan_mi} mi</b></span>'
-        act_part   = f' &nbsp;·&nbsp; <span style="color:#6b7280;font-size:12px">So far <b style="color:#FC4C02">{act_mi:.1f} mi</b></span>' if act_mi > 0 else ""
-        grade_html = plan_badge + act_part
-
-    dow_headers = "".join(f'<div style="font-size:10px;color:#9ca3af;text-align:center;padding:2px 0">{d}</div>' for d in DOWS)
-    cells = "".join(day_cell((ws+timedelta(days=i)).isoformat(), planned_map.get((ws+timedelta(days=i)).isoformat()),
-                             act_runs.get((ws+timedelta(days=i)).isoformat()), today_str, plan_start_str, gps, col=i)
-                    for i in range(7))
-
-    return f"""
-    <div style="background:{hbg};border:{hbdr};border-radius:10px;padding:12px 14px;margin-bottom:12px">
-      <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:10px">
-        <div style="font-size:13px;font-weight:600;color:#374151">{lbl}</div>
-        <div>{grade_html}</div>
-      </div>
-      <div style="display:grid;grid-template-columns:repeat(7,minmax(0,1fr));gap:4px">
-        {dow_headers}{cells}
-      </div>
-    </div>"""
 
 # ── oauth ─────────────────────────────────────────────────────
 def get_auth_url():
-    return "https://www.strava.com/oauth/authorize?" + urllib.parse.urlencode(dict(
+    return f"{STRAVA_URL}/oauth/authorize?" + urllib.parse.urlencode(dict(
         client_id=CLIENT_ID, response_type="code", redirect_uri=REDIRECT_URI,
         scope="activity:read_all", approval_prompt="force"))
 
 def exchange_code(code):
-    return requests.post("https://www.strava.com/oauth/token", json=dict(
+    return requests.post(f"{STRAVA_URL}/oauth/token", json=dict(
         client_id=CLIENT_ID, client_secret=CLIENT_SECRET,
         code=code, grant_type="authorization_code", redirect_uri=REDIRECT_URI)).json()
 
 def do_refresh(ref):
-    return requests.post("https://www.strava.com/oauth/token", json=dict(
+    return requests.post(f"{STRAVA_URL}/oauth/token", json=dict(
         client_id=CLIENT_ID, client_secret=CLIENT_SECRET,
         refresh_token=ref, grant_type="refresh_token")).json()
 
@@ -1378,258 +394,382 @@ def get_valid_token():
     if not ss.get("access_token"): return None
     if datetime.utcnow().timestamp() < ss.get("token_expires_at", 0) - 60:
         return ss["access_token"]
-    data = do_refresh(ss.get("refresh_token",""))
+    # The sync daemon may already have refreshed (and so revoked this refresh token)
+    athlete_id = verified_athlete_id() or get_store().athlete_id
+    stored = get_activity_store().tokens(athlete_id) if athlete_id else None
+    if stored and (stored["expires_at"] or 0) > ss.get("token_expires_at", 0):
+        ss["refresh_token"] = stored["refresh_token"]
+    if stored and datetime.utcnow().timestamp() < (stored["expires_at"] or 0) - 60:
+        data = stored
+    else:
+        data = do_refresh(ss.get("refresh_token",""))
     if "access_token" in data:
         ss["access_token"] = data["access_token"]
-        ss["refresh_token"] = data.get("refresh_token", ss["refresh_token"])
+        ss["refresh_token"] = data.get("refresh_token") or ss["refresh_token"]
         ss["token_expires_at"] = data["expires_at"]
         persist_session()
+        register_athlete()
         return data["access_token"]
     return None
 
-def fetch_activities(token):
-    since = int((datetime.utcnow()-timedelta(days=65)).timestamp())
-    all_acts, page = [], 1
+# ── concurrent fetches ────────────────────────────────────────
+# Strava requests that don't depend on each other go out together, so a first load waits
+# for the slowest one rather than the sum of them. The threads carry this script run's
+# context, so st.cache_* and st.secrets behave there as they do on the script thread.
+PAGE_BATCH = 4   # history pages requested together once the first page comes back full
+FETCH_TIMEOUT = (5, 30)   # connect, read: a hung connection fails the load instead of stalling it
+
+def in_background(fn, *args):
+    """Start fn(*args) on its own thread; returns a Future for the result."""
+    fut = Future()
+    def run():
+        if not fut.set_running_or_notify_cancel(): return
+        try:
+            fut.set_result(fn(*args))
+        except Exception as e:
+            fut.set_exception(e)
+    thread = threading.Thread(target=run, name=f"fetch-{fn.__name__}", daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+    return fut
+
+def fetch_athlete(token):
+    return requests.get(f"{STRAVA_URL}/api/v3/athlete", headers={"Authorization":f"Bearer {token}"},
+                        timeout=FETCH_TIMEOUT).json()
+
+def fetch_activities(token, days=65):
+    """Runs from the last `days` days (days=None → full history). The first page goes
+    alone; if it comes back full, the rest are requested PAGE_BATCH pages at a time."""
+    since = int((datetime.utcnow()-timedelta(days=days)).timestamp()) if days else 0
+    def page(n):
+        return requests.get(f"{STRAVA_URL}/api/v3/athlete/activities?per_page=100&after={since}&page={n}",
+                            headers={"Authorization": f"Bearer {token}"}, timeout=FETCH_TIMEOUT).json()
+    all_acts, batch, last = [], [page(1)], 1
     while True:
-        r = requests.get(f"https://www.strava.com/api/v3/athlete/activities?per_page=100&after={since}&page={page}",
-                         headers={"Authorization": f"Bearer {token}"}).json()
-        if not isinstance(r, list) or not r: break
-        all_acts.extend(a for a in r if a.get("type")=="Run" or a.get("sport_type")=="Run")
-        if len(r) < 100: break
-        page += 1
-    return all_acts
-
-# ── main ──────────────────────────────────────────────────────
-def main():
+        for r in batch:
+            if not isinstance(r, list) or not r: return all_acts
+            all_acts.extend(a for a in r if a.get("type")=="Run" or a.get("sport_type")=="Run")
+            if len(r) < 100: return all_acts
+        batch = [f.result() for f in [in_background(page, last + i) for i in range(1, PAGE_BATCH + 1)]]
+        last += PAGE_BATCH
+
+# Runs are shared per athlete: all their tabs reference one read-only copy, and a session
+# whose copy was evicted (session_memory) picks it up again from here. Keyed by athlete id,
+# and only ever looked up under verified_athlete_id(), so the token on a miss is that
+# athlete's own. Athletes the sync daemon has synced are read from the activity store
+# instead, keyed by their last sync, so a new sync is a new entry. Entries outlive the
+# session idle timeout by a wide margin, so an evicted session is rebuilt from here and
+# not from Strava.
+ACTIVITY_TTL = 3 * 60 * float(st.secrets.get("SESSION_IDLE_MINUTES", 15))
+RECENT_DAYS = 65
+
+def runs_version(athlete_id, runs):
+    """Version of a runs map that changes only when the runs do (ids, starts, distances,
+    times), so a refetch of the same activities keeps every act_version-keyed cache."""
+    h = hashlib.sha1()
+    for ds in sorted(runs):
+        for r in runs[ds]:
+            h.update(f"{r.get('id')}|{r.get('start')}|{r['miles']:.3f}|{r.get('moving_time')};".encode())
+    return f"{athlete_id or ''}:{h.hexdigest()[:16]}"
+
+def _recent_runs(token, athlete_id, acts=None):
+    acts = acts.result() if acts else fetch_activities(token, days=RECENT_DAYS)
+    recent = [a for a in acts if (datetime.utcnow()-datetime.fromisoformat(a["start_date_local"][:19])).days<28]
+    runs = runs_by_date(acts)
+    return MappingProxyType(dict(
+        runs=MappingProxyType(runs), version=runs_version(athlete_id, runs), fetched=time.time(),
+        mpw=round(sum(a["distance"]/1609.34 for a in recent)/4)))
+
+@st.cache_resource(ttl=ACTIVITY_TTL, max_entries=256, show_spinner=False)
+def _shared_recent_runs(athlete_id, _token, _acts=None):
+    return _recent_runs(_token, athlete_id, _acts)
+
+@st.cache_resource(ttl=ACTIVITY_TTL, max_entries=64, show_spinner=False)
+def _shared_history_runs(athlete_id, _token):
+    return MappingProxyType(runs_by_date(fetch_activities(_token, days=None)))
+
+@st.cache_resource(ttl=ACTIVITY_TTL, max_entries=256, show_spinner=False)
+def _stored_recent_runs(athlete_id, synced):
+    since = (date.today() - timedelta(days=RECENT_DAYS)).isoformat()
+    runs = get_activity_store().runs_by_date(athlete_id, since=since)
+    recent = [r for day in runs.values() for r in day
+              if (datetime.utcnow()-datetime.fromisoformat(r["start"][:19])).days<28]
+    return MappingProxyType(dict(
+        runs=MappingProxyType(runs),
+        version=runs_version(athlete_id, runs), fetched=synced,
+        mpw=round(sum(r["miles"] for r in recent)/4)))
+
+@st.cache_resource(ttl=ACTIVITY_TTL, max_entries=64, show_spinner=False)
+def _stored_history_runs(athlete_id, synced):
+    return MappingProxyType(get_activity_store().runs_by_date(athlete_id))
+
+def _sync_info(athlete_id):
+    try:
+        return get_activity_store().sync_info(athlete_id) if athlete_id else None
+    except sqlite3.Error as e:
+        print(f"[activity_store] read failed: {e}")
+        return None
+
+def load_recent_runs(token, athlete_id=None, acts=None):
+    """{runs, version, fetched, mpw} for the last 65 days; shared when the athlete is known.
+    acts: a Future of fetch_activities already under way, used on a miss."""
+    info = _sync_info(athlete_id)
+    if info:
+        return _stored_recent_runs(athlete_id, info["synced"])
+    return _shared_recent_runs(athlete_id, token, acts) if athlete_id else _recent_runs(token, None, acts)
+
+def _first_load(token, athlete_id=None):
+    """(athlete Strava returned, recent runs). Without a verified athlete id, /athlete and
+    the activities are fetched together, and shared entries are only used under the id
+    Strava returns, so a session can neither read nor seed another athlete's."""
+    if athlete_id:
+        return None, load_recent_runs(token, athlete_id)
+    acts = in_background(fetch_activities, token, RECENT_DAYS)
+    athlete = fetch_athlete(token)
+    athlete_id = athlete.get("id") if isinstance(athlete, dict) else None
+    return athlete if athlete_id else None, load_recent_runs(token, athlete_id, acts)
+
+def start_first_load(token):
+    """Future of the first load, started as soon as the token is valid so Strava is busy
+    while the sidebar renders."""
+    return in_background(_first_load, token, verified_athlete_id())
+
+def finish_first_load(first):
+    """Wait for start_first_load(); keep the verified athlete and their runs in the session."""
     ss = st.session_state
-    params = st.query_params
-
-    # Load persisted state from browser localStorage
-    hydrate_session_from_store()
-
-    if "code" in params and "access_token" not in ss:
-        with st.spinner("Connecting to Strava..."):
-            data = exchange_code(params["code"])
-        if "access_token" in data:
-            ss["access_token"] = data["access_token"]
-            ss["refresh_token"] = data["refresh_token"]
-            ss["token_expires_at"] = data["expires_at"]
-            ss["athlete"] = data.get("athlete", {})
+    with st.spinner("Loading Strava activities..."), metrics.phase("fetch_activities"):
+        athlete, recent = first.result()
+    if athlete is not None:
+        ss["_verified_athlete"] = athlete["id"]
+        if athlete != ss.get("athlete"):
+            ss["athlete"] = athlete
             persist_session()
-            st.query_params.clear()
-            st.rerun()
-        else:
-            st.error(f"Auth failed: {data.get('message','unknown')}")
-            st.stop()
-
-    token = get_valid_token()
-
-    if not token:
-        st.markdown("## Marathon Training Planner")
-        st.markdown("Connect Strava to load your runs and build a Pfitzinger training calendar.")
-        st.markdown(
-            f'<a href="{get_auth_url()}" style="display:inline-flex;align-items:center;gap:8px;'
-            f'background:#FC4C02;color:white;padding:10px 20px;border-radius:6px;'
-            f'text-decoration:none;font-weight:600;font-size:14px">'
-            f'<svg width="18" height="18" viewBox="0 0 24 24" fill="white">'
-            f'<path d="M15.387 17.944l-2.089-4.116h-3.065L15.387 24l5.15-10.172h-3.066'
-            f'm-7.008-5.599l2.836 5.598h4.172L10.463 0l-7 13.828h4.169"/></svg>'
-            f'Connect with Strava</a>', unsafe_allow_html=True)
-        st.stop()
-
-    if "activities" not in ss:
-        with st.spinner("Loading Strava activities..."):
-            if not ss.get("athlete"):
-                ss["athlete"] = requests.get("https://www.strava.com/api/v3/athlete",
-                                              headers={"Authorization":f"Bearer {token}"}).json()
-            acts = fetch_activities(token)
-            rm = {}
-            for a in acts:
-                k = (a.get("start_date_local") or "")[:10]
-                if not k or not a.get("distance"): continue
-                rm.setdefault(k,[]).append(dict(
-                    name=a.get("name","Run"), miles=a["distance"]/1609.34,
-                    moving_time=a.get("moving_time",0),
-                    pace=a.get("moving_time",0)/(a["distance"]/1609.34),
-                    hr=a.get("average_heartrate"),
-                    elev=round((a.get("total_elevation_gain") or 0)*3.28084)))
-            ss["activities"] = rm
-            recent = [a for a in acts if (datetime.utcnow()-datetime.fromisoformat(a["start_date_local"][:19])).days<28]
-            ss["weekly_mpw"] = round(sum(a["distance"]/1609.34 for a in recent)/4)
-
-    athlete = ss.get("athlete", {})
-    act_runs = ss["activities"]
-    mpw = ss.get("weekly_mpw", 0)
-
-    with st.sidebar:
-        if athlete:
-            name = f"{athlete.get('firstname','')} {athlete.get('lastname','')}".strip()
-            pic  = athlete.get("profile","")
-            c1,c2 = st.columns([1,3])
-            with c1:
-                if pic and "large.jpg" not in pic: st.image(pic, width=48)
-            with c2:
-                st.markdown(f"**{name}**")
-                st.markdown("🟢 Connected")
-            st.divider()
-        st.markdown("### Race goal")
-        goal_time = st.text_input("Finish time", value=ss.get("goal_time","3:30:00"), placeholder="3:30:00")
-        default_race = ss.get("race_date", date.today()+timedelta(weeks=20))
-        race_date = st.date_input("Race date", value=default_race, min_value=date.today()+timedelta(weeks=8))
-        st.divider()
-        st.markdown("### Training plan")
-        auto = "pfitz-18-70" if mpw>=60 else "pfitz-18-55" if mpw>=45 else "pfitz-12-55"
-        if "selected_plan" not in ss: ss["selected_plan"] = auto
-        if mpw > 0: st.caption(f"Recent avg: ~{mpw} mpw")
-        plan_key = st.radio("Plan", options=list(PLANS.keys()),
-                            format_func=lambda k: f"{PLANS[k]['name']} — {PLANS[k]['desc']}",
-                            index=list(PLANS.keys()).index(ss["selected_plan"]),
-                            label_visibility="collapsed")
-
-        # ── Schedule day preferences ──
-        is_me = PLANS[plan_key].get("kind") == "me"
-        if not is_me:
-            st.divider()
-            st.markdown("### Schedule")
-            st.caption("Pick which day each type of run lands on.")
-            DOW_OPTS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-            # Internal index mapping: schedule uses 0=Sun..6=Sat, but display Mon-first
-            DOW_TO_INT = {"Mon":1,"Tue":2,"Wed":3,"Thu":4,"Fri":5,"Sat":6,"Sun":0}
-            INT_TO_DOW = {v:k for k,v in DOW_TO_INT.items()}
-
-            # Default: long=Sun matches race day if race is Sunday, otherwise let user pick
-            default_long_dow    = INT_TO_DOW.get(race_date.isoweekday() % 7, "Sun")
-            default_quality_dow = ss.get("quality_dow", "Wed")
-
-            long_dow = st.selectbox(
-                "Long run day",
-                DOW_OPTS,
-                index=DOW_OPTS.index(ss.get("long_dow", default_long_dow)),
-                help="Should match your race day for race-week alignment."
-            )
-            quality_dow = st.selectbox(
-                "Quality workout day",
-                DOW_OPTS,
-                index=DOW_OPTS.index(default_quality_dow),
-                help="Best practice: 3+ days before/after long run for full recovery."
-            )
-            is_high_vol = PLANS[plan_key].get("peak_mpw", 55) >= 70
-            n_rest_days = 1 if is_high_vol else 2
-
-            # Default rest days
-            default_rest = ss.get("rest_dows", ["Mon", "Fri"] if not is_high_vol else ["Mon"])
-            if isinstance(default_rest, str): default_rest = [default_rest]  # migrate old single value
-
-            if n_rest_days == 1:
-                rest_dows_sel = [st.selectbox(
-                    "Rest day",
-                    DOW_OPTS,
-                    index=DOW_OPTS.index(default_rest[0] if default_rest else "Mon"),
-                    help="One rest day for 70-mpw plans. Best practice: day after long run."
-                )]
-            else:
-                st.caption("55-mpw plans have 2 rest days per week.")
-                rest_dows_sel = st.multiselect(
-                    "Rest days (pick 2)",
-                    DOW_OPTS,
-                    default=[d for d in default_rest if d in DOW_OPTS][:2] or ["Mon","Fri"],
-                    max_selections=2,
-                    help="Best practice: spread them out. Mon + Fri or Mon + Thu work well."
-                )
-                if len(rest_dows_sel) < 2:
-                    st.warning("Pick exactly 2 rest days for this plan.")
-
-            rest_dow = rest_dows_sel[0] if rest_dows_sel else "Mon"  # primary rest day for validation
-
-            # Validation
-            warnings = []
-            def cyclic_gap(a, b):
-                ai = DOW_TO_INT[a]
-                bi = DOW_TO_INT[b]
-                return min((ai - bi) % 7, (bi - ai) % 7)
-
-            if long_dow == quality_dow:
-                warnings.append("Quality and long run can't be on the same day.")
-            elif cyclic_gap(long_dow, quality_dow) < 2:
-                warnings.append(f"Quality on {quality_dow} is only {cyclic_gap(long_dow, quality_dow)} day(s) from long run on {long_dow}. Aim for 3+ days for recovery.")
-
-            for rd in rest_dows_sel:
-                if rd == quality_dow:
-                    warnings.append(f"Rest on {rd} conflicts with quality workout day.")
-                if rd == long_dow:
-                    warnings.append(f"Rest on {rd} conflicts with long run day.")
-
-            if n_rest_days == 2 and len(rest_dows_sel) == 2:
-                gap = cyclic_gap(rest_dows_sel[0], rest_dows_sel[1])
-                if gap < 2:
-                    warnings.append(f"Rest days {rest_dows_sel[0]} and {rest_dows_sel[1]} are only {gap} day(s) apart. Spread them out for better recovery.")
-
-            for w in warnings:
-                st.warning(w)
-
-            blocking = any("conflicts" in w or "can't be" in w for w in warnings)
-            if not blocking and (n_rest_days == 1 or len(rest_dows_sel) == 2):
-                ss["long_dow"]   = long_dow
-                ss["quality_dow"] = quality_dow
-                ss["rest_dows"]  = rest_dows_sel
-
-            long_day_int    = DOW_TO_INT[ss.get("long_dow", default_long_dow)]
-            quality_day_int = DOW_TO_INT[ss.get("quality_dow", default_quality_dow)]
-            saved_rests     = ss.get("rest_dows", ["Mon"])
-            rest_day_int    = DOW_TO_INT[saved_rests[0]] if saved_rests else 1
-        else:
-            long_day_int = quality_day_int = rest_day_int = None  # ME plans handle their own layout
-
-        # Track previous values to detect changes worth persisting
-        prev_plan      = ss.get("selected_plan")
-        prev_goal_time = ss.get("goal_time")
-        prev_race_date = ss.get("race_date")
-        prev_long      = ss.get("_last_long")
-        prev_quality   = ss.get("_last_quality")
-        prev_rest      = ss.get("_last_rest")
-
-        ss["selected_plan"] = plan_key
-        ss["goal_time"] = goal_time
-        ss["race_date"] = race_date
-
-        changed = (prev_plan != plan_key) or (prev_goal_time != goal_time) or (prev_race_date != race_date)
-        if not is_me:
-            ss["_last_long"]    = ss.get("long_dow")
-            ss["_last_quality"] = ss.get("quality_dow")
-            ss["_last_rest"]    = str(ss.get("rest_dows"))
-            changed = changed or (prev_long != ss["_last_long"]) or (prev_quality != ss["_last_quality"]) or (prev_rest != ss["_last_rest"])
-
-        if changed:
-            persist_session()
-
-        st.divider()
-        if st.button("Disconnect Strava"):
-            for k in ["access_token","refresh_token","token_expires_at","athlete","activities","weekly_mpw","swaps"]:
-                ss.pop(k,None)
-            get_store().clear()
-            st.rerun()
-
-    plan = PLANS[plan_key]
-    race_date_str = race_date.isoformat()
-    today = date.today()
-    today_str = today.isoformat()
-    gps = goal_pace_secs(goal_time)
+        register_athlete()
+    ss.pop("_activities_refresh", None)
+    ss["activities"] = recent["runs"]
+    ss["activities_version"] = recent["version"]
+    ss["activities_fetched"] = recent["fetched"]
+    ss["rollups"] = MileageRollups()
+    ss["rollups"].add_runs(recent["runs"])
+    ss["weekly_mpw"] = recent["mpw"]
+
+# ── background refresh ────────────────────────────────────────
+# Once a session's runs are REFRESH_EVERY old, the next rerun (or the sidebar's freshness
+# fragment, which reruns itself every REFRESH_CHECK seconds) starts a refresh in the
+# background, and whichever runs after it finishes swaps the new runs in. Neither waits
+# on Strava; until the swap the session keeps showing what it has.
+REFRESH_EVERY = 5 * 60
+REFRESH_CHECK = 60
+
+def refresh_recent_runs(token, athlete_id):
+    """load_recent_runs, refetched if the shared copy is REFRESH_EVERY old. Another tab
+    of the same athlete may have refreshed it already."""
+    recent = load_recent_runs(token, athlete_id)
+    if athlete_id and time.time() - recent["fetched"] >= REFRESH_EVERY and not _sync_info(athlete_id):
+        _shared_recent_runs.clear(athlete_id, token)
+        recent = _shared_recent_runs(athlete_id, token)
+    return recent
+
+def poll_activity_refresh():
+    """Swap in a finished refresh, or start one if the runs are stale. True if swapped."""
+    ss = st.session_state
+    pending = ss.get("_activities_refresh")
+    if pending is not None:
+        if not pending.done():
+            return False
+        del ss["_activities_refresh"]
+        try:
+            recent = pending.result()
+        except (requests.RequestException, ValueError) as e:
+            print(f"[refresh] recent runs: {e}")   # keep what we have; retry after REFRESH_EVERY
+            return False
+        if recent["version"] == ss.get("activities_version"):
+            ss["activities_fetched"] = recent["fetched"]   # checked, and nothing changed
+            return False
+        if "rollups" in ss:
+            ss["rollups"].add_runs(recent["runs"])      # new runs only; keeps folded-in history
+        ss.update(activities=recent["runs"], activities_version=recent["version"],
+                  activities_fetched=recent["fetched"], weekly_mpw=recent["mpw"])
+        return True
+    now = time.time()
+    # Only for a session someone is using: an idle tab's timer stops refreshing once the
+    # session counts as idle (and can be evicted), and picks up again on its next rerun.
+    # And only with a token that's still good: refreshing it talks to Strava, and the next
+    # full rerun's get_valid_token() does that anyway.
+    ctx = get_script_run_ctx()
+    registry = get_session_registry()
+    if ctx is not None and registry.idle_for(ctx.session_id) > registry.idle_secs:
+        return False
+    if (ss.get("token_expires_at") or 0) > now + 60 and \
+            now - max(ss.get("activities_fetched", 0), ss.get("_activities_checked", 0)) >= REFRESH_EVERY:
+        ss["_activities_checked"] = now
+        ss["_activities_refresh"] = in_background(refresh_recent_runs, ss["access_token"], verified_athlete_id())
+    return False
+
+@st.fragment(run_every=REFRESH_CHECK)
+def render_freshness():
+    """How old the session's runs are. Reruns itself, so a background refresh shows up
+    (with a full rerun, only when the runs changed) without waiting for the user to
+    interact. Its timer reruns don't count as activity for session_memory."""
+    ss = st.session_state
+    if "activities" in ss and poll_activity_refresh():
+        st.rerun()
+    age = time.time() - ss.get("activities_fetched", time.time())
+    ago = "just now" if age < 60 else f"{age // 60:.0f} min ago" if age < 3600 else f"{age // 3600:.0f} h ago"
+    st.caption(f"Runs updated {ago}" + (" · refreshing…" if "_activities_refresh" in ss else ""))
+
+def load_history_runs(token, athlete_id=None):
+    """Full-history runs by date; shared when the athlete is known."""
+    info = _sync_info(athlete_id)
+    if info and info["backfilled"]:
+        return _stored_history_runs(athlete_id, info["synced"])
+    if athlete_id:
+        return _shared_history_runs(athlete_id, token)
+    return MappingProxyType(runs_by_date(fetch_activities(token, days=None)))
+
+# ── activity details (streams, laps) ──────────────────────────
+# Fetched by one process-wide DetailFetcher on its own threads, never on the request path;
+# a rerun asks for what's missing and reads what's been fetched. DETAIL_RATE is its share
+# of Strava's per-app limit (100 requests per 15 minutes), next to the sync daemon's --rate.
+def fetch_detail(kind, activity_id, day, token):
+    """One activity's laps, or its streams reduced to best efforts and an HR / grade
+    summary (small enough to keep for good)."""
+    query = "?keys=distance,time,heartrate,altitude&key_by_type=true" if kind == "streams" else ""
+    r = requests.get(f"{STRAVA_URL}/api/v3/activities/{activity_id}/{kind}{query}",
+                     headers={"Authorization": f"Bearer {token}"}, timeout=FETCH_TIMEOUT)
+    if r.status_code == 429:
+        raise RateLimited()
+    r.raise_for_status()
+    if kind == "laps":
+        return [dict(distance=l.get("distance", 0), moving_time=l.get("moving_time", 0)) for l in r.json()]
+    streams = {k: v["data"] for k, v in r.json().items()}
+    if "distance" not in streams or "time" not in streams:
+        return dict(date=day, efforts={}, summary=None)  # manual / indoor activity without streams
+    d, t = streams["distance"], streams["time"]
+    return dict(date=day, efforts=activity_best_efforts(d, t),
+                summary=summarize(d, t, streams.get("heartrate"), streams.get("altitude")))
 
+@st.cache_resource
+def get_detail_fetcher() -> DetailFetcher:
+    return DetailFetcher(get_activity_store(), fetch_detail, rate=int(st.secrets.get("DETAIL_RATE", 30)))
+
+def stream_index():
+    """{activity id: dict(date, efforts, summary)} for the athlete's runs indexed so far."""
+    return get_detail_fetcher().index(verified_athlete_id(), "streams")
+
+def request_streams(runs, token):
+    """Queue stream fetches for runs not indexed yet, newest first. Doesn't wait."""
+    athlete_id = verified_athlete_id()
+    if not athlete_id or not token:
+        return 0
+    fetcher = get_detail_fetcher()
+    index = fetcher.index(athlete_id, "streams")
+    return fetcher.request(athlete_id, "streams", [(ds, r["id"]) for ds in runs for r in runs[ds]
+                                                   if r.get("id") and r["id"] not in index], token)
+
+# ── interval compliance ───────────────────────────────────────
+LAP_WAIT = 2.0   # seconds the calendar waits for laps of the weeks on screen
+
+def week_compliance(week_dates, planned_map, matcher, gps, fivek_secs, token):
+    """{date: score_reps result} for completed quality days among week_dates. Every run
+    the matcher gave the day is scored (either half of a double may be the workout) and
+    the best kept. Laps come from the detail fetcher: the weeks on screen are queued ahead
+    of the stream backlog and waited on briefly; laps that failed back off there instead
+    of being asked for again on every page."""
+    athlete_id = verified_athlete_id()
+    if not athlete_id:
+        return {}
+    quality = []
+    for ds in week_dates:
+        planned = planned_map.get(ds)
+        if planned and planned["t"] in QUALITY_TYPES:
+            runs = [r for r in matcher.matched(ds) if r.get("id")]
+            if runs:
+                quality.append((ds, planned, runs))
+    fetcher = get_detail_fetcher()
+    ids = [(ds, r["id"]) for ds, _, runs in quality for r in runs]
+    if token and ids:
+        fetcher.request(athlete_id, "laps", ids, token)
+        fetcher.wait(athlete_id, "laps", [aid for _, aid in ids], LAP_WAIT)
+    laps = fetcher.index(athlete_id, "laps")
+    out = {}
+    for ds, planned, runs in quality:
+        segs = workout_segments(planned["t"], planned["m"], gps, note=planned.get("note"), fivek_secs=fivek_secs)
+        scored = [s for s in (score_reps(segs, laps[r["id"]]) for r in runs if r["id"] in laps) if s]
+        if scored:
+            out[ds] = max(scored, key=lambda s: (s["score"], s["on"]))
+    return out
+
+# ── cached pipeline ───────────────────────────────────────────
+# Everything below main()'s sidebar is keyed on small signatures so an app rerun only
+# recomputes what its inputs actually changed. Large inputs (activities, plan maps) are
+# passed as _underscored args, which st.cache_data skips when hashing; the plan signature
+# and activities version stand in for them.
+# The base plan is a shared resource (no per-call copy as with cache_data); it's exposed
+# read-only and every session layers its swaps over it with apply_swaps.
+@st.cache_resource(show_spinner=False, max_entries=64)
+def cached_planned_map(plan_key, race_date_str, long_day, quality_day, rest_day):
     if PLANS[plan_key].get("kind") == "me":
-        planned_map, plan_start_str = build_planned_map(plan_key, race_date_str)
+        planned, plan_start_str = build_planned_map(plan_key, race_date_str)
     else:
-        planned_map, plan_start_str = build_planned_map(
-            plan_key, race_date_str,
-            long_day=long_day_int, quality_day=quality_day_int, rest_day=rest_day_int
-        )
-    plan_start = date.fromisoformat(plan_start_str)
-
-    miles_ahead = sum(r["m"] for ds,r in planned_map.items() if ds >= today_str)
-    completed   = sum(1 for ds in act_runs if planned_map.get(ds) and ds < today_str)
-    missed      = sum(1 for ds in planned_map if ds < today_str and ds >= plan_start_str and ds not in act_runs)
-
-    st.markdown(f"## {plan['name']} &nbsp;·&nbsp; {goal_time} goal")
-    st.caption(f"{plan['weeks']} weeks · race on {race_date.strftime('%B %-d, %Y')}")
+        planned, plan_start_str = build_planned_map(plan_key, race_date_str,
+                                                    long_day=long_day, quality_day=quality_day, rest_day=rest_day)
+    return MappingProxyType(planned), plan_start_str
+
+def swaps_signature(swaps):
+    """Cheap, stable cache key for the user's swaps layer."""
+    return _json.dumps(swaps, sort_keys=True) if swaps else ""
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def fit_finish(act_version, plan_sig, today_str, _act_runs, _planned_map):
+    # One weighted Riegel fit over every quality/long effort in the last 8 weeks
+    return predict_marathon(*collect_efforts(_act_runs, _planned_map, date.fromisoformat(today_str)))
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def predict_finish(act_version, plan_sig, today_str, _act_runs, _planned_map):
+    """Race time predictor — returns (label, minutes, detail, range) or (None, None, None, None)."""
+    fit = fit_finish(act_version, plan_sig, today_str, _act_runs, _planned_map)
+    if not fit:
+        return None, None, None, None
+    names = dict(race="race effort", quality="quality run", long="long run")
+    parts = [f"{n} {names[kind]}{'s' if n > 1 else ''}" for kind, n in fit["counts"].items()]
+    pred_detail = "from " + " + ".join(parts)
+    range_label = f"80% range {fmt_hm(fit['lo'])}–{fmt_hm(fit['hi'])}"
+    predicted_mins = fit["secs"] / 60
+    predicted_label = f"{int(predicted_mins//60)}:{int(predicted_mins%60):02d}:{int((predicted_mins%1)*60):02d}"
+    return predicted_label, predicted_mins, pred_detail, range_label
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def simulate_finish(act_version, plan_sig, swaps_sig, today_str, goal_time, adherence,
+                    _act_runs, _planned_map, _effective_map):
+    """Monte Carlo race outcome — dict(pct, p_goal, n, adherence) or None without a fit.
+    adherence is the past weeks' effective completion (0–1) from the session's
+    PlanAdherence, so the outlook grades weeks exactly as the calendar does."""
+    fit = fit_finish(act_version, plan_sig, today_str, _act_runs, _planned_map)
+    if not fit:
+        return None
+    today = date.fromisoformat(today_str)
+    remaining = {}
+    for ds, run in _effective_map.items():
+        if ds >= today_str and run and run["t"] != "race":
+            widx = week_index(date.fromisoformat(ds))
+            remaining[widx] = remaining.get(widx, 0) + run["m"]
+    total = sum(run["m"] for run in _effective_map.values() if run and run["t"] != "race")
+    try:
+        goal = goal_secs(goal_time)
+    except (ValueError, IndexError):
+        goal = None
+    return simulate(fit, goal, [remaining[w] for w in sorted(remaining)], total, adherence,
+                    seed=today.toordinal())
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def build_header_html(plan_sig, plan_start_str, goal_time, today_str, prediction, _planned_map, outlook=None):
+    plan_key, race_date_str = plan_sig[0], plan_sig[1]
+    plan = PLANS[plan_key]
+    planned_map = _planned_map
+    race_date = date.fromisoformat(race_date_str)
+    today = date.fromisoformat(today_str)
+    predicted_label, predicted_mins, pred_detail, pred_range = prediction
 
     # ── countdown / progress / this week header ──────────────
     days_to_race  = (race_date - today).days
@@ -1675,41 +815,6 @@ def main():
     today_run    = planned_map.get(today_str)
     tomorrow_run = planned_map.get((today + timedelta(days=1)).isoformat())
 
-    # ── race time predictor ─────────────────────────────────
-    # Use recent LT/VO2 runs to predict finish time via Riegel
-    # Collect recent quality runs from the last 8 weeks
-    eight_wks_ago = (today - timedelta(weeks=8)).isoformat()
-    recent_tempos = []
-    recent_long_paces = []
-    for ds, runs in act_runs.items():
-        if ds < eight_wks_ago: continue
-        plan_entry = planned_map.get(ds)
-        for r in runs:
-            if plan_entry and plan_entry["t"] in ("tempo","vo2","me_primary","me_secondary"):
-                recent_tempos.append(r["pace"])  # sec/mi
-            elif plan_entry and plan_entry["t"] in ("long","me_weekend") and r["miles"] >= 12:
-                recent_long_paces.append(r["pace"])
-
-    predicted_label = None
-    predicted_mins  = None
-    pred_detail     = None
-    if recent_tempos:
-        avg_quality_pace = sum(recent_tempos) / len(recent_tempos)
-        # Riegel: predict marathon time from quality pace
-        # Assume quality sessions are run at ~15K effort (9.32 mi)
-        pred_marathon_secs = avg_quality_pace * 9.32 * (26.2 / 9.32) ** 1.06
-        predicted_mins = pred_marathon_secs / 60
-        predicted_label = f"{int(predicted_mins//60)}:{int(predicted_mins%60):02d}:{int((predicted_mins%1)*60):02d}"
-        pred_detail = f"from {len(recent_tempos)} quality run{'s' if len(recent_tempos)>1 else ''}"
-    elif recent_long_paces:
-        avg_long = sum(recent_long_paces) / len(recent_long_paces)
-        # Long run conversion: marathon ≈ long run pace × 1.08 (rough rule of thumb)
-        pred_pace = avg_long * 1.08
-        pred_marathon_secs = pred_pace * 26.2
-        predicted_mins = pred_marathon_secs / 60
-        predicted_label = f"{int(predicted_mins//60)}:{int(predicted_mins%60):02d}:{int((predicted_mins%1)*60):02d}"
-        pred_detail = f"from {len(recent_long_paces)} long run{'s' if len(recent_long_paces)>1 else ''}"
-
     goal_mins = None
     if ":" in goal_time:
         parts = goal_time.split(":")
@@ -1748,12 +853,20 @@ def main():
         phase_sub = f"{days_into} days in"
 
     # Predictor card content
+    outlook_html = ""
+    if predicted_label and outlook and outlook["p_goal"] is not None:
+        p10, p50, p90 = (fmt_hm(outlook["pct"][p]) for p in (10, 50, 90))
+        outlook_html = (f'<div style="font-size:10px;color:#6b7280;margin-top:3px" '
+                        f'title="{outlook["n"]:,} simulated races · median {p50} · 10–90% {p10}–{p90}">'
+                        f'{outlook["p_goal"]:.0%} chance of goal · race day {p10}–{p90}</div>')
+
     if predicted_label:
         pred_card = f"""
         <div style="font-size:10px;letter-spacing:0.08em;color:#9ca3af;margin-bottom:4px">PREDICTED FINISH</div>
         <div style="font-size:24px;font-weight:600;color:#374151;line-height:1.1">{predicted_label}</div>
         <div style="font-size:11px;color:{pred_color};margin-top:5px;font-weight:600">{pred_vs_goal or ''}</div>
-        <div style="font-size:10px;color:#9ca3af;margin-top:3px">{pred_detail}</div>"""
+        <div style="font-size:10px;color:#9ca3af;margin-top:3px">{pred_detail}</div>
+        <div style="font-size:10px;color:#9ca3af;margin-top:1px">{pred_range}</div>{outlook_html}"""
     else:
         pred_card = """
         <div style="font-size:10px;letter-spacing:0.08em;color:#9ca3af;margin-bottom:4px">PREDICTED FINISH</div>
@@ -1811,101 +924,25 @@ def main():
         {pred_card}
       </div>
     </div>"""
+    return header_html
 
-    st.html(header_html)
-
-    c1,c2,c3,c4 = st.columns(4)
-    c1.metric("Weeks", plan["weeks"])
-    c2.metric("Miles remaining", round(miles_ahead))
-    c3.metric("Planned runs hit", completed)
-    c4.metric("Missed", missed)
-    st.divider()
-
-    # Build week list: 60 days back (aligned to Monday) through race date
-    cal_start = today - timedelta(days=60)
-    cal_start -= timedelta(days=cal_start.weekday())  # Mon=0 in weekday()
-    all_weeks = []
-    w = cal_start
-    race_date_obj = date.fromisoformat(race_date_str)
-    while w <= race_date_obj:
-        all_weeks.append(w)
-        w += timedelta(weeks=1)
-
-    # Find current week
-    cur_idx = next((i for i,ws in enumerate(all_weeks) if ws <= today < ws+timedelta(weeks=1)), 0)
-
-    if "week_offset" not in ss: ss["week_offset"] = 0
-    WINDOW = 4
-    total = len(all_weeks)
-    start_idx = max(0, min(cur_idx + ss["week_offset"], total - WINDOW))
-
-    nc1, nc2, nc3 = st.columns([1,4,1])
-    with nc1:
-        if st.button("← Earlier"):
-            ss["week_offset"] -= WINDOW
-            st.rerun()
-    with nc2:
-        wa = all_weeks[start_idx]
-        wb = all_weeks[min(start_idx+WINDOW-1, total-1)]
-        st.markdown(f'<div style="text-align:center;color:#6b7280;font-size:13px">{wa.strftime("%b %-d")} – {(wb+timedelta(days=6)).strftime("%b %-d, %Y")}</div>', unsafe_allow_html=True)
-    with nc3:
-        if st.button("Later →"):
-            ss["week_offset"] += WINDOW
-            st.rerun()
-
-    col_j, _ = st.columns([1,3])
-    with col_j:
-        if st.button("Jump to today", type="secondary"):
-            ss["week_offset"] = 0
-            st.rerun()
-
-    # Legend + color key
-    leg = """
-    <div style="display:flex;flex-wrap:wrap;align-items:center;gap:12px;margin:12px 0 16px;font-size:11px;color:#6b7280">
-      <div style="display:flex;align-items:center;gap:6px">
-        <div style="width:100px;height:12px;border-radius:3px;background:linear-gradient(to right,#e05757,#e8a825,#5DCAA5)"></div>
-        <span>On target → Missed</span>
-      </div>
-      <span style="background:#d1fae5;color:#065f46;padding:2px 8px;border-radius:4px;font-weight:600">Easy</span>
-      <span style="background:#dbeafe;color:#1e40af;padding:2px 8px;border-radius:4px;font-weight:600">Long</span>
-      <span style="background:#fed7aa;color:#7c2d12;padding:2px 8px;border-radius:4px;font-weight:600">Tempo</span>
-      <span style="background:#fecaca;color:#991b1b;padding:2px 8px;border-radius:4px;font-weight:600">VO2</span>
-      <span style="background:#e5e7eb;color:#374151;padding:2px 8px;border-radius:4px;font-weight:600">Unplanned</span>
-    </div>"""
-    st.html(leg)
-
-    # Apply any user swaps
-    if "swaps" not in ss: ss["swaps"] = {}
-    effective_map = apply_swaps(planned_map, ss["swaps"])
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_planned_weeks(plan_sig, swaps_sig, _effective_map):
+    """{week index: planned miles} for the effective plan — one pass per plan/swaps change."""
+    return weekly_planned_totals(_effective_map)
 
-    cal_html = tooltip_css()
-    for i in range(WINDOW):
-        idx = start_idx + i
-        if idx >= total: break
-        ws = all_weeks[idx]
-        we = ws + timedelta(days=6)
-        cal_html += render_week(ws, effective_map, act_runs, plan_start_str, gps, ws <= today <= we)
-    st.html(cal_html)
-
-    # ── fitness trend chart ──────────────────────────────────
+@st.cache_data(show_spinner=False, max_entries=256)
+def trend_chart_svg(rollups_digest, plan_sig, swaps_sig, today_str, _planned_weeks, _rollups):
+    today = date.fromisoformat(today_str)
     # Anchor to today so chart always shows regardless of plan position
     chart_anchor = today - timedelta(weeks=9)
     chart_anchor -= timedelta(days=chart_anchor.weekday())
-    trend_weeks = []
-    w = chart_anchor
-    for _ in range(12):
-        trend_weeks.append(w)
-        w += timedelta(weeks=1)
+    trend_weeks = [chart_anchor + timedelta(weeks=i) for i in range(12)]
 
-    trend_planned, trend_actual, trend_labels = [], [], []
-    for ws in trend_weeks:
-        week_ds = [(ws + timedelta(days=j)).isoformat() for j in range(7)]
-        p_mi = round(sum(effective_map[ds]["m"] for ds in week_ds
-                   if effective_map.get(ds) and effective_map[ds].get("t") != "race"), 1)
-        a_mi = round(sum(r["miles"] for ds in week_ds for r in act_runs.get(ds, [])), 1)
-        trend_planned.append(p_mi)
-        trend_actual.append(a_mi)
-        trend_labels.append((ws + timedelta(days=3)).strftime("%-m/%-d"))
+    # Weekly totals come straight from the rollups — no per-day scan
+    trend_planned = [round(float(p), 1) for p in planned_series(_planned_weeks, chart_anchor, 12)]
+    trend_actual  = [round(float(a), 1) for a in _rollups.weekly(chart_anchor, 12)]
+    trend_labels  = [(ws + timedelta(days=3)).strftime("%-m/%-d") for ws in trend_weeks]
 
     max_mi = max(trend_planned + trend_actual + [1])
     n = len(trend_weeks)
@@ -1933,39 +970,276 @@ def main():
             bg_stroke = "#FC4C02" if is_cur else "#e5e7eb"
             bars_planned += f'<rect x="{x_center - bar_w//2}" y="{pad_t + chart_h - ph}" width="{bar_w}" height="{ph}" fill="{bg_fill}" stroke="{bg_stroke}" stroke-width="1" rx="2"/>'
 
-        if a > 0 and not is_future:
-            ah = max(2, int(a / max_mi * chart_h))
-            fill = "#FC4C02" if is_cur else "#5DCAA5"
-            bars_actual += f'<rect x="{x_center - bar_w//2 + 1}" y="{pad_t + chart_h - ah}" width="{bar_w - 2}" height="{ah}" fill="{fill}" rx="2" opacity="0.9"/>'
-            points.append((x_center, yc(a)))
+        if a > 0 and not is_future:
+            ah = max(2, int(a / max_mi * chart_h))
+            fill = "#FC4C02" if is_cur else "#5DCAA5"
+            bars_actual += f'<rect x="{x_center - bar_w//2 + 1}" y="{pad_t + chart_h - ah}" width="{bar_w - 2}" height="{ah}" fill="{fill}" rx="2" opacity="0.9"/>'
+            points.append((x_center, yc(a)))
+
+        if i % 2 == 0 or n <= 8:
+            fw = "600" if is_cur else "400"
+            fc = "#FC4C02" if is_cur else "#9ca3af"
+            labels_html += f'<text x="{x_center}" y="{H - 5}" text-anchor="middle" font-size="9" fill="{fc}" font-weight="{fw}">{lbl}</text>'
+
+    if len(points) > 1:
+        pts = " ".join(f"{px},{py}" for px, py in points)
+        trend_line_svg = f'<polyline points="{pts}" fill="none" stroke="#5DCAA5" stroke-width="1.5" stroke-linejoin="round" opacity="0.5"/>'
+
+    grid = ""
+    for frac in [0.25, 0.5, 0.75, 1.0]:
+        ty = int(pad_t + chart_h * (1 - frac))
+        mi_val = int(max_mi * frac)
+        grid += f'<line x1="{pad_l}" y1="{ty}" x2="{W - pad_r}" y2="{ty}" stroke="#f3f4f6" stroke-width="1"/>'
+        grid += f'<text x="{pad_l - 5}" y="{ty + 4}" text-anchor="end" font-size="9" fill="#d1d5db">{mi_val}</text>'
+
+    return (f'<svg viewBox="0 0 {W} {H}" xmlns="http://www.w3.org/2000/svg" style="width:100%;font-family:system-ui,sans-serif">'
+            + grid + bars_planned + bars_actual + trend_line_svg + labels_html
+            + f'<text x="{pad_l}" y="{pad_t - 8}" font-size="10" fill="#9ca3af" font-weight="600" letter-spacing="0.05em">WEEKLY MILEAGE — planned vs actual</text>'
+            + f'<rect x="{W-135}" y="4" width="9" height="9" fill="#f3f4f6" stroke="#e5e7eb" stroke-width="1" rx="1"/>'
+            + f'<text x="{W-122}" y="12" font-size="9" fill="#9ca3af">Planned</text>'
+            + f'<rect x="{W-72}" y="4" width="9" height="9" fill="#5DCAA5" rx="1"/>'
+            + f'<text x="{W-59}" y="12" font-size="9" fill="#9ca3af">Actual</text>'
+            + '</svg>')
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def season_chart_svg(rollups_digest, plan_sig, swaps_sig, today_str, _planned_weeks, _rollups):
+    """Multi-season mileage chart. Reads only the weekly/monthly rollups and averages weeks
+    into bins so the SVG has at most one bar per few pixels, however long the history."""
+    today = date.fromisoformat(today_str)
+    W, H = 700, 200
+    pad_l, pad_r, pad_t, pad_b = 45, 20, 24, 36
+    chart_w = W - pad_l - pad_r
+    chart_h = H - pad_t - pad_b
+    first = _rollups.first_week or (today - timedelta(days=today.weekday()))
+    last_plan_wk = max(_planned_weeks) if _planned_weeks else week_index(today)
+    n_weeks = max(week_index(today), last_plan_wk) - week_index(first) + 1
+
+    actual, size = downsample(_rollups.weekly(first, n_weeks), chart_w // 5)
+    planned, _   = downsample(planned_series(_planned_weeks, first, n_weeks), chart_w // 5)
+    lead_pad = len(actual) * size - n_weeks   # empty weeks padded in front of the first bin
+    max_mi = max(float(actual.max(initial=0)), float(planned.max(initial=0)), 1)
+    bar_gap = chart_w / len(actual)
+    bar_w = max(1.0, bar_gap - (2 if bar_gap >= 6 else 0.5))
+    cur_bin = (week_index(today) - week_index(first) + lead_pad) // size
+
+    bars = ""
+    for i, (p, a) in enumerate(zip(planned, actual)):
+        x = pad_l + i * bar_gap
+        if p > 0:
+            ph = max(1, int(p / max_mi * chart_h))
+            bars += f'<rect x="{x:.1f}" y="{pad_t + chart_h - ph}" width="{bar_w:.1f}" height="{ph}" fill="#f3f4f6" stroke="#e5e7eb" stroke-width="0.5"/>'
+        if a > 0 and i <= cur_bin:
+            ah = max(1, int(a / max_mi * chart_h))
+            fill = "#FC4C02" if i == cur_bin else "#5DCAA5"
+            bars += f'<rect x="{x:.1f}" y="{pad_t + chart_h - ah}" width="{bar_w:.1f}" height="{ah}" fill="{fill}" opacity="0.9"/>'
+
+    # Year boundaries, labelled with the year's total from the monthly rollup
+    years = _rollups.year_totals()
+    marks = ""
+    for y in range(first.year + 1, today.year + 1):
+        jan1 = date(y, 1, 1)
+        x = pad_l + (week_index(jan1) - week_index(first) + lead_pad) / size * bar_gap
+        marks += f'<line x1="{x:.1f}" y1="{pad_t}" x2="{x:.1f}" y2="{pad_t + chart_h}" stroke="#e5e7eb" stroke-width="1" stroke-dasharray="2,2"/>'
+    for y in range(first.year, today.year + 1):
+        x = pad_l + max(0, (week_index(date(y, 1, 1)) - week_index(first) + lead_pad) / size * bar_gap)
+        marks += f'<text x="{x + 3:.1f}" y="{H - 5}" font-size="9" fill="#9ca3af">{y} · {years.get(y, 0):,.0f} mi</text>'
+
+    grid = ""
+    for frac in [0.25, 0.5, 0.75, 1.0]:
+        ty = int(pad_t + chart_h * (1 - frac))
+        grid += f'<line x1="{pad_l}" y1="{ty}" x2="{W - pad_r}" y2="{ty}" stroke="#f3f4f6" stroke-width="1"/>'
+        grid += f'<text x="{pad_l - 5}" y="{ty + 4}" text-anchor="end" font-size="9" fill="#d1d5db">{int(max_mi * frac)}</text>'
+
+    title = "WEEKLY MILEAGE — all history" + (f" (avg of {size}-week blocks)" if size > 1 else "")
+    return (f'<svg viewBox="0 0 {W} {H}" xmlns="http://www.w3.org/2000/svg" style="width:100%;font-family:system-ui,sans-serif">'
+            + grid + bars + marks
+            + f'<text x="{pad_l}" y="{pad_t - 8}" font-size="10" fill="#9ca3af" font-weight="600" letter-spacing="0.05em">{title}</text>'
+            + '</svg>')
+
+def adherence_heatmap_html(adherence):
+    """One square per plan week, colored by graded completion; future weeks stay grey."""
+    today = adherence.today
+    cells = ""
+    for ws, grade, color, pct in adherence.grades():
+        current = ws <= today < ws + timedelta(weeks=1)
+        tip = f"Week of {ws.strftime('%b %-d')}" + (f" · {grade} ({pct:.0f}%)" if grade else "")
+        bg = color or "#f3f4f6"
+        border = "2px solid #FC4C02" if current else "1px solid #e5e7eb"
+        cells += (f'<div title="{tip}" style="width:14px;height:14px;border-radius:3px;'
+                  f'background:{bg};border:{border};box-sizing:border-box"></div>')
+    return (f'<div style="display:flex;flex-wrap:wrap;align-items:center;gap:3px;margin:4px 0 0">'
+            f'<span style="font-size:11px;color:#9ca3af;margin-right:6px">Adherence</span>{cells}</div>')
+
+# ── page sections ─────────────────────────────────────────────
+def session_activity(fn):
+    """For fragments the user drives: a fragment rerun skips the script's begin() / end(),
+    so without this the session looks idle and could have keys evicted mid-run."""
+    @wraps(fn)
+    def run(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        with get_session_registry().active(ctx.session_id, ctx.session_state):
+            return fn(*args, **kwargs)
+    return run
+
+def render_plan(plan_sig, goal_time, act_runs, act_version):
+    """Header, stats and calendar for the selected plan. Called on every app rerun, but all
+    heavy lifting is served from the cached pipeline above."""
+    plan_key, race_date_str = plan_sig[0], plan_sig[1]
+    plan = PLANS[plan_key]
+    race_date = date.fromisoformat(race_date_str)
+    today = date.today()
+    today_str = today.isoformat()
+
+    with metrics.phase("build_planned_map"):
+        planned_map, plan_start_str = cached_planned_map(*plan_sig)
+
+    miles_ahead = sum(r["m"] for ds,r in planned_map.items() if ds >= today_str)
+    effective_map = apply_swaps(planned_map, st.session_state.get("swaps", {}))
+    with metrics.phase("adherence"):
+        adherence   = get_adherence(effective_map, plan_start_str, race_date_str, act_runs, today,
+                                    get_matcher(effective_map, act_runs))
+    completed, missed = adherence.totals()
+
+    st.markdown(f"## {plan['name']} &nbsp;·&nbsp; {goal_time} goal")
+    st.caption(f"{plan['weeks']} weeks · race on {race_date.strftime('%B %-d, %Y')}")
+
+    with metrics.phase("prediction"):
+        prediction = predict_finish(act_version, plan_sig, today_str, act_runs, planned_map)
+        outlook = simulate_finish(act_version, plan_sig, swaps_signature(st.session_state.get("swaps", {})),
+                                  today_str, goal_time,
+                                  tuple(adherence.effective(w) / 100 for w in adherence.past_weeks()),
+                                  act_runs, planned_map, effective_map)
+    with metrics.phase("header"):
+        header = build_header_html(plan_sig, plan_start_str, goal_time, today_str, prediction, planned_map, outlook)
+    st.html(metrics.payload("header", header))
+
+    c1,c2,c3,c4 = st.columns(4)
+    c1.metric("Weeks", plan["weeks"])
+    c2.metric("Miles remaining", round(miles_ahead))
+    c3.metric("Planned runs hit", completed)
+    c4.metric("Missed", missed)
+    st.html(metrics.payload("heatmap", adherence_heatmap_html(adherence)))
+    st.divider()
+
+    render_calendar(plan_sig, goal_time, act_runs, act_version)
+
+@st.fragment
+@session_activity
+@metrics.timed("calendar")
+def render_calendar(plan_sig, goal_time, act_runs, act_version):
+    """Week navigation, calendar, trend chart and swap controls. Runs as a fragment, so
+    paging through weeks or picking swap days reruns only this block."""
+    ss = st.session_state
+    race_date_str = plan_sig[1]
+    today = date.today()
+    today_str = today.isoformat()
+    gps = goal_pace_secs(goal_time)
+    planned_map, plan_start_str = cached_planned_map(*plan_sig)
+
+    # Build week list: 60 days back (aligned to Monday) through race date
+    cal_start = today - timedelta(days=60)
+    cal_start -= timedelta(days=cal_start.weekday())  # Mon=0 in weekday()
+    all_weeks = []
+    w = cal_start
+    race_date_obj = date.fromisoformat(race_date_str)
+    while w <= race_date_obj:
+        all_weeks.append(w)
+        w += timedelta(weeks=1)
+
+    # Find current week
+    cur_idx = next((i for i,ws in enumerate(all_weeks) if ws <= today < ws+timedelta(weeks=1)), 0)
+
+    if "week_offset" not in ss: ss["week_offset"] = 0
+    WINDOW = 4
+    total = len(all_weeks)
+    start_idx = max(0, min(cur_idx + ss["week_offset"], total - WINDOW))
+
+    # Navigation uses on_click callbacks: they run before the fragment rerun the click
+    # triggers, so the new offset is picked up without a second rerun.
+    def shift_weeks(delta):
+        ss["week_offset"] = 0 if delta is None else ss["week_offset"] + delta
 
-        if i % 2 == 0 or n <= 8:
-            fw = "600" if is_cur else "400"
-            fc = "#FC4C02" if is_cur else "#9ca3af"
-            labels_html += f'<text x="{x_center}" y="{H - 5}" text-anchor="middle" font-size="9" fill="{fc}" font-weight="{fw}">{lbl}</text>'
+    nc1, nc2, nc3 = st.columns([1,4,1])
+    with nc1:
+        st.button("← Earlier", on_click=shift_weeks, args=(-WINDOW,))
+    with nc2:
+        wa = all_weeks[start_idx]
+        wb = all_weeks[min(start_idx+WINDOW-1, total-1)]
+        st.markdown(f'<div style="text-align:center;color:#6b7280;font-size:13px">{wa.strftime("%b %-d")} – {(wb+timedelta(days=6)).strftime("%b %-d, %Y")}</div>', unsafe_allow_html=True)
+    with nc3:
+        st.button("Later →", on_click=shift_weeks, args=(WINDOW,))
 
-    if len(points) > 1:
-        pts = " ".join(f"{px},{py}" for px, py in points)
-        trend_line_svg = f'<polyline points="{pts}" fill="none" stroke="#5DCAA5" stroke-width="1.5" stroke-linejoin="round" opacity="0.5"/>'
+    col_j, _ = st.columns([1,3])
+    with col_j:
+        st.button("Jump to today", type="secondary", on_click=shift_weeks, args=(None,))
 
-    grid = ""
-    for frac in [0.25, 0.5, 0.75, 1.0]:
-        ty = int(pad_t + chart_h * (1 - frac))
-        mi_val = int(max_mi * frac)
-        grid += f'<line x1="{pad_l}" y1="{ty}" x2="{W - pad_r}" y2="{ty}" stroke="#f3f4f6" stroke-width="1"/>'
-        grid += f'<text x="{pad_l - 5}" y="{ty + 4}" text-anchor="end" font-size="9" fill="#d1d5db">{mi_val}</text>'
+    # Legend + color key
+    leg = """
+    <div style="display:flex;flex-wrap:wrap;align-items:center;gap:12px;margin:12px 0 16px;font-size:11px;color:#6b7280">
+      <div style="display:flex;align-items:center;gap:6px">
+        <div style="width:100px;height:12px;border-radius:3px;background:linear-gradient(to right,#e05757,#e8a825,#5DCAA5)"></div>
+        <span>On target → Missed</span>
+      </div>
+      <span style="background:#d1fae5;color:#065f46;padding:2px 8px;border-radius:4px;font-weight:600">Easy</span>
+      <span style="background:#dbeafe;color:#1e40af;padding:2px 8px;border-radius:4px;font-weight:600">Long</span>
+      <span style="background:#fed7aa;color:#7c2d12;padding:2px 8px;border-radius:4px;font-weight:600">Tempo</span>
+      <span style="background:#fecaca;color:#991b1b;padding:2px 8px;border-radius:4px;font-weight:600">VO2</span>
+      <span style="background:#e5e7eb;color:#374151;padding:2px 8px;border-radius:4px;font-weight:600">Unplanned</span>
+    </div>"""
+    st.html(leg)
+
+    # Apply any user swaps
+    if "swaps" not in ss: ss["swaps"] = {}
+    effective_map = apply_swaps(planned_map, ss["swaps"])
 
-    svg = (f'<svg viewBox="0 0 {W} {H}" xmlns="http://www.w3.org/2000/svg" style="width:100%;font-family:system-ui,sans-serif">'
-           + grid + bars_planned + bars_actual + trend_line_svg + labels_html
-           + f'<text x="{pad_l}" y="{pad_t - 8}" font-size="10" fill="#9ca3af" font-weight="600" letter-spacing="0.05em">WEEKLY MILEAGE — planned vs actual</text>'
-           + f'<rect x="{W-135}" y="4" width="9" height="9" fill="#f3f4f6" stroke="#e5e7eb" stroke-width="1" rx="1"/>'
-           + f'<text x="{W-122}" y="12" font-size="9" fill="#9ca3af">Planned</text>'
-           + f'<rect x="{W-72}" y="4" width="9" height="9" fill="#5DCAA5" rx="1"/>'
-           + f'<text x="{W-59}" y="12" font-size="9" fill="#9ca3af">Actual</text>'
-           + '</svg>')
+    load = get_training_load(act_runs, gps)
+    matcher = get_matcher(effective_map, act_runs)
+    adherence = get_adherence(effective_map, plan_start_str, race_date_str, act_runs, today, matcher)
+    streams = stream_index()
+    fivek_secs, _ = fivek_equivalent(streams, today)
+    cal_html = tooltip_css()
+    with metrics.phase("weeks"):
+        shown = all_weeks[start_idx:start_idx + WINDOW]
+        compliance = week_compliance([(ws + timedelta(days=d)).isoformat() for ws in shown for d in range(7)],
+                                     effective_map, matcher, gps, fivek_secs, ss.get("access_token"))
+        for i in range(WINDOW):
+            idx = start_idx + i
+            if idx >= total: break
+            ws = all_weeks[idx]
+            we = ws + timedelta(days=6)
+            cal_html += render_week(ws, effective_map, act_runs, plan_start_str, gps, ws <= today <= we, load=load,
+                                    fivek_secs=fivek_secs, compliance=compliance, streams=streams,
+                                    adherence=adherence, matcher=matcher)
+    st.html(metrics.payload("calendar", cal_html))
 
+    # ── fitness trend chart ──────────────────────────────────
     st.markdown("---")
-    st.html(svg)
+    swaps_sig = swaps_signature(ss["swaps"])
+    planned_weeks = cached_planned_weeks(plan_sig, swaps_sig, effective_map)
+    if "rollups" not in ss:
+        ss["rollups"] = MileageRollups()
+        ss["rollups"].add_runs(act_runs)
+    rollups = ss["rollups"]
+    trend_mode = st.radio("Trend range", ["12 weeks", "All history"], horizontal=True,
+                          key="trend_mode", label_visibility="collapsed")
+    if trend_mode == "All history":
+        if not ss.get("history_loaded"):
+            # One-off backfill: keep compact run dicts (not the raw payloads) and fold them
+            # into the rollups and training load
+            token = get_valid_token()
+            if token:
+                with st.spinner("Loading full Strava history..."):
+                    ss["history_runs"] = load_history_runs(token, verified_athlete_id())
+                    rollups.add_runs(ss["history_runs"])
+                    if "training_load" in ss:
+                        ss["training_load"].add_runs(ss["history_runs"])
+                ss["history_loaded"] = True
+        with metrics.phase("chart"):
+            chart = season_chart_svg(rollups.digest, plan_sig, swaps_sig, today_str, planned_weeks, rollups)
+    else:
+        with metrics.phase("chart"):
+            chart = trend_chart_svg(rollups.digest, plan_sig, swaps_sig, today_str, planned_weeks, rollups)
+    st.html(metrics.payload("chart", chart))
 
     # ── swap UI ───────────────────────────────────────────────
     # Show swap controls for weeks that have at least 2 future planned days
@@ -2017,23 +1291,458 @@ def main():
                     ds_a = swap_options[day_a_label]
                     ds_b = swap_options[day_b_label]
                     if ds_a != ds_b:
-                        run_a = effective_map[ds_a]
-                        run_b = effective_map[ds_b]
-                        ss["swaps"][ds_a] = run_b
-                        ss["swaps"][ds_b] = run_a
+                        ss["swaps"] = get_swap_history().apply({ds_a: effective_map[ds_b],
+                                                                ds_b: effective_map[ds_a]})
                         persist_session()
+                        # Header counts and the chart depend on the swapped plan — full rerun
                         st.rerun()
                     else:
                         st.warning("Pick two different days to swap.")
 
-    # Show reset button if any swaps exist
-    if ss.get("swaps"):
+    # Reset / undo / redo, once there's any swap history
+    history = get_swap_history()
+    if ss.get("swaps") or history.can_undo or history.can_redo:
         st.divider()
-        rc1, _ = st.columns([1, 3])
+        rc1, rc2, rc3, _ = st.columns([1, 0.5, 0.5, 2])
         with rc1:
-            if st.button("Reset all swaps", type="secondary"):
-                ss["swaps"] = {}
+            if st.button("Reset all swaps", type="secondary", disabled=not ss.get("swaps")):
+                ss["swaps"] = history.reset()
+                persist_session()
+                st.rerun()
+        with rc2:
+            if st.button("↶ Undo", disabled=not history.can_undo):
+                ss["swaps"] = history.undo()
+                persist_session()
+                st.rerun()
+        with rc3:
+            if st.button("↷ Redo", disabled=not history.can_redo):
+                ss["swaps"] = history.redo()
                 persist_session()
                 st.rerun()
 
-main()
+
+def get_swap_history():
+    """Session undo/redo history for swaps. Swap layers are replaced, never edited in
+    place, so a history whose current layer isn't ss["swaps"] (hydrated or reset from
+    elsewhere) is stale and restarts from the current layer."""
+    ss = st.session_state
+    history = ss.get("swap_history")
+    if history is None or history.current is not ss.get("swaps"):
+        history = ss["swap_history"] = SwapHistory(ss.setdefault("swaps", {}))
+    return history
+
+def get_matcher(planned_map, act_runs):
+    """Session PlanMatcher; each call rematches only around days that changed."""
+    model = st.session_state.setdefault("matcher", PlanMatcher())
+    model.sync(planned_map, act_runs)
+    return model
+
+def get_adherence(planned_map, plan_start_str, race_date_str, act_runs, today, matcher=None):
+    """Session PlanAdherence. Rebuilt when the plan window moves; otherwise only days whose
+    plan entry or runs changed are refreshed."""
+    ss = st.session_state
+    model = ss.get("adherence")
+    if model is None or model.start.isoformat() != plan_start_str or model.race_date_str != race_date_str:
+        model = ss["adherence"] = PlanAdherence(plan_start_str, race_date_str)
+    model.sync(planned_map, act_runs, today, matcher)
+    return model
+
+def get_training_load(act_runs, gps):
+    """Session TrainingLoad. Rebuilt in one vectorized pass when the goal pace changes;
+    otherwise recent runs it hasn't seen are folded in, late uploads included. History is
+    folded in once, when it's loaded."""
+    ss = st.session_state
+    model = ss.get("training_load")
+    if model is None or model.gps != gps:
+        model = ss["training_load"] = TrainingLoad.from_runs({**ss.get("history_runs", {}), **act_runs}, gps)
+    else:
+        model.add_new(act_runs)
+    return model
+
+# ── instrumentation ───────────────────────────────────────────
+@st.cache_resource
+def start_metrics_server(port):
+    """Process-wide /metrics endpoint (Prometheus text), started once per port."""
+    return metrics.serve(port)
+
+# Idle sessions give back what they can rebuild, so memory follows active users rather
+# than every tab ever opened
+@st.cache_resource
+def get_session_registry() -> SessionRegistry:
+    """Process-wide session footprints; idle minutes and the cap come from secrets."""
+    registry = SessionRegistry(idle_secs=60 * float(st.secrets.get("SESSION_IDLE_MINUTES", 15)),
+                               cap_bytes=float(st.secrets.get("SESSION_MEMORY_MB", 512)) * 2**20)
+    metrics.REGISTRY.gauge("sessions", lambda: registry.snapshot()["sessions"])
+    metrics.REGISTRY.gauge("session_bytes", lambda: registry.snapshot()["keys"])
+    metrics.REGISTRY.gauge("session_evictions_total", lambda: registry.evicted)
+    return registry
+
+def render_memory_panel():
+    """?debug: this session's bytes per key, and totals across sessions."""
+    own, shared = measure(get_script_run_ctx().session_state)
+    snap = get_session_registry().snapshot()
+    st.markdown("### Session memory")
+    rows = [f"| `{k}` | {n / 1024:.1f} KB |" for k, n in sorted(own.items(), key=lambda kv: -kv[1]) if n >= 1024]
+    rows += [f"| `{k}` (shared) | {n / 1024:.1f} KB |" for k, n in shared.items()]
+    if rows:
+        st.markdown("| key | approx. |\n|---|---|\n" + "\n".join(rows))
+    st.caption(f"{snap['sessions']} sessions ({snap['active']} active) hold ~{snap['own'] / 2**20:.1f} MB "
+               f"of a {snap['cap'] / 2**20:.0f} MB cap · {snap['evicted']} evictions")
+
+# Off unless the PROFILING secret (or the PLANNER_PROFILING=1 environment variable) turns
+# it on. Then ?profile (sampling) or ?profile=trace (cProfile) profiles this session's
+# runs for admins and coaches, and athlete ids listed in the PROFILE_ATHLETES secret are
+# sampled without asking them for anything. Rate-limited process-wide; output goes to
+# PROFILE_DIR.
+@st.cache_resource
+def get_profile_limiter() -> profiler.Limiter:
+    return profiler.Limiter(per_minute=int(st.secrets.get("PROFILE_PER_MINUTE", 6)))
+
+def profile_mode():
+    """"sample" / "trace" when this run should be profiled, else None."""
+    if not (st.secrets.get("PROFILING", False) or os.environ.get("PLANNER_PROFILING") == "1"):
+        return None
+    requested = st.query_params.get("profile")
+    if requested is not None and can_diagnose():
+        return "trace" if requested == "trace" else "sample"
+    athlete_id = verified_athlete_id()
+    if athlete_id and athlete_id in st.secrets.get("PROFILE_ATHLETES", []):
+        return "sample"
+    return None
+
+@contextmanager
+def maybe_profile():
+    """Profile the enclosed run if profile_mode() asks for it and the limiter allows."""
+    mode = profile_mode()
+    limiter = get_profile_limiter()
+    if mode is None or not limiter.acquire():
+        yield
+        return
+    athlete_id = verified_athlete_id() or "anon"
+    name = f"{datetime.now():%Y%m%d-%H%M%S}-{athlete_id}-{secrets.token_hex(2)}"
+    report = None
+    try:
+        with profiler.profile(st.secrets.get("PROFILE_DIR", "profiles"), name, mode,
+                              root=os.path.dirname(os.path.abspath(__file__))) as report:
+            yield
+    finally:
+        limiter.release()
+        if report is not None and report.paths:   # st.rerun() / st.stop() land here too
+            st.session_state["_last_profile"] = report.text()
+            print(f"[profile] {report.paths[-1]}: {report.seconds * 1000:.0f} ms")
+
+def render_debug_panel():
+    """?debug: this run's phase breakdown and rolling percentiles across all sessions."""
+    timer = metrics.current()
+    st.divider()
+    st.markdown("### Rerun timings")
+    if timer:
+        rows = [f"| `{name}` | {secs * 1000:.1f} ms |" for name, secs in timer.phases]
+        rows += [f"| `{name}` html | {n / 1024:.1f} KB |" for name, n in timer.payload_bytes.items()]
+        st.markdown("| phase | this run |\n|---|---|\n" + "\n".join(rows))
+        st.caption(f"{timer.elapsed() * 1000:.0f} ms so far (before final flush)")
+    snap = metrics.REGISTRY.snapshot()
+    if snap:
+        rows = [f"| `{name}` | {v['n']} | {v['p50']:.1f} | {v['p95']:.1f} |" for name, v in snap.items()]
+        st.markdown("| series | n | p50 | p95 |\n|---|---|---|---|\n" + "\n".join(rows))
+    render_memory_panel()
+    if st.session_state.get("_last_profile"):
+        st.markdown("### Last profile")
+        st.code(st.session_state["_last_profile"], language=None)
+
+# ?coach: one row per athlete in the coach's squad that the sync daemon keeps current.
+# Squads are configured in the COACH_SQUADS secret, a table of coach athlete id → athlete
+# ids. The daemon builds the rows (see coach.py) and keeps them in the activity store;
+# the dashboard only reads them.
+def coach_squad():
+    """Athlete ids in the verified athlete's squad, or None if they don't coach one."""
+    athlete_id = verified_athlete_id()
+    squad = st.secrets.get("COACH_SQUADS", {}).get(str(athlete_id)) if athlete_id else None
+    return None if squad is None else {int(a) for a in squad}
+
+def is_coach():
+    return coach_squad() is not None
+
+def can_diagnose():
+    """?debug and ?profile: only for a verified athlete listed in the ADMINS secret, or a
+    coach. They show process-wide timings and memory, and profiles cost every session."""
+    athlete_id = verified_athlete_id()
+    if not athlete_id:
+        return False
+    return athlete_id in {int(a) for a in st.secrets.get("ADMINS", [])} or is_coach()
+
+def render_coach_view():
+    squad = coach_squad() or set()
+    stored = get_activity_store().summaries(squad)
+    rows = [row for row, _ in stored.values() if row]
+    built = max((at for _, at in stored.values()), default=None)
+    st.markdown("## Squad")
+    if built is None:
+        st.caption("No rows yet: they're built by sync_daemon.py as squad athletes sync. "
+                   "[back to my plan](?)")
+    else:
+        age = time.time() - built
+        ago = "just now" if age < 60 else f"{age // 60:.0f} min ago" if age < 3600 else f"{age // 3600:.0f} h ago"
+        st.caption(f"{len(rows)} of {len(squad)} athletes · last row built {ago} · [back to my plan](?)")
+    order = st.radio("Sort by", ["Name", "Last grade", "Race date"], horizontal=True, label_visibility="collapsed")
+    if order == "Last grade":
+        rows = sorted(rows, key=lambda r: (r["grade"] or "Z", r["name"]))
+    elif order == "Race date":
+        rows = sorted(rows, key=lambda r: (r["race_date"], r["name"]))
+    else:
+        rows = sorted(rows, key=lambda r: r["name"].lower())
+    st.html(metrics.payload("coach", coach.dashboard_html(rows)))
+
+# ── main ──────────────────────────────────────────────────────
+def main():
+    ss = st.session_state
+    params = st.query_params
+
+    if st.secrets.get("METRICS_PORT"):
+        start_metrics_server(int(st.secrets["METRICS_PORT"]))
+
+    # Load persisted state (server-side, found via the device cookie)
+    with metrics.phase("hydrate"):
+        hydrate_session_from_store()
+    write_device_cookie()
+
+    if "code" in params and "access_token" not in ss:
+        with st.spinner("Connecting to Strava..."):
+            data = exchange_code(params["code"])
+        if "access_token" in data:
+            ss["access_token"] = data["access_token"]
+            ss["refresh_token"] = data["refresh_token"]
+            ss["token_expires_at"] = data["expires_at"]
+            ss["athlete"] = data.get("athlete", {})
+            ss["_verified_athlete"] = ss["athlete"].get("id")
+            # Plan settings saved from another device come back with the athlete
+            if ss["athlete"].get("id"):
+                for k, v in get_store().attach(ss["athlete"]["id"]).items():
+                    if k not in ("access_token", "refresh_token", "token_expires_at"):
+                        ss.setdefault(k, v)
+            persist_session()
+            register_athlete()
+            st.query_params.clear()
+            st.rerun()
+        else:
+            st.error(f"Auth failed: {data.get('message','unknown')}")
+            st.stop()
+
+    with metrics.phase("get_valid_token"):
+        token = get_valid_token()
+
+    if not token:
+        st.markdown("## Marathon Training Planner")
+        st.markdown("Connect Strava to load your runs and build a Pfitzinger training calendar.")
+        st.markdown(
+            f'<a href="{get_auth_url()}" style="display:inline-flex;align-items:center;gap:8px;'
+            f'background:#FC4C02;color:white;padding:10px 20px;border-radius:6px;'
+            f'text-decoration:none;font-weight:600;font-size:14px">'
+            f'<svg width="18" height="18" viewBox="0 0 24 24" fill="white">'
+            f'<path d="M15.387 17.944l-2.089-4.116h-3.065L15.387 24l5.15-10.172h-3.066'
+            f'm-7.008-5.599l2.836 5.598h4.172L10.463 0l-7 13.828h4.169"/></svg>'
+            f'Connect with Strava</a>', unsafe_allow_html=True)
+        st.stop()
+
+    # First load: activities are fetched while the sidebar renders, and waited for just
+    # before the first thing that reads them. After that, refreshes happen in the background.
+    first_load = None
+    if "activities" not in ss:
+        with metrics.phase("start_fetch"):
+            first_load = start_first_load(token)
+    else:
+        poll_activity_refresh()
+
+    if "coach" in params:
+        if first_load is not None:
+            # whether this is a coach is decided by the id Strava returns with the first load
+            finish_first_load(first_load)
+            first_load = None
+        if is_coach():
+            with metrics.phase("coach"):
+                render_coach_view()
+            if "debug" in params and can_diagnose():
+                with st.sidebar:
+                    render_debug_panel()
+            return
+    athlete = ss.get("athlete", {})
+    coach_link = None
+    with st.sidebar:
+        if athlete:
+            name = f"{athlete.get('firstname','')} {athlete.get('lastname','')}".strip()
+            pic  = athlete.get("profile","")
+            c1,c2 = st.columns([1,3])
+            with c1:
+                if pic and "large.jpg" not in pic: st.image(pic, width=48)
+            with c2:
+                st.markdown(f"**{name}**")
+                st.markdown("🟢 Connected")
+            coach_link = st.empty()    # filled in once the first load has verified the athlete
+            st.divider()
+        st.markdown("### Race goal")
+        goal_time = st.text_input("Finish time", value=ss.get("goal_time","3:30:00"), placeholder="3:30:00")
+        default_race = ss.get("race_date", date.today()+timedelta(weeks=20))
+        race_date = st.date_input("Race date", value=default_race, min_value=date.today()+timedelta(weeks=8))
+        st.divider()
+        st.markdown("### Training plan")
+        if first_load is not None:
+            finish_first_load(first_load)
+        if coach_link is not None and is_coach():
+            coach_link.markdown("[Squad dashboard](?coach)")
+        mpw = ss.get("weekly_mpw", 0)
+        auto = "pfitz-18-70" if mpw>=60 else "pfitz-18-55" if mpw>=45 else "pfitz-12-55"
+        if "selected_plan" not in ss: ss["selected_plan"] = auto
+        if mpw > 0: st.caption(f"Recent avg: ~{mpw} mpw")
+        render_freshness()
+        plan_key = st.radio("Plan", options=list(PLANS.keys()),
+                            format_func=lambda k: f"{PLANS[k]['name']} — {PLANS[k]['desc']}",
+                            index=list(PLANS.keys()).index(ss["selected_plan"]),
+                            label_visibility="collapsed")
+
+        # ── Schedule day preferences ──
+        is_me = PLANS[plan_key].get("kind") == "me"
+        if not is_me:
+            st.divider()
+            st.markdown("### Schedule")
+            st.caption("Pick which day each type of run lands on.")
+            DOW_OPTS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+            # Internal index mapping: schedule uses 0=Sun..6=Sat, but display Mon-first
+            DOW_TO_INT = {"Mon":1,"Tue":2,"Wed":3,"Thu":4,"Fri":5,"Sat":6,"Sun":0}
+            INT_TO_DOW = {v:k for k,v in DOW_TO_INT.items()}
+
+            # Default: long=Sun matches race day if race is Sunday, otherwise let user pick
+            default_long_dow    = INT_TO_DOW.get(race_date.isoweekday() % 7, "Sun")
+            default_quality_dow = ss.get("quality_dow", "Wed")
+
+            long_dow = st.selectbox(
+                "Long run day",
+                DOW_OPTS,
+                index=DOW_OPTS.index(ss.get("long_dow", default_long_dow)),
+                help="Should match your race day for race-week alignment."
+            )
+            quality_dow = st.selectbox(
+                "Quality workout day",
+                DOW_OPTS,
+                index=DOW_OPTS.index(default_quality_dow),
+                help="Best practice: 3+ days before/after long run for full recovery."
+            )
+            is_high_vol = PLANS[plan_key].get("peak_mpw", 55) >= 70
+            n_rest_days = 1 if is_high_vol else 2
+
+            # Default rest days
+            default_rest = ss.get("rest_dows", ["Mon", "Fri"] if not is_high_vol else ["Mon"])
+            if isinstance(default_rest, str): default_rest = [default_rest]  # migrate old single value
+
+            if n_rest_days == 1:
+                rest_dows_sel = [st.selectbox(
+                    "Rest day",
+                    DOW_OPTS,
+                    index=DOW_OPTS.index(default_rest[0] if default_rest else "Mon"),
+                    help="One rest day for 70-mpw plans. Best practice: day after long run."
+                )]
+            else:
+                st.caption("55-mpw plans have 2 rest days per week.")
+                rest_dows_sel = st.multiselect(
+                    "Rest days (pick 2)",
+                    DOW_OPTS,
+                    default=[d for d in default_rest if d in DOW_OPTS][:2] or ["Mon","Fri"],
+                    max_selections=2,
+                    help="Best practice: spread them out. Mon + Fri or Mon + Thu work well."
+                )
+                if len(rest_dows_sel) < 2:
+                    st.warning("Pick exactly 2 rest days for this plan.")
+
+            rest_dow = rest_dows_sel[0] if rest_dows_sel else "Mon"  # primary rest day for validation
+
+            # Validation
+            warnings = []
+            def cyclic_gap(a, b):
+                ai = DOW_TO_INT[a]
+                bi = DOW_TO_INT[b]
+                return min((ai - bi) % 7, (bi - ai) % 7)
+
+            if long_dow == quality_dow:
+                warnings.append("Quality and long run can't be on the same day.")
+            elif cyclic_gap(long_dow, quality_dow) < 2:
+                warnings.append(f"Quality on {quality_dow} is only {cyclic_gap(long_dow, quality_dow)} day(s) from long run on {long_dow}. Aim for 3+ days for recovery.")
+
+            for rd in rest_dows_sel:
+                if rd == quality_dow:
+                    warnings.append(f"Rest on {rd} conflicts with quality workout day.")
+                if rd == long_dow:
+                    warnings.append(f"Rest on {rd} conflicts with long run day.")
+
+            if n_rest_days == 2 and len(rest_dows_sel) == 2:
+                gap = cyclic_gap(rest_dows_sel[0], rest_dows_sel[1])
+                if gap < 2:
+                    warnings.append(f"Rest days {rest_dows_sel[0]} and {rest_dows_sel[1]} are only {gap} day(s) apart. Spread them out for better recovery.")
+
+            for w in warnings:
+                st.warning(w)
+
+            blocking = any("conflicts" in w or "can't be" in w for w in warnings)
+            if not blocking and (n_rest_days == 1 or len(rest_dows_sel) == 2):
+                ss["long_dow"]   = long_dow
+                ss["quality_dow"] = quality_dow
+                ss["rest_dows"]  = rest_dows_sel
+
+            long_day_int    = DOW_TO_INT[ss.get("long_dow", default_long_dow)]
+            quality_day_int = DOW_TO_INT[ss.get("quality_dow", default_quality_dow)]
+            saved_rests     = ss.get("rest_dows", ["Mon"])
+            rest_day_int    = DOW_TO_INT[saved_rests[0]] if saved_rests else 1
+        else:
+            long_day_int = quality_day_int = rest_day_int = None  # ME plans handle their own layout
+
+        # Track previous values to detect changes worth persisting
+        prev_plan      = ss.get("selected_plan")
+        prev_goal_time = ss.get("goal_time")
+        prev_race_date = ss.get("race_date")
+        prev_long      = ss.get("_last_long")
+        prev_quality   = ss.get("_last_quality")
+        prev_rest      = ss.get("_last_rest")
+
+        ss["selected_plan"] = plan_key
+        ss["goal_time"] = goal_time
+        ss["race_date"] = race_date
+
+        changed = (prev_plan != plan_key) or (prev_goal_time != goal_time) or (prev_race_date != race_date)
+        if not is_me:
+            ss["_last_long"]    = ss.get("long_dow")
+            ss["_last_quality"] = ss.get("quality_dow")
+            ss["_last_rest"]    = str(ss.get("rest_dows"))
+            changed = changed or (prev_long != ss["_last_long"]) or (prev_quality != ss["_last_quality"]) or (prev_rest != ss["_last_rest"])
+
+        if changed:
+            persist_session()
+
+        st.divider()
+        if st.button("Disconnect Strava"):
+            if verified_athlete_id():
+                get_activity_store().unregister(verified_athlete_id())
+                get_detail_fetcher().forget(verified_athlete_id())
+            for k in ["access_token","refresh_token","token_expires_at","athlete","_verified_athlete","activities","activities_version","activities_fetched","_activities_refresh","_activities_checked","rollups","history_loaded","history_runs","training_load","matcher","adherence","weekly_mpw","swaps","swap_history"]:
+                ss.pop(k,None)
+            get_store().clear()
+            st.rerun()
+
+    act_runs = ss["activities"]
+    with metrics.phase("stream_index"):
+        request_streams({**ss.get("history_runs", {}), **act_runs}, token)
+    plan_sig = (plan_key, race_date.isoformat(), long_day_int, quality_day_int, rest_day_int)
+    render_plan(plan_sig, goal_time, act_runs, ss.get("activities_version", ""))
+
+    if "debug" in params and can_diagnose():
+        with st.sidebar:
+            render_debug_panel()
+
+with metrics.rerun("app"):
+    _ctx = get_script_run_ctx()
+    get_session_registry().begin(_ctx.session_id, _ctx.session_state)
+    try:
+        with maybe_profile():
+            main()
+    finally:
+        with metrics.phase("flush"):
+            flush_store()  # also runs on st.rerun() / st.stop(), which unwind by exception
+        with metrics.phase("memory"):
+            get_session_registry().end(_ctx.session_id)
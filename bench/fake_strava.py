@@ -0,0 +1,144 @@
+"""Offline stand-in for the parts of the Strava API the app calls.
+
+Serves OAuth token exchange/refresh, the athlete, paginated activities, streams and laps
+for synthetic athletes. The OAuth code "athlete-<n>" logs in athlete n, whose history
+comes from bench.synthetic with seed n. Point the app at it with the STRAVA_BASE_URL
+secret.
+"""
+import json
+import math
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench.synthetic import athlete_runs
+
+METERS_PER_MILE = 1609.34
+SAMPLE_SECS = 5
+
+
+class FakeStrava:
+    def __init__(self, history_days=365, latency=0.0):
+        self.history_days = history_days
+        self.latency = latency          # seconds added to every response, like a network hop
+        self.requests = 0
+        self._athletes = {}             # id → [activity payload]
+        self._activities = {}           # activity id → payload
+        self._lock = threading.Lock()
+        self.server = None
+
+    # ── data ──
+    def activities(self, athlete_id):
+        with self._lock:
+            if athlete_id not in self._athletes:
+                acts = []
+                for ds, runs in athlete_runs(self.history_days, date.today(), seed=athlete_id).items():
+                    for r in runs:
+                        a = dict(id=athlete_id * 10**8 + r["id"] % 10**8, name=r["name"], type="Run",
+                                 sport_type="Run", distance=r["miles"] * METERS_PER_MILE,
+                                 moving_time=r["moving_time"], start_date_local=r["start"] + "Z",
+                                 average_heartrate=r["hr"], total_elevation_gain=r["elev"] / 3.28084)
+                        acts.append(a)
+                        self._activities[a["id"]] = a
+                acts.sort(key=lambda a: a["start_date_local"], reverse=True)
+                self._athletes[athlete_id] = acts
+            return self._athletes[athlete_id]
+
+    def streams(self, activity_id):
+        a = self._activities.get(activity_id)
+        if a is None:
+            return None
+        n = max(2, a["moving_time"] // SAMPLE_SECS)
+        speed = a["distance"] / a["moving_time"]
+        t = [i * SAMPLE_SECS for i in range(n)]
+        d, dist = [], 0.0
+        for i in range(n):
+            d.append(round(dist, 1))
+            dist += speed * SAMPLE_SECS * (1 + 0.15 * math.sin(i / 40))
+        hr = [round(a["average_heartrate"] + 8 * math.sin(i / 60)) for i in range(n)]
+        alt = [round(50 + 20 * math.sin(i / 90), 1) for i in range(n)]
+        return {k: dict(data=v) for k, v in dict(time=t, distance=d, heartrate=hr, altitude=alt).items()}
+
+    def laps(self, activity_id):
+        a = self._activities.get(activity_id)
+        if a is None:
+            return None
+        laps, left = [], a["distance"]
+        while left > 1:
+            m = min(METERS_PER_MILE, left)
+            laps.append(dict(distance=m, moving_time=round(a["moving_time"] * m / a["distance"])))
+            left -= m
+        return laps
+
+    # ── http ──
+    def start(self, port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body, status=200):
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _athlete(self):
+                auth = self.headers.get("Authorization", "")
+                tok = auth.rpartition("tok-")[2]
+                return int(tok) if tok.isdigit() else None
+
+            def do_POST(self):
+                fake._hit()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if urlparse(self.path).path != "/oauth/token":
+                    return self._send(dict(message="Not Found"), 404)
+                key = body.get("code") or body.get("refresh_token") or ""
+                n = key.rpartition("-")[2]
+                if not n.isdigit():
+                    return self._send(dict(message="Bad Request"), 400)
+                self._send(dict(access_token=f"tok-{n}", refresh_token=f"refresh-{n}",
+                                expires_at=int(time.time()) + 6 * 3600,
+                                athlete=dict(id=int(n), firstname="Load", lastname=f"Test {n}")))
+
+            def do_GET(self):
+                fake._hit()
+                url = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(url.query).items()}
+                athlete = self._athlete()
+                if athlete is None:
+                    return self._send(dict(message="Authorization Error"), 401)
+                parts = url.path.strip("/").split("/")
+                if url.path == "/api/v3/athlete":
+                    return self._send(dict(id=athlete, firstname="Load", lastname=f"Test {athlete}"))
+                if url.path == "/api/v3/athlete/activities":
+                    after = int(q.get("after", 0))
+                    per, page = int(q.get("per_page", 30)), int(q.get("page", 1))
+                    acts = [a for a in fake.activities(athlete)
+                            if datetime.fromisoformat(a["start_date_local"][:19]).timestamp() > after]
+                    return self._send(acts[(page - 1) * per:page * per])
+                if len(parts) == 5 and parts[2] == "activities" and parts[4] in ("streams", "laps"):
+                    fn = fake.streams if parts[4] == "streams" else fake.laps
+                    body = fn(int(parts[3]))
+                    return self._send(body, 200) if body is not None else self._send(dict(message="Not Found"), 404)
+                self._send(dict(message="Not Found"), 404)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="fake-strava", daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def _hit(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
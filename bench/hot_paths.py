@@ -0,0 +1,244 @@
+"""Benchmarks for plan generation, workout parsing and calendar rendering.
+
+Each benchmark is a function and a list of argument tuples. One op is one call, and
+ops/sec is measured over the whole list, so a benchmark reflects every plan, day layout
+or week it covers rather than one lucky input. Allocation is the mean peak traced
+memory per call (tracemalloc, on a separate pass so it doesn't skew timings).
+
+    python -m bench.hot_paths                  # run and compare with bench/baseline.json
+    python -m bench.hot_paths --save           # record a new baseline
+    python -m bench.hot_paths -k render_week   # only matching benchmarks
+
+Exits 1 when any benchmark is slower (ops/sec) or allocates more than the baseline by
+more than --threshold. Speed is compared as a ratio to a fixed calibration workload
+timed right around each benchmark, so a baseline recorded on a faster machine, or a box
+that is busy for part of the run, still compares fairly.
+Runs offline: inputs are the repo's plans and synthetic athletes.
+"""
+import argparse
+import csv
+import gc
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from itertools import permutations
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from adherence import PlanAdherence                                   # noqa: E402
+from calendar_view import make_tooltip, parse_me_segments, render_week, workout_segments  # noqa: E402
+from importer import read_log                                         # noqa: E402
+from matching import PlanMatcher                                      # noqa: E402
+from pace_utils import get_pace_range                                 # noqa: E402
+from plan_builder import PLANS, build_me_schedule, build_planned_map, build_schedule, goal_pace_secs  # noqa: E402
+from training_load import TrainingLoad                                # noqa: E402
+
+from bench.synthetic import ATHLETES, athlete_runs                    # noqa: E402
+
+BASELINE = Path(__file__).with_name("baseline.json")
+GOAL = "3:30:00"
+MIN_TIME = 0.2        # seconds per timing repeat
+REPEATS = 7
+
+
+def race_date(today, weeks=12):
+    d = today + timedelta(weeks=weeks)
+    return d + timedelta(days=(6 - d.weekday()) % 7)   # a Sunday
+
+
+def plan_runs(plan_key, today):
+    planned, _ = build_planned_map(plan_key, race_date(today).isoformat())
+    return list(planned.values())
+
+
+def csv_descriptions():
+    out = []
+    for path in sorted((ROOT / "plans").glob("*.csv")) + [ROOT / "run_plan.csv"]:
+        if not path.exists():
+            continue
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                out += [re.sub(r"^\d{4}-\d{2}-\d{2}:\s*", "", c) for c in row[1:] if c]
+    return out
+
+
+def benchmarks():
+    """[(name, fn, cases)]"""
+    today = date.today()
+    gps = goal_pace_secs(GOAL)
+    out = []
+
+    days = list(permutations(range(7), 3))     # (long, quality, rest), all distinct
+    for key, meta in PLANS.items():
+        if meta.get("kind") == "me":
+            out.append((f"build_me_schedule[{key}]", build_me_schedule, [(meta,)]))
+        else:
+            out.append((f"build_schedule[{key}]", build_schedule, [(key, *d) for d in days]))
+
+    me_notes = [r["note"] for key, meta in PLANS.items() if meta.get("kind") == "me"
+                for r in plan_runs(key, today) if r.get("note")]
+    out.append(("parse_me_segments", parse_me_segments,
+                [(n, gps) for n in me_notes] + [(n, gps, 1200) for n in me_notes]))
+
+    all_runs = [r for key in PLANS for r in plan_runs(key, today)]
+    out.append(("workout_segments", workout_segments,
+                [(r["t"], r["m"], gps, r.get("note")) for r in all_runs]))
+
+    actual = dict(id=1, name="Morning Run", miles=8.1, moving_time=3900, pace=481, hr=152, elev=120)
+    out.append(("make_tooltip", make_tooltip,
+                [("planned", r["t"], r["m"], gps, None, r.get("note")) for r in all_runs] +
+                [("both", r["t"], r["m"], gps, actual, r.get("note")) for r in all_runs]))
+
+    out.append(("get_pace_range", get_pace_range,
+                [(d, gps, p) for d in csv_descriptions() for p in ("", "run_plan.csv")]))
+    if (ROOT / "run_plan.csv").exists():
+        out.append(("read_log[run_plan]", read_log, [(ROOT / "run_plan.csv", "2025-04-13")]))
+
+    rd = race_date(today).isoformat()
+    planned_map, plan_start = build_planned_map("pfitz-18-55", rd)
+    start = date.fromisoformat(plan_start)
+    weeks = [start + timedelta(weeks=w) for w in range((date.fromisoformat(rd) - start).days // 7 + 1)]
+    for label, n_days in ATHLETES.items():
+        runs = athlete_runs(n_days, today)
+        matcher = PlanMatcher()
+        matcher.sync(planned_map, runs)
+        adherence = PlanAdherence(plan_start, rd)
+        adherence.sync(planned_map, runs, today, matcher)
+        load = TrainingLoad.from_runs(runs, gps)
+        out.append((f"render_week[{label}]", render_week,
+                    [(ws, planned_map, runs, plan_start, gps, ws <= today < ws + timedelta(weeks=1), load,
+                      None, None, None, adherence, matcher) for ws in weeks]))
+        out.append((f"plan_sync[{label}]", _cold_sync, [(planned_map, runs, plan_start, rd, today)]))
+        recent = {ds: r for ds, r in runs.items() if ds >= (today - timedelta(days=65)).isoformat()}
+        out.append((f"training_load_rerun[{label}]", load.add_new, [(recent,)]))
+    return out
+
+
+def _cold_sync(planned_map, runs, plan_start, rd, today):
+    matcher = PlanMatcher()
+    matcher.sync(planned_map, runs)
+    PlanAdherence(plan_start, rd).sync(planned_map, runs, today, matcher)
+
+
+def _passes(fn, cases, seconds):
+    t = time.perf_counter()
+    for c in cases:
+        fn(*c)
+    return max(1, int(seconds / max(time.perf_counter() - t, 1e-6)))
+
+
+def _block(fn, cases, passes):
+    t = time.perf_counter()
+    for _ in range(passes):
+        for c in cases:
+            fn(*c)
+    return time.perf_counter() - t
+
+
+def _calibration_work(n):
+    d = {f"k{i}": i * 1.5 for i in range(n)}
+    return sorted(d.items(), key=lambda kv: -kv[1])[:10], "".join(f"{v:.1f}" for v in d.values())
+
+
+CALIBRATION = (_calibration_work, [(500,)])
+
+
+def ops_per_sec(fn, cases):
+    """(ops/sec, calibration ops/sec), each the best of REPEATS.
+
+    Benchmark and calibration blocks alternate, so a stretch where the machine is slow
+    (other load, CPU steal) hits both and cancels out of their ratio.
+    """
+    passes = _passes(fn, cases, MIN_TIME)
+    cal_fn, cal_cases = CALIBRATION
+    cal_passes = _passes(cal_fn, cal_cases, MIN_TIME / 4)
+    best = cal_best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(REPEATS):
+            cal_best = min(cal_best, _block(cal_fn, cal_cases, cal_passes))
+            best = min(best, _block(fn, cases, passes))
+            gc.collect()
+    finally:
+        gc.enable()
+    return passes * len(cases) / best, cal_passes / cal_best
+
+
+def alloc_kb(fn, cases):
+    """Mean peak traced allocation per call, in KiB."""
+    tracemalloc.start()
+    try:
+        total = 0
+        for c in cases:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(*c)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(cases) / 1024
+
+
+def run(pattern=None):
+    results = {}
+    for name, fn, cases in benchmarks():
+        if pattern and pattern not in name:
+            continue
+        ops, calib = ops_per_sec(fn, cases)
+        results[name] = dict(ops=round(ops, 1), rel=round(ops / calib, 6),
+                             alloc_kb=round(alloc_kb(fn, cases), 2), cases=len(cases))
+        r = results[name]
+        print(f"{name:<34} {r['ops']:>12,.0f} ops/s {r['alloc_kb']:>10.1f} KiB/op  ({r['cases']} cases)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """[(name, message)] for every benchmark that regressed beyond threshold."""
+    bad = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if r["rel"] < b["rel"] * (1 - threshold):
+            bad.append((name, f"{r['ops']:,.0f} ops/s, {r['rel'] / b['rel'] - 1:+.0%} vs baseline "
+                              f"relative to calibration"))
+        if r["alloc_kb"] > b["alloc_kb"] * (1 + threshold) + 0.5:
+            bad.append((name, f"{r['alloc_kb']:.1f} KiB/op vs baseline {b['alloc_kb']:.1f} "
+                              f"({r['alloc_kb'] / max(b['alloc_kb'], 1e-9) - 1:+.0%})"))
+    return bad
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("-k", dest="pattern", help="only benchmarks whose name contains this")
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--threshold", type=float, default=0.3, help="allowed regression, as a fraction")
+    args = ap.parse_args(argv)
+
+    results = run(args.pattern)
+    if args.save:
+        # -k re-records just the matching entries; a full run replaces the baseline
+        old = json.loads(args.baseline.read_text())["results"] if args.pattern and args.baseline.exists() else {}
+        data = dict(machine=f"{platform.python_implementation()} {platform.python_version()} {platform.machine()}",
+                    results={**old, **results})
+        args.baseline.write_text(json.dumps(data, indent=1, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print("no baseline; run with --save first")
+        return 0
+    bad = compare(results, json.loads(args.baseline.read_text())["results"], args.threshold)
+    for name, msg in bad:
+        print(f"REGRESSION {name}: {msg}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""Concurrent-session load test for app.py against an offline Strava stand-in.
+
+Each simulated athlete is a headless AppTest session driven from its own thread, all in
+one process, like Streamlit serving many browser tabs. A session logs in through the
+OAuth redirect, then repeats rounds of week paging, a plan switch and a plain rerun.
+Each level of concurrency reports:
+- latency percentiles per interaction;
+- process CPU (as % of one core);
+- resident memory added per session;
+- the app's own slowest phases (from metrics.py).
+
+    python -m bench.loadtest --sessions 1,2,4,8,16 --rounds 5
+
+The level where rerun p95 first exceeds --degrade × the single-session p95 is reported as
+the point where latency degrades. Sessions start with _hydrated set: a new browser has
+nothing to restore, and the localStorage fallback is a browser component that AppTest
+can't answer.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from streamlit.testing.v1 import AppTest          # noqa: E402
+
+import metrics                                     # noqa: E402
+from bench.fake_strava import FakeStrava           # noqa: E402
+
+APP = str(ROOT / "app.py")
+TIMEOUT = 120
+RERUN_KINDS = ("rerun", "next_week", "prev_week", "switch_plan")
+
+# AppTest swaps process globals (the runtime, secrets, config) in and out around every
+# script run, so two runs can't overlap in one process. Runs take turns, and the wait for
+# a turn counts towards each interaction's latency, as queueing behind other sessions'
+# reruns does on a real server. What's lost is overlap of Strava I/O between sessions.
+_run_lock = threading.Lock()
+_app_run = AppTest._run
+
+
+def _serialised_run(self, *args, **kwargs):
+    with _run_lock:
+        return _app_run(self, *args, **kwargs)
+
+
+AppTest._run = _serialised_run
+
+
+def percentile(vals, p):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, len(vals) * p // 100)] if vals else float("nan")
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_secs():
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    return r.ru_utime + r.ru_stime
+
+
+def new_session(base_url, db_path):
+    at = AppTest.from_file(APP, default_timeout=TIMEOUT)
+    at.secrets["STRAVA_CLIENT_ID"] = "0"
+    at.secrets["STRAVA_CLIENT_SECRET"] = "loadtest"
+    at.secrets["REDIRECT_URI"] = "http://localhost:8501"
+    at.secrets["STRAVA_BASE_URL"] = base_url
+    at.secrets["STATE_DB_PATH"] = db_path
+    at.session_state["_hydrated"] = True
+    return at
+
+
+def _click(at, label):
+    btn = [b for b in at.button if b.label == label]
+    if not btn:
+        raise RuntimeError(f"no {label!r} button on the page")
+    btn[0].click().run()
+
+
+def drive(at, athlete, rounds, think, record, ready):
+    """One athlete: login, then `rounds` of paging / plan switch / rerun."""
+    def timed(kind, fn):
+        t = time.perf_counter()
+        fn()
+        record(kind, time.perf_counter() - t)
+        if at.exception:
+            raise RuntimeError(f"{kind}: {at.exception[0].value}")
+        if think:
+            time.sleep(think)
+
+    at.query_params["code"] = f"athlete-{athlete}"
+    timed("login", at.run)
+    ready()
+    for i in range(rounds):
+        timed("next_week", lambda: _click(at, "Later →"))
+        timed("prev_week", lambda: _click(at, "← Earlier"))
+        if not at.sidebar.radio:
+            raise RuntimeError("no plan picker in the sidebar")
+        plans = at.sidebar.radio[0]
+        timed("switch_plan", lambda: plans.set_value(plans.options[(i + 1) % len(plans.options)]).run())
+        timed("rerun", at.run)
+
+
+def run_level(n, base_url, db_path, rounds, think, first_athlete):
+    samples = {}
+    lock = threading.Lock()
+    errors = []
+    logged_in = threading.Barrier(n + 1)
+
+    def record(kind, secs):
+        with lock:
+            samples.setdefault(kind, []).append(secs)
+
+    def one(i):
+        try:
+            drive(new_session(base_url, db_path), first_athlete + i, rounds, think, record, logged_in.wait)
+        except Exception as e:          # one failing session shouldn't hang the level
+            errors.append(f"session {i}: {e}")
+            traceback.print_exc()
+            logged_in.abort()
+
+    metrics.REGISTRY = metrics.Registry()
+    rss0, cpu0, t0 = rss_mb(), cpu_secs(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = [pool.submit(one, i) for i in range(n)]
+        try:
+            logged_in.wait()
+            rss_live = rss_mb()        # every session logged in and holding its state
+        except threading.BrokenBarrierError:
+            rss_live = rss_mb()
+        for f in futures:
+            f.result()
+    wall = time.perf_counter() - t0
+    return dict(
+        sessions=n, errors=errors, wall=wall,
+        cpu_pct=100 * (cpu_secs() - cpu0) / wall,
+        mb_per_session=(rss_live - rss0) / n,
+        latency={k: dict(n=len(v), p50=percentile(v, 50), p95=percentile(v, 95), p99=percentile(v, 99))
+                 for k, v in samples.items()},
+        reruns=[s for k in RERUN_KINDS for s in samples.get(k, [])],
+        app_phases=metrics.REGISTRY.snapshot(),
+    )
+
+
+def report(level):
+    print(f"\n── {level['sessions']} session(s) · {level['wall']:.1f}s wall · CPU {level['cpu_pct']:.0f}% "
+          f"of one core · +{level['mb_per_session']:.1f} MB RSS per session")
+    print(f"  {'interaction':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for kind, v in level["latency"].items():
+        print(f"  {kind:<12} {v['n']:>5} {v['p50'] * 1000:>9.0f} {v['p95'] * 1000:>9.0f} {v['p99'] * 1000:>9.0f}")
+    phases = sorted(((v["p95"], k) for k, v in level["app_phases"].items()
+                     if ".ms." in k and not k.endswith(".total")), reverse=True)[:4]
+    if phases:
+        print("  slowest app phases (p95): " + ", ".join(f"{k.split('.ms.')[1]} {v:.0f}ms" for v, k in phases))
+    for e in level["errors"]:
+        print(f"  ERROR {e}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrency levels")
+    ap.add_argument("--rounds", type=int, default=5, help="interaction rounds per session")
+    ap.add_argument("--think", type=float, default=0.0, help="seconds between a session's interactions")
+    ap.add_argument("--history-days", type=int, default=365, help="synthetic history per athlete")
+    ap.add_argument("--strava-latency", type=float, default=0.02, help="seconds added per Strava request")
+    ap.add_argument("--degrade", type=float, default=2.0,
+                    help="rerun p95 over this multiple of the 1-session p95 counts as degraded")
+    args = ap.parse_args(argv)
+    levels = [int(x) for x in args.sessions.split(",")]
+
+    fake = FakeStrava(history_days=args.history_days, latency=args.strava_latency)
+    base_url = fake.start()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "state.db")
+        # imports, compiled regexes and shared plans load once per process, not per session
+        drive(new_session(base_url, db_path), 0, 0, 0, lambda kind, secs: None, lambda: None)
+        first = 1
+        for n in levels:
+            level = run_level(n, base_url, db_path, args.rounds, args.think, first)
+            first += n          # fresh athletes each level, so every login fetches history
+            report(level)
+            results.append(level)
+    fake.stop()
+
+    base = percentile(results[0]["reruns"], 95)
+    knee = next((r["sessions"] for r in results if percentile(r["reruns"], 95) > args.degrade * base), None)
+    print(f"\nrerun p95 at {results[0]['sessions']} session(s): {base * 1000:.0f} ms; "
+          + (f"exceeds {args.degrade:g}× at {knee} sessions" if knee else
+             f"stays within {args.degrade:g}× up to {results[-1]['sessions']} sessions"))
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
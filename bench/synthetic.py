@@ -0,0 +1,42 @@
+"""Deterministic synthetic athletes for benchmarks: runs_by_date-shaped activity maps."""
+import random
+from datetime import date, datetime, time, timedelta
+
+ATHLETES = {          # label → days of history
+    "2mo": 60,
+    "1y": 365,
+    "3y": 3 * 365,
+    "10y": 10 * 365,
+}
+
+
+def athlete_runs(days, today=None, seed=0):
+    """{date_str: [run dict]} for `days` of history ending yesterday.
+
+    About six runs a week, a long run on Sundays, an occasional AM/PM double and the odd
+    duplicate upload, so matching and dedupe see realistic input.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    out = {}
+    aid = 10_000_000
+    for back in range(days, 0, -1):
+        d = today - timedelta(days=back)
+        if rng.random() < 0.15:
+            continue
+        long_day = d.weekday() == 6
+        n = 2 if not long_day and rng.random() < 0.08 else 1
+        runs = []
+        for k in range(n):
+            miles = rng.uniform(14, 22) if long_day else rng.uniform(3, 9) / n * (1.5 if n == 2 else 1)
+            pace = rng.uniform(420, 560)
+            start = datetime.combine(d, time(6 + 11 * k, rng.randrange(60)))
+            aid += 1
+            runs.append(dict(id=aid, name="Long Run" if long_day else "Morning Run", miles=miles,
+                             moving_time=round(miles * pace), pace=pace, hr=rng.uniform(135, 165),
+                             start=start.isoformat(), elev=rng.randrange(0, 600)))
+            if rng.random() < 0.01:
+                aid += 1
+                runs.append(dict(runs[-1], id=aid))   # watch + phone upload
+        out[d.isoformat()] = runs
+    return out
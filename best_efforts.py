@@ -0,0 +1,83 @@
+"""Best-efforts index: fastest 1 km, 1 mi, 5K, 10K, half and 30K across all activities.
+
+Each activity's distance/time stream is scanned once with a two-pointer sliding window
+per target distance (O(n) per distance). The result is a few numbers per activity, small
+enough to persist forever. The global top-N per distance is a merge over those per-activity
+results, so new activities never trigger a rescan of old streams.
+"""
+import heapq
+from datetime import date, timedelta
+
+METERS_PER_MILE = 1609.34
+DISTANCES = {           # label → metres
+    "1k": 1000.0,
+    "1mi": METERS_PER_MILE,
+    "5k": 5000.0,
+    "10k": 10000.0,
+    "half": 21097.5,
+    "30k": 30000.0,
+}
+RIEGEL_B = 1.06
+
+
+def fastest_window(distance, time, target):
+    """Fastest time to cover `target` metres within one activity, or None if it's shorter.
+
+    distance and time are the cumulative stream arrays (metres, seconds). For each end
+    point j the start pointer i only moves forward, so the scan is O(n). The best window
+    covers at least `target`; its time is scaled down to exactly `target`.
+    """
+    n = len(distance)
+    if n < 2 or distance[-1] - distance[0] < target:
+        return None
+    best, i = None, 0
+    for j in range(1, n):
+        # Advance i while the window would still cover the target without it
+        while i + 1 < j and distance[j] - distance[i + 1] >= target:
+            i += 1
+        covered = distance[j] - distance[i]
+        if covered >= target:
+            t = (time[j] - time[i]) * target / covered
+            if best is None or t < best:
+                best = t
+    return best
+
+
+def activity_best_efforts(distance, time):
+    """{label: seconds} for every target distance the activity covers."""
+    out = {}
+    for label, metres in DISTANCES.items():
+        t = fastest_window(distance, time, metres)
+        if t is not None and t > 0:
+            out[label] = round(float(t), 1)
+    return out
+
+
+def top_efforts(per_activity, n=3, since=None):
+    """Merge per-activity results into {label: [(secs, activity_id, date_str), ...]}.
+
+    per_activity maps activity id → {"date": "YYYY-MM-DD", "efforts": {label: secs}}.
+    Only activities dated on or after `since` (a date string) are considered.
+    """
+    out = {}
+    for label in DISTANCES:
+        rows = ((e["efforts"][label], aid, e["date"]) for aid, e in per_activity.items()
+                if label in e["efforts"] and (since is None or e["date"] >= since))
+        best = heapq.nsmallest(n, rows)
+        if best:
+            out[label] = best
+    return out
+
+
+def fivek_equivalent(per_activity, today: date, weeks=12):
+    """Fastest recent effort at any indexed distance, converted to 5K time via Riegel.
+
+    Returns (secs, label) or (None, None) when nothing recent has been indexed.
+    """
+    since = (today - timedelta(weeks=weeks)).isoformat()
+    best = None
+    for label, rows in top_efforts(per_activity, n=1, since=since).items():
+        secs = rows[0][0] * (DISTANCES["5k"] / DISTANCES[label]) ** RIEGEL_B
+        if best is None or secs < best[0]:
+            best = (secs, label)
+    return best or (None, None)
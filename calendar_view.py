@@ -0,0 +1,830 @@
+"""Calendar HTML: structured workout segments, tooltips, day pills and week rows."""
+from datetime import date, timedelta
+
+from adherence import completion_color, week_grade
+from matching import combine_runs
+from plan_builder import fmt_pace, fmt_time
+from stream_analysis import combine, gap_pace, time_in_zones, ZONE_NAMES, ZONE_COLORS
+
+# ── structured segments ───────────────────────────────────────
+def fmt_range(lo, hi):
+    """Format a pace range e.g. 7:40–8:15/mi"""
+    return f"{fmt_pace(lo)}–{fmt_pace(hi)}"
+
+# ── Marathon Excellence pace math ─────────────────────────────
+# 5K pace from marathon goal via Riegel (T2 = T1 * (D2/D1)^1.06)
+# Given marathon pace per mile, returns 5K pace per mile. A measured 5K time
+# (from the best-efforts index) takes precedence over the goal-derived one.
+def fivek_pace_secs(marathon_gps, fivek_secs=None):
+    if fivek_secs:
+        return fivek_secs / 3.10686
+    marathon_time_secs = marathon_gps * 26.2
+    fivek_time_secs = marathon_time_secs * (3.10686 / 26.2) ** 1.06
+    return fivek_time_secs / 3.10686
+
+def fmt_elapsed(secs):
+    """Short elapsed time format — 1:23 or 5:02 or 1:02:30"""
+    if secs < 60:
+        return f"{int(round(secs))}s"
+    if secs < 3600:
+        m, s = divmod(int(round(secs)), 60)
+        return f"{m}:{s:02d}"
+    h, rem = divmod(int(round(secs)), 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}"
+
+def pace_for_pct(pct_lo, pct_hi, base_pace_secs):
+    """Given % of reference pace (5k or MP) and base pace sec/mi, return formatted range.
+       Higher % effort = faster pace = fewer seconds per mile.
+       % is effort relative to reference race pace, so 100% = base_pace, 108% MP = faster."""
+    # 108% of MP effort means running at a pace that's faster than MP.
+    # Convert: target pace secs = base_pace / (pct/100)
+    lo_pace = base_pace_secs / (pct_hi / 100)   # faster pace comes from higher %
+    hi_pace = base_pace_secs / (pct_lo / 100)
+    if abs(lo_pace - hi_pace) < 2:
+        return fmt_pace(lo_pace)
+    return f"{fmt_pace(lo_pace)}–{fmt_pace(hi_pace)}"
+
+def parse_me_segments(note, gps, fivek_secs=None):
+    """Parse a Marathon Excellence workout description into structured segments.
+    Returns list of (label, distance_str, pace_str, detail).
+    Also includes a warmup and cooldown line.
+    """
+    import re
+    if not note:
+        return []
+
+    text = note
+    fivek_p = fivek_pace_secs(gps, fivek_secs)  # 5K pace sec/mi
+    mp_p    = gps
+    segs    = []
+
+    # Always prefix with a warmup
+    segs.append(("Warmup", "~2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to get loose"))
+
+    # Helper to extract % ranges: "90–92% 5k" or "108% MP"
+    def find_pct_pace(s):
+        """Return (pct_lo, pct_hi, ref) or None. ref = '5k' or 'MP'."""
+        m = re.search(r"(\d+)(?:[-–](\d+))?\s*%\s*(5k|MP)", s, re.IGNORECASE)
+        if not m: return None
+        lo = int(m.group(1))
+        hi = int(m.group(2)) if m.group(2) else lo
+        return lo, hi, m.group(3).upper()
+
+    def pace_str_for(pct_info):
+        lo, hi, ref = pct_info
+        base = fivek_p if ref == "5K" else mp_p
+        return pace_for_pct(lo, hi, base)
+
+    def effort_for_pct(pct_lo, pct_hi, ref):
+        """Plain-English effort description based on intensity."""
+        avg = (pct_lo + pct_hi) / 2
+        if ref == "5K":
+            if avg >= 102: return "All-out — 1500m to 3K race effort. Hard, controlled breathing. Should not be sustainable past the rep duration."
+            if avg >= 98:  return "5K race effort. Hard but controlled. Heavy breathing, can only get out 1–2 words at a time."
+            if avg >= 92:  return "10K race effort. Comfortably hard — labored breathing, legs working but not redlining. You should finish each rep wanting one more."
+            if avg >= 86:  return "Half-marathon race effort. Steady, focused — breathing is elevated but rhythmic. Just below threshold."
+            if avg >= 80:  return "Steady aerobic effort. Conversational becomes hard but possible. Builds aerobic strength."
+            return         "Easy-to-moderate effort. Should still feel relaxed."
+        else:  # MP
+            if avg >= 108: return "Faster than marathon pace by ~30 sec/mi. Sharpens your top-end aerobic gear."
+            if avg >= 104: return "Slightly faster than goal MP. Should feel controlled but pointed — practice for late-race gear shifts."
+            if avg >= 100: return "Goal marathon pace. Feels comfortably hard — sustainable, but not relaxing. This is your race rhythm."
+            if avg >= 95:  return "Just below MP. Strong aerobic effort that builds confidence at race-adjacent paces."
+            if avg >= 88:  return "Marathon-specific endurance pace. Builds the engine without the recovery cost of true MP work."
+            return         "Steady aerobic — recovery between hard efforts."
+
+    # Handle each class of workout
+
+    # 1) Time-based rep: e.g. "8 × 3 min at 90–92% 5k w/ 1 min jog"
+    m = re.search(r"(\d+)(?:[-–](\d+))?\s*×\s*(\d+(?:\.\d+)?)\s*min\s*at\s*([^,w]+?)(?:\s*w/\s*(.+))?$", text, re.IGNORECASE)
+    if m:
+        reps_lo = int(m.group(1))
+        reps_hi = int(m.group(2)) if m.group(2) else reps_lo
+        rep_min = float(m.group(3))
+        pct = find_pct_pace(m.group(4))
+        jog = m.group(5) or "jog"
+        if pct:
+            reps_str = f"{reps_lo}" if reps_lo == reps_hi else f"{reps_lo}–{reps_hi}"
+            lo, hi, ref = pct
+            base = fivek_p if ref == "5K" else mp_p
+            rep_pace_lo = base / (hi / 100)
+            rep_pace_hi = base / (lo / 100)
+            # Distance covered per rep
+            dist_lo = rep_min * 60 / rep_pace_hi  # miles
+            dist_hi = rep_min * 60 / rep_pace_lo
+            avg_dist = (dist_lo + dist_hi) / 2
+            total_hard_mi = reps_lo * avg_dist
+            segs.append((
+                f"{reps_str} × {rep_min:g} min @ {lo}–{hi}% {ref}" if lo != hi else f"{reps_str} × {rep_min:g} min @ {lo}% {ref}",
+                f"~{total_hard_mi:.1f} mi",
+                pace_str_for(pct),
+                f"Each rep {fmt_elapsed(rep_min*60)} (~{avg_dist:.2f} mi). Recovery: {jog}"
+            ))
+            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog"))
+            return segs
+
+    # 2) Distance-based rep: "5 × 1 mi at 95% 5k w/ 3 min jog" or "8 × 1 km at 95% 5k"
+    m = re.search(r"(\d+)(?:[-–](\d+))?\s*×\s*(\d+(?:\.\d+)?)\s*(mi|km|m)\b\s*at\s*([^,w]+?)(?:\s*w/\s*(.+))?$", text, re.IGNORECASE)
+    if m:
+        reps_lo = int(m.group(1))
+        reps_hi = int(m.group(2)) if m.group(2) else reps_lo
+        rep_dist = float(m.group(3))
+        unit = m.group(4).lower()
+        pct = find_pct_pace(m.group(5))
+        jog = m.group(6) or "jog"
+        # Convert rep distance to miles
+        if unit == "km":
+            rep_mi = rep_dist * 0.621371
+            dist_label = f"{rep_dist:g} km"
+        elif unit == "m":
+            rep_mi = rep_dist / 1609.34
+            dist_label = f"{rep_dist:g}m"
+        else:
+            rep_mi = rep_dist
+            dist_label = f"{rep_dist:g} mi"
+        if pct:
+            reps_str = f"{reps_lo}" if reps_lo == reps_hi else f"{reps_lo}–{reps_hi}"
+            lo, hi, ref = pct
+            base = fivek_p if ref == "5K" else mp_p
+            rep_pace_lo = base / (hi / 100)
+            rep_pace_hi = base / (lo / 100)
+            rep_time_lo = rep_mi * rep_pace_lo
+            rep_time_hi = rep_mi * rep_pace_hi
+            total_hard_mi = reps_lo * rep_mi
+            time_str = (f"{fmt_elapsed(rep_time_lo)}" if abs(rep_time_hi - rep_time_lo) < 2
+                        else f"{fmt_elapsed(rep_time_lo)}–{fmt_elapsed(rep_time_hi)}")
+            pct_str = f"{lo}–{hi}% {ref}" if lo != hi else f"{lo}% {ref}"
+            segs.append((
+                f"{reps_str} × {dist_label} @ {pct_str}",
+                f"~{total_hard_mi:.1f} mi total",
+                pace_str_for(pct),
+                f"Each rep: {time_str}. Recovery: {jog}"
+            ))
+            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog"))
+            return segs
+
+    # 3) Continuous effort: e.g. "7 mi at 85% 5k" or "9–10 mi at 100% MP"
+    m = re.search(r"(\d+(?:\.\d+)?)(?:[-–](\d+(?:\.\d+)?))?\s*mi\s*at\s*([^,]+)$", text, re.IGNORECASE)
+    if m:
+        d_lo = float(m.group(1))
+        d_hi = float(m.group(2)) if m.group(2) else d_lo
+        pct = find_pct_pace(m.group(3))
+        if pct:
+            lo, hi, ref = pct
+            base = fivek_p if ref == "5K" else mp_p
+            pace_lo = base / (hi / 100)
+            pace_hi = base / (lo / 100)
+            total_time_lo = d_lo * pace_hi
+            total_time_hi = d_hi * pace_lo
+            d_str = f"{d_lo:g} mi" if d_lo == d_hi else f"{d_lo:g}–{d_hi:g} mi"
+            pct_str = f"{lo}–{hi}% {ref}" if lo != hi else f"{lo}% {ref}"
+            time_str = f"{fmt_elapsed(total_time_lo)}–{fmt_elapsed(total_time_hi)}"
+            segs = segs[:-1] if segs and segs[-1][0] == "Warmup" else segs  # keep warmup
+            segs.append((
+                f"Continuous @ {pct_str}",
+                d_str,
+                pace_str_for(pct),
+                f"Total elapsed: {time_str}"
+            ))
+            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog"))
+            return segs
+
+    # 4) Kenyan-style progression — describe the concept
+    if "Kenyan-style" in text or "kenyan-style" in text.lower():
+        d = re.search(r"(\d+(?:\.\d+)?)\s*mi", text)
+        dist = f"{d.group(1)} mi" if d else f"~{6} mi"
+        segs = []
+        segs.append((
+            "Kenyan-style progression",
+            dist,
+            fmt_range(gps + 30, gps + 75),
+            "Start at easy/long pace, progressively pick up to finish near or at MP"
+        ))
+        segs.append(("Finish effort (last ~1 mi)", "", fmt_pace(gps), "Should feel strong but controlled"))
+        return segs
+
+    # 5) Ladder / set patterns:
+    #    "2 sets of 4-3-2-1 min at 96-98-100-102% 5k w/ 1 min mod / 2-3 min jog"
+    #    "4 × (3-2-1 min at 98-100-102% 5k w/ 1-1-2 min jog)"
+    #    "3-2-1-3-2-1 km at 86–88% 5k w/ 2 min walk"
+    set_patterns = [
+        r"(\d+)\s*sets?\s*of\s*([\d-]+)\s*(min|km|m(?!i)|mi)\s*at\s*([\d-]+)\s*%\s*(5k|MP)(?:\s*w/\s*(.+))?",
+        r"(\d+)\s*×\s*\(\s*([\d-]+)\s*(min|km|m(?!i)|mi)\s*at\s*([\d-]+)\s*%\s*(5k|MP)(?:\s*w/\s*([^)]+))?\)",
+    ]
+    for pat in set_patterns:
+        m = re.search(pat, text, re.IGNORECASE)
+        if m:
+            n_sets = int(m.group(1))
+            durations = [float(x) for x in m.group(2).split("-")]
+            unit = m.group(3).lower()
+            pcts = [int(x) for x in m.group(4).split("-")]
+            ref = m.group(5).upper()
+            recovery = m.group(6) or "jog"
+
+            # If pcts shorter than durations, repeat pcts; if pcts longer, the prescription
+            # is a ladder where each duration has its own pct. Most ME workouts pair them 1-to-1.
+            # Pad pcts to match durations length.
+            if len(pcts) < len(durations):
+                # Same pct for all reps in ladder
+                pcts = [pcts[0]] * len(durations) if len(pcts) == 1 else pcts + [pcts[-1]] * (len(durations) - len(pcts))
+
+            base = fivek_p if ref == "5K" else mp_p
+
+            # Build the per-rep table with exact pace + time/distance
+            sets_to_show = 1 if n_sets > 3 else n_sets
+            for set_i in range(sets_to_show):
+                if n_sets > 1:
+                    segs.append((f"— Set {set_i+1} of {n_sets} —", "", "", ""))
+                for rep_i, dur in enumerate(durations):
+                    pct = pcts[rep_i] if rep_i < len(pcts) else pcts[-1]
+                    target_pace = base / (pct / 100)
+                    if unit == "min":
+                        dist_mi = dur * 60 / target_pace
+                        time_str = fmt_elapsed(dur * 60)
+                        label = f"Rep {rep_i+1}: {dur:g} min @ {pct}% {ref}"
+                        dist_str = f"{dist_mi:.2f} mi"
+                    elif unit == "km":
+                        dist_mi = dur * 0.621371
+                        time_secs = dist_mi * target_pace
+                        time_str = fmt_elapsed(time_secs)
+                        label = f"Rep {rep_i+1}: {dur:g} km @ {pct}% {ref}"
+                        dist_str = f"{dur:g} km"
+                    elif unit == "m":
+                        dist_mi = dur / 1609.34
+                        time_secs = dist_mi * target_pace
+                        time_str = fmt_elapsed(time_secs)
+                        label = f"Rep {rep_i+1}: {dur:g}m @ {pct}% {ref}"
+                        dist_str = f"{dur:g}m"
+                    else:  # mi
+                        dist_mi = dur
+                        time_secs = dist_mi * target_pace
+                        time_str = fmt_elapsed(time_secs)
+                        label = f"Rep {rep_i+1}: {dur:g} mi @ {pct}% {ref}"
+                        dist_str = f"{dur:g} mi"
+                    effort = effort_for_pct(pct, pct, ref)
+                    segs.append((label, dist_str, fmt_pace(target_pace),
+                                 f"Run for {time_str} at {fmt_pace(target_pace)}. {effort}"))
+
+            if n_sets > sets_to_show:
+                segs.append((f"↻ Repeat for {n_sets} total sets", "—", "—", f"Pattern above × {n_sets}."))
+            segs.append(("Recovery between reps", "—", "—", recovery.strip()))
+            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to flush the legs and bring HR down."))
+            return segs
+
+    # 6) Explicit alternating segments inside parens, e.g. "5 × (1600m at 105–107% MP, 400m at 95–98% MP)"
+    paren_alt = re.search(r"(\d+)\s*×\s*\((.+)\)", text)
+    if paren_alt:
+        n = int(paren_alt.group(1))
+        inner = paren_alt.group(2)
+        # Parse comma-separated segments
+        parts = [p.strip() for p in inner.split(",")]
+        parsed_parts = []
+        for p in parts:
+            # Try to extract distance/time + pct
+            d = re.search(r"(\d+(?:\.\d+)?)\s*(km|m(?!i)|mi|min)\s*at\s*(\d+)(?:[-–](\d+))?\s*%\s*(5k|MP)", p, re.IGNORECASE)
+            if d:
+                amt = float(d.group(1))
+                unit = d.group(2).lower()
+                pct_lo = int(d.group(3)); pct_hi = int(d.group(4)) if d.group(4) else pct_lo
+                ref = d.group(5).upper()
+                parsed_parts.append((amt, unit, pct_lo, pct_hi, ref))
+            else:
+                parsed_parts.append(("recovery", p))
+
+        if parsed_parts and isinstance(parsed_parts[0], tuple) and parsed_parts[0][0] != "recovery":
+            # For workouts with many sets, show only set 1 in detail + a note
+            sets_to_show = 1 if n > 3 else n
+            for set_i in range(sets_to_show):
+                if n > 1:
+                    segs.append((f"— Set {set_i+1} of {n} —", "", "", ""))
+                for rep_i, pp in enumerate(parsed_parts):
+                    if pp[0] == "recovery":
+                        segs.append(("Recovery", "—", "—", pp[1]))
+                        continue
+                    amt, unit, pct_lo, pct_hi, ref = pp
+                    base = fivek_p if ref == "5K" else mp_p
+                    pace_secs = base / (pct_hi / 100)  # use the faster end of range
+                    if unit == "km":
+                        dist_mi = amt * 0.621371
+                        dist_str = f"{amt:g} km"
+                        time_str = fmt_elapsed(dist_mi * pace_secs)
+                    elif unit == "m":
+                        dist_mi = amt / 1609.34
+                        dist_str = f"{amt:g}m"
+                        time_str = fmt_elapsed(dist_mi * pace_secs)
+                    elif unit == "mi":
+                        dist_mi = amt
+                        dist_str = f"{amt:g} mi"
+                        time_str = fmt_elapsed(dist_mi * pace_secs)
+                    else:  # min
+                        dist_mi = amt * 60 / pace_secs
+                        dist_str = f"~{dist_mi:.2f} mi"
+                        time_str = fmt_elapsed(amt * 60)
+                    pct_str = f"{pct_lo}–{pct_hi}% {ref}" if pct_lo != pct_hi else f"{pct_lo}% {ref}"
+                    pace_disp = pace_for_pct(pct_lo, pct_hi, base) if pct_lo != pct_hi else fmt_pace(pace_secs)
+                    effort = effort_for_pct(pct_lo, pct_hi, ref)
+                    segs.append((f"Segment {rep_i+1}: {pct_str}", dist_str, pace_disp,
+                                 f"Run for {time_str} at this pace. {effort}"))
+            if n > sets_to_show:
+                segs.append((f"↻ Repeat for {n} total sets", "—", "—", f"Pattern above × {n}. Recovery between sets as prescribed."))
+            segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to flush the legs and bring HR down."))
+            return segs
+
+    # 7) Hyphenated ladder of distances at single pct, e.g. "3-2-1-3-2-1 km at 86–88% 5k w/ 2 min walk"
+    ladder = re.search(r"^([\d-]+)\s*(km|m(?!i)|mi)\s*at\s*(\d+)(?:[-–](\d+))?\s*%\s*(5k|MP)(?:\s*w/\s*(.+))?", text, re.IGNORECASE)
+    if ladder:
+        amounts = [float(x) for x in ladder.group(1).split("-")]
+        unit = ladder.group(2).lower()
+        pct_lo = int(ladder.group(3)); pct_hi = int(ladder.group(4)) if ladder.group(4) else pct_lo
+        ref = ladder.group(5).upper()
+        recovery = ladder.group(6) or "jog"
+        base = fivek_p if ref == "5K" else mp_p
+        pace_secs = base / (pct_hi / 100)
+        for rep_i, amt in enumerate(amounts):
+            if unit == "km":
+                dist_mi = amt * 0.621371
+                dist_str = f"{amt:g} km"
+            elif unit == "m":
+                dist_mi = amt / 1609.34
+                dist_str = f"{amt:g}m"
+            else:
+                dist_mi = amt
+                dist_str = f"{amt:g} mi"
+            time_str = fmt_elapsed(dist_mi * pace_secs)
+            pace_disp = pace_for_pct(pct_lo, pct_hi, base) if pct_lo != pct_hi else fmt_pace(pace_secs)
+            pct_str = f"{pct_lo}–{pct_hi}% {ref}" if pct_lo != pct_hi else f"{pct_lo}% {ref}"
+            effort = effort_for_pct(pct_lo, pct_hi, ref)
+            segs.append((f"Rep {rep_i+1}: {dist_str} @ {pct_str}", dist_str, pace_disp,
+                         f"Should take ~{time_str}. {effort}"))
+        segs.append(("Recovery between reps", "—", "—", recovery.strip()))
+        segs.append(("Cooldown", "~1–2 mi", fmt_range(gps + 60, gps + 90), "Easy jog to flush the legs and bring HR down."))
+        return segs
+
+    # 8) Final fallback — show prescription verbatim with reference paces
+    segs.append((
+        "Full session",
+        "—",
+        "See prescription",
+        note
+    ))
+    segs.append(("Your 5K pace (est.)",  "—", fmt_pace(fivek_p), "From Riegel formula vs marathon goal"))
+    segs.append(("Your MP (goal)",       "—", fmt_pace(mp_p),    "Marathon goal pace"))
+    return segs
+
+def total_miles_placeholder_unused(): return 0  # avoid NameError in fallback branch
+
+def workout_segments(wtype, total_miles, gps, note=None, fivek_secs=None):
+    easy_p  = fmt_range(gps + 60, gps + 90)   # 60–90 sec/mi slower than MP
+    long_p  = fmt_range(gps + 45, gps + 75)   # 45–75 sec/mi slower than MP
+    tempo_p = fmt_range(gps - 25, gps - 15)   # 15K to HM race pace (Pfitz LT)
+    vo2_p   = fmt_range(gps - 70, gps - 50)   # ~60 sec/mi faster than MP
+    mp_p    = fmt_pace(gps)
+    rec_p   = fmt_range(gps + 80, gps + 105)  # very easy recovery jog
+
+    # Marathon Excellence workouts: parse the verbatim note into structured segments
+    if wtype in ("me_primary", "me_secondary", "me_weekend"):
+        parsed = parse_me_segments(note, gps, fivek_secs) if note else []
+        if parsed:
+            # Prepend verbatim prescription at the top for reference
+            header = [("Prescription", "—", "—", note)] if note else []
+            return header + parsed
+        return [("Session", f"~{total_miles} mi", "—", note or "See book")]
+
+    if wtype == "easy":
+        return [("Full run", f"{total_miles} mi", easy_p, "Conversational effort throughout — you should be able to speak full sentences")]
+
+    elif wtype == "long":
+        easy_m = round(total_miles * 0.75, 1)
+        mp_m   = round(total_miles - easy_m, 1)
+        return [
+            ("Easy portion", f"{easy_m} mi", long_p, "Relaxed aerobic effort"),
+            ("Final portion (optional)", f"{mp_m} mi", mp_p, "Finish at marathon pace only if feeling strong — skip if fatigued"),
+        ]
+
+    elif wtype == "tempo":
+        wu = min(2.0, round(total_miles * 0.20, 1))
+        cd = min(2.0, round(total_miles * 0.20, 1))
+        lt = round(total_miles - wu - cd, 1)
+        return [
+            ("Warmup", f"{wu} mi", easy_p, "Easy effort, gradually loosening up"),
+            ("Lactate threshold", f"{lt} mi", tempo_p, "Comfortably hard — labored breathing, few words. This is the key effort"),
+            ("Cooldown", f"{cd} mi", easy_p, "Easy effort, flush the legs"),
+        ]
+
+    elif wtype == "vo2":
+        wu = min(2.0, round(total_miles * 0.18, 1))
+        cd = min(2.0, round(total_miles * 0.18, 1))
+        interval_block = round(total_miles - wu - cd, 1)
+        if interval_block <= 3.5:
+            n_reps = 5; rep_m_per = 1000
+            rep_str = "5 × 1000m"
+        elif interval_block <= 5.0:
+            n_reps = 6; rep_m_per = 1000
+            rep_str = "6 × 1000m or 5 × 1200m"
+        elif interval_block <= 6.5:
+            n_reps = 6; rep_m_per = 1200
+            rep_str = "6 × 1200m"
+        else:
+            n_reps = 8; rep_m_per = 1200
+            rep_str = "8 × 1200m"
+        hard_m = round(n_reps * rep_m_per / 1609.34, 1)
+
+        # Per Pfitz: recovery jog duration ≈ equal to interval duration (not fixed 400m).
+        # Recovery pace = very easy, 90-120 sec/mi slower than MP (slower than easy runs).
+        # For a rep of rep_m_per meters at VO2 pace (gps - 60 sec/mi):
+        vo2_pace_spm = gps - 60  # approx center of VO2 range
+        rep_time_secs = (rep_m_per / 1609.34) * vo2_pace_spm
+        # Recovery pace: genuinely conversational — slower than easy runs
+        rec_pace_spm = gps + 100  # ~100 sec/mi slower than MP
+        rec_dist_per = round(rep_time_secs / rec_pace_spm, 2)  # miles of recovery per rep
+        rec_m = round((n_reps - 1) * rec_dist_per, 1)
+        rec_time_str = f"{int(rep_time_secs // 60)}:{int(rep_time_secs % 60):02d}"
+        rec_pace_fmt = fmt_pace(rec_pace_spm)
+
+        actual_subtotal = hard_m + rec_m + wu + cd
+        diff = total_miles - actual_subtotal
+        if abs(diff) > 0.3:
+            cd = max(1.0, round(cd + diff, 1))
+
+        return [
+            ("Warmup", f"{wu} mi", easy_p, "Easy jog — get loose, add 4-6 strides at the end"),
+            (f"Intervals ({rep_str})", f"{hard_m} mi", vo2_p, "5K race effort. Hard but controlled — not an all-out sprint"),
+            (f"Recovery jogs ({n_reps - 1} × ~{rec_time_str})", f"{rec_m} mi",
+             "jog / walk",
+             f"Jog or walk for ≈ the same duration as the rep (~{rec_time_str} each). "
+             f"No pace target — go as slow as you need. Don't start the next rep until breathing is fully under control."),
+            ("Cooldown", f"{cd} mi", easy_p, "Easy jog home — shake out the legs"),
+        ]
+
+    elif wtype == "race":
+        return [
+            ("Miles 1–13.1 (first half)", "13.1 mi", mp_p, "Disciplined and patient — resist the crowd and adrenaline"),
+            ("Miles 13.1–18 (second half, early)", "4.9 mi", mp_p, "Stay locked in. This stretch decides the race"),
+            ("Miles 18–22 (the wall zone)", "4 mi", mp_p, "Dig deep. Shorten stride, stay relaxed, keep turnover high"),
+            ("Miles 22–26.2 (finish)", "4.2 mi", fmt_pace(gps - 10), "Give what you have — controlled aggression"),
+        ]
+
+    return [("Full run", f"{total_miles} mi", fmt_pace(gps + 75), "")]
+
+# ── pill styles ───────────────────────────────────────────────
+PILL_STYLE = {
+    "easy":   ("rgba(93,202,165,0.15)",  "#085041", "#5DCAA5"),
+    "long":   ("rgba(155,143,232,0.15)", "#3C3489", "#9b8fe8"),
+    "tempo":  ("rgba(232,168,37,0.15)",  "#633806", "#e8a825"),
+    "vo2":    ("rgba(224,87,87,0.15)",   "#791F1F", "#e05757"),
+    "race":   ("#FC4C02",                "#ffffff", "#FC4C02"),
+    "actual": ("rgba(91,163,232,0.15)",  "#0C447C", "#5ba3e8"),
+    "both":   ("rgba(93,202,165,0.2)",   "#065f46", "#5DCAA5"),
+    "missed": ("rgba(224,87,87,0.12)",   "#991b1b", "#e05757"),
+}
+WTYPE_LABEL = dict(
+    easy="Easy run", long="Long run", tempo="Lactate threshold", vo2="VO2 max", race="Race day",
+    me_primary="Primary workout", me_secondary="Secondary workout", me_weekend="Weekend workout",
+)
+WTYPE_PURPOSE = dict(
+    easy="Aerobic base building and active recovery.",
+    long="Builds endurance, fat oxidation, and mental toughness. The most important run of the week.",
+    tempo="Raises lactate threshold — the pace you can sustain for extended periods.",
+    vo2="Increases maximal aerobic capacity. High stress, high reward.",
+    race="Your goal marathon. Patient first half — the race truly begins at mile 18.",
+    me_primary="Main quality session for the week. The most important workout.",
+    me_secondary="Second quality session of the week, usually lower intensity than the primary.",
+    me_weekend="Long run or marathon-specific session. Often the highest volume of the week.",
+)
+
+def seg_table(segments):
+    rows = ""
+    for name, dist, pace, note in segments:
+        # Prescription row has "—" for dist and pace - render it as a single full-width row
+        if name == "Prescription":
+            rows += f"""
+          <tr><td colspan="3" style="padding:6px 0;color:#fff;font-size:11px;font-weight:600;line-height:1.5;word-wrap:break-word;white-space:normal">{note}</td></tr>
+            """
+            continue
+        rows += f"""
+          <tr>
+            <td style="padding:5px 8px 5px 0;color:#ccc;font-size:11px;vertical-align:top;word-wrap:break-word;white-space:normal">{name}</td>
+            <td style="padding:5px 4px;color:#fff;font-family:monospace;font-size:11px;white-space:nowrap;vertical-align:top">{dist}</td>
+            <td style="padding:5px 0 5px 4px;color:#FC4C02;font-family:monospace;font-size:11px;white-space:nowrap;vertical-align:top;text-align:right">{pace}</td>
+          </tr>
+          {f'<tr><td colspan="3" style="padding:0 0 6px 0;color:#555;font-size:10px;font-style:italic;line-height:1.4;word-wrap:break-word;white-space:normal">{note}</td></tr>' if note else ''}
+        """
+    return f'''<table style="width:100%;border-collapse:collapse;table-layout:fixed">
+      <colgroup>
+        <col style="width:38%">
+        <col style="width:27%">
+        <col style="width:35%">
+      </colgroup>
+      {rows}
+    </table>'''
+
+def reps_table(reps):
+    """Per-rep verdicts from compliance.score_reps, for the completed-run tooltip."""
+    vc = dict(on="#5DCAA5", fast="#e05757", slow="#e8a825")
+    vl = dict(on="✓", fast="too fast", slow="too slow")
+    rows = "".join(
+        f'<tr><td style="color:#ccc;font-size:11px;padding:2px 10px 2px 0">Rep {i}</td>'
+        f'<td style="color:#fff;font-family:monospace;font-size:11px">{mi:.2f} mi</td>'
+        f'<td style="color:#FC4C02;font-family:monospace;font-size:11px">{fmt_pace(pace)}</td>'
+        f'<td style="color:{vc[v]};font-size:10px;text-align:right;padding-left:6px">{vl[v]}</td></tr>'
+        for i, (mi, pace, _, v) in enumerate(reps["reps"], 1))
+    return f"""
+        <div style="border-top:1px solid #2a2a2a;margin-top:10px;padding-top:10px">
+        <div style="font-size:10px;color:#555;margin-bottom:8px;text-transform:uppercase;letter-spacing:.06em">Reps · {reps["on"]}/{max(reps["expected"], len(reps["reps"]))} on target</div>
+        <table style="width:100%;border-collapse:collapse">{rows}</table></div>"""
+
+def make_tooltip(mode, wtype, planned_miles, gps, actual=None, note=None, fivek_secs=None, reps=None, stream=None):
+    label   = WTYPE_LABEL.get(wtype, "Run") if wtype else (actual or {}).get("name","Run")
+    purpose = WTYPE_PURPOSE.get(wtype, "")
+    status_map = dict(planned="#5ba3e8", both="#5DCAA5", missed="#e05757", actual="#5ba3e8")
+    status_lbl = dict(planned="Upcoming", both="Completed", missed="Missed", actual="Unplanned")
+    sc = status_map.get(mode, "#aaa")
+    sl = status_lbl.get(mode, "")
+    if actual and actual.get("shifted"):
+        sl += f" · {actual['shifted']}"
+
+    body = ""
+    gp = gap_pace(stream) if stream else None
+
+    if mode in ("planned", "both", "missed") and wtype:
+        segs = workout_segments(wtype, planned_miles, gps, note=note, fivek_secs=fivek_secs)
+        is_me = wtype in ("me_primary", "me_secondary", "me_weekend")
+        mi_prefix = "~" if is_me else ""
+        body += f"""
+        <div style="font-size:13px;color:#aaa;margin-bottom:10px">{mi_prefix}{planned_miles} mi planned</div>
+        <div style="font-size:10px;color:#555;margin-bottom:6px;text-transform:uppercase;letter-spacing:.06em">Workout structure</div>
+        {seg_table(segs)}"""
+
+    if mode == "both" and actual:
+        # Distance delta
+        dist_diff = actual["miles"] - planned_miles
+        dist_pct  = dist_diff / planned_miles * 100 if planned_miles else 0
+        if abs(dist_pct) < 5:
+            dist_verdict = ("✓ On target", "#5DCAA5")
+        elif dist_diff > 0:
+            dist_verdict = (f"+{dist_diff:.1f} mi over", "#5ba3e8")
+        else:
+            dist_verdict = (f"{dist_diff:.1f} mi short", "#e8a825")
+
+        # Pace delta vs target pace for this workout type
+        target_spm = gps + {"easy":75,"long":60,"tempo":-20,"vo2":-60,"race":0}.get(wtype, 75)
+        pace_diff  = actual["pace"] - target_spm  # positive = slower than target
+        if abs(pace_diff) < 15:
+            pace_verdict = ("✓ On pace", "#5DCAA5")
+        elif pace_diff > 0:
+            pace_verdict = (f"{abs(round(pace_diff))}s/mi too slow", "#e8a825")
+        else:
+            pace_verdict = (f"{abs(round(pace_diff))}s/mi too fast", "#e05757")
+
+        body += f"""
+        <div style="border-top:1px solid #2a2a2a;margin-top:10px;padding-top:10px">
+        <div style="font-size:10px;color:#555;margin-bottom:8px;text-transform:uppercase;letter-spacing:.06em">Your actual run</div>
+        <table style="width:100%;border-collapse:collapse">
+          <tr>
+            <td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Distance</td>
+            <td style="color:#fff;font-family:monospace;font-size:11px">{actual["miles"]:.2f} mi</td>
+            <td style="color:{dist_verdict[1]};font-size:10px;text-align:right;padding-left:6px">{dist_verdict[0]}</td>
+          </tr>
+          <tr>
+            <td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg pace</td>
+            <td style="color:#FC4C02;font-family:monospace;font-size:11px">{fmt_pace(actual["pace"])}</td>
+            <td style="color:{pace_verdict[1]};font-size:10px;text-align:right;padding-left:6px">{pace_verdict[0]}</td>
+          </tr>
+          {"" if not actual.get("hr") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg HR</td><td style="color:#fff;font-family:monospace;font-size:11px" colspan="2">{round(actual["hr"])} bpm</td></tr>'}
+          {"" if not actual.get("elev") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Elevation</td><td style="color:#fff;font-family:monospace;font-size:11px" colspan="2">{actual["elev"]} ft</td></tr>'}
+          {"" if not gp else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Grade-adj pace</td><td style="color:#FC4C02;font-family:monospace;font-size:11px" colspan="2">{fmt_pace(gp)}</td></tr>'}
+          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Time</td><td style="color:#fff;font-family:monospace;font-size:11px" colspan="2">{fmt_time(actual["moving_time"])}</td></tr>
+        </table></div>"""
+        if reps and reps["reps"]:
+            body += reps_table(reps)
+
+    if mode == "actual" and actual:
+        body += f"""
+        <table style="width:100%;border-collapse:collapse;margin-top:8px">
+          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Distance</td><td style="color:#fff;font-family:monospace;font-size:11px">{actual['miles']:.2f} mi</td></tr>
+          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg pace</td><td style="color:#FC4C02;font-family:monospace;font-size:11px">{fmt_pace(actual['pace'])}</td></tr>
+          {"" if not actual.get("hr") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Avg HR</td><td style="color:#fff;font-family:monospace;font-size:11px">{round(actual["hr"])} bpm</td></tr>'}
+          {"" if not actual.get("elev") else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Elevation</td><td style="color:#fff;font-family:monospace;font-size:11px">{actual["elev"]} ft</td></tr>'}
+          {"" if not gp else f'<tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Grade-adj pace</td><td style="color:#FC4C02;font-family:monospace;font-size:11px">{fmt_pace(gp)}</td></tr>'}
+          <tr><td style="color:#ccc;font-size:11px;padding:3px 10px 3px 0">Time</td><td style="color:#fff;font-family:monospace;font-size:11px">{fmt_time(actual['moving_time'])}</td></tr>
+        </table>"""
+
+    html = f"""
+    <div style="background:#111;border:1px solid #2a2a2a;border-radius:10px;padding:14px 16px;width:290px;font-family:system-ui,sans-serif">
+      <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:6px">
+        <div style="font-size:15px;font-weight:600;color:#fff">{label}</div>
+        <div style="font-size:10px;color:{sc};background:{sc}22;padding:2px 8px;border-radius:20px;font-weight:600">{sl}</div>
+      </div>
+      <div style="font-size:11px;color:#555;line-height:1.5;margin-bottom:8px">{purpose if mode != "actual" else ""}</div>
+      {body}
+    </div>"""
+    return html
+
+def tooltip_css():
+    return """
+<style>
+.tip-wrap{position:relative;display:block}
+.tip-pill{font-size:10px;padding:2px 6px;border-radius:4px;font-weight:600;
+  white-space:nowrap;overflow:hidden;text-overflow:ellipsis;cursor:default;line-height:1.6;display:block}
+.tip-box{
+  display:none;
+  position:absolute;
+  z-index:9999;
+  top:calc(100% + 4px);
+  left:0;
+  width:320px;
+  max-width:320px;
+  max-height:420px;
+  overflow-y:auto;
+  pointer-events:auto;
+}
+/* On the left-side columns of the week grid, flip tooltip to align to pill's LEFT edge going right.
+   On the right-side columns, anchor to RIGHT edge going left.
+   This is handled per-day using data-col attribute below. */
+.tip-wrap[data-col="0"] .tip-box,
+.tip-wrap[data-col="1"] .tip-box,
+.tip-wrap[data-col="2"] .tip-box,
+.tip-wrap[data-col="3"] .tip-box{left:0;right:auto}
+.tip-wrap[data-col="4"] .tip-box,
+.tip-wrap[data-col="5"] .tip-box,
+.tip-wrap[data-col="6"] .tip-box{left:auto;right:0}
+.tip-wrap:hover .tip-box{display:block}
+/* Keep hover alive while moving mouse across the small gap */
+.tip-wrap::after{content:"";position:absolute;top:100%;left:-8px;right:-8px;height:8px}
+</style>"""
+
+def pill_html(label, bg, tooltip_html, fg=None, col=0):
+    # fg auto-selects based on bg lightness if not provided
+    light_bgs = {"#e5e7eb", "#dbeafe", "#f3f4f6"}
+    if fg is None:
+        fg = "#374151" if bg in light_bgs else "#fff"
+    return f'''
+<div class="tip-wrap" data-col="{col}">
+  <div class="tip-pill" style="background:{bg};color:{fg}">{label}</div>
+  <div class="tip-box">{tooltip_html}</div>
+</div>'''  
+
+WTYPE_SHORT = dict(
+    easy="Easy", long="Long", tempo="Tempo", vo2="VO2", race="Race",
+    me_primary="Primary", me_secondary="Secondary", me_weekend="Weekend",
+)
+
+def day_cell(ds, planned, actuals, today_str, plan_start_str, gps, col=0, fivek_secs=None, reps=None, streams=None,
+             extra=None, shift=0):
+    """One calendar day. actuals are the runs matched to the planned session (possibly
+    shifted from a neighbouring day), extra the day's runs that match no session."""
+    is_today = ds == today_str
+    is_past  = ds < today_str
+    in_win   = ds >= plan_start_str
+    border   = "2px solid #FC4C02" if is_today else "1px solid #e5e7eb"
+    bg       = "#f9fafb" if (is_past and not actuals and not extra and not planned) else "#fff"
+    nc       = "#FC4C02" if is_today else "#9ca3af"
+    nw       = "600" if is_today else "400"
+    day_num  = int(ds.split("-")[2])
+
+    # Color palette per workout type — bg, text color
+    TYPE_COLORS = {
+        "easy":         ("#d1fae5", "#065f46"),  # light green
+        "long":         ("#dbeafe", "#1e40af"),  # blue
+        "tempo":        ("#fed7aa", "#7c2d12"),  # warm orange (LT)
+        "vo2":          ("#fecaca", "#991b1b"),  # hot red-orange (VO2 max)
+        "race":         ("#FC4C02", "#ffffff"),  # solid Strava orange
+        "me_primary":   ("#fecaca", "#991b1b"),  # ME primary = hard workout
+        "me_secondary": ("#fed7aa", "#7c2d12"),  # ME secondary = LT-ish
+        "me_weekend":   ("#dbeafe", "#1e40af"),  # ME weekend long
+    }
+
+    inner = f'<div style="font-size:10px;color:{nc};font-weight:{nw};margin-bottom:3px">{day_num}</div>'
+
+    def stream_for(act):
+        entry = (streams or {}).get(act.get("id"))
+        return entry["summary"] if entry else None
+
+    if planned and actuals:
+        # Completed run with plan — show completion gradient (performance signal)
+        act = combine_runs(actuals)
+        if shift:
+            act = {**act, "shifted": f"a day {'early' if shift < 0 else 'late'}" if abs(shift) == 1
+                   else f"{abs(shift)} days {'early' if shift < 0 else 'late'}"}
+        dist_pct = (act["miles"] / planned["m"] * 100) if planned["m"] else 100
+        color = completion_color(dist_pct)
+        tip = make_tooltip("both", planned["t"], planned["m"], gps, actual=act, note=planned.get("note"),
+                           fivek_secs=fivek_secs, reps=reps, stream=stream_for(act) if len(actuals) == 1 else None)
+        short = WTYPE_SHORT.get(planned["t"], "Run")
+        inner += pill_html(f"{short} · {act['miles']:.1f}mi", color, tip, col=col)
+    elif planned and is_past and in_win:
+        # Missed planned run — red regardless of type
+        tip = make_tooltip("missed", planned["t"], planned["m"], gps, note=planned.get("note"), fivek_secs=fivek_secs)
+        short = WTYPE_SHORT.get(planned["t"], "Run")
+        inner += pill_html(f"{short} · missed", "#e05757", tip, col=col)
+    elif planned and not is_past:
+        # Upcoming planned — color by workout type
+        tip = make_tooltip("planned", planned["t"], planned["m"], gps, note=planned.get("note"), fivek_secs=fivek_secs)
+        short = WTYPE_SHORT.get(planned["t"], "Run")
+        lbl = "Race day" if planned["t"] == "race" else f"{short} · {planned['m']}mi"
+        bg_c, fg_c = TYPE_COLORS.get(planned["t"], ("#e5e7eb", "#374151"))
+        inner += pill_html(lbl, bg_c, tip, fg=fg_c, col=col)
+
+    for act in extra or []:
+        # Unplanned run — light blue
+        tip = make_tooltip("actual", None, act["miles"], gps, actual=act, stream=stream_for(act))
+        inner += pill_html(f"Run · {act['miles']:.1f}mi", "#dbeafe", tip, fg="#1e40af", col=col)
+
+    return f'<div style="min-height:60px;border-radius:7px;padding:5px 6px;border:{border};background:{bg};overflow:visible">{inner}</div>'
+
+def load_html(load, d):
+    """Fitness / fatigue / form line for the end of day d."""
+    ctl, atl, tsb = load.on(d)
+    if ctl < 1 and atl < 1:
+        return ""
+    tc = "#065f46" if tsb >= -10 else "#b45309" if tsb >= -30 else "#991b1b"
+    return (f'<div style="font-size:10px;color:#9ca3af;text-align:right;margin-top:2px" '
+            f'title="Chronic (42-day) load · acute (7-day) load · form = fitness − fatigue">'
+            f'Fitness {ctl:.0f} · Fatigue {atl:.0f} · <span style="color:{tc}">Form {tsb:+.0f}</span></div>')
+
+def zones_html(summary, lthr):
+    """Stacked time-in-zone bar for a week's combined stream summary."""
+    secs = time_in_zones(summary["hr_hist"], lthr)
+    total = secs.sum()
+    if total < 60:
+        return ""
+    tip = " · ".join(f"{z} {s / 60:.0f}m" for z, s in zip(ZONE_NAMES, secs))
+    gp = gap_pace(summary)
+    if gp:
+        tip += f" · GAP {fmt_pace(gp)}"
+    bars = "".join(f'<div style="width:{s / total * 100:.1f}%;background:{c}"></div>'
+                   for s, c in zip(secs, ZONE_COLORS) if s)
+    return (f'<div title="{tip}" style="display:flex;height:4px;border-radius:2px;overflow:hidden;'
+            f'margin-top:4px;width:100%">{bars}</div>')
+
+def week_stream_summary(week_dates, act_runs, index):
+    """One week's HR histogram / GAP totals: a sum of the cached per-activity summaries."""
+    sums = [index[r["id"]]["summary"] for ds in week_dates for r in act_runs.get(ds, [])
+            if r.get("id") in index and index[r["id"]]["summary"]]
+    return combine(sums) if sums else None
+
+def render_week(ws, planned_map, act_runs, plan_start_str, gps, is_current, load=None, fivek_secs=None,
+                compliance=None, streams=None, adherence=None, matcher=None):
+    today_str = date.today().isoformat()
+    today     = date.today()
+    DOWS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+    hbg  = "#fff8f5" if is_current else "#fff"
+    hbdr = "2px solid #FC4C02" if is_current else "1px solid #e5e7eb"
+    lbl  = f"Week of {ws.strftime('%b %-d')}" + (" · this week" if is_current else "")
+
+    week_dates = [(ws+timedelta(days=i)).isoformat() for i in range(7)]
+    # Week totals come from the materialized plan adherence; weeks outside the plan have none
+    stats = adherence.week(ws) if adherence else None
+    plan_mi, act_mi, planned_days, completed_days, missed_days = stats or (0, 0, 0, 0, 0)
+    plan_mi = round(plan_mi, 1) if plan_mi % 1 else int(plan_mi)
+
+    # Only grade fully past weeks (last day < today)
+    week_end = ws + timedelta(days=6)
+    is_past_week = week_end < today
+
+    grade_html = ""
+    if is_past_week and plan_mi > 0:
+        grade, gc = week_grade(plan_mi, act_mi, planned_days, completed_days, missed_days)
+        if grade:
+            pct = round(act_mi / plan_mi * 100) if plan_mi else 0
+            grade_html = (f'<div style="display:flex;align-items:center;gap:8px">' +
+                f'<div style="font-size:18px;font-weight:700;color:{gc}">{grade}</div>' +
+                f'<div style="font-size:11px;color:#9ca3af">{act_mi:.1f}/{plan_mi} mi ({pct}%)</div>' +
+                f'</div>')
+    elif plan_mi > 0:
+        plan_badge = f'<span style="color:#6b7280;font-size:12px">Planned <b style="color:#374151">{plan_mi} mi</b></span>'
+        act_part   = f' &nbsp;·&nbsp; <span style="color:#6b7280;font-size:12px">So far <b style="color:#FC4C02">{act_mi:.1f} mi</b></span>' if act_mi > 0 else ""
+        grade_html = plan_badge + act_part
+
+    # Training load as of the end of the week (or today, for the current week)
+    if load is not None and ws <= today:
+        grade_html += load_html(load, min(week_end, today))
+    week_streams = week_stream_summary(week_dates, act_runs, streams) if streams else None
+    if week_streams and load is not None and load.lthr:
+        grade_html += zones_html(week_streams, load.lthr)
+
+    dow_headers = "".join(f'<div style="font-size:10px;color:#9ca3af;text-align:center;padding:2px 0">{d}</div>' for d in DOWS)
+    cells = ""
+    for i, ds in enumerate(week_dates):
+        planned = planned_map.get(ds)
+        if matcher is not None:
+            actuals = matcher.matched(ds) if planned else None
+            extra, shift = matcher.unmatched(ds), matcher.shift(ds) if planned else 0
+        else:
+            runs = act_runs.get(ds)
+            actuals, extra, shift = (runs, None, 0) if planned else (None, (runs or [])[:1], 0)
+        cells += day_cell(ds, planned, actuals, today_str, plan_start_str, gps, col=i,
+                          fivek_secs=fivek_secs, reps=(compliance or {}).get(ds), streams=streams,
+                          extra=extra, shift=shift)
+
+    return f"""
+    <div style="background:{hbg};border:{hbdr};border-radius:10px;padding:12px 14px;margin-bottom:12px">
+      <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:10px">
+        <div style="font-size:13px;font-weight:600;color:#374151">{lbl}</div>
+        <div>{grade_html}</div>
+      </div>
+      <div style="display:grid;grid-template-columns:repeat(7,minmax(0,1fr));gap:4px">
+        {dow_headers}{cells}
+      </div>
+    </div>"""
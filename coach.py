@@ -0,0 +1,237 @@
+"""Squad dashboard for coaches: one summary row per athlete.
+
+A row comes from the athlete's saved plan settings (the rows the app persists) and
+their runs in the activity store. It shows:
+- where they are in their plan;
+- last finished week's adherence grade;
+- weekly mileage for the last TREND_WEEKS weeks;
+- predicted marathon finish.
+
+Rows are built by the sync daemon, never on a dashboard load: SummaryCache keeps each
+row in the activity store with the inputs it was built from (the athlete's last sync,
+when their settings last changed, and the date), and the daemon rebuilds the rows whose
+inputs changed after every sync and every minute or so, in a process pool when there are
+enough of them to pay for starting one. The dashboard only reads the stored rows.
+
+Base plans are built once per (plan, race date, day preferences) and shared by every
+athlete on them; each athlete's swaps are layered over the shared map.
+"""
+import json
+import multiprocessing
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from html import escape
+
+from adherence import PlanAdherence
+from matching import PlanMatcher
+from plan_builder import PLANS, apply_swaps, build_planned_map, fmt_hm, goal_secs
+from prediction import collect_efforts, predict_marathon
+from rollups import MileageRollups
+import state_codec
+
+DOW_TO_INT = {"Mon": 1, "Tue": 2, "Wed": 3, "Thu": 4, "Fri": 5, "Sat": 6, "Sun": 0}   # schedule: 0=Sun
+TREND_WEEKS = 8
+POOL_MIN = 32         # fewer rows to build than this aren't worth starting processes for
+
+_plans = {}           # plan signature → (planned map, plan start), per worker
+# Workers are spawned, not forked: the app server is multithreaded, and a child forked
+# while another thread holds a lock inherits it locked
+_MP = multiprocessing.get_context("spawn")
+
+
+# ── inputs ────────────────────────────────────────────────────
+def plan_sig(settings):
+    """(plan, race date, long, quality, rest) as the app derives it from saved settings,
+    or None when the athlete hasn't picked a plan and race date yet."""
+    plan_key, race = settings.get("selected_plan"), settings.get("race_date")
+    if plan_key not in PLANS or not race:
+        return None
+    race_str = race.isoformat() if hasattr(race, "isoformat") else str(race)
+    if PLANS[plan_key].get("kind") == "me":
+        return plan_key, race_str, None, None, None
+    long_default = {v: k for k, v in DOW_TO_INT.items()}[date.fromisoformat(race_str).isoweekday() % 7]
+    rests = settings.get("rest_dows") or ["Mon"]
+    if isinstance(rests, str):
+        rests = [rests]
+    return (plan_key, race_str, DOW_TO_INT[settings.get("long_dow") or long_default],
+            DOW_TO_INT[settings.get("quality_dow") or "Wed"], DOW_TO_INT[rests[0]])
+
+
+def build_plan(sig):
+    """(planned map, plan start) for a plan signature."""
+    plan_key, race_str, long_day, quality_day, rest_day = sig
+    if long_day is None:
+        return build_planned_map(plan_key, race_str)
+    return build_planned_map(plan_key, race_str, long_day=long_day, quality_day=quality_day, rest_day=rest_day)
+
+
+def runs_since(plan_start_str, today):
+    """Earliest date a row reads runs from: plan start or the trend window, if earlier."""
+    return min(date.fromisoformat(plan_start_str), today - timedelta(weeks=TREND_WEEKS)).isoformat()
+
+
+def make_job(athlete_id, settings, store, today):
+    """The summarize() job for an athlete, from their saved settings and runs in the
+    activity store; None if they haven't picked a plan."""
+    sig = plan_sig(settings)
+    if sig is None:
+        return None
+    athlete = settings.get("athlete") or {}
+    return dict(athlete_id=athlete_id, sig=sig, goal_time=settings.get("goal_time"), swaps=settings.get("swaps"),
+                today=today.isoformat(),
+                name=f"{athlete.get('firstname', '')} {athlete.get('lastname', '')}".strip() or f"Athlete {athlete_id}",
+                runs=store.runs_by_date(athlete_id, since=runs_since(_plan(sig)[1], today)))
+
+
+class SavedSettings:
+    """Athletes' saved settings, read from the app's state database (STATE_DB_PATH), where
+    the app keeps them as state_codec rows under owner "athlete:<id>"."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _query(self, q, args=()):
+        with self._lock:
+            try:
+                return self._conn.execute(q, args).fetchall()
+            except sqlite3.OperationalError:        # the app hasn't created its tables yet
+                return []
+
+    def changed(self):
+        """{athlete id: when their settings last changed}."""
+        return {int(owner[8:]): updated for owner, updated in self._query(
+            "SELECT owner, max(updated) FROM state WHERE owner LIKE 'athlete:%' GROUP BY owner")}
+
+    def read(self, athlete_id):
+        return state_codec.from_rows(dict(self._query("SELECT key, value FROM state WHERE owner = ?",
+                                                      (f"athlete:{athlete_id}",))))
+
+
+def _plan(sig):
+    if sig not in _plans:
+        _plans[sig] = build_plan(sig)
+    return _plans[sig]
+
+
+# ── rows ──────────────────────────────────────────────────────
+def summarize(job):
+    """One dashboard row. job: athlete_id, name, sig, goal_time, swaps, runs, today."""
+    sig, runs, today = job["sig"], job["runs"], date.fromisoformat(job["today"])
+    planned, plan_start_str = _plan(sig)
+    plan_start = date.fromisoformat(plan_start_str)
+    effective = apply_swaps(planned, job.get("swaps") or {})
+
+    matcher = PlanMatcher()                 # grades runs to days as the athlete's calendar does
+    matcher.sync(effective, runs)
+    adherence = PlanAdherence(plan_start_str, sig[1])
+    adherence.sync(effective, runs, today, matcher)
+    completed, missed = adherence.totals()
+    graded = [(ws, g, color, pct) for ws, g, color, pct in adherence.grades() if g]
+
+    rollups = MileageRollups()
+    rollups.add_runs(runs)
+    first = today - timedelta(days=today.weekday(), weeks=TREND_WEEKS - 1)
+    trend = [round(float(mi), 1) for mi in rollups.weekly(first, TREND_WEEKS)]
+
+    fit = predict_marathon(*collect_efforts(runs, planned, today))
+    try:
+        goal = goal_secs(job.get("goal_time"))
+    except (ValueError, IndexError):
+        goal = None
+    return dict(athlete_id=job["athlete_id"], name=job["name"], plan=PLANS[sig[0]]["name"],
+                race_date=sig[1], week=(today - plan_start).days // 7 + 1, weeks=adherence.n_weeks,
+                grade=graded[-1][1] if graded else None, grade_color=graded[-1][2] if graded else None,
+                completed=completed, missed=missed, trend=trend,
+                mpw=round(sum(trend[-5:-1]) / 4), goal=goal,
+                predicted=fit and dict(secs=fit["secs"], lo=fit["lo"], hi=fit["hi"]))
+
+
+def _init_worker(plans):
+    _plans.clear()
+    _plans.update(plans)
+
+
+def summarize_many(jobs, plans=None, workers=1):
+    """[row] for jobs, in order. plans: {sig: (planned map, plan start)} already built."""
+    plans = dict(plans or {})
+    for job in jobs:
+        if job["sig"] not in plans:
+            plans[job["sig"]] = build_plan(job["sig"])
+    if workers <= 1 or len(jobs) < POOL_MIN:
+        _init_worker(plans)
+        return [summarize(job) for job in jobs]
+    # read-only views don't pickle; workers get plain copies once, at startup
+    plans = {sig: (dict(planned), start) for sig, (planned, start) in plans.items()}
+    with ProcessPoolExecutor(workers, mp_context=_MP, initializer=_init_worker, initargs=(plans,)) as pool:
+        return list(pool.map(summarize, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+class SummaryCache:
+    """Rows by athlete in the activity store, each kept with the key it was built from."""
+
+    def __init__(self, store):
+        self.store = store
+        self.built = 0
+
+    def refresh(self, entries, load_job, workers=1):
+        """Rebuild the rows of entries [(athlete id, key)] whose stored key differs, and
+        return how many were built.
+
+        load_job(athlete_id) returns that athlete's summarize() job, or None when they have
+        no row (no plan picked); that is stored too, so they aren't looked at again until
+        their key changes.
+        """
+        stored = self.store.summary_keys()
+        jobs, keys, empty = [], [], []
+        for aid, key in entries:
+            key = json.dumps(key)
+            if stored.get(aid) == key:
+                continue
+            job = load_job(aid)
+            if job is None:
+                empty.append((aid, key, None))
+            else:
+                jobs.append(job)
+                keys.append((aid, key))
+        built = summarize_many(jobs, _plans, workers)
+        self.store.save_summaries([(aid, key, row) for (aid, key), row in zip(keys, built)] + empty)
+        self.built += len(built)
+        return len(built)
+
+
+# ── html ──────────────────────────────────────────────────────
+def sparkline(values, width=96, height=22):
+    top = max(max(values), 1)
+    step = width / max(len(values) - 1, 1)
+    pts = " ".join(f"{i * step:.1f},{height - 2 - v / top * (height - 4):.1f}" for i, v in enumerate(values))
+    return (f'<svg width="{width}" height="{height}" style="vertical-align:middle">'
+            f'<polyline points="{pts}" fill="none" stroke="#FC4C02" stroke-width="1.5"/></svg>')
+
+
+def dashboard_html(rows):
+    head = "".join(f'<th style="text-align:left;padding:4px 8px;color:#6b7280;font-weight:500">{h}</th>'
+                   for h in ("Athlete", "Plan", "Week", "Last grade", "Hit / missed",
+                             f"Last {TREND_WEEKS} weeks", "Predicted", "Goal"))
+    body = []
+    for r in rows:
+        if r["week"] < 1:
+            week = f"starts in {1 - r['week']} wk"
+        elif r["week"] > r["weeks"]:
+            week = "raced"
+        else:
+            week = f"{r['week']} / {r['weeks']}"
+        grade = (f'<span style="background:{r["grade_color"]};color:white;border-radius:4px;padding:1px 6px">'
+                 f'{r["grade"]}</span>') if r["grade"] else "—"
+        p = r["predicted"]
+        pred = f'{fmt_hm(p["secs"])} <span style="color:#9ca3af">({fmt_hm(p["lo"])}–{fmt_hm(p["hi"])})</span>' if p else "—"
+        cells = (escape(r["name"]), f'{escape(r["plan"])}<br><span style="color:#9ca3af">race {r["race_date"]}</span>',
+                 week, grade, f'{r["completed"]} / {r["missed"]}',
+                 f'{sparkline(r["trend"])} <span style="color:#6b7280">{r["mpw"]} mpw</span>',
+                 pred, fmt_hm(r["goal"]) if r["goal"] else "—")
+        body.append("<tr>" + "".join(f'<td style="padding:4px 8px;border-top:1px solid #e5e7eb">{c}</td>'
+                                     for c in cells) + "</tr>")
+    return (f'<table style="border-collapse:collapse;font-size:13px;width:100%">'
+            f'<thead><tr>{head}</tr></thead><tbody>{"".join(body)}</tbody></table>')
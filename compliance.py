@@ -0,0 +1,74 @@
+"""Interval compliance: score a quality run's laps against its prescribed segments.
+
+Targets come from the same segment tuples the tooltips show — (label, distance, pace,
+detail) from workout_segments / parse_me_segments — so what is scored is exactly what was
+prescribed. Warmup, cooldown and recovery rows are skipped. Every other row with a pace
+target is a work target. Laps faster than the slowest work target (plus WORK_SLACK) count
+as reps. Each rep is judged against the nearest target range.
+"""
+import re
+
+METERS_PER_MILE = 1609.34
+QUALITY_TYPES = ("tempo", "vo2", "me_primary", "me_secondary", "me_weekend")
+SKIP_ROWS = ("warmup", "cooldown", "recovery", "prescription", "session", "finish effort")
+PACE_TOL = 5          # s/mi either side of the range still counts as on target
+WORK_SLACK = 30       # laps up to this much slower than the slowest target are reps gone slow
+MIN_LAP_M = 100       # ignore auto-lap slivers and button mashes
+
+_PACE = re.compile(r"(\d+):(\d{2})(?:/mi)?(?:\s*[–-]\s*(\d+):(\d{2}))?/mi")
+_REPS = re.compile(r"(\d+)(?:[-–]\d+)?\s*×")
+
+
+def parse_pace_range(s):
+    """"7:40–8:15/mi" or "7:40/mi–8:15/mi" → (460, 495); "7:40/mi" → (460, 460); anything
+    else → None."""
+    m = _PACE.search(s or "")
+    if not m:
+        return None
+    lo = int(m.group(1)) * 60 + int(m.group(2))
+    hi = int(m.group(3)) * 60 + int(m.group(4)) if m.group(3) else lo
+    return min(lo, hi), max(lo, hi)
+
+
+def work_targets(segments):
+    """[(label, (lo, hi), expected_reps)] for the rows a lap can be scored against."""
+    out = []
+    for label, _dist, pace, _detail in segments:
+        if label.lower().startswith(SKIP_ROWS):
+            continue
+        rng = parse_pace_range(pace)
+        if rng:
+            m = _REPS.search(label)
+            out.append((label, rng, int(m.group(1)) if m else 1))
+    return out
+
+
+def lap_paces(laps):
+    """Strava lap payloads → [(distance_mi, pace_s_per_mi)], dropping slivers."""
+    return [(l["distance"] / METERS_PER_MILE, l["moving_time"] / (l["distance"] / METERS_PER_MILE))
+            for l in laps if l.get("distance", 0) >= MIN_LAP_M and l.get("moving_time")]
+
+
+def score_reps(segments, laps):
+    """Score laps against prescribed work targets.
+
+    Returns dict(reps=[(miles, pace, (lo, hi), verdict)], expected, on, score) or None if
+    the workout has no pace targets or the run has no usable laps. verdict is
+    'on' / 'fast' / 'slow'; score is reps on target over max(expected, reps run).
+    """
+    targets = work_targets(segments)
+    paces = lap_paces(laps or [])
+    if not targets or not paces:
+        return None
+    cutoff = max(hi for _, (_, hi), _ in targets) + WORK_SLACK
+    reps = []
+    for miles, pace in paces:
+        if pace > cutoff:
+            continue  # warmup / recovery / cooldown lap
+        lo, hi = min((rng for _, rng, _ in targets),
+                     key=lambda r: 0 if r[0] <= pace <= r[1] else min(abs(pace - r[0]), abs(pace - r[1])))
+        verdict = "fast" if pace < lo - PACE_TOL else "slow" if pace > hi + PACE_TOL else "on"
+        reps.append((miles, pace, (lo, hi), verdict))
+    expected = sum(n for _, _, n in targets)
+    on = sum(1 for r in reps if r[3] == "on")
+    return dict(reps=reps, expected=expected, on=on, score=on / max(expected, len(reps), 1))
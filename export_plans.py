@@ -0,0 +1,216 @@
+"""Bulk export of training plans to ICS and CSV for a whole squad, without the app.
+
+The roster is a CSV with one athlete per row:
+
+    athlete,plan,race_date,goal_time,long_day,quality_day,rest_day
+    Sam Lee,pfitz-18-55,2027-04-18,3:15:00,Sun,Wed,Mon
+    Ana Ruiz,me-gale-70,2027-04-18,2:59:00,,,
+
+The day columns are optional (Mon..Sun). They default as in the app: long run on race
+day, quality on Wed, rest on Mon. Marathon Excellence plans ignore them.
+
+Each athlete gets <slug>.ics (all-day events, each with the workout's segment
+breakdown) and <slug>.csv (one row per planned day), written as they're generated:
+
+    python export_plans.py roster.csv --out exports/ --workers 8
+
+Athletes are spread over a process pool. Schedules are built once per (plan, day
+preferences) in the parent and handed to each worker when it starts. Each workout's
+event text is memoized per worker, since a squad shares most of its paces and sessions.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+from calendar_view import WTYPE_LABEL, WTYPE_SHORT, workout_segments
+from plan_builder import PLANS, build_planned_map, build_schedule, fmt_pace, goal_pace_secs
+
+DOW_TO_INT = {"Mon": 1, "Tue": 2, "Wed": 3, "Thu": 4, "Fri": 5, "Sat": 6, "Sun": 0}   # schedule: 0=Sun
+CSV_FIELDS = ["date", "week", "day", "workout", "miles", "details"]
+
+_templates = {}       # (plan, long, quality, rest) → build_schedule() result, per worker
+
+
+# ── roster ────────────────────────────────────────────────────
+def read_roster(path):
+    """[athlete dict] from the roster CSV. Raises ValueError naming the first bad row."""
+    athletes, slugs = [], set()
+    with open(path, newline="") as f:
+        for n, row in enumerate(csv.DictReader(f), start=2):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            try:
+                athletes.append(_athlete(row))
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{path} line {n}: {e}") from None
+            slug = base = re.sub(r"[^a-z0-9]+", "-", athletes[-1]["name"].lower()).strip("-") or "athlete"
+            k = 2
+            while slug in slugs:
+                slug, k = f"{base}-{k}", k + 1
+            slugs.add(slug)
+            athletes[-1]["slug"] = slug
+    return athletes
+
+
+def _athlete(row):
+    plan = row.get("plan", "")
+    if plan not in PLANS:
+        raise ValueError(f"unknown plan {plan!r} (one of {', '.join(PLANS)})")
+    race = date.fromisoformat(row["race_date"])
+    goal = row.get("goal_time") or "3:30:00"
+    goal_pace_secs(goal)                              # fails on a malformed time
+    days = [row.get(k) or None for k in ("long_day", "quality_day", "rest_day")]
+    for d in days:
+        if d and d[:3].title() not in DOW_TO_INT:
+            raise ValueError(f"unknown day {d!r}")
+    if PLANS[plan].get("kind") == "me":
+        long_day = quality_day = rest_day = None
+    else:
+        long_day = DOW_TO_INT[days[0][:3].title()] if days[0] else race.isoweekday() % 7
+        quality_day = DOW_TO_INT[days[1][:3].title()] if days[1] else DOW_TO_INT["Wed"]
+        rest_day = DOW_TO_INT[days[2][:3].title()] if days[2] else DOW_TO_INT["Mon"]
+    return dict(name=row.get("athlete") or row.get("name") or "Athlete", plan=plan,
+                race_date=race.isoformat(), goal_time=goal,
+                key=(plan, long_day, quality_day, rest_day))
+
+
+def build_templates(athletes):
+    """One schedule per distinct (plan, day preferences) in the roster."""
+    out = {}
+    for a in athletes:
+        plan, long_day, quality_day, rest_day = a["key"]
+        if a["key"] not in out:
+            out[a["key"]] = (build_schedule(plan) if long_day is None else
+                             build_schedule(plan, long_day=long_day, quality_day=quality_day, rest_day=rest_day))
+    return out
+
+
+# ── formatting ────────────────────────────────────────────────
+def segment_lines(wtype, miles, gps, note):
+    lines = []
+    for name, dist, pace, detail in workout_segments(wtype, miles, gps, note):
+        if name == "Prescription":
+            lines.append(f"Prescription: {detail}")
+            continue
+        parts = [p for p in (dist, f"@ {pace}" if pace != "—" else "") if p and p != "—"]
+        lines.append(f"{name}: {' '.join(parts)}" + (f" — {detail}" if detail else ""))
+    return lines
+
+
+def describe(run, gps):
+    """(summary, [detail lines]) for one planned day."""
+    t, m = run["t"], run["m"]
+    if t == "race":
+        return f"Marathon race day (goal {fmt_pace(gps)})", [WTYPE_LABEL["race"]]
+    head = f"{WTYPE_LABEL.get(t, 'Run')} · {m:g} mi"
+    return f"{WTYPE_SHORT.get(t, 'Run')} {m:g} mi", [head, *segment_lines(t, m, gps, run.get("note"))]
+
+
+def ics_escape(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def ics_fold(line):
+    """RFC 5545 folding: lines over 75 octets continue on the next line after a space."""
+    raw = line.encode()
+    if len(raw) <= 75:
+        return line
+    out, i, width = [], 0, 75
+    while i < len(raw):
+        j = min(i + width, len(raw))
+        while j < len(raw) and raw[j] & 0xC0 == 0x80:    # don't split a UTF-8 sequence
+            j -= 1
+        out.append(raw[i:j].decode())
+        i, width = j, 74                                  # continuation lines start with a space
+    return "\r\n ".join(out)
+
+
+@lru_cache(maxsize=4096)
+def event_text(wtype, miles, gps, note):
+    """Folded SUMMARY and DESCRIPTION lines for a workout; shared by every day it recurs."""
+    summary, details = describe(dict(t=wtype, m=miles, note=note), gps)
+    return (ics_fold(f"SUMMARY:{ics_escape(summary)}") + "\r\n" +
+            ics_fold(f"DESCRIPTION:{ics_escape(chr(10).join(details))}") + "\r\n"), " | ".join(details[1:])
+
+
+# ── export ────────────────────────────────────────────────────
+def _init_worker(templates):
+    _templates.update(templates)
+
+
+def export_one(athlete, out_dir):
+    """Write one athlete's .ics and .csv; returns (slug, planned days, total miles)."""
+    gps = goal_pace_secs(athlete["goal_time"])
+    plan = athlete["plan"]
+    schedule = _templates.get(athlete["key"]) or build_templates([athlete])[athlete["key"]]
+    planned, plan_start = build_planned_map(plan, athlete["race_date"], schedule=schedule)
+    start = date.fromisoformat(plan_start)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    base = os.path.join(out_dir, athlete["slug"])
+    miles = 0.0
+    with open(base + ".ics", "w", newline="") as ics, open(base + ".csv", "w", newline="") as f:
+        rows = csv.writer(f)
+        rows.writerow(CSV_FIELDS)
+        for line in ("BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Marathon Planner//export_plans//EN",
+                     "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+                     f"X-WR-CALNAME:{ics_escape(athlete['name'] + ' — ' + PLANS[plan]['name'])}"):
+            ics.write(ics_fold(line) + "\r\n")
+        for ds in sorted(planned):
+            run = planned[ds]
+            d = date.fromisoformat(ds)
+            text, details = event_text(run["t"], run["m"], gps, run.get("note"))
+            miles += run["m"]
+            rows.writerow([ds, (d - start).days // 7 + 1, d.strftime("%a"), WTYPE_SHORT.get(run["t"], "Run"),
+                           f"{run['m']:g}", details])
+            ics.write(f"BEGIN:VEVENT\r\nUID:{athlete['slug']}-{ds}@marathon-planner\r\nDTSTAMP:{stamp}\r\n"
+                      f"DTSTART;VALUE=DATE:{d:%Y%m%d}\r\nDTEND;VALUE=DATE:{d + timedelta(days=1):%Y%m%d}\r\n"
+                      f"{text}TRANSP:TRANSPARENT\r\nEND:VEVENT\r\n")
+        ics.write("END:VCALENDAR\r\n")
+    return athlete["slug"], len(planned), miles
+
+
+def export(athletes, out_dir, workers=None):
+    """Yield export_one() results as athletes finish (in roster order)."""
+    os.makedirs(out_dir, exist_ok=True)
+    templates = build_templates(athletes)
+    if workers == 1:
+        _init_worker(templates)
+        for a in athletes:
+            yield export_one(a, out_dir)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(templates,)) as pool:
+        chunk = max(1, len(athletes) // (workers * 8))
+        yield from pool.map(export_one, athletes, [out_dir] * len(athletes), chunksize=chunk)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("roster", help="CSV: athlete, plan, race_date, goal_time[, long_day, quality_day, rest_day]")
+    ap.add_argument("--out", default="exports", help="directory for the .ics / .csv files")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU; 1 = no pool)")
+    ap.add_argument("-q", "--quiet", action="store_true", help="only print the final summary")
+    args = ap.parse_args(argv)
+
+    try:
+        athletes = read_roster(args.roster)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    t = time.perf_counter()
+    n = days = 0
+    for slug, n_days, miles in export(athletes, args.out, args.workers):
+        n, days = n + 1, days + n_days
+        if not args.quiet:
+            print(f"{slug:<32} {n_days:>4} days {miles:>7.0f} mi")
+    print(f"exported {n} athletes ({days} planned days) to {args.out}/ in {time.perf_counter() - t:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
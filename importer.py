@@ -0,0 +1,184 @@
+"""Bulk import of logged training spreadsheets such as run_plan.csv.
+
+A log has one row per day. Columns are found by header name, in any order:
+
+    Days Out, Date, Day, Plan, Actual, Dist (mi), Total Time, Avg Pace,
+    Seg Time, Seg Dist (mi), Seg Pace
+
+The first header cell names the plan ("Pfitz 18/55"). Week labels in the first column
+and the weekly / overall total columns are ignored; they're derived from the days.
+Plan text is workout shorthand ("GA 7 w/ 10x100m strides") and is read with the
+pace_utils grammar.
+
+Each column is parsed once per distinct value, not once per cell: a multi-season log
+repeats a few dozen descriptions and times. The parsed values are indexed back onto the
+rows with NumPy; parsing each distinct value and building each day's run dicts are still
+plain Python loops. The result is in the app's own shapes:
+- planned: {date: run dict (t, m, note)}, as build_planned_map makes;
+- actual: {date: [run dict]}, as runs_by_date makes.
+
+    python importer.py run_plan.csv --race-date 2025-04-13
+    python importer.py logs/*.csv --json imported.json
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from pace_utils import parse_workout
+
+# Workout kinds (pace_utils.KIND_ALIASES) → the app's workout types
+WORKOUT_TYPE = {
+    "easy": "easy", "aerobic": "easy", "recovery": "easy", "sprint": "easy", "hill": "easy",
+    "mlr": "long", "long": "long", "mp": "tempo", "lt": "tempo", "tempo": "tempo", "hmp": "tempo",
+    "vo2": "vo2", "race": "race",
+}
+COLUMNS = dict(days_out="days out", date="date", plan="plan", actual="actual", miles="dist (mi)",
+               time="total time", pace="avg pace", seg_time="seg time", seg_miles="seg dist (mi)",
+               seg_pace="seg pace")
+_CLOCK = re.compile(r"^\s*(?:(\d+):)?(\d{1,2}):(\d{2})\s*$")
+_DAY_MONTH = re.compile(r"^\s*\d{1,2}-[A-Za-z]{3}\s*$")
+
+
+# ── columns ───────────────────────────────────────────────────
+def _by_value(values, parse, dtype=object):
+    """parse() applied once per distinct value, broadcast back over the column."""
+    uniq, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return np.array([parse(v) for v in uniq], dtype=dtype)[inverse]
+
+
+def _float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def _seconds(text):
+    """'1:02:33' / '7:45' → seconds; blank or zero → nan."""
+    m = _CLOCK.match(text)
+    if not m:
+        return np.nan
+    secs = int(m[1] or 0) * 3600 + int(m[2]) * 60 + int(m[3])
+    return secs or np.nan
+
+
+def _dates(col, days_out, race_date, year):
+    """ISO dates for the rows: counted back from race_date, or 'd-Mon' cells with the year
+    rolled forward whenever the month goes backwards."""
+    if race_date is not None and not np.isnan(days_out).any():
+        race = date.fromisoformat(race_date) if isinstance(race_date, str) else race_date
+        return np.array([(race - timedelta(days=int(n))).isoformat() for n in days_out])
+    parsed = _by_value(col, lambda s: datetime.strptime(s.strip(), "%d-%b") if s.strip() else None)
+    if any(p is None for p in parsed):
+        raise ValueError("every row needs a Date (or give race_date and a Days Out column)")
+    months = np.array([p.month for p in parsed])
+    years = (year or date.today().year) + np.concatenate([[0], np.cumsum(np.diff(months) < 0)])
+    return np.array([date(int(y), p.month, p.day).isoformat() for y, p in zip(years, parsed)])
+
+
+# ── logs ──────────────────────────────────────────────────────
+def _align(row, date_col, width):
+    """Pad the row to the header; rows exported without their first (week) cell are
+    shifted back into place, found by where their date sits."""
+    if (date_col and not _DAY_MONTH.match(row[date_col] if date_col < len(row) else "")
+            and _DAY_MONTH.match(row[date_col - 1])):
+        row = [""] + row
+    return row + [""] * (width - len(row))
+
+
+def read_log(path, race_date=None, year=None):
+    """dict(name, planned, actual, days, unparsed) for one logged spreadsheet.
+
+    Dates come from Days Out when race_date is given; otherwise from the Date column,
+    starting in `year` (default: this year). unparsed lists plan text the shorthand
+    grammar didn't recognise; those days are kept as easy runs of unknown distance.
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        raise ValueError(f"{path}: empty")
+    name = rows[0][0].strip() if rows[0] else ""
+    header = [h.strip().lower() for h in rows[0]]
+    idx = {k: header.index(name) for k, name in COLUMNS.items() if name in header}
+    if "plan" not in idx or ("date" not in idx and "days_out" not in idx):
+        raise ValueError(f"{path}: needs a Plan column and Date or Days Out")
+    rows = [_align(r, idx.get("date"), len(header)) for r in rows[1:] if any(c.strip() for c in r)]
+    col = {k: [r[i] for r in rows] for k, i in idx.items()}
+    blank = [""] * len(rows)
+
+    days_out = _by_value(col.get("days_out", blank), _float, float)
+    days = _dates(col.get("date", blank), days_out, race_date, year)
+    workouts = _by_value(col["plan"], lambda s: parse_workout(s.strip()) if s.strip() else None)
+    miles = _by_value(col.get("miles", blank), _float, float)
+    secs = _by_value(col.get("time", blank), _seconds, float)
+    pace = _by_value(col.get("pace", blank), _seconds, float)
+    seg_miles = _by_value(col.get("seg_miles", blank), _float, float)
+    seg_secs = _by_value(col.get("seg_time", blank), _seconds, float)
+    # pace column wins; otherwise time over distance
+    pace = np.where(np.isnan(pace), secs / np.where(miles > 0, miles, np.nan), pace)
+
+    planned, actual, unparsed = {}, {}, set()
+    for i, ds in enumerate(days.tolist()):
+        text = col["plan"][i].strip()
+        w = workouts[i]
+        entry = None
+        if days_out[i] == 0:                      # race day, however it's written
+            entry = dict(t="race", m=(w and w["miles"]) or 26.2, note=text)
+        elif w is not None and w["kind"] != "rest":
+            entry = dict(t=WORKOUT_TYPE.get(w["kind"], "easy"), m=w["miles"] or 0, note=text)
+        elif w is None and text:
+            unparsed.add(text)
+            entry = dict(t="easy", m=0, note=text)
+        # A day written twice ("V8 w/ ..." then "VO₂Max w/ ...") keeps the first row that
+        # gives a distance
+        if entry and (ds not in planned or not planned[ds]["m"]):
+            planned[ds] = entry
+        if miles[i] > 0:
+            run = dict(id=None, name=col.get("actual", blank)[i].strip() or text or "Run", miles=float(miles[i]),
+                       moving_time=0 if np.isnan(secs[i]) else int(secs[i]),
+                       pace=0 if np.isnan(pace[i]) else float(pace[i]), hr=None, start=ds + "T00:00:00", elev=0)
+            if seg_miles[i] > 0:
+                run["segment"] = dict(miles=float(seg_miles[i]),
+                                      moving_time=0 if np.isnan(seg_secs[i]) else int(seg_secs[i]))
+            actual.setdefault(ds, []).append(run)
+    return dict(name=name, planned=planned, actual=actual, days=len(set(days.tolist())), unparsed=sorted(unparsed))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("logs", nargs="+", help="logged spreadsheets (CSV)")
+    ap.add_argument("--race-date", help="date the Days Out column counts down to (YYYY-MM-DD)")
+    ap.add_argument("--year", type=int, help="year of the first row when dating from the Date column")
+    ap.add_argument("--json", metavar="PATH", help="write {log: {name, planned, actual}} here")
+    args = ap.parse_args(argv)
+
+    t = time.perf_counter()
+    out = {}
+    for path in args.logs:
+        try:
+            log = read_log(path, args.race_date, args.year)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        out[path] = log
+        planned_mi = sum(r["m"] for r in log["planned"].values())
+        actual_mi = sum(r["miles"] for runs in log["actual"].values() for r in runs)
+        print(f"{path}: {log['name'] or 'log'} · {log['days']} days · {len(log['planned'])} planned "
+              f"({planned_mi:.0f} mi) · {sum(map(len, log['actual'].values()))} logged ({actual_mi:.0f} mi)")
+        for text in log["unparsed"]:
+            print(f"  unrecognised: {text!r}")
+    print(f"imported {len(out)} logs in {(time.perf_counter() - t) * 1000:.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(out, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Assign activities to planned sessions.
+
+A planned day takes the runs done on it, and also a run done a day early or late when
+that run fits it better than anything else. AM/PM doubles take two runs. Duplicate
+uploads of the same run (watch + phone) are collapsed before matching.
+
+Candidate pairs come from a sorted index of run days, searched within ±WINDOW days of
+each planned session. Pairs are scored as DAY_COST per day of offset plus the relative
+distance miss, and assigned greedily cheapest-first; a run on a planned day can always
+count for it, shifted runs only when they're a close fit. Assignments are cached; when plan
+entries or runs change, only a window around the changed days is rematched.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+WINDOW = 1                # days either side a run may be shifted to meet its plan
+DAY_COST = 0.5
+MAX_SHIFT_COST = 0.8      # shifted runs must also be within ~30% of the planned distance
+DUP_START_SECS = 600      # two uploads starting within 10 minutes are the same run
+
+
+def slots(entry):
+    """How many runs a planned session takes: 2 for AM/PM doubles, else 1."""
+    note = (entry or {}).get("note") or ""
+    return 2 if "AM:" in note and "PM:" in note else 1
+
+
+def _start(run):
+    s = run.get("start")
+    return datetime.fromisoformat(s[:19]) if s else None
+
+
+def dedupe(runs):
+    """Drop duplicate uploads, keeping the longest copy."""
+    kept = []
+    for r in sorted(runs, key=lambda r: -r["miles"]):
+        s = _start(r)
+        dup = False
+        for k in kept:
+            ks = _start(k)
+            if s and ks:
+                dup = abs((s - ks).total_seconds()) <= DUP_START_SECS
+            else:
+                dup = (abs(r["miles"] - k["miles"]) <= 0.01 * k["miles"]
+                       and abs(r.get("moving_time", 0) - k.get("moving_time", 0)) <= 0.02 * (k.get("moving_time") or 1))
+            if dup:
+                break
+        if not dup:
+            kept.append(r)
+    kept.sort(key=lambda r: r.get("start") or "")
+    return kept
+
+
+def combine_runs(runs):
+    """Merge a double (or any several runs) into one run dict for display."""
+    if len(runs) == 1:
+        return runs[0]
+    miles = sum(r["miles"] for r in runs)
+    secs = sum(r.get("moving_time", 0) for r in runs)
+    hr_runs = [r for r in runs if r.get("hr")]
+    hr_secs = sum(r.get("moving_time", 0) for r in hr_runs)
+    return dict(id=runs[0].get("id"), name=" + ".join(r.get("name", "Run") for r in runs),
+                miles=miles, moving_time=secs, pace=secs / miles if miles else 0,
+                hr=sum(r["hr"] * r.get("moving_time", 0) for r in hr_runs) / hr_secs if hr_secs else None,
+                elev=sum(r.get("elev") or 0 for r in runs), start=runs[0].get("start"))
+
+
+class PlanMatcher:
+    """Cached plan ↔ activity assignment for one athlete."""
+
+    def __init__(self):
+        self._plan = {}        # ordinal → plan entry
+        self._runs = {}        # ordinal → (deduped runs, source list)
+        self._days = []        # sorted ordinals that have runs
+        self.assigned = {}     # plan ordinal → [(run ordinal, run index)]
+        self._owner = {}       # (run ordinal, run index) → plan ordinal
+
+    def sync(self, planned_map, act_runs):
+        """Refresh from the current plan and runs; returns the number of changed days."""
+        plan = {date.fromisoformat(ds).toordinal(): e for ds, e in planned_map.items() if e}
+        runs = {date.fromisoformat(ds).toordinal(): rs for ds, rs in act_runs.items() if rs}
+        changed = {d for d in plan.keys() | self._plan.keys() if plan.get(d) != self._plan.get(d)}
+        changed |= {d for d in runs.keys() | self._runs.keys()
+                    if d not in self._runs or d not in runs or self._runs[d][1] != runs[d]}
+        if not changed:
+            return 0
+        self._plan = plan
+        for d in changed:
+            if d in runs:
+                self._runs[d] = (dedupe(runs[d]), runs[d])
+            else:
+                self._runs.pop(d, None)
+        self._days = sorted(self._runs)
+        self._rematch(min(changed) - 2 * WINDOW, max(changed) + 2 * WINDOW)
+        return len(changed)
+
+    def _rematch(self, lo, hi):
+        # A session in the window may now take fewer runs than it holds (a double turned
+        # single); widen the window over all its runs so none of them is kept as surplus
+        for p, got in self.assigned.items():
+            if lo <= p <= hi and p in self._plan and len(got) > slots(self._plan[p]):
+                lo = min(lo, *(d - WINDOW for d, _ in got))
+                hi = max(hi, *(d + WINDOW for d, _ in got))
+        # Release every assignment with both ends inside [lo, hi]. Ones reaching outside the
+        # window stay fixed (their far end is at least WINDOW days from any changed day), so
+        # the rest of the season isn't disturbed.
+        for p in [p for p in self.assigned if lo <= p <= hi]:
+            keep = [(d, i) for d, i in self.assigned[p] if not lo <= d <= hi and p in self._plan]
+            for key in self.assigned[p]:
+                if key not in keep:
+                    self._owner.pop(key, None)
+            if keep:
+                self.assigned[p] = keep
+            else:
+                del self.assigned[p]
+
+        pairs = []
+        for p in range(lo, hi + 1):
+            entry = self._plan.get(p)
+            if not entry:
+                continue
+            target = entry["m"] / slots(entry)
+            for d in self._days[bisect_left(self._days, p - WINDOW):bisect_right(self._days, p + WINDOW)]:
+                for i, r in enumerate(self._runs[d][0]):
+                    off = abs(d - p)
+                    cost = DAY_COST * off + abs(r["miles"] - target) / max(target, 1)
+                    if off == 0 or cost <= MAX_SHIFT_COST:
+                        pairs.append((cost, off, p, d, i))
+        # Cheapest first: a run on its planned day wins unless it fits a neighbouring
+        # session clearly better (e.g. long run and easy day swapped)
+        for _, _, p, d, i in sorted(pairs):
+            if (d, i) in self._owner or len(self.assigned.get(p, [])) >= slots(self._plan[p]):
+                continue
+            self.assigned.setdefault(p, []).append((d, i))
+            self._owner[(d, i)] = p
+
+    def matched(self, ds):
+        """Runs assigned to the planned session on ds (possibly from a neighbouring day)."""
+        p = date.fromisoformat(ds).toordinal()
+        return [self._runs[d][0][i] for d, i in self.assigned.get(p, [])]
+
+    def unmatched(self, ds):
+        """Runs done on ds that aren't assigned to any planned session (duplicates dropped)."""
+        d = date.fromisoformat(ds).toordinal()
+        runs = self._runs.get(d, ((), ()))[0]
+        return [r for i, r in enumerate(runs) if (d, i) not in self._owner]
+
+    def shift(self, ds):
+        """Day offset of the first run matched to ds's plan (-1 = done a day early)."""
+        p = date.fromisoformat(ds).toordinal()
+        got = self.assigned.get(p)
+        return got[0][0] - p if got else 0
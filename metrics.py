@@ -0,0 +1,208 @@
+"""Per-rerun phase timings and HTML payload sizes.
+
+A script run opens a RunTimer (rerun() / timed()). Code inside it marks phases with
+`with phase("name")`, and nested phases are recorded as "outer/inner". Rendered HTML is
+counted with payload("name", html). When the run ends, every phase time and payload
+size goes into the process-wide REGISTRY. The registry keeps a rolling window of recent
+samples per series.
+
+The registry can be read three ways:
+- a periodic "[metrics]" log line;
+- Prometheus-style text from serve(port), a small background HTTP server, along with
+  any gauges registered with gauge();
+- snapshot(), for the ?debug sidebar.
+
+Streamlit runs each session's script in its own thread, so the active timer is
+thread-local and phase() is a no-op outside a run.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WINDOW = 500          # recent samples kept per series
+LOG_EVERY = 60        # seconds between log lines
+PERCENTILES = (50, 95)
+
+_local = threading.local()
+
+
+class Registry:
+    """Rolling samples per series name, shared by every session in the process."""
+
+    def __init__(self, window=WINDOW):
+        self._window = window
+        self._series = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._last_log = time.monotonic()
+        self.runs = 0
+
+    def observe(self, name, value):
+        with self._lock:
+            s = self._series.get(name)
+            if s is None:
+                s = self._series[name] = deque(maxlen=self._window)
+            s.append(value)
+
+    def gauge(self, name, fn):
+        """Report fn() on every scrape: a number, or {label: number} for a labelled series."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def snapshot(self):
+        """{name: dict(n, p50, p95, max)} over the current window."""
+        with self._lock:
+            series = {k: sorted(v) for k, v in self._series.items()}
+        out = {}
+        for name, vals in sorted(series.items()):
+            if not vals:
+                continue
+            row = dict(n=len(vals), max=vals[-1])
+            for p in PERCENTILES:
+                row[f"p{p}"] = vals[min(len(vals) - 1, len(vals) * p // 100)]
+            out[name] = row
+        return out
+
+    def prometheus(self):
+        lines = [f"planner_runs_total {self.runs}"]
+        for name, row in self.snapshot().items():
+            metric = "planner_" + name.replace("/", "_").replace(".", "_").replace("-", "_")
+            for p in PERCENTILES:
+                lines.append(f'{metric}{{quantile="{p / 100}"}} {row[f"p{p}"]:.3f}')
+            lines.append(f"{metric}_count {row['n']}")
+        with self._lock:
+            gauges = list(self._gauges.items())
+        for name, fn in gauges:
+            value = fn()
+            if isinstance(value, dict):
+                lines += [f'planner_{name}{{key="{k}"}} {v}' for k, v in sorted(value.items())]
+            else:
+                lines.append(f"planner_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def finish_run(self, timer):
+        for name, secs in timer.phases:
+            self.observe(f"{timer.kind}.ms.{name}", secs * 1000)
+        for name, n in timer.payload_bytes.items():
+            self.observe(f"{timer.kind}.bytes.{name}", n)
+        self.observe(f"{timer.kind}.ms.total", timer.total * 1000)
+        with self._lock:
+            self.runs += 1
+            due = time.monotonic() - self._last_log >= LOG_EVERY
+            if due:
+                self._last_log = time.monotonic()
+        if due:
+            print(self.log_line())
+
+    def log_line(self):
+        snap = self.snapshot()
+        totals = [f"{k.split('.')[0]} p50={v['p50']:.0f}ms p95={v['p95']:.0f}ms"
+                  for k, v in snap.items() if k.endswith(".ms.total")]
+        slowest = sorted(((v["p95"], k) for k, v in snap.items()
+                          if ".ms." in k and not k.endswith(".total")), reverse=True)[:3]
+        return (f"[metrics] runs={self.runs} " + " · ".join(totals) +
+                (" · slowest p95: " + ", ".join(f"{k.split('.ms.')[1]}={v:.0f}ms" for v, k in slowest)
+                 if slowest else ""))
+
+
+REGISTRY = Registry()
+
+
+class RunTimer:
+    """Phase timings and payload sizes for one script run."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.phases = []          # [(name, seconds)] in completion order
+        self.payload_bytes = {}
+        self._stack = []
+        self._t0 = time.perf_counter()
+        self.total = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        self._stack.append(name)
+        full = "/".join(self._stack)
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((full, time.perf_counter() - t))
+            self._stack.pop()
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+
+def current():
+    return getattr(_local, "timer", None)
+
+
+@contextmanager
+def rerun(kind):
+    """Time a script run. Nested inside an active run it just yields that run."""
+    timer = current()
+    if timer is not None:
+        yield timer
+        return
+    timer = _local.timer = RunTimer(kind)
+    try:
+        yield timer
+    finally:
+        _local.timer = None
+        timer.total = timer.elapsed()
+        REGISTRY.finish_run(timer)
+
+
+@contextmanager
+def phase(name):
+    timer = current()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+def timed(name):
+    """Decorator: a phase inside a full run, or its own run (e.g. a fragment rerun)."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with rerun(name), phase(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def payload(name, html):
+    """Count an HTML payload's bytes against the current run; returns html unchanged."""
+    timer = current()
+    if timer is not None:
+        timer.payload_bytes[name] = timer.payload_bytes.get(name, 0) + len(html.encode())
+    return html
+
+
+def serve(port, registry=REGISTRY):
+    """Serve registry.prometheus() at http://localhost:<port>/metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
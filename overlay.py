@@ -0,0 +1,96 @@
+"""The user's swaps as a layer over a shared base plan, with undo/redo.
+
+The base plan map is built once per plan signature and shared by every session, so it
+is never copied or mutated. PlanOverlay answers reads from the swap layer first and
+falls back to the base. Building one costs nothing, and a lookup is two dict probes.
+
+Swap layers are treated as immutable: an edit builds a new layer from the current one
+(O(number of swaps)), and the old one stays valid as a snapshot. Undo and redo just
+move along the list of snapshots.
+"""
+from collections.abc import Mapping
+
+HISTORY = 50      # snapshots kept for undo
+
+
+class PlanOverlay(Mapping):
+    """Read-only {date: run} view: layer entries win, None in the layer hides a base day."""
+    __slots__ = ("base", "layer")
+
+    def __init__(self, base, layer):
+        self.base = base
+        self.layer = layer
+
+    def __getitem__(self, ds):
+        if ds in self.layer:
+            run = self.layer[ds]
+            if run is None:
+                raise KeyError(ds)
+            return run
+        return self.base[ds]
+
+    def get(self, ds, default=None):
+        if ds in self.layer:
+            run = self.layer[ds]
+            return default if run is None else run
+        return self.base.get(ds, default)
+
+    def __contains__(self, ds):
+        return self.get(ds) is not None
+
+    def __iter__(self):
+        # Same order dict(base) + layer updates would give
+        for ds in self.base:
+            if ds not in self.layer or self.layer[ds] is not None:
+                yield ds
+        for ds, run in self.layer.items():
+            if ds not in self.base and run is not None:
+                yield ds
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class SwapHistory:
+    """Undo/redo over snapshots of the swap layer."""
+
+    def __init__(self, layer=None):
+        self._snaps = [layer if layer is not None else {}]
+        self._i = 0
+
+    @property
+    def current(self):
+        return self._snaps[self._i]
+
+    def apply(self, changes):
+        """New layer = current + changes; drops anything that could be redone."""
+        return self._push({**self.current, **changes})
+
+    def reset(self):
+        return self._push({})
+
+    def _push(self, layer):
+        del self._snaps[self._i + 1:]
+        self._snaps.append(layer)
+        if len(self._snaps) > HISTORY + 1:
+            del self._snaps[0]
+        self._i = len(self._snaps) - 1
+        return layer
+
+    @property
+    def can_undo(self):
+        return self._i > 0
+
+    @property
+    def can_redo(self):
+        return self._i < len(self._snaps) - 1
+
+    def undo(self):
+        if self.can_undo:
+            self._i -= 1
+        return self.current
+
+    def redo(self):
+        if self.can_redo:
+            self._i += 1
+        return self.current
@@ -1,3 +1,142 @@
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
+# ── workout shorthand ─────────────────────────────────────────
+# One grammar for workout text as written in training logs and plan tables:
+#   "GA 7 w/ 10x100m strides", "Rec + Sp 5 w/ 6 x 100 strides", "LT 10 w/ 5 @ 15K to HMP",
+#   "V8 w/ 5 x 800 @ 5K pace", "Q1: Tempo 10 w/ 6 @ Tempo", "8K - 15K tune-up race"
+# get_pace_range() reads the workout kind from it and importer.py parses whole
+# spreadsheets with it.
+
+# Pace zones: kind -> (low_delta, high_delta) in seconds from marathon pace, and a label
+ZONES = {
+    "easy": ((45, 90), "Easy"),
+    "aerobic": ((30, 60), "Aerobic"),
+    "recovery": ((60, 120), "Recovery"),
+    "mlr": ((30, 75), "MLR"),
+    "long": ((45, 90), "Long Run"),
+    "mp": ((-5, 5), "MP"),
+    "lt": ((-25, -15), "LT"),
+    "tempo": ((-25, -15), "Tempo"),
+    "hmp": ((-20, -10), "HMP"),
+    "vo2": ((-50, -40), "VO₂Max"),
+    "hill": (None, "Hard effort"),
+    "sprint": (None, "Max effort"),
+    "race": (None, "Race Pace"),
+}
+
+# How each kind is written, as a leading word of shorthand
+KIND_ALIASES = {
+    "rest": ("rest or cross-training", "rest", "off"),
+    "easy": ("easy",),
+    "aerobic": ("general aerobic", "aerobic", "ga"),
+    "recovery": ("recovery", "rec"),
+    "mlr": ("medium-long", "mlr"),
+    "long": ("long run", "endurance", "lr"),
+    "mp": ("marathon pace", "dress rehearsal", "mp"),
+    "lt": ("lactate threshold", "lt"),
+    "tempo": ("tempo",),
+    "hmp": ("half marathon pace", "hmp"),
+    "vo2": ("vo₂max", "vo2max", "vo2", "v"),
+    "hill": ("hills", "hill"),
+    "sprint": ("sprints", "sprint", "speed", "sp"),
+    "race": ("race",),
+}
+_MARATHON_KM = {"half marathon": 21.0975, "marathon": 42.195}
+_ALIAS_KIND = {a: k for k, aliases in KIND_ALIASES.items() for a in aliases}
+_KIND = "|".join(re.escape(a) for a in sorted(_ALIAS_KIND, key=len, reverse=True))
+_NUM = r"\d+(?:\.\d+)?"
+
+WORKOUT_RE = re.compile(rf"""
+    ^\s*(?:q\d+:\s*)?                                   # "Q1:" quality-session prefix
+    (?:
+        (?P<race_lo>{_NUM})\s*k(?:\s*-\s*(?P<race_hi>{_NUM})\s*k)?\s+tune-up\s+race
+      | (?P<marathon>(?:half\s+)?marathon)(?:\s+race)?\s*\(?\s*(?:{_NUM}\s*(?:mi)?)?\s*\)?
+      | (?P<lead_miles>{_NUM})\s*mi(?:les?)?\b\s*(?:run|(?P<lead_pace>pace))?
+      | (?P<kind>{_KIND})(?![a-z])
+        (?:\s*\+\s*(?P<extra>{_KIND})(?![a-z]))?
+        \s*(?:(?P<miles>{_NUM})(?![\d.]|\s*x)\s*(?:mi(?:les?)?\b)?)?
+        (?:\s*(?:w/)?\s*(?P<detail>\S.*?))?
+    )\s*$""", re.IGNORECASE | re.VERBOSE)
+
+DETAIL_RE = re.compile(rf"""
+    ^(?:(?P<reps>\d+)\s*x\s*(?P<rep>{_NUM})\s*(?P<unit>mi|m|k)?\b | (?P<seg>{_NUM}))?
+    \s*(?:(?P<strides>strides?) | @\s*(?P<pace>.+?) | (?P<what>[a-z].*?))?\s*$""", re.IGNORECASE | re.VERBOSE)
+
+
+@lru_cache(maxsize=8192)
+def parse_workout(text: str):
+    """
+    Parse workout shorthand into its parts, once per distinct string.
+
+    Returns:
+        A read-only mapping with kind, extra (a second kind, as in "GA + Sp"), miles,
+        reps, rep_m (rep distance in meters), seg_mi (miles of the w/ segment), pace
+        (the segment's pace as written), strides and race_km (lo, hi), missing parts
+        None; or None when the text isn't shorthand.
+    """
+    m = WORKOUT_RE.match(text or "")
+    if not m:
+        return None
+    out = dict(kind=None, extra=None, miles=None, reps=None, rep_m=None, seg_mi=None,
+               pace=None, strides=False, race_km=None)
+    if m["race_lo"]:
+        out["kind"] = "race"
+        out["race_km"] = (float(m["race_lo"]), float(m["race_hi"] or m["race_lo"]))
+        return MappingProxyType(out)
+    if m["marathon"]:
+        km = _MARATHON_KM[" ".join(m["marathon"].lower().split())]
+        out.update(kind="race", miles=round(km / 1.609344, 1), race_km=(km, km))
+        return MappingProxyType(out)
+    if m["lead_miles"]:
+        # "6 mi run" / "5 mi pace": the kind comes after the distance
+        out.update(kind="mp" if m["lead_pace"] else "easy", miles=float(m["lead_miles"]))
+        return MappingProxyType(out)
+    out["kind"] = _ALIAS_KIND[m["kind"].lower()]
+    out["extra"] = m["extra"] and _ALIAS_KIND[m["extra"].lower()]
+    out["miles"] = m["miles"] and float(m["miles"])
+    d = m["detail"] and DETAIL_RE.match(m["detail"])
+    if m["detail"] and not d:
+        return None
+    if d:
+        if d["reps"]:
+            rep, unit = float(d["rep"]), (d["unit"] or "").lower()
+            # bare rep distances: 100-1600 are meters, single digits are miles
+            out["reps"] = int(d["reps"])
+            out["rep_m"] = rep * 1000 if unit == "k" else rep * 1609.34 if unit == "mi" or (not unit and rep < 20) else rep
+        elif d["seg"]:
+            out["seg_mi"] = float(d["seg"])
+        out["strides"] = bool(d["strides"])
+        out["pace"] = d["pace"] or (d["what"] and d["what"].lower())
+        if d["what"] and d["what"].lower().startswith("hill"):
+            out["extra"] = out["extra"] or "hill"
+    return MappingProxyType(out)
+
+
+# Keywords searched for in free text, in priority order
+_KEYWORDS = (
+    ("easy", "easy"), ("general aerobic", "aerobic"), ("aerobic", "aerobic"),
+    ("recovery", "recovery"), ("rec", "recovery"), ("medium-long", "mlr"), ("mlr", "mlr"),
+    ("long run", "long"), ("lr", "long"), ("marathon pace", "mp"), ("mp", "mp"),
+    ("lactate threshold", "lt"), ("lt", "lt"), ("tempo", "tempo"),
+    ("half marathon pace", "hmp"), ("hmp", "hmp"), ("vo₂max", "vo2"), ("v8", "vo2"),
+    ("hill", "hill"), ("sprint", "sprint"), ("sp", "sprint"), ("race", "race"),
+)
+
+
+def _format_range(low, high, adjustment_factor):
+    if adjustment_factor != 1.0:
+        # For paces faster than marathon pace, being less aggressive means slower (closer to MP)
+        # For paces slower than marathon pace, being less aggressive means even slower (further from MP)
+        # A simple multiplier works for both cases.
+        low *= adjustment_factor
+        high *= adjustment_factor
+    low_min, low_sec = divmod(int(low), 60)
+    high_min, high_sec = divmod(int(high), 60)
+    return f"{low_min}:{low_sec:02d} - {high_min}:{high_sec:02d}"
+
+
 def marathon_pace_seconds(goal_marathon_time: str) -> float:
     """
     Calculate marathon pace in seconds per mile from a goal time string.
@@ -38,63 +177,22 @@ def get_pace_range(activity_description: str, goal_marathon_pace_seconds: float,
         if "run_plan.csv" in plan_name or "unofficial-pfitz-18-63" in plan_name:
             adjustment_factor = 1.05
 
-    # Pace mappings: keyword -> (low_delta, high_delta) in seconds from marathon pace
-    pace_map = {
-        "easy": {"delta": (45, 90), "label": "Easy"},
-        "general aerobic": {"delta": (30, 60), "label": "Aerobic"},
-        "aerobic": {"delta": (30, 60), "label": "Aerobic"},
-        "recovery": {"delta": (60, 120), "label": "Recovery"},
-        "rec": {"delta": (60, 120), "label": "Recovery"},
-        "medium-long": {"delta": (30, 75), "label": "MLR"},
-        "mlr": {"delta": (30, 75), "label": "MLR"},
-        "long run": {"delta": (45, 90), "label": "Long Run"},
-        "lr": {"delta": (45, 90), "label": "Long Run"},
-        "marathon pace": {"delta": (-5, 5), "label": "MP"},
-        "mp": {"delta": (-5, 5), "label": "MP"},
-        "lactate threshold": {"delta": (-25, -15), "label": "LT"},
-        "lt": {"delta": (-25, -15), "label": "LT"},
-        "tempo": {"delta": (-25, -15), "label": "Tempo"},
-        "half marathon pace": {"delta": (-20, -10), "label": "HMP"},
-        "hmp": {"delta": (-20, -10), "label": "HMP"},
-        "vo₂max": {"delta": (-50, -40), "label": "VO₂Max"},
-        "v8": {"delta": (-50, -40), "label": "VO₂Max"},
-        "hill": {"delta": None, "label": "Hard effort"},
-        "sprint": {"delta": None, "label": "Max effort"},
-        "sp": {"delta": None, "label": "Max effort"},
-        "race": {"delta": None, "label": "Race Pace"},
-    }
-
-    # Find the best matching pace type
-    for keyword, mapping in pace_map.items():
+    # Shorthand ("GA 7 w/ 10x100m strides") names its kind up front
+    workout = parse_workout(activity_description)
+    if workout is not None:
+        if workout["kind"] not in ZONES:
+            return "—"
+        delta, label = ZONES[workout["kind"]]
+        return label if delta is None else _format_range(gmp_sec + delta[0], gmp_sec + delta[1], adjustment_factor)
+
+    # Free text: the first keyword found anywhere in it
+    for keyword, kind in _KEYWORDS:
         if keyword in desc:
-            if mapping["delta"] is None:
-                return mapping["label"]
-            
-            low = gmp_sec + mapping["delta"][0]
-            high = gmp_sec + mapping["delta"][1]
-
-            if adjustment_factor != 1.0:
-                # For paces faster than marathon pace, being less aggressive means slower (closer to MP)
-                # For paces slower than marathon pace, being less aggressive means even slower (further from MP)
-                # A simple multiplier works for both cases.
-                low *= adjustment_factor
-                high *= adjustment_factor
-            
-            # Format to M:SS
-            low_min, low_sec = divmod(int(low), 60)
-            high_min, high_sec = divmod(int(high), 60)
-            
-            return f"{low_min}:{low_sec:02d} - {high_min}:{high_sec:02d}"
+            delta, label = ZONES[kind]
+            return label if delta is None else _format_range(gmp_sec + delta[0], gmp_sec + delta[1], adjustment_factor)
 
     # Default for unrecognized runs
     if "run" in desc or "mile" in desc:
-        low = gmp_sec + 30
-        high = gmp_sec + 90
-        if adjustment_factor != 1.0:
-            low *= adjustment_factor
-            high *= adjustment_factor
-        low_min, low_sec = divmod(int(low), 60)
-        high_min, high_sec = divmod(int(high), 60)
-        return f"{low_min}:{low_sec:02d} - {high_min}:{high_sec:02d}"
+        return _format_range(gmp_sec + 30, gmp_sec + 90, adjustment_factor)
 
     return "—"
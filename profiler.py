@@ -0,0 +1,191 @@
+"""Opt-in profiling of single script runs, for diagnosing one athlete's slow page.
+
+Two modes:
+- "sample" (default): a background thread reads the profiled thread's stack every
+  `interval` seconds and writes collapsed stacks (<name>.folded). flamegraph.pl,
+  speedscope and inferno all read this format. Only that one thread is slowed, and only
+  by the stack walks.
+- "trace": cProfile on the script thread, written as <name>.prof for pstats or snakeviz.
+  Exact call counts, but every call in the run pays for them.
+
+Both also write <name>.txt, the app functions (those under `root`) with the most
+inclusive time, such as render_week or parse_me_segments. A Limiter keeps it to one
+profiled run at a time and a few per minute across the process. A URL left open with
+?profile can't then slow everyone else. The app only profiles at all when its PROFILING
+switch is on (a secret or environment variable, never the URL alone).
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+INTERVAL = 0.002      # seconds between stack samples
+TOP = 15              # functions in the summary; only the app's own code when root is given
+KEEP = 200            # newest profile files kept in out_dir
+
+
+class Limiter:
+    """At most one profiled run at a time, and per_minute of them in any 60 s."""
+
+    def __init__(self, per_minute=6):
+        self.per_minute = per_minute
+        self._starts = deque()
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._busy.acquire(blocking=False):
+            return False
+        with self._lock:
+            now = time.monotonic()
+            while self._starts and now - self._starts[0] > 60:
+                self._starts.popleft()
+            if len(self._starts) >= self.per_minute:
+                self._busy.release()
+                return False
+            self._starts.append(now)
+        return True
+
+    def release(self):
+        self._busy.release()
+
+
+def _label(code, root):
+    path = code.co_filename
+    short = os.path.relpath(path, root) if root and path.startswith(root) else os.path.basename(path)
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({short}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Collapsed-stack counts for one thread, sampled from a daemon thread."""
+
+    def __init__(self, thread_id, interval=INTERVAL, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self._ours = set()          # labels of frames under root
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            # outermost first; drop Streamlit's runner frames above our code
+            stack.reverse()
+            if self.root:
+                first = next((i for i, c in enumerate(stack) if c.co_filename.startswith(self.root)), len(stack))
+                stack = stack[first:]
+            if stack:
+                labels = [_label(c, self.root) for c in stack]
+                self._ours.update(l for l, c in zip(labels, stack) if self.root and c.co_filename.startswith(self.root))
+                self.stacks[";".join(labels)] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def summary(self, top=TOP):
+        """[(function, inclusive fraction, self fraction)], most inclusive first."""
+        total = sum(self.stacks.values())
+        if not total:
+            return []
+        incl, own = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for f in set(frames):
+                incl[f] += n
+        rows = [(f, n / total, own[f] / total) for f, n in incl.most_common()
+                if not self._ours or f in self._ours]
+        return rows[:top]
+
+
+def _trace_summary(prof, root=None, top=TOP):
+    stats = pstats.Stats(prof, stream=io.StringIO())
+    total = stats.total_tt or 1e-9
+    rows = sorted(stats.stats.items(), key=lambda kv: -kv[1][3])
+    if root:
+        rows = [r for r in rows if r[0][0].startswith(root)] or rows
+    return [(f"{func} ({os.path.basename(file)}:{line})", cum / total, tt / total)
+            for (file, line, func), (_, _, tt, cum, _) in rows[:top]]
+
+
+class Report:
+    """What a profiled run left behind: file paths, wall time and the summary rows."""
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+        self.paths = []
+        self.seconds = 0.0
+        self.summary = []
+
+    def text(self):
+        head = f"{self.name} · {self.mode} · {self.seconds * 1000:.0f} ms"
+        rows = [f"{incl:6.1%} {own:6.1%}  {func}" for func, incl, own in self.summary]
+        return "\n".join([head, "  total   self  function", *rows]) + "\n"
+
+
+@contextmanager
+def profile(out_dir, name, mode="sample", interval=INTERVAL, root=None):
+    """Profile the block on the calling thread and write files named after `name` to out_dir.
+
+    Files are written even when the block unwinds by exception (st.rerun / st.stop do).
+    """
+    report = Report(name, mode)
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, name)
+    t = time.perf_counter()
+    if mode == "trace":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield report
+        finally:
+            prof.disable()
+            report.seconds = time.perf_counter() - t
+            prof.dump_stats(base + ".prof")
+            report.paths.append(base + ".prof")
+            report.summary = _trace_summary(prof, root)
+            _finish(report, base, out_dir)
+    else:
+        sampler = Sampler(threading.get_ident(), interval, root).start()
+        try:
+            yield report
+        finally:
+            sampler.stop()
+            report.seconds = time.perf_counter() - t
+            with open(base + ".folded", "w") as f:
+                f.write(sampler.folded())
+            report.paths.append(base + ".folded")
+            report.summary = sampler.summary()
+            _finish(report, base, out_dir)
+
+
+def _finish(report, base, out_dir):
+    with open(base + ".txt", "w") as f:
+        f.write(report.text())
+    report.paths.append(base + ".txt")
+    files = sorted((os.path.join(out_dir, n) for n in os.listdir(out_dir)), key=os.path.getmtime)
+    for path in files[:-KEEP]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
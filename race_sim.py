@@ -0,0 +1,49 @@
+"""Monte Carlo race-outcome simulator.
+
+Each draw combines three sources of uncertainty, all sampled at once as NumPy arrays:
+- current fitness: log marathon time ~ Normal(fit mean, fit sd) from prediction.py;
+- the rest of the plan: each remaining week's completion is resampled from the athlete's
+  own past weekly adherence (the same effective % week_grade scores), weighted by that
+  week's planned miles. Completing the remaining plan is worth up to TRAIN_GAIN of
+  finish time, pro rata to its share of the whole plan's volume;
+- race day: a log-normal day-to-day swing sized by the scatter of the athlete's efforts.
+"""
+import numpy as np
+
+N_DRAWS = 10_000
+TRAIN_GAIN = 0.05          # log-time gain from completing a full plan, start to finish
+ADHERENCE_CAP = 1.1        # overshooting a week helps, but only so much
+RACE_DAY_SD_MIN = 0.015
+PRIOR_ADHERENCE = (8, 2)   # Beta(8, 2), mean 80%, when no past weeks have been graded yet
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def simulate(fit, goal_secs, remaining_miles, total_miles, adherence, n=N_DRAWS, seed=0):
+    """Sample n finish times; returns dict(pct={p: secs}, p_goal, n, adherence).
+
+    fit is predict_marathon's dict (needs secs, sd, sigma). remaining_miles is planned
+    miles per remaining week, total_miles the plan's total, adherence the past weekly
+    completion fractions (possibly empty).
+    """
+    rng = np.random.default_rng(seed)
+    remaining = np.asarray(remaining_miles, dtype=np.float64)
+    hist = np.minimum(np.asarray(adherence, dtype=np.float64), ADHERENCE_CAP)
+
+    fitness = rng.normal(np.log(fit["secs"]), fit["sd"], n)
+
+    if remaining.sum() > 0 and total_miles > 0:
+        if len(hist):
+            weeks = hist[rng.integers(0, len(hist), size=(n, len(remaining)))]
+        else:
+            weeks = rng.beta(*PRIOR_ADHERENCE, size=(n, len(remaining)))
+        done = weeks @ remaining                    # miles completed in each draw
+        gain = TRAIN_GAIN * done / total_miles
+    else:
+        gain = np.zeros(n)
+
+    race_day = rng.normal(0.0, max(RACE_DAY_SD_MIN, fit.get("sigma", 0.0)), n)
+    finish = np.exp(fitness - gain + race_day)
+
+    return dict(pct=dict(zip(PERCENTILES, np.percentile(finish, PERCENTILES).tolist())),
+                p_goal=float((finish <= goal_secs).mean()) if goal_secs else None,
+                n=n, adherence=float(hist.mean()) if len(hist) else None)
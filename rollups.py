@@ -0,0 +1,145 @@
+"""Weekly and monthly mileage rollups.
+
+Activities are folded in once, as they arrive, so trend charts read pre-summed totals
+instead of rescanning per-day maps on every rerun. Weekly totals live in a dense NumPy
+array indexed by week (Monday ordinal // 7), so any span is a slice and downsampling to
+the chart width is a reshape.
+"""
+import hashlib
+from datetime import date
+
+import numpy as np
+
+
+def week_index(d: date) -> int:
+    """Monday-aligned week number. Ordinal 1 (0001-01-01) is a Monday, so every Monday's
+    ordinal is 7k + 1 and this returns k."""
+    return (d.toordinal() - d.weekday()) // 7
+
+
+def week_start(idx: int) -> date:
+    return date.fromordinal(idx * 7 + 1)
+
+
+class MileageRollups:
+    """Incrementally maintained weekly + monthly actual-mileage totals for one athlete."""
+
+    def __init__(self):
+        self._origin = None                      # week index of _weekly[0]
+        self._weekly = np.zeros(0, dtype=np.float64)
+        self._lo = self._hi = None               # first / last week index holding data
+        self.monthly = {}                        # (year, month) -> miles
+        self._seen = set()                       # activity keys already folded in
+        self.version = 0                         # bumped on every fold (per instance)
+        self._digest = (None, None)              # (version, digest) last computed
+
+    def __len__(self):
+        return 0 if self._lo is None else self._hi - self._lo + 1
+
+    @property
+    def first_week(self):
+        return None if self._lo is None else week_start(self._lo)
+
+    @property
+    def last_week(self):
+        return None if self._hi is None else week_start(self._hi)
+
+    @property
+    def digest(self):
+        """Hash of the weekly totals: equal only for equal mileage, so unlike version
+        it's safe as a key for caches shared between athletes."""
+        if self._digest[0] != self.version:
+            h = hashlib.sha1(str(self._lo).encode())
+            if self._lo is not None:
+                h.update(self._weekly[self._lo - self._origin:self._hi - self._origin + 1].tobytes())
+            self._digest = (self.version, h.hexdigest()[:16])
+        return self._digest[1]
+
+    def _slot(self, widx):
+        """Array position for a week index, growing the array (amortized O(1)) if needed."""
+        if self._origin is None:
+            self._origin, self._weekly = widx, np.zeros(64, dtype=np.float64)
+        if widx < self._origin:
+            # Older history (e.g. a full backfill arriving newest-first): grow the front
+            # with headroom so a run of older weeks doesn't copy the array each time.
+            grow = max(self._origin - widx, len(self._weekly))
+            self._weekly = np.concatenate([np.zeros(grow), self._weekly])
+            self._origin -= grow
+        pos = widx - self._origin
+        if pos >= len(self._weekly):
+            grow = max(pos + 1 - len(self._weekly), len(self._weekly))
+            self._weekly = np.concatenate([self._weekly, np.zeros(grow)])
+        self._lo = widx if self._lo is None else min(self._lo, widx)
+        self._hi = widx if self._hi is None else max(self._hi, widx)
+        return pos
+
+    def add(self, ds, miles, key=None):
+        """Fold one activity in. O(1); activities seen before (same key) are ignored."""
+        key = key if key is not None else (ds, round(miles, 3))
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        d = date.fromisoformat(ds[:10])
+        pos = self._slot(week_index(d))  # may reallocate _weekly
+        self._weekly[pos] += miles
+        self.monthly[(d.year, d.month)] = self.monthly.get((d.year, d.month), 0.0) + miles
+        self.version += 1
+        return True
+
+    def add_runs(self, act_runs):
+        """Fold an act_runs-style map (date string → list of run dicts)."""
+        added = 0
+        for ds, runs in act_runs.items():
+            for r in runs:
+                key = r.get("id") or (ds, round(r["miles"], 3))
+                added += self.add(ds, r["miles"], key=key)
+        return added
+
+    def weekly(self, start: date, n_weeks: int) -> np.ndarray:
+        """Actual miles for n_weeks consecutive weeks beginning at the week containing start."""
+        out = np.zeros(n_weeks, dtype=np.float64)
+        if self._origin is None:
+            return out
+        lo = week_index(start) - self._origin
+        src_lo, src_hi = max(lo, 0), min(lo + n_weeks, len(self._weekly))
+        if src_hi > src_lo:
+            out[src_lo - lo:src_hi - lo] = self._weekly[src_lo:src_hi]
+        return out
+
+    def year_totals(self):
+        """{year: miles}, summed from the monthly store (≤ 12 lookups per year)."""
+        years = {}
+        for (y, _), mi in self.monthly.items():
+            years[y] = years.get(y, 0.0) + mi
+        return years
+
+
+def weekly_planned_totals(planned_map):
+    """{week index: planned miles} for a plan map, excluding race day (matches the chart)."""
+    totals = {}
+    for ds, run in planned_map.items():
+        if not run or run.get("t") == "race":
+            continue
+        widx = week_index(date.fromisoformat(ds))
+        totals[widx] = totals.get(widx, 0) + run["m"]
+    return totals
+
+
+def planned_series(planned_totals, start: date, n_weeks: int) -> np.ndarray:
+    w0 = week_index(start)
+    return np.array([planned_totals.get(w0 + i, 0) for i in range(n_weeks)], dtype=np.float64)
+
+
+def downsample(values: np.ndarray, max_points: int):
+    """Average consecutive weeks into at most max_points bins.
+
+    Returns (bin_means, bin_size). Means keep the y-axis in miles per week whatever the
+    zoom level; the leading partial bin is padded so the latest weeks stay aligned right.
+    """
+    n = len(values)
+    if n <= max_points:
+        return values.astype(np.float64), 1
+    size = -(-n // max_points)
+    pad = (-n) % size
+    padded = np.concatenate([np.full(pad, np.nan), values]) if pad else values
+    return np.nanmean(padded.reshape(-1, size), axis=1), size
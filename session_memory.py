@@ -0,0 +1,193 @@
+"""Approximate memory held per session, and eviction of payloads idle sessions can rebuild.
+
+Each script run is bracketed with begin() / end(); active() does the same for a fragment
+rerun, which doesn't run the script around it. end() re-measures the session now and
+then: a deep sys.getsizeof walk per session-state key. Read-only views
+(MappingProxyType) are payloads shared through a process-wide cache. They are reported
+as shared and left out of the session's own total, since dropping one session's
+reference doesn't free them.
+
+Then it sweeps. Sessions idle for longer than idle_secs lose their EVICTABLE keys, and
+so do the least recently active sessions while the tracked total is over cap_bytes.
+The app rebuilds those keys on the next run, from shared caches. A session is only
+swept between its runs. begin() and the sweep share a lock, so a run never starts
+halfway through an eviction.
+
+Streamlit gives no hook for a closed tab, so a closed tab is just a session that stays
+idle. Its entry is forgotten after forget_secs.
+"""
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import MappingProxyType
+
+# Rebuilt on demand: activities / history from the shared per-athlete caches, the rest
+# from those runs.
+EVICTABLE = ("activities", "history_runs", "history_loaded", "rollups",
+             "training_load", "matcher", "adherence")
+MEASURE_EVERY = 10    # seconds between re-measuring a session whose keys haven't changed
+
+
+def approx_bytes(obj, seen):
+    """Deep sys.getsizeof of obj, skipping anything whose id is already in seen.
+
+    Read-only views nested inside obj (a model holding the shared base plan, say) are
+    someone else's and aren't followed.
+    """
+    total, stack = 0, [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or (o is not obj and isinstance(o, MappingProxyType)):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, (dict, MappingProxyType)):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, (str, bytes, int, float, bool, type(None))):
+            continue
+        else:
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+            for slot in getattr(type(o), "__slots__", ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total
+
+
+def measure(state):
+    """({key: bytes} held by the session, {key: bytes} of shared views it references)."""
+    seen, own, shared = set(), {}, {}
+    items = list(state.filtered_state.items())
+    # shared views first, so the session's own models don't count runs they reference
+    for k, v in items:
+        if isinstance(v, MappingProxyType):
+            shared[k] = approx_bytes(v, seen)
+    for k, v in items:
+        if k not in shared:
+            own[k] = approx_bytes(v, seen)
+    return own, shared
+
+
+class _Session:
+    __slots__ = ("state", "last_active", "running", "measured_at", "own", "shared", "evictions")
+
+    def __init__(self, state):
+        self.state = state
+        self.last_active = time.monotonic()
+        self.running = False
+        self.measured_at = 0.0
+        self.own, self.shared = {}, {}
+        self.evictions = 0
+
+    @property
+    def total(self):
+        return sum(self.own.values())
+
+
+class SessionRegistry:
+    """Every live session's footprint, and the eviction policy over them."""
+
+    def __init__(self, idle_secs=15 * 60, cap_bytes=512 * 2**20, forget_secs=None):
+        self.idle_secs = idle_secs
+        self.cap_bytes = cap_bytes
+        self.forget_secs = forget_secs if forget_secs is not None else 4 * idle_secs
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def begin(self, session_id, state):
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is None:
+                s = self._sessions[session_id] = _Session(state)
+            s.state, s.running, s.last_active = state, True, time.monotonic()
+
+    def idle_for(self, session_id):
+        """Seconds since the session's last run ended; 0 while one is running."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is None or s.running:
+                return 0.0
+            return time.monotonic() - s.last_active
+
+    @contextmanager
+    def active(self, session_id, state):
+        """begin() / end() around a run, unless the session is already inside one (e.g. a
+        fragment rendered as part of a full run)."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+            nested = s is not None and s.running
+        if nested:
+            yield
+            return
+        self.begin(session_id, state)
+        try:
+            yield
+        finally:
+            self.end(session_id)
+
+    def end(self, session_id):
+        """Re-measure this session if due, then sweep the others. Returns evicted ids."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+        if s is None:
+            return []
+        now = time.monotonic()
+        if now - s.measured_at >= MEASURE_EVERY or s.state.filtered_state.keys() != s.own.keys() | s.shared.keys():
+            s.own, s.shared = measure(s.state)
+            s.measured_at = now
+        with self._lock:
+            s.running, s.last_active = False, now
+            return self._sweep(now, keep=session_id)
+
+    def _sweep(self, now, keep):
+        evicted = []
+        for sid, s in list(self._sessions.items()):
+            if now - s.last_active > self.forget_secs and not s.running:
+                del self._sessions[sid]
+            elif now - s.last_active > self.idle_secs and sid != keep and self._evict(s):
+                evicted.append(sid)
+        total = sum(s.total for s in self._sessions.values())
+        for sid, s in sorted(self._sessions.items(), key=lambda kv: kv[1].last_active):
+            if total <= self.cap_bytes:
+                break
+            before = s.total
+            if sid != keep and self._evict(s):
+                total -= before - s.total
+                evicted.append(sid)
+        return evicted
+
+    def _evict(self, s):
+        if s.running:
+            return False
+        dropped = [k for k in EVICTABLE if k in s.state]
+        for k in dropped:
+            del s.state[k]
+            s.own.pop(k, None)
+            s.shared.pop(k, None)
+        if dropped:
+            s.evictions += 1
+            self.evicted += 1
+        return bool(dropped)
+
+    def snapshot(self):
+        """Process totals plus one row per tracked session, largest first."""
+        now = time.monotonic()
+        with self._lock:
+            rows = [dict(session=sid[:8], own=s.total, shared=sum(s.shared.values()),
+                         idle=now - s.last_active, running=s.running, evictions=s.evictions,
+                         keys={**s.own, **s.shared})
+                    for sid, s in self._sessions.items()]
+        rows.sort(key=lambda r: -r["own"])
+        keys = {}
+        for r in rows:
+            for k, n in r["keys"].items():
+                keys[k] = keys.get(k, 0) + n
+        return dict(sessions=len(rows), own=sum(r["own"] for r in rows),
+                    active=sum(1 for r in rows if r["idle"] <= self.idle_secs),
+                    cap=self.cap_bytes, evicted=self.evicted, keys=keys, rows=rows)
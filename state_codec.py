@@ -0,0 +1,96 @@
+"""Storage format for persisted session state.
+
+State is kept as rows of (key, value string), so a store only has to write the rows
+that changed. Format 2:
+- each swap is its own row, "swaps/<day ordinal>", so moving one run rewrites two small
+  rows rather than the whole swaps map;
+- a swapped run is a positional list [type code, miles, day, extras] with workout types
+  coded by their index in WORKOUT_TYPES;
+- values are JSON prefixed "2|", or "2z|" + base64 zlib when that is shorter.
+
+Rows without a prefix are format 1 (plain JSON, with swaps as one date-string → run dict
+map). They are read transparently and replaced by format-2 rows on the next save.
+"""
+import base64
+import json
+import zlib
+from datetime import date
+
+FORMAT = 2
+# Append-only: a type's index is what's stored
+WORKOUT_TYPES = ("easy", "long", "tempo", "vo2", "race", "me_primary", "me_secondary", "me_weekend")
+_TYPE_CODE = {t: i for i, t in enumerate(WORKOUT_TYPES)}
+SWAP_PREFIX = "swaps/"
+COMPRESS_MIN = 160      # shorter values don't shrink enough to pay for base64
+
+
+def encode_run(run):
+    if run is None:
+        return None
+    extras = {k: v for k, v in run.items() if k not in ("t", "m", "d")}
+    t = run.get("t")
+    out = [_TYPE_CODE.get(t, t), run.get("m"), run.get("d")]
+    return out + [extras] if extras else out
+
+
+def decode_run(v):
+    if v is None:
+        return None
+    t, m, d, *rest = v
+    run = dict(d=d, t=WORKOUT_TYPES[t] if isinstance(t, int) else t, m=m)
+    if d is None:
+        del run["d"]
+    if rest:
+        run.update(rest[0])
+    return run
+
+
+def dumps(value) -> str:
+    raw = json.dumps(value, separators=(",", ":"), sort_keys=True)
+    if len(raw) >= COMPRESS_MIN:
+        packed = base64.b64encode(zlib.compress(raw.encode(), 9)).decode()
+        if len(packed) < len(raw):
+            return f"{FORMAT}z|{packed}"
+    return f"{FORMAT}|{raw}"
+
+
+def loads(s: str):
+    head, sep, body = s.partition("|")
+    if sep and head == f"{FORMAT}z":
+        return json.loads(zlib.decompress(base64.b64decode(body)))
+    if sep and head == str(FORMAT):
+        return json.loads(body)
+    return json.loads(s)   # format 1
+
+
+def to_rows(state: dict) -> dict:
+    """{row key: value string} for a state snapshot. None values are left out."""
+    rows = {}
+    for k, v in state.items():
+        if v is None:
+            continue
+        if k == "swaps":
+            for ds, run in v.items():
+                rows[f"{SWAP_PREFIX}{date.fromisoformat(ds).toordinal()}"] = dumps(encode_run(run))
+        elif k == "race_date" and hasattr(v, "isoformat"):
+            rows[k] = dumps(v.isoformat())
+        else:
+            rows[k] = dumps(v)
+    return rows
+
+
+def from_rows(rows: dict) -> dict:
+    """Inverse of to_rows; also reads format-1 rows."""
+    state = {}
+    swaps = {}
+    for k, s in rows.items():
+        if k.startswith(SWAP_PREFIX):
+            swaps[date.fromordinal(int(k[len(SWAP_PREFIX):])).isoformat()] = decode_run(loads(s))
+        elif k == "swaps":
+            swaps.update(loads(s) or {})   # format 1: the whole map in one row
+        else:
+            v = loads(s)
+            state[k] = date.fromisoformat(v) if k == "race_date" and v else v
+    if swaps or "swaps" in rows:
+        state["swaps"] = dict(sorted(swaps.items()))
+    return state
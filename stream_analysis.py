@@ -0,0 +1,82 @@
+"""Heart-rate zones and grade-adjusted pace from activity streams.
+
+Each activity is reduced once to a small, parameter-free summary:
+- a 1-bpm heart-rate histogram (seconds per bpm), so any zone boundaries can be applied
+  later without going back to the stream;
+- grade-adjusted distance, using Minetti's energy cost of running on a slope relative to
+  the flat, so GAP = moving time / adjusted distance.
+
+Week and season aggregates are sums of those summaries. A whole season of weekly zone
+bars is a few hundred vector adds.
+"""
+import numpy as np
+
+HR_LO, HR_HI = 40, 220          # histogram covers [HR_LO, HR_HI) bpm
+MAX_GAP_SECS = 30               # longer sample gaps are pauses, not running
+GRADE_CLIP = 0.45
+SMOOTH_POINTS = 5               # altitude moving average; raw GPS altitude is noisy
+# Zones as fractions of lactate-threshold HR (Friel): Z1 < 85%, Z2 85–89, Z3 90–94,
+# Z4 95–99, Z5 ≥ 100
+ZONE_EDGES = (0.85, 0.90, 0.95, 1.00)
+ZONE_NAMES = ("Z1", "Z2", "Z3", "Z4", "Z5")
+ZONE_COLORS = ("#cbd5e1", "#5DCAA5", "#e8a825", "#f97316", "#e05757")
+
+
+def minetti_cost(grade):
+    """Energy cost of running (J/kg/m) at a grade, Minetti et al. 2002."""
+    g = np.clip(grade, -GRADE_CLIP, GRADE_CLIP)
+    return ((((155.4 * g - 30.4) * g - 43.3) * g + 46.3) * g + 19.5) * g + 3.6
+
+
+def summarize(distance, time, heartrate=None, altitude=None):
+    """Per-activity summary: dict(secs, meters, gap_meters, hr_hist) from raw streams."""
+    d = np.asarray(distance, dtype=np.float64)
+    t = np.asarray(time, dtype=np.float64)
+    dt = np.diff(t)
+    moving = (dt > 0) & (dt <= MAX_GAP_SECS)
+    dd = np.diff(d)
+    out = dict(secs=float(dt[moving].sum()), meters=float(dd[moving].sum()), gap_meters=None, hr_hist=None)
+
+    if altitude is not None and len(altitude) == len(d):
+        alt = np.asarray(altitude, dtype=np.float64)
+        if len(alt) >= SMOOTH_POINTS:
+            alt = np.convolve(np.pad(alt, SMOOTH_POINTS // 2, mode="edge"),
+                              np.ones(SMOOTH_POINTS) / SMOOTH_POINTS, mode="valid")
+        grade = np.divide(np.diff(alt), dd, out=np.zeros_like(dd), where=dd > 0.5)
+        flat = minetti_cost(0.0)
+        out["gap_meters"] = float((dd * minetti_cost(grade) / flat)[moving].sum())
+
+    if heartrate is not None and len(heartrate) == len(t):
+        hr = np.clip(np.asarray(heartrate, dtype=np.int64)[1:], HR_LO, HR_HI - 1) - HR_LO
+        hist = np.bincount(hr[moving], weights=dt[moving], minlength=HR_HI - HR_LO)
+        out["hr_hist"] = hist.round().astype(int).tolist()
+    return out
+
+
+def combine(summaries):
+    """Sum summaries (e.g. one week's activities). Missing HR/elevation data is skipped."""
+    secs = meters = gap_secs = gap_meters = 0.0
+    hist = np.zeros(HR_HI - HR_LO)
+    for s in summaries:
+        secs += s["secs"]; meters += s["meters"]
+        if s.get("gap_meters"):
+            gap_secs += s["secs"]; gap_meters += s["gap_meters"]
+        if s.get("hr_hist"):
+            hist += s["hr_hist"]
+    return dict(secs=secs, meters=meters, gap_secs=gap_secs, gap_meters=gap_meters, hr_hist=hist)
+
+
+def gap_pace(summary):
+    """Grade-adjusted pace in s/mi, or None without elevation data."""
+    secs = summary.get("gap_secs", summary["secs"])
+    gm = summary.get("gap_meters")
+    return secs / (gm / 1609.34) if gm else None
+
+
+def time_in_zones(hr_hist, lthr):
+    """Seconds in each of the five zones for an HR histogram, given LTHR in bpm."""
+    hist = np.asarray(hr_hist, dtype=np.float64)
+    edges = [int(np.clip(round(f * lthr) - HR_LO, 0, len(hist))) for f in ZONE_EDGES]
+    csum = np.concatenate([[0.0], np.cumsum(hist)])
+    bounds = [0, *edges, len(hist)]
+    return np.diff(csum[bounds])
@@ -0,0 +1,338 @@
+"""Long-running Strava sync for every connected athlete, feeding activity_store.
+
+The app registers an athlete's tokens in the activity store when they connect. This
+daemon then keeps their runs current:
+- the first sync backfills their history (--backfill-days, 0 = all of it);
+- every --interval after that, it fetches only activities newer than the last one seen,
+  with a few days of overlap for late uploads and edits;
+- once a day that re-read reaches back RECONCILE instead, for older edits.
+Every sync replaces the stored runs on the days it re-read in full, so activities
+deleted on Strava (or changed to another sport) disappear from the store too.
+Tokens are refreshed shortly before they expire and written back to the store, where
+the app picks them up.
+
+All athletes share one concurrency limit (--concurrency requests in flight) and one
+rate budget (--rate requests per 15 minutes, under Strava's per-app limit). A 429
+pauses everyone until the window resets. HTTP goes through requests on worker threads
+(asyncio.to_thread), so there's no extra dependency.
+
+For athletes in a coach's squad (the COACH_SQUADS secret), the daemon also builds the
+coach dashboard rows, after each of their syncs and whenever their saved settings (read
+from the app's STATE_DB_PATH) or the date change; the dashboard only reads them.
+
+Progress and lag go to the log and, with --metrics-port, to /metrics:
+- athletes, in-flight syncs, errors;
+- sync lag (seconds since each athlete's last completed sync);
+- requests used in the current window.
+
+    python sync_daemon.py                          # run forever
+    python sync_daemon.py --once                   # one pass over every athlete, then exit
+    python sync_daemon.py --import-tokens tokens.json   # migrate the old tracker.py athlete
+
+Credentials and paths are read from .streamlit/secrets.toml, as the app reads them:
+STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_BASE_URL, ACTIVITY_DB_PATH, STATE_DB_PATH,
+COACH_SQUADS.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import tomllib
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import requests
+
+import coach
+import metrics
+from activity_store import ActivityStore, is_run
+
+PER_PAGE = 200                # Strava's maximum
+OVERLAP = 3 * 86400           # re-read this much before the newest synced activity
+RECONCILE = 30 * 86400        # ...and this much on an athlete's first sync of the day
+RECONCILE_EVERY = 86400
+REFRESH_MARGIN = 300          # refresh tokens this many seconds before expiry
+WINDOW = 15 * 60              # Strava's short rate-limit window
+SUPERVISE_EVERY = 30          # seconds between checks for newly registered athletes
+
+
+class RateBudget:
+    """At most `limit` requests in any rolling WINDOW, plus a shared pause after a 429."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._sent = deque()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def used(self):
+        now = time.monotonic()
+        while self._sent and now - self._sent[0] > WINDOW:
+            self._sent.popleft()
+        return len(self._sent)
+
+    async def acquire(self):
+        async with self._lock:       # FIFO: waiters take slots in arrival order
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0 and self.used() < self.limit:
+                    self._sent.append(now)
+                    return
+                if wait <= 0:
+                    wait = self._sent[0] + WINDOW - now
+                await asyncio.sleep(max(wait, 0.01))
+
+    def pause(self):
+        """After a 429: wait for the next quarter-hour, when Strava's window resets."""
+        now = time.time()
+        self._paused_until = time.monotonic() + (WINDOW - now % WINDOW) + 1
+
+
+def reread_since(after):
+    """First local date whose runs all start after `after` (UTC epoch seconds) in any time
+    zone, so a fetch with that `after` returned every run on it and the days after."""
+    return (datetime.fromtimestamp(after, timezone.utc).date() + timedelta(days=2)).isoformat()
+
+
+class SyncDaemon:
+    def __init__(self, store, client_id, client_secret, base_url="https://www.strava.com",
+                 interval=600, concurrency=8, rate=90, backfill_days=0, settings=None, squads=None,
+                 summary_workers=1):
+        self.store = store
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url
+        self.interval = interval
+        self.backfill_days = backfill_days
+        self.budget = RateBudget(rate)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = {}              # athlete id → its loop task
+        self._reconciled = {}         # athlete id → time of the last RECONCILE-deep sync
+        self.in_flight = 0
+        self.errors = 0
+        # coach rows: settings is a coach.SavedSettings, squads the COACH_SQUADS table
+        self.settings = settings
+        self.squad_ids = {int(a) for squad in (squads or {}).values() for a in squad}
+        self.summaries = coach.SummaryCache(store)
+        self.summary_workers = summary_workers
+        self._summarizing = asyncio.Lock()
+
+    # ── http ──
+    async def _call(self, method, path, **kwargs):
+        """One Strava request within the concurrency and rate budget; returns parsed JSON."""
+        async with self._slots:
+            await self.budget.acquire()
+            r = await asyncio.to_thread(requests.request, method, self.base_url + path, timeout=30, **kwargs)
+        if r.status_code == 429:
+            self.budget.pause()
+            raise RuntimeError("rate limited")
+        r.raise_for_status()
+        return r.json()
+
+    async def _token(self, athlete_id):
+        tok = self.store.tokens(athlete_id)
+        if tok is None:
+            return None
+        if (tok["expires_at"] or 0) - REFRESH_MARGIN > time.time():
+            return tok["access_token"]
+        data = await self._call("POST", "/oauth/token", json=dict(
+            client_id=self.client_id, client_secret=self.client_secret,
+            refresh_token=tok["refresh_token"], grant_type="refresh_token"))
+        self.store.register(athlete_id, data["access_token"], data.get("refresh_token", tok["refresh_token"]),
+                            data["expires_at"])
+        return data["access_token"]
+
+    # ── sync ──
+    async def sync(self, athlete_id):
+        """Fetch what's new for one athlete and store it. Returns (runs saved, runs deleted),
+        or None if the athlete is gone."""
+        info = self.store.sync_info(athlete_id)
+        backfill = not (info and info["backfilled"])
+        started = time.time()
+        deep = backfill or started - self._reconciled.get(athlete_id, 0) >= RECONCILE_EVERY
+        if backfill:
+            after = int(started - self.backfill_days * 86400) if self.backfill_days else 0
+        else:
+            after = int(max(0, (info["newest"] or 0) - (RECONCILE if deep else OVERLAP)))
+        token = await self._token(athlete_id)
+        if token is None:
+            return None
+        acts, page = [], 1
+        while True:
+            batch = await self._call("GET", "/api/v3/athlete/activities",
+                                     params=dict(per_page=PER_PAGE, after=after, page=page),
+                                     headers={"Authorization": f"Bearer {token}"})
+            if not isinstance(batch, list) or not batch:
+                break
+            acts.extend(a for a in batch if is_run(a))
+            if len(batch) < PER_PAGE:
+                break
+            page += 1
+        result = await asyncio.to_thread(self.store.save_runs, athlete_id, acts, started, backfill,
+                                         reread_since(after))
+        if deep:
+            self._reconciled[athlete_id] = started
+        return result
+
+    # ── coach rows ──
+    def build_summaries(self, today=None):
+        """Rebuild stale coach rows for synced squad athletes; returns how many were built."""
+        if self.settings is None or not self.squad_ids:
+            return 0
+        today = today or date.today()
+        synced = {a["athlete_id"]: a["synced"] for a in self.store.athletes()
+                  if a["athlete_id"] in self.squad_ids and a["synced"] is not None}
+        changed = self.settings.changed()
+        entries = [(aid, [synced[aid], changed.get(aid), today.isoformat()]) for aid in sorted(synced)]
+        return self.summaries.refresh(
+            entries, lambda aid: coach.make_job(aid, self.settings.read(aid), self.store, today),
+            self.summary_workers)
+
+    async def refresh_summaries(self):
+        async with self._summarizing:               # one build at a time
+            try:
+                return await asyncio.to_thread(self.build_summaries)
+            except Exception as e:
+                self.errors += 1
+                print(f"[sync] coach rows: {e}")
+                return 0
+
+    async def athlete_loop(self, athlete_id):
+        # spread first syncs out so a restart doesn't send every athlete at once
+        await asyncio.sleep(random.uniform(0, min(self.interval, 60)))
+        while True:
+            info = self.store.sync_info(athlete_id)
+            lag = time.time() - info["synced"] if info else None
+            t = time.perf_counter()
+            self.in_flight += 1
+            try:
+                result = await self.sync(athlete_id)
+            except Exception as e:                  # network, auth, 429: retry next interval
+                self.errors += 1
+                self.store.mark_error(athlete_id, str(e)[:200])
+                print(f"[sync] athlete {athlete_id}: {e}")
+            else:
+                if result is None:
+                    return                          # unregistered (disconnected)
+                secs = time.perf_counter() - t
+                metrics.REGISTRY.observe("sync.ms.athlete", secs * 1000)
+                print(f"[sync] athlete {athlete_id}: {result[0]} runs, {result[1]} deleted in {secs:.1f}s"
+                      + (f", lag was {lag:.0f}s" if lag is not None else " (backfill)"))
+                if athlete_id in self.squad_ids:
+                    await self.refresh_summaries()
+            finally:
+                self.in_flight -= 1
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    async def supervise(self):
+        """Start a loop for every registered athlete; stop loops for ones who left."""
+        while True:
+            ids = {a["athlete_id"] for a in self.store.athletes()}
+            for aid in ids - self._tasks.keys():
+                self._tasks[aid] = asyncio.create_task(self.athlete_loop(aid))
+            for aid in list(self._tasks):
+                if aid not in ids or self._tasks[aid].done():
+                    self._tasks.pop(aid).cancel()
+            await self.refresh_summaries()          # settings changes and the date rolling over
+            await asyncio.sleep(SUPERVISE_EVERY)
+
+    async def run_once(self):
+        athletes = self.store.athletes()
+        results = await asyncio.gather(*(self.sync(a["athlete_id"]) for a in athletes), return_exceptions=True)
+        for a, r in zip(athletes, results):
+            if isinstance(r, Exception):
+                self.errors += 1
+                self.store.mark_error(a["athlete_id"], str(r)[:200])
+            print(f"[sync] athlete {a['athlete_id']}: "
+                  f"{r if isinstance(r, Exception) else f'{r[0]} runs, {r[1]} deleted' if r else 'gone'}")
+        built = await self.refresh_summaries()
+        if built:
+            print(f"[sync] {built} coach rows built")
+        return results
+
+    # ── reporting ──
+    def lag(self):
+        """{athlete id: seconds since last completed sync} (None = never synced)."""
+        now = time.time()
+        return {a["athlete_id"]: (now - a["synced"]) if a["synced"] else None for a in self.store.athletes()}
+
+    def register_gauges(self, registry=None):
+        registry = registry or metrics.REGISTRY
+        def lag_stats():
+            lags = sorted(v for v in self.lag().values() if v is not None)
+            if not lags:
+                return {}
+            return dict(p50=lags[len(lags) // 2], p95=lags[min(len(lags) - 1, len(lags) * 95 // 100)], max=lags[-1])
+        registry.gauge("sync_athletes", lambda: len(self.store.athletes()))
+        registry.gauge("sync_never_synced", lambda: sum(v is None for v in self.lag().values()))
+        registry.gauge("sync_in_flight", lambda: self.in_flight)
+        registry.gauge("sync_errors_total", lambda: self.errors)
+        registry.gauge("sync_requests_in_window", self.budget.used)
+        registry.gauge("sync_lag_seconds", lag_stats)
+        registry.gauge("sync_coach_rows_built_total", lambda: self.summaries.built)
+
+
+def load_secrets(path):
+    p = Path(path)
+    return tomllib.loads(p.read_text()) if p.exists() else {}
+
+
+def import_tokens(store, path, base_url):
+    """Register the single athlete from a tokens.json as the old tracker.py kept it."""
+    tokens = json.loads(Path(path).read_text())
+    athlete = tokens.get("athlete") or requests.get(f"{base_url}/api/v3/athlete", timeout=30, headers={
+        "Authorization": f"Bearer {tokens['access_token']}"}).json()
+    store.register(athlete["id"], tokens["access_token"], tokens["refresh_token"], tokens["expires_at"])
+    return athlete["id"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--secrets", default=".streamlit/secrets.toml")
+    ap.add_argument("--db", help="activity store path (default: ACTIVITY_DB_PATH or activities.db)")
+    ap.add_argument("--interval", type=float, default=600, help="seconds between an athlete's syncs")
+    ap.add_argument("--concurrency", type=int, default=8, help="Strava requests in flight at once")
+    ap.add_argument("--rate", type=int, default=90, help="requests per 15 minutes, across all athletes")
+    ap.add_argument("--backfill-days", type=int, default=0, help="history to fetch on first sync (0 = all)")
+    ap.add_argument("--state-db", help="the app's state database, for coach rows "
+                                       "(default: STATE_DB_PATH or planner_state.db)")
+    ap.add_argument("--summary-workers", type=int, default=os.cpu_count() or 1,
+                    help="processes for building coach rows (1 = no pool)")
+    ap.add_argument("--metrics-port", type=int, help="serve /metrics on this port")
+    ap.add_argument("--once", action="store_true", help="sync every athlete once and exit")
+    ap.add_argument("--import-tokens", metavar="TOKENS_JSON", help="register a tokens.json athlete first")
+    args = ap.parse_args(argv)
+
+    conf = load_secrets(args.secrets)
+    base_url = conf.get("STRAVA_BASE_URL", "https://www.strava.com")
+    store = ActivityStore(args.db or conf.get("ACTIVITY_DB_PATH", "activities.db"))
+    if args.import_tokens:
+        print(f"registered athlete {import_tokens(store, args.import_tokens, base_url)}")
+
+    async def run():
+        daemon = SyncDaemon(store, conf.get("STRAVA_CLIENT_ID"), conf.get("STRAVA_CLIENT_SECRET"), base_url,
+                            interval=args.interval, concurrency=args.concurrency, rate=args.rate,
+                            backfill_days=args.backfill_days,
+                            settings=coach.SavedSettings(args.state_db or conf.get("STATE_DB_PATH", "planner_state.db")),
+                            squads=conf.get("COACH_SQUADS"), summary_workers=args.summary_workers)
+        if args.once:
+            results = await daemon.run_once()
+            return 1 if any(isinstance(r, Exception) for r in results) else 0
+        daemon.register_gauges()
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+        await daemon.supervise()
+
+    try:
+        return asyncio.run(run())
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
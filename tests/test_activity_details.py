@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from activity_details import RETRY_MAX, RETRY_MIN, WINDOW, DetailFetcher, RateLimited
+from activity_store import ActivityStore
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+class Strava:
+    """fetch() stand-in: records calls; ids in `fail` raise, ids in `limited` 429 once."""
+
+    def __init__(self, fail=(), limited=()):
+        self.calls, self.fail, self.limited = [], set(fail), set(limited)
+
+    def __call__(self, kind, aid, day, token):
+        self.calls.append((kind, aid, token))
+        if aid in self.limited:
+            self.limited.discard(aid)
+            raise RateLimited()
+        if aid in self.fail:
+            raise ConnectionError("offline")
+        return dict(date=day, kind=kind, aid=aid)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ActivityStore(str(tmp_path / "activities.db"))
+
+
+def fetcher(store, strava, **kw):
+    return DetailFetcher(store, strava, threads=0, clock=kw.pop("clock", Clock()), **kw)
+
+
+def test_fetches_newest_first_laps_ahead_of_streams_and_stores_them(store):
+    strava = Strava()
+    f = fetcher(store, strava)
+    assert f.request(1, "streams", [("2026-05-01", 11), ("2026-05-03", 13), ("2026-05-02", 12)], "tok") == 3
+    assert f.request(1, "laps", [("2026-04-01", 21)], "tok") == 1
+    assert f.run_pending() == 4
+    assert [c[1] for c in strava.calls] == [21, 13, 12, 11]
+    assert f.index(1, "streams")[13] == dict(date="2026-05-03", kind="streams", aid=13)
+    # Fetched once: neither this process nor a restarted one asks again
+    assert f.request(1, "streams", [("2026-05-03", 13)], "tok") == 0
+    again = fetcher(store, strava)
+    assert set(again.index(1, "streams")) == {11, 12, 13} and again.index(2, "streams") == {}
+    assert again.request(1, "streams", [("2026-05-03", 13)], "tok") == 0
+
+
+def test_index_is_replaced_not_mutated(store):
+    f = fetcher(store, Strava())
+    before = f.index(1, "streams")
+    f.request(1, "streams", [("2026-05-01", 11)], "tok")
+    f.run_pending()
+    assert dict(before) == {} and 11 in f.index(1, "streams")
+
+
+def test_failures_back_off_instead_of_retrying_every_rerun(store):
+    clock, strava = Clock(), Strava(fail={11})
+    f = fetcher(store, strava, clock=clock)
+    f.request(1, "streams", [("2026-05-01", 11)], "tok")
+    f.run_pending()
+    for _ in range(5):                  # reruns while it backs off
+        assert f.request(1, "streams", [("2026-05-01", 11)], "tok") == 0
+        f.run_pending()
+    assert len(strava.calls) == 1 and f.failures == 1
+    assert f.backing_off(1, "streams") == {11: RETRY_MIN}
+    clock.t += RETRY_MIN + 1
+    assert f.request(1, "streams", [("2026-05-01", 11)], "tok") == 1
+    f.run_pending()
+    assert f.backing_off(1, "streams") == {11: 2 * RETRY_MIN}
+    for _ in range(20):
+        clock.t += RETRY_MAX + 1
+        f.request(1, "streams", [("2026-05-01", 11)], "tok")
+        f.run_pending()
+    assert f.backing_off(1, "streams") == {11: RETRY_MAX}
+    strava.fail.clear()
+    clock.t += RETRY_MAX + 1
+    f.request(1, "streams", [("2026-05-01", 11)], "new-tok")
+    f.run_pending()
+    assert 11 in f.index(1, "streams") and f.backing_off(1, "streams") == {}
+    assert strava.calls[-1] == ("streams", 11, "new-tok")
+
+
+def test_rate_budget_and_429_pause(store):
+    clock, strava = Clock(), Strava(limited={3})
+    f = fetcher(store, strava, clock=clock, rate=2)
+    f.request(1, "streams", [(f"2026-05-0{i}", i) for i in range(1, 6)], "tok")
+    assert f.run_pending() == 2                 # budget spent
+    clock.t += WINDOW + 1
+    assert f.run_pending() == 1                 # id 3: 429, pauses everything and stays queued
+    assert f.run_pending() == 0 and 3 not in f.index(1, "streams")
+    assert f.backing_off(1, "streams") == {}
+    clock.t += WINDOW + 2
+    assert f.run_pending() == 2 and f.run_pending() == 0
+    clock.t += WINDOW + 1
+    assert f.run_pending() == 1
+    assert set(f.index(1, "streams")) == {1, 2, 3, 4, 5}
+
+
+def test_forget_drops_an_athlete(store):
+    f = fetcher(store, Strava(fail={12}))
+    f.request(1, "laps", [("2026-05-01", 11), ("2026-05-02", 12)], "tok")
+    f.run_pending()
+    f.request(1, "laps", [("2026-05-03", 13)], "tok")
+    store.unregister(1)
+    f.forget(1)
+    assert f.run_pending() == 0
+    assert f.index(1, "laps") == {} and f.backing_off(1, "laps") == {}
+
+
+def test_workers_and_wait(store):
+    release = threading.Event()
+
+    def slow(kind, aid, day, token):
+        release.wait(5)
+        return [dict(distance=1609.34, moving_time=400)]
+
+    f = DetailFetcher(store, slow, threads=2)
+    f.request(1, "laps", [("2026-05-01", 11), ("2026-05-02", 12)], "tok")
+    assert not f.wait(1, "laps", [11, 12], 0.05)
+    release.set()
+    assert f.wait(1, "laps", [11, 12], 5)
+    assert set(f.index(1, "laps")) == {11, 12}
+    assert f.wait(1, "laps", [99], 0)         # nothing queued for it
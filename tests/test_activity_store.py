@@ -0,0 +1,112 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import sync_daemon
+from activity_store import ActivityStore
+from bench.fake_strava import FakeStrava
+from sync_daemon import SyncDaemon, reread_since
+
+
+def act(aid, day, miles=5.0, sport="Run", hour=7):
+    return dict(id=aid, name=f"Run {aid}", type=sport, sport_type=sport, distance=miles * 1609.34,
+                moving_time=int(miles * 480), start_date_local=f"{day}T{hour:02d}:00:00Z",
+                average_heartrate=150, total_elevation_gain=10)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ActivityStore(str(tmp_path / "activities.db"))
+
+
+def test_tokens(store):
+    assert store.tokens(1) is None
+    store.register(1, "a1", "r1", 100)
+    store.register(1, "a0", "r0", 50)                   # an older refresh doesn't win
+    assert store.tokens(1) == dict(access_token="a1", refresh_token="r1", expires_at=100)
+    store.register(1, "a2", "r2", 200)
+    assert store.tokens(1)["access_token"] == "a2"
+    assert [a["athlete_id"] for a in store.athletes()] == [1] and store.sync_info(1) is None
+
+
+def test_save_and_read_runs(store):
+    store.register(1, "a", "r", 100)
+    acts = [act(11, "2026-05-04", 6), act(12, "2026-05-04", 3, hour=18), act(13, "2026-05-06"),
+            act(14, "2026-05-06", sport="Ride"), dict(act(15, "2026-05-07"), distance=0)]
+    assert store.save_runs(1, acts, 1000.0) == (3, 0)
+    runs = store.runs_by_date(1)
+    assert list(runs) == ["2026-05-04", "2026-05-06"]
+    assert [r["id"] for r in runs["2026-05-04"]] == [11, 12] and runs["2026-05-04"][0]["miles"] == pytest.approx(6)
+    assert list(store.runs_by_date(1, since="2026-05-05")) == ["2026-05-06"]
+    info = store.sync_info(1)
+    assert info["synced"] == 1000.0 and not info["backfilled"] and info["newest"] > 0
+    store.save_runs(1, [act(11, "2026-05-04", 6.5)], 1100.0, backfilled=True)   # an edit upserts
+    assert store.runs_by_date(1)["2026-05-04"][0]["miles"] == pytest.approx(6.5)
+    assert store.sync_info(1)["backfilled"] and store.sync_info(1)["newest"] == info["newest"]
+
+
+def test_reread_days_drop_deleted_runs(store):
+    store.register(1, "a", "r", 100)
+    store.save_runs(1, [act(11, "2026-05-01"), act(12, "2026-05-04"), act(13, "2026-05-05")], 1000.0)
+    store.save_detail(1, 12, "laps", [1, 2])
+    # 12 was deleted and 13 turned into a ride; 11 is before the re-read days, so it stays
+    assert store.save_runs(1, [act(14, "2026-05-06")], 1100.0, since="2026-05-03") == (1, 2)
+    assert {d: [r["id"] for r in rs] for d, rs in store.runs_by_date(1).items()} == {
+        "2026-05-01": [11], "2026-05-06": [14]}
+    assert store.details(1, "laps") == {}
+
+
+def test_details_and_unregister(store):
+    store.register(1, "a", "r", 100)
+    store.register(2, "a", "r", 100)
+    store.save_runs(1, [act(11, "2026-05-04")], 1000.0)
+    store.save_runs(2, [act(21, "2026-05-04")], 1000.0)
+    store.save_detail(1, 11, "laps", [dict(distance=1609.34, moving_time=420)])
+    store.save_detail(1, 11, "streams", dict(date="2026-05-04"))
+    store.save_detail(1, 11, "laps", [])                  # replaced, not duplicated
+    store.save_detail(2, 21, "laps", [1])
+    assert store.details(1, "laps") == {11: []} and store.details(1, "streams") == {11: dict(date="2026-05-04")}
+    store.unregister(1)
+    assert store.tokens(1) is None and store.runs_by_date(1) == {} and store.details(1, "laps") == {}
+    assert store.runs_by_date(2) and store.details(2, "laps") == {21: [1]}
+
+
+def test_reread_since_covers_every_time_zone():
+    after = int(datetime(2026, 5, 4, 23, 30, tzinfo=timezone.utc).timestamp())
+    assert reread_since(after) == "2026-05-06"
+    assert reread_since(0) == "1970-01-03"
+
+
+def run_ids(store):
+    return {r["id"] for rs in store.runs_by_date(7).values() for r in rs}
+
+
+def test_daemon_reconciles_deletes(tmp_path, monkeypatch):
+    fake = FakeStrava(history_days=40)
+    url = fake.start()
+    try:
+        store = ActivityStore(str(tmp_path / "activities.db"))
+        store.register(7, "tok-7", "refresh-7", time.time() + 3600)
+        daemon = SyncDaemon(store, "id", "secret", url)
+        saved, deleted = asyncio.run(daemon.sync(7))
+        acts = fake.activities(7)
+        assert saved == len(acts) and deleted == 0 and store.sync_info(7)["backfilled"]
+
+        gone = acts.pop(0)                              # the newest run, deleted on Strava
+        assert asyncio.run(daemon.sync(7))[1] == 1
+        assert gone["id"] not in run_ids(store)
+
+        # past the overlap, edits and deletions are only seen by the daily deep re-read
+        old = acts.pop(20)
+        acts[21]["distance"] *= 2
+        asyncio.run(daemon.sync(7))
+        assert old["id"] in run_ids(store)
+        monkeypatch.setattr(sync_daemon, "RECONCILE_EVERY", 0)
+        assert asyncio.run(daemon.sync(7))[1] == 1
+        assert old["id"] not in run_ids(store) and len(run_ids(store)) == len(acts)
+        edited = store.runs_by_date(7)[acts[21]["start_date_local"][:10]]
+        assert [r["miles"] for r in edited if r["id"] == acts[21]["id"]] == [pytest.approx(acts[21]["distance"] / 1609.34)]
+    finally:
+        fake.stop()
@@ -0,0 +1,67 @@
+import random
+from datetime import date, timedelta
+
+from adherence import PlanAdherence, week_grade
+from matching import PlanMatcher
+
+START, RACE = date(2026, 3, 2), "2026-04-26"
+
+
+def run(ds, miles, rid):
+    return dict(id=rid, name="Run", miles=miles, moving_time=miles * 480, pace=480,
+                start=f"{ds}T07:00:00")
+
+
+def cold(plan, runs, today):
+    matcher = PlanMatcher()
+    matcher.sync(plan, runs)
+    adh = PlanAdherence(START.isoformat(), RACE)
+    adh.sync(plan, runs, today, matcher)
+    return adh
+
+
+def same(a, b):
+    assert a.grades() == b.grades() and a.totals() == b.totals()
+    for w in range(a.n_weeks):
+        ws = START + timedelta(weeks=w)
+        assert a.week(ws) == b.week(ws)
+
+
+def test_week_grade():
+    assert week_grade(0, 5, 0, 0, 0) == (None, None)
+    assert week_grade(40, 40, 5, 5, 0)[0] == "A"
+    assert week_grade(40, 40, 5, 3, 2)[0] == "B"      # missed days cost a little
+    assert week_grade(40, 10, 5, 1, 4)[0] == "F"
+
+
+def test_incremental_matches_cold():
+    rng = random.Random(7)
+    days = [(START + timedelta(days=i)).isoformat() for i in range(56)]
+    plan = {ds: dict(t="easy", m=rng.choice([4, 5, 6, 8])) for ds in days if rng.random() < 0.75}
+    runs, rid = {}, 0
+    matcher, adh = PlanMatcher(), PlanAdherence(START.isoformat(), RACE)
+    for step in range(12):
+        today = START + timedelta(days=4 * step + 5)
+        for ds in rng.sample([d for d in days if d < today.isoformat()], 4):
+            rid += 1
+            runs = {**runs, ds: [*runs.get(ds, []), run(ds, rng.choice([3, 5, 6, 9]), rid)]}
+        a, b = rng.sample(days, 2)                  # a swap moves two plan entries
+        plan = dict(plan)
+        pa, pb = plan.pop(a, None), plan.pop(b, None)
+        if pa: plan[b] = pa
+        if pb: plan[a] = pb
+        matcher.sync(plan, runs)
+        adh.sync(plan, runs, today, matcher)
+        same(adh, cold(plan, runs, today))
+
+
+def test_sync_rewrites_only_touched_days():
+    plan = {"2026-03-02": dict(t="easy", m=5), "2026-03-04": dict(t="easy", m=6)}
+    runs = {"2026-03-02": [run("2026-03-02", 5, 1)]}
+    adh = PlanAdherence(START.isoformat(), RACE)
+    adh.sync(plan, runs, date(2026, 3, 10))
+    assert adh.totals() == (1, 1)
+    assert adh.sync(plan, runs, date(2026, 3, 10)) == 0
+    runs = {**runs, "2026-03-04": [run("2026-03-04", 6, 2)]}
+    assert adh.sync(plan, runs, date(2026, 3, 10)) == 1
+    assert adh.totals() == (2, 0) and adh.grades()[0][1] == "A"
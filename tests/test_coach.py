@@ -0,0 +1,129 @@
+import json
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import coach
+import state_codec
+from activity_store import ActivityStore
+from bench.synthetic import athlete_runs
+from coach import SavedSettings, SummaryCache, make_job, plan_sig, summarize
+from sync_daemon import SyncDaemon
+
+TODAY = date(2026, 5, 6)
+RACE = date(2026, 8, 30)          # a Sunday
+
+
+@pytest.mark.parametrize("settings, sig", [
+    ({}, None),
+    (dict(selected_plan="pfitz-18-55"), None),
+    (dict(selected_plan="nope", race_date=RACE), None),
+    (dict(selected_plan="pfitz-18-55", race_date=RACE), ("pfitz-18-55", "2026-08-30", 0, 3, 1)),
+    (dict(selected_plan="pfitz-18-55", race_date="2026-08-29", long_dow="Sat", quality_dow="Thu",
+          rest_dows=["Fri", "Mon"]), ("pfitz-18-55", "2026-08-29", 6, 4, 5)),
+    (dict(selected_plan="pfitz-12-55", race_date=RACE, rest_dows="Tue"), ("pfitz-12-55", "2026-08-30", 0, 3, 2)),
+    (dict(selected_plan="me-gale-70", race_date=RACE, long_dow="Sat"), ("me-gale-70", "2026-08-30", None, None, None)),
+])
+def test_plan_sig(settings, sig):
+    assert plan_sig(settings) == sig
+
+
+def job(**kw):
+    runs = athlete_runs(120, TODAY, seed=3)
+    return dict(dict(athlete_id=3, name="Sam", sig=("pfitz-18-55", RACE.isoformat(), 0, 3, 1),
+                     goal_time="3:15:00", swaps={}, runs=runs, today=TODAY.isoformat()), **kw)
+
+
+def test_summarize():
+    row = summarize(job())
+    assert row["athlete_id"] == 3 and row["plan"] == "Pfitz 18/55" and row["weeks"] == 18
+    plan_start = RACE - timedelta(weeks=18) + timedelta(days=1)
+    assert row["week"] == (TODAY - plan_start).days // 7 + 1
+    assert len(row["trend"]) == coach.TREND_WEEKS and row["mpw"] == round(sum(row["trend"][-5:-1]) / 4)
+    assert row["grade"] in {"A", "B", "C", "D", "F"} and row["completed"] + row["missed"] > 0
+    assert row["goal"] == 3 * 3600 + 15 * 60 and row["predicted"]["lo"] <= row["predicted"]["secs"] <= row["predicted"]["hi"]
+    json.dumps(row)                                   # stored as JSON
+    assert summarize(job(goal_time="soon", runs={}))["goal"] is None
+
+
+def test_summarize_sees_swaps():
+    base = summarize(job())
+    planned, _ = coach.build_plan(job()["sig"])
+    past = [ds for ds in sorted(planned) if ds < TODAY.isoformat()]
+    swapped = summarize(job(swaps={ds: None for ds in past}))
+    assert swapped["completed"] == swapped["missed"] == 0 and base["completed"] + base["missed"] > 0
+
+
+class Store:
+    """The summary half of ActivityStore, in memory."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def summary_keys(self):
+        return {aid: key for aid, (key, _) in self.rows.items()}
+
+    def save_summaries(self, rows):
+        self.rows.update({aid: (key, row) for aid, key, row in rows})
+
+
+def test_cache_rebuilds_only_stale_keys():
+    store, loads = Store(), []
+    cache = SummaryCache(store)
+
+    def load_job(aid):
+        loads.append(aid)
+        return None if aid == 9 else job(athlete_id=aid, runs={})
+
+    assert cache.refresh([(1, ["s1", "c1", "d1"]), (2, ["s1", "c1", "d1"]), (9, ["s", None, "d1"])], load_job) == 2
+    assert store.rows[9] == (json.dumps(["s", None, "d1"]), None)   # no plan: remembered, no row
+    loads.clear()
+    assert cache.refresh([(1, ["s1", "c1", "d1"]), (2, ["s2", "c1", "d1"]), (9, ["s", None, "d1"])], load_job) == 1
+    assert loads == [2]                               # only the athlete who synced again
+    assert cache.refresh([(1, ["s1", "c1", "d2"]), (2, ["s2", "c1", "d2"])], load_job) == 2   # new day
+    assert cache.built == 5 and store.rows[1][1]["athlete_id"] == 1
+
+
+def write_settings(path, athlete_id, settings):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS state (owner TEXT, key TEXT, value TEXT, updated REAL, "
+                 "PRIMARY KEY (owner, key))")
+    for i, (k, v) in enumerate(state_codec.to_rows(settings).items()):
+        conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)", (f"athlete:{athlete_id}", k, v, 100.0 + i))
+    conn.commit()
+    conn.close()
+
+
+def test_saved_settings(tmp_path):
+    path = str(tmp_path / "planner_state.db")
+    saved = SavedSettings(path)
+    assert saved.changed() == {} and saved.read(1) == {}           # before the app made its tables
+    settings = dict(selected_plan="pfitz-18-55", race_date=RACE, goal_time="3:15:00",
+                    swaps={"2026-05-04": None}, athlete=dict(firstname="Sam", lastname="Lee"))
+    write_settings(path, 5, settings)
+    assert saved.read(5) == settings and saved.changed() == {5: 104.0}
+
+
+def test_daemon_builds_rows_the_dashboard_reads(tmp_path):
+    store = ActivityStore(str(tmp_path / "activities.db"))
+    state = str(tmp_path / "planner_state.db")
+    for aid in (5, 6, 7):
+        store.register(aid, "a", "r", 100)
+    acts = [dict(id=aid * 100, type="Run", distance=8000, moving_time=2400, start_date_local="2026-05-04T07:00:00Z")
+            for aid in (5, 6, 7)]
+    for a, aid in zip(acts, (5, 6, 7)):
+        store.save_runs(aid, [a], 1000.0)
+    write_settings(state, 5, dict(selected_plan="pfitz-18-55", race_date=RACE, athlete=dict(firstname="Sam")))
+    write_settings(state, 6, dict(goal_time="3:00:00"))            # no plan yet
+    daemon = SyncDaemon(store, "id", "secret", settings=SavedSettings(state), squads={"1": [5, 6]})
+    assert daemon.build_summaries(TODAY) == 1 and daemon.build_summaries(TODAY) == 0
+    rows = store.summaries([5, 6, 7])
+    assert rows[5][0]["name"] == "Sam" and rows[6][0] is None and 7 not in rows
+    assert make_job(5, SavedSettings(state).read(5), store, TODAY)["runs"] == store.runs_by_date(5, "2026-01-01")
+
+    write_settings(state, 6, dict(selected_plan="me-gale-70", race_date=RACE))
+    assert daemon.build_summaries(TODAY) == 1 and store.summaries([6])[6][0]["plan"] == "ME Gale 70"
+    assert daemon.build_summaries(TODAY + timedelta(days=1)) == 2
+    store.unregister(5)
+    assert 5 not in store.summaries([5])
@@ -0,0 +1,59 @@
+import pytest
+
+from calendar_view import workout_segments
+from compliance import METERS_PER_MILE, lap_paces, parse_pace_range, score_reps, work_targets
+
+GPS = 480   # 8:00/mi marathon pace
+
+
+def lap(miles, pace):
+    return dict(distance=miles * METERS_PER_MILE, moving_time=round(miles * pace))
+
+
+@pytest.mark.parametrize("text, rng", [
+    ("7:40–8:15/mi", (460, 495)),
+    ("7:35/mi–7:45/mi", (455, 465)),         # fmt_range, as the tooltips write it
+    ("8:15 - 7:40/mi", (460, 495)),
+    ("7:40/mi", (460, 460)),
+    ("jog / walk", None),
+    (None, None),
+])
+def test_parse_pace_range(text, rng):
+    assert parse_pace_range(text) == rng
+
+
+def test_work_targets_skip_easy_rows():
+    assert work_targets(workout_segments("tempo", 10, GPS)) == [("Lactate threshold", (455, 465), 1)]
+    assert work_targets(workout_segments("vo2", 10, GPS)) == [("Intervals (6 × 1200m)", (410, 430), 6)]
+    assert work_targets([("Recovery jogs (5 × ~5:13)", "2.7 mi", "jog / walk", "")]) == []
+
+
+def test_lap_paces_drop_slivers():
+    assert lap_paces([lap(1, 480), dict(distance=40, moving_time=20), dict(distance=500, moving_time=0)]) == [
+        (pytest.approx(1.0), pytest.approx(480))]
+
+
+def test_intervals_scored_against_their_range():
+    segs = workout_segments("vo2", 10, GPS)
+    laps = [lap(1.8, 560)]                                     # warmup
+    for pace in (420, 418, 425, 400, 440, 421):                # one fast, one slow
+        laps += [lap(0.75, pace), lap(0.3, 700)]                # rep, recovery jog
+    laps.append(lap(1.0, 560))                                  # cooldown
+    result = score_reps(segs, laps)
+    assert [r[3] for r in result["reps"]] == ["on", "on", "on", "fast", "slow", "on"]
+    assert result["expected"] == 6 and result["on"] == 4
+    assert result["score"] == pytest.approx(4 / 6)
+
+
+def test_tempo_and_missing_reps():
+    segs = workout_segments("tempo", 10, GPS)
+    result = score_reps(segs, [lap(2, 560), lap(3, 460), lap(3, 462), lap(2, 560)])
+    assert result["on"] == 2 and result["score"] == 1.0       # a 6 mi tempo run as two laps
+    easy_day = score_reps(segs, [lap(5, 550)])
+    assert easy_day["reps"] == [] and easy_day["score"] == 0
+
+
+def test_nothing_to_score():
+    assert score_reps([("Session", "~10 mi", "—", "See book")], [lap(6, 540)]) is None
+    assert score_reps(workout_segments("tempo", 10, GPS), []) is None
+    assert score_reps(workout_segments("tempo", 10, GPS), None) is None
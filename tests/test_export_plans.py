@@ -0,0 +1,75 @@
+import csv
+
+import pytest
+
+import export_plans
+from export_plans import DOW_TO_INT, export, ics_escape, ics_fold, read_roster
+from plan_builder import build_planned_map
+
+ROSTER = """athlete,plan,race_date,goal_time,long_day,quality_day,rest_day
+Sam Lee,pfitz-18-55,2027-04-18,3:15:00,Sat,Thu,Fri
+Ana Ruiz,me-gale-70,2027-04-18,2:59:00,Sun,,
+Sam Lee,pfitz-18-55,2027-04-25,,,,
+"""
+
+
+def roster(tmp_path, text=ROSTER):
+    p = tmp_path / "roster.csv"
+    p.write_text(text)
+    return str(p)
+
+
+def test_read_roster(tmp_path):
+    sam, ana, sam2 = read_roster(roster(tmp_path))
+    assert [a["slug"] for a in (sam, ana, sam2)] == ["sam-lee", "ana-ruiz", "sam-lee-2"]
+    assert sam["key"] == ("pfitz-18-55", DOW_TO_INT["Sat"], DOW_TO_INT["Thu"], DOW_TO_INT["Fri"])
+    assert ana["key"] == ("me-gale-70", None, None, None)          # ME plans ignore the days
+    # defaults: long run on race day (a Sunday), quality Wed, rest Mon
+    assert sam2["key"] == ("pfitz-18-55", 0, 3, 1) and sam2["goal_time"] == "3:30:00"
+
+
+@pytest.mark.parametrize("row, err", [
+    ("X,nope,2027-04-18,3:00:00,,,", "line 2: unknown plan 'nope'"),
+    ("X,pfitz-18-55,2027-04-18,3:00:00,Funday,,", "line 2: unknown day 'Funday'"),
+    ("X,pfitz-18-55,someday,3:00:00,,,", "line 2"),
+])
+def test_bad_rows_are_named(tmp_path, row, err):
+    with pytest.raises(ValueError, match=err):
+        read_roster(roster(tmp_path, ROSTER.splitlines()[0] + "\n" + row + "\n"))
+
+
+def test_ics_fold_and_escape():
+    assert ics_escape("a,b;c\\d\ne") == "a\\,b\\;c\\\\d\\ne"
+    short = "SUMMARY:" + "x" * 60
+    assert ics_fold(short) == short
+    long = "DESCRIPTION:" + "é" * 80
+    folded = ics_fold(long)
+    lines = folded.split("\r\n")
+    assert all(len(l.encode()) <= 75 for l in lines) and all(l.startswith(" ") for l in lines[1:])
+    assert "".join(l[1:] if i else l for i, l in enumerate(lines)) == long
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_export_writes_every_planned_day(tmp_path, workers):
+    athletes = read_roster(roster(tmp_path))
+    out = tmp_path / "out"
+    results = list(export(athletes, str(out), workers))
+    assert [r[0] for r in results] == ["sam-lee", "ana-ruiz", "sam-lee-2"]
+    for a, (slug, n_days, miles) in zip(athletes, results):
+        planned, _ = build_planned_map(a["plan"], a["race_date"],
+                                       schedule=export_plans.build_templates([a])[a["key"]])
+        assert n_days == len(planned)
+        with open(out / f"{slug}.csv", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [r["date"] for r in rows] == sorted(planned)
+        assert sum(float(r["miles"]) for r in rows) == pytest.approx(miles)
+        ics = (out / f"{slug}.ics").read_text()
+        assert ics.count("BEGIN:VEVENT") == n_days and ics.rstrip().endswith("END:VCALENDAR")
+        assert f"DTSTART;VALUE=DATE:{a['race_date'].replace('-', '')}" in ics
+
+
+def test_main(tmp_path, capsys):
+    out = tmp_path / "out"
+    assert export_plans.main([roster(tmp_path), "--out", str(out), "--workers", "1", "-q"]) == 0
+    assert "exported 3 athletes" in capsys.readouterr().out
+    assert export_plans.main([str(tmp_path / "missing.csv")]) == 2
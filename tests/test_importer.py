@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from importer import main, read_log
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_PLAN = os.path.join(ROOT, "run_plan.csv")
+HEADER = "Pfitz 18/55,Days Out,Date,Day,Plan,Actual,Dist (mi),Total Time,Avg Pace,Seg Time,Seg Dist (mi),Seg Pace\n"
+
+
+def write(tmp_path, body, header=HEADER):
+    path = tmp_path / "log.csv"
+    path.write_text(header + body)
+    return str(path)
+
+
+def test_run_plan():
+    log = read_log(RUN_PLAN, race_date="2025-04-13")
+    assert log["name"] == "Pfitz 18/55"
+    assert log["days"] == 126 and log["unparsed"] == [] and log["actual"] == {}
+    assert min(log["planned"]) == "2024-12-10" and max(log["planned"]) == "2025-04-13"
+    assert log["planned"]["2024-12-10"] == dict(t="easy", m=7.0, note="GA 7 w/ 10x100m strides")
+    assert log["planned"]["2024-12-15"] == dict(t="long", m=12.0, note="MLR 12")
+    assert log["planned"]["2025-04-13"]["t"] == "race" and log["planned"]["2025-04-13"]["m"] == 26.2
+    assert "2024-12-09" not in log["planned"]            # Rest
+    # Days written twice keep the row with a distance
+    assert log["planned"]["2025-02-12"] == dict(t="vo2", m=8.0, note="V8 w/ 5 x 800 @ 5K pace")
+    # The d-Mon Date column, rolling into the new year, gives the same days
+    assert read_log(RUN_PLAN, year=2024)["planned"] == log["planned"]
+
+
+def test_logged_runs(tmp_path):
+    path = write(tmp_path, "Week 1,2,30-Dec,M,LT 10 w/ 5 @ 15K to HMP,Threshold,10.2,1:15:30,,0:35:10,5,\n"
+                           ",1,31-Dec,T,Rec 4,,4,,9:30,,,\n"
+                           ",0,1-Jan,W,Marathon,Race!,26.4,3:10:00,,,,\n")
+    log = read_log(path, year=2025)
+    assert sorted(log["planned"]) == ["2025-12-30", "2025-12-31", "2026-01-01"]
+    assert log["planned"]["2025-12-30"] == dict(t="tempo", m=10.0, note="LT 10 w/ 5 @ 15K to HMP")
+    assert log["planned"]["2026-01-01"]["t"] == "race"
+    (lt,), (rec,), (race,) = (log["actual"][ds] for ds in sorted(log["actual"]))
+    assert lt["name"] == "Threshold" and lt["miles"] == 10.2 and lt["moving_time"] == 4530
+    assert lt["pace"] == pytest.approx(4530 / 10.2)
+    assert lt["segment"] == dict(miles=5.0, moving_time=2110)
+    assert rec["name"] == "Rec 4" and rec["pace"] == 570 and rec["moving_time"] == 0
+    assert race["start"] == "2026-01-01T00:00:00" and race["moving_time"] == 11400
+    # Days Out counted back from a race date wins over the Date column
+    assert min(read_log(path, race_date="2026-04-01")["planned"]) == "2026-03-30"
+
+
+def test_rows_missing_their_week_cell_are_realigned(tmp_path):
+    path = write(tmp_path, "Week 1,2,9-Dec,M,GA 7,,7.1,,,,,\n"
+                           "1,10-Dec,T,Rest or cross-training,,,,,,,\n")
+    log = read_log(path, year=2024)
+    assert log["planned"] == {"2024-12-09": dict(t="easy", m=7.0, note="GA 7")}
+    assert log["actual"]["2024-12-09"][0]["miles"] == 7.1
+
+
+def test_unparsed_plan_text_is_kept_as_easy(tmp_path):
+    path = write(tmp_path, ",1,9-Dec,M,Bike 60 min,,,,,,,\n,0,10-Dec,T,Rest,,,,,,,\n")
+    log = read_log(path, year=2024)
+    assert log["unparsed"] == ["Bike 60 min"]
+    assert log["planned"]["2024-12-09"] == dict(t="easy", m=0, note="Bike 60 min")
+
+
+@pytest.mark.parametrize("header", ["Name,Date,Dist (mi)\n", ""])
+def test_bad_logs(tmp_path, header):
+    path = write(tmp_path, "", header=header)
+    with pytest.raises(ValueError):
+        read_log(path)
+
+
+def test_cli(tmp_path, capsys):
+    out = tmp_path / "imported.json"
+    assert main([RUN_PLAN, "--race-date", "2025-04-13", "--json", str(out)]) == 0
+    assert "126 days" in capsys.readouterr().out and out.exists()
+    assert main([str(tmp_path / "missing.csv")]) == 2
@@ -0,0 +1,110 @@
+import random
+from datetime import date, timedelta
+
+from matching import PlanMatcher, combine_runs, dedupe, slots
+
+
+def run(ds, miles, hour=7, rid=None, minute=0):
+    return dict(id=rid, name="Run", miles=miles, moving_time=miles * 480, pace=480,
+                start=f"{ds}T{hour:02d}:{minute:02d}:00")
+
+
+def test_run_on_its_day():
+    m = PlanMatcher()
+    m.sync({"2026-05-04": dict(t="easy", m=6)}, {"2026-05-04": [run("2026-05-04", 6.2)]})
+    assert [r["miles"] for r in m.matched("2026-05-04")] == [6.2]
+    assert m.unmatched("2026-05-04") == [] and m.shift("2026-05-04") == 0
+
+
+def test_swapped_long_run_and_easy_day():
+    plan = {"2026-05-09": dict(t="long", m=18), "2026-05-10": dict(t="easy", m=5)}
+    runs = {"2026-05-09": [run("2026-05-09", 5)], "2026-05-10": [run("2026-05-10", 18)]}
+    m = PlanMatcher()
+    m.sync(plan, runs)
+    assert [r["miles"] for r in m.matched("2026-05-09")] == [18]
+    assert [r["miles"] for r in m.matched("2026-05-10")] == [5]
+    assert m.shift("2026-05-09") == 1 and m.shift("2026-05-10") == -1
+
+
+def test_poor_fit_is_not_shifted():
+    m = PlanMatcher()
+    m.sync({"2026-05-09": dict(t="long", m=18)}, {"2026-05-10": [run("2026-05-10", 5)]})
+    assert m.matched("2026-05-09") == []
+    assert len(m.unmatched("2026-05-10")) == 1
+
+
+def test_double_takes_two_runs():
+    entry = dict(t="easy", m=10, note="AM: 6 PM: 4")
+    assert slots(entry) == 2 and slots(dict(t="easy", m=10)) == 1
+    m = PlanMatcher()
+    m.sync({"2026-05-04": entry}, {"2026-05-04": [run("2026-05-04", 6, 6), run("2026-05-04", 4, 18)]})
+    got = m.matched("2026-05-04")
+    assert len(got) == 2
+    both = combine_runs(got)
+    assert both["miles"] == 10 and both["moving_time"] == 4800 and both["name"] == "Run + Run"
+
+
+def test_dedupe_keeps_the_longest_upload():
+    ds = "2026-05-04"
+    watch, phone, later = run(ds, 8.1, rid=1), run(ds, 7.9, rid=2, minute=3), run(ds, 4, hour=18, rid=3)
+    assert [r["id"] for r in dedupe([phone, later, watch])] == [1, 3]
+    # Without start times, near-identical distance and time mean the same run
+    a, b = dict(miles=8.0, moving_time=3840), dict(miles=8.05, moving_time=3850)
+    assert dedupe([a, b]) == [b]
+
+
+def test_double_turned_single_releases_surplus_runs():
+    # Runs either side of a double; the plan changes to a single both are poor fits for
+    runs = {"2026-05-03": [run("2026-05-03", 5)], "2026-05-05": [run("2026-05-05", 5)]}
+    m = PlanMatcher()
+    m.sync({"2026-05-04": dict(t="easy", m=10, note="AM: 5 PM: 5")}, runs)
+    assert len(m.matched("2026-05-04")) == 2
+    m.sync({"2026-05-04": dict(t="easy", m=10)}, runs)
+    assert m.matched("2026-05-04") == []
+    assert len(m.unmatched("2026-05-03")) == 1 and len(m.unmatched("2026-05-05")) == 1
+    # And straight through _rematch, with a window that doesn't reach the runs
+    m = PlanMatcher()
+    m.sync({"2026-05-04": dict(t="easy", m=10, note="AM: 5 PM: 5")}, runs)
+    p = date(2026, 5, 4).toordinal()
+    m._plan[p] = dict(t="easy", m=10)
+    m._rematch(p, p)
+    assert all(len(got) <= slots(m._plan[q]) for q, got in m.assigned.items())
+
+
+def season(seed, days=84):
+    rng = random.Random(seed)
+    first = date(2026, 1, 5)
+    plan, runs = {}, {}
+    for i in range(days):
+        ds = (first + timedelta(days=i)).isoformat()
+        if rng.random() < 0.85:
+            double = rng.random() < 0.1
+            plan[ds] = dict(t="easy", m=rng.choice([5, 6, 8, 10, 12, 16, 18]),
+                            note="AM: x PM: y" if double else "")
+        if rng.random() < 0.8:
+            runs[ds] = [run(ds, round(rng.uniform(3, 18), 1), h, rid=i * 10 + h)
+                        for h in ((6, 18) if rng.random() < 0.15 else (7,))]
+    return plan, runs
+
+
+def test_incremental_sync_matches_a_fresh_match():
+    plan, runs = season(3)
+    m = PlanMatcher()
+    m.sync(plan, runs)
+    rng = random.Random(4)
+    for k in range(30):
+        ds = rng.choice(sorted(plan))
+        plan, runs = dict(plan), dict(runs)
+        if rng.random() < 0.5:
+            plan[ds] = dict(plan[ds], m=rng.choice([4, 8, 20]))
+        else:
+            runs[ds] = runs.get(ds, []) + [run(ds, round(rng.uniform(3, 18), 1), 20, rid=-(k + 1))]
+        m.sync(plan, runs)
+        # Every run has at most one session, and no session holds more than it takes
+        owners = [key for got in m.assigned.values() for key in got]
+        assert len(owners) == len(set(owners))
+        assert all(len(got) <= slots(m._plan[p]) for p, got in m.assigned.items())
+    fresh = PlanMatcher()
+    fresh.sync(plan, runs)
+    assert m.sync(plan, runs) == 0
+    assert {p: sorted(got) for p, got in m.assigned.items()} == {p: sorted(got) for p, got in fresh.assigned.items()}
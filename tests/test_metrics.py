@@ -0,0 +1,82 @@
+import threading
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import Registry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    r = Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", r)
+    return r
+
+
+def test_snapshot_percentiles_over_the_window():
+    r = Registry(window=10)
+    for v in range(100):
+        r.observe("x", v)
+    assert r.snapshot() == {"x": dict(n=10, max=99, p50=95, p95=99)}
+
+
+def test_nested_phases_and_payloads(registry):
+    with metrics.rerun("full") as timer:
+        with metrics.phase("plan"):
+            with metrics.phase("build"):
+                pass
+        metrics.payload("calendar", "<p>é</p>")
+        metrics.payload("calendar", "<p></p>")
+        with metrics.rerun("fragment") as inner:         # nested run is the same run
+            assert inner is timer
+    assert [name for name, _ in timer.phases] == ["plan/build", "plan"]
+    assert timer.payload_bytes == {"calendar": 16}
+    snap = registry.snapshot()
+    assert {"full.ms.plan", "full.ms.plan/build", "full.ms.total", "full.bytes.calendar"} <= set(snap)
+    assert snap["full.bytes.calendar"]["max"] == 16 and registry.runs == 1
+    assert metrics.current() is None
+
+
+def test_outside_a_run_is_a_no_op(registry):
+    with metrics.phase("orphan"):
+        pass
+    assert metrics.payload("x", "<b>") == "<b>" and registry.snapshot() == {}
+
+
+def test_timed_is_its_own_run_or_a_phase(registry):
+    @metrics.timed("calendar")
+    def render():
+        return metrics.current().kind
+
+    assert render() == "calendar"
+    with metrics.rerun("full"):
+        assert render() == "full"
+    assert {"calendar.ms.calendar", "full.ms.calendar"} <= set(registry.snapshot())
+
+
+def test_timers_are_per_thread(registry):
+    seen = []
+    with metrics.rerun("full"):
+        t = threading.Thread(target=lambda: seen.append(metrics.current()))
+        t.start(); t.join()
+    assert seen == [None]
+
+
+def test_prometheus_and_serve():
+    r = Registry()
+    r.observe("full.ms.plan/build", 12.5)
+    r.gauge("sessions", lambda: 3)
+    r.gauge("rss", lambda: {"b": 2, "a": 1})
+    text = r.prometheus()
+    assert 'planner_full_ms_plan_build{quantile="0.5"} 12.500' in text
+    assert "planner_full_ms_plan_build_count 1" in text and "planner_sessions 3" in text
+    assert text.index('planner_rss{key="a"} 1') < text.index('planner_rss{key="b"} 2')
+    server = metrics.serve(0, r)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        assert urllib.request.urlopen(url + "/metrics").read().decode() == r.prometheus()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other")
+    finally:
+        server.shutdown()
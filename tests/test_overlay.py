@@ -0,0 +1,63 @@
+import pytest
+
+from overlay import HISTORY, PlanOverlay, SwapHistory
+
+BASE = {"2026-05-04": dict(t="easy", m=5), "2026-05-05": dict(t="tempo", m=8),
+        "2026-05-07": dict(t="easy", m=6)}
+
+
+def applied(base, swaps):
+    """What apply_swaps used to build: a copy with the swaps written over it."""
+    out = dict(base)
+    for ds, run in swaps.items():
+        if run is None:
+            out.pop(ds, None)
+        else:
+            out[ds] = run
+    return out
+
+
+def test_overlay_reads_like_the_copy():
+    swaps = {"2026-05-04": BASE["2026-05-05"], "2026-05-05": None,
+             "2026-05-06": BASE["2026-05-04"], "2026-05-08": None}
+    ov = PlanOverlay(BASE, swaps)
+    want = applied(BASE, swaps)
+    assert list(ov) == list(want) and len(ov) == 3 and dict(ov) == want
+    assert ov["2026-05-04"]["t"] == "tempo" and ov.get("2026-05-06")["m"] == 5
+    assert "2026-05-05" not in ov and "2026-05-08" not in ov and "2026-05-07" in ov
+    assert ov.get("2026-05-05", "rest") == "rest"
+    with pytest.raises(KeyError):
+        ov["2026-05-05"]
+    assert ov == want                             # Mapping equality
+    assert BASE["2026-05-04"]["t"] == "easy" and len(BASE) == 3
+
+
+def test_empty_layer_is_the_base():
+    ov = PlanOverlay(BASE, {})
+    assert list(ov) == list(BASE) and len(ov) == len(BASE)
+
+
+def test_history_undo_redo():
+    h = SwapHistory()
+    assert h.current == {} and not h.can_undo and not h.can_redo
+    first = h.apply({"a": 1})
+    h.apply({"b": None})
+    assert h.current == {"a": 1, "b": None} and first == {"a": 1}   # snapshots stay valid
+    assert h.undo() == {"a": 1} and h.can_redo
+    assert h.redo() == {"a": 1, "b": None} and not h.can_redo
+    assert h.reset() == {} and h.undo() == {"a": 1, "b": None}     # reset is undoable
+    h.undo()
+    h.apply({"c": 2})                                             # a new edit drops the redo
+    assert h.current == {"a": 1, "c": 2} and not h.can_redo
+    assert h.undo() == {"a": 1} and h.undo() == {} and h.undo() == {}
+
+
+def test_history_is_bounded():
+    h = SwapHistory({"start": 0})
+    for i in range(HISTORY + 10):
+        h.apply({i: i})
+    n = 0
+    while h.can_undo:
+        h.undo()
+        n += 1
+    assert n == HISTORY and h.current == {"start": 0, **{i: i for i in range(10)}}
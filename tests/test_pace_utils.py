@@ -0,0 +1,68 @@
+import pytest
+
+from pace_utils import get_pace_range, marathon_pace_seconds, parse_workout
+
+GMP = 480   # 8:00/mi
+
+
+@pytest.mark.parametrize("text, parts", [
+    ("GA 7 w/ 10x100m strides", dict(kind="aerobic", miles=7.0, reps=10, rep_m=100.0, strides=True)),
+    ("Rec + Sp 5 w/  6 x 100 strides", dict(kind="recovery", extra="sprint", miles=5.0, reps=6, rep_m=100.0)),
+    ("LT 10 w/ 5 @ 15K to HMP", dict(kind="lt", miles=10.0, seg_mi=5.0, pace="15K to HMP")),
+    ("V8 w/ 5 x 800 @ 5K pace", dict(kind="vo2", miles=8.0, reps=5, rep_m=800.0, pace="5K pace")),
+    ("MP 13 w/ 8 @ MP", dict(kind="mp", miles=13.0, seg_mi=8.0, pace="MP")),
+    ("Q1: Tempo 10 w/ 6 @ Tempo", dict(kind="tempo", miles=10.0, seg_mi=6.0)),
+    ("8K - 15K tune-up race", dict(kind="race", race_km=(8.0, 15.0))),
+    ("Half Marathon", dict(kind="race", miles=13.1)),
+    ("6 mi run", dict(kind="easy", miles=6.0)),
+    ("Rest", dict(kind="rest", miles=None)),
+])
+def test_parse_workout(text, parts):
+    w = parse_workout(text)
+    assert {k: w[k] for k in parts} == parts
+
+
+@pytest.mark.parametrize("text", ["Cross-train 40 min", "", "Gardening", "LT 10 w/ ???"])
+def test_parse_workout_rejects_free_text(text):
+    assert parse_workout(text) is None
+
+
+# Shorthand the old substring scan read wrongly: (text, old output, output now). The new
+# outputs are intended: plan shorthand such as "GA 7 w/ ..." used to get no range at all
+# ("—") or another workout's, and now gets the range for its kind.
+FIXED = [
+    ("GA 7 w/ 10x100m strides", "—", "8:30 - 9:00"),
+    ("Tempo", "7:55 - 8:05", "7:35 - 7:45"),                      # "mp" inside "tempo"
+    ("LT 10 w/ 5 @ 15K to HMP", "7:55 - 8:05", "7:35 - 7:45"),    # "mp" inside "hmp"
+    ("GA 9", "—", "8:30 - 9:00"),
+    ("V10", "—", "7:10 - 7:20"),
+    ("GA + Sp", "Max effort", "8:30 - 9:00"),
+]
+# Unchanged by the grammar
+SAME = [
+    ("Easy run", "8:45 - 9:30"), ("Long Run", "8:45 - 9:30"), ("MLR 12", "8:30 - 9:15"),
+    ("Rec 5", "9:00 - 10:00"), ("Marathon pace 14", "7:55 - 8:05"), ("V8 w/ 5 x 800 @ 5K pace", "7:10 - 7:20"),
+    ("Hills and sprints today", "Hard effort"), ("8K - 15K tune-up race", "Race Pace"), ("Rest", "—"),
+    ("a 6 mile loop", "8:30 - 9:30"), ("Cross-train 40 min", "—"), ("", "—"), (None, "—"),
+]
+
+
+@pytest.mark.parametrize("text, old, now", FIXED)
+def test_get_pace_range_reads_shorthand(text, old, now):
+    assert get_pace_range(text, GMP) == now != old
+
+
+@pytest.mark.parametrize("text, expected", SAME)
+def test_get_pace_range_unchanged(text, expected):
+    assert get_pace_range(text, GMP) == expected
+
+
+def test_get_pace_range_plan_adjustment():
+    assert get_pace_range("GA 9", GMP, "plans/run_plan.csv") == "8:55 - 9:27"
+    assert get_pace_range("Easy run", GMP, "plans/unofficial-pfitz-18-63.csv") == "9:11 - 9:58"
+    assert get_pace_range("Tempo", GMP, "plans/other.csv") == "7:35 - 7:45"
+
+
+def test_marathon_pace_seconds():
+    assert marathon_pace_seconds("3:30:00") == pytest.approx(12600 / 26.2188)
+    assert marathon_pace_seconds("soon") == 600.0
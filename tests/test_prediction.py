@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from prediction import (LONG_PACE_FACTOR, MARATHON_MI, QUALITY_EQUIV_MI, RIEGEL_B, collect_efforts,
+                        fit_riegel, predict_marathon)
+
+TODAY = date(2026, 5, 1)
+
+
+def efforts(marathon_secs, b, dists, ages=None, kind="race"):
+    dist = np.asarray(dists, dtype=np.float64)
+    secs = marathon_secs * (dist / MARATHON_MI) ** b
+    age = np.asarray(ages if ages is not None else [7] * len(dist), dtype=np.float64)
+    return dist, secs, age, np.asarray([kind] * len(dist), dtype=object)
+
+
+def test_predicts_marathon_from_efforts_on_a_riegel_curve():
+    pred = predict_marathon(*efforts(3 * 3600, RIEGEL_B, [3.1, 6.2, 9.32, 13.1, 13.1, 9.32]))
+    assert pred["secs"] == pytest.approx(3 * 3600, rel=1e-3)
+    assert pred["b"] == pytest.approx(RIEGEL_B, abs=1e-3)
+    assert pred["lo"] < pred["secs"] < pred["hi"]
+    assert pred["n"] == 6 and pred["counts"] == {"race": 6}
+
+
+def test_single_distance_keeps_the_prior_exponent():
+    # One distance says nothing about the exponent: 15K in 1:05 → Riegel's 1.06
+    dist, secs, age, kind = efforts(1, 1, [9.32] * 4)
+    secs[:] = 65 * 60
+    pred = predict_marathon(dist, secs, age, kind)
+    assert pred["b"] == pytest.approx(RIEGEL_B, abs=1e-6)
+    assert pred["secs"] == pytest.approx(65 * 60 * (MARATHON_MI / 9.32) ** RIEGEL_B, rel=1e-6)
+
+
+def test_spread_efforts_pull_the_exponent_towards_the_athlete():
+    pred = predict_marathon(*efforts(3 * 3600, 1.12, [3.1, 3.1, 6.2, 9.32, 13.1, 13.1, 20, 20]))
+    assert RIEGEL_B < pred["b"] < 1.12
+
+
+def test_interval_widens_with_level_and_scatter():
+    tight = predict_marathon(*efforts(3 * 3600, RIEGEL_B, [3.1, 6.2, 13.1]))
+    dist, secs, age, kind = efforts(3 * 3600, RIEGEL_B, [3.1, 6.2, 13.1])
+    noisy = predict_marathon(dist, secs * np.array([0.95, 1.06, 0.97]), age, kind)
+    assert noisy["hi"] - noisy["lo"] > tight["hi"] - tight["lo"]
+    wide = predict_marathon(*efforts(3 * 3600, RIEGEL_B, [3.1, 6.2, 13.1]), level=0.95)
+    assert wide["hi"] - wide["lo"] > tight["hi"] - tight["lo"]
+
+
+def test_recent_efforts_outweigh_old_ones():
+    dist = np.array([13.1, 13.1])
+    secs = np.array([95 * 60, 85 * 60])
+    kind = np.array(["race", "race"], dtype=object)
+    coef, _, _ = fit_riegel(dist, secs, np.array([56.0, 0.0]), kind)
+    assert np.exp(coef[0] + coef[1] * np.log(13.1)) < 90 * 60
+
+
+def test_predict_without_efforts():
+    assert predict_marathon(*collect_efforts({}, {}, TODAY)) is None
+
+
+def test_collect_efforts_maps_runs_to_race_equivalents():
+    day = lambda n: (TODAY - timedelta(days=n)).isoformat()
+    act_runs = {
+        day(3): [dict(miles=10, pace=420)],
+        day(6): [dict(miles=18, pace=500)],
+        day(13): [dict(miles=9, pace=520)],        # long day, too short to count
+        day(20): [dict(miles=6, pace=540)],        # easy day
+        day(70): [dict(miles=10, pace=410)],       # outside the window
+    }
+    planned = {day(3): dict(t="tempo"), day(6): dict(t="long"), day(13): dict(t="long"),
+               day(20): dict(t="easy"), day(70): dict(t="vo2")}
+    dist, secs, age, kind = collect_efforts(act_runs, planned, TODAY, race_efforts=[(13.1, 5400, 10), (6.2, 2400, 90)])
+    got = sorted(zip(kind, dist, secs, age))
+    assert got == [("long", MARATHON_MI, pytest.approx(500 * LONG_PACE_FACTOR * MARATHON_MI), 6),
+                   ("quality", QUALITY_EQUIV_MI, pytest.approx(420 * QUALITY_EQUIV_MI), 3),
+                   ("race", 13.1, 5400, 10)]
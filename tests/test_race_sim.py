@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from race_sim import ADHERENCE_CAP, PERCENTILES, TRAIN_GAIN, simulate
+
+FIT = dict(secs=3 * 3600, sd=0.03, sigma=0.02)
+
+
+def test_deterministic_for_a_seed():
+    args = (FIT, 3 * 3600, [40, 45, 50], 800, [0.9, 0.8, 1.0])
+    assert simulate(*args, seed=3) == simulate(*args, seed=3)
+    assert simulate(*args, seed=3)["pct"] != simulate(*args, seed=4)["pct"]
+
+
+def test_percentiles_are_ordered_and_bracket_the_fit():
+    out = simulate(FIT, None, [], 0, [])
+    pct = [out["pct"][p] for p in PERCENTILES]
+    assert pct == sorted(pct)
+    assert out["pct"][10] < FIT["secs"] < out["pct"][90]
+    assert out["pct"][50] == pytest.approx(FIT["secs"], rel=2e-3)
+    assert out["p_goal"] is None and out["adherence"] is None and out["n"] == 10_000
+
+
+def test_spread_follows_the_fit_and_race_day_sd():
+    out = simulate(FIT, None, [], 0, [], n=200_000)
+    sd = np.log(out["pct"][90] / out["pct"][10]) / (2 * 1.2816)
+    assert sd == pytest.approx(np.hypot(FIT["sd"], FIT["sigma"]), rel=0.02)
+
+
+def test_remaining_training_speeds_the_finish():
+    idle = simulate(FIT, 3 * 3600, [], 1000, [])
+    trained = simulate(FIT, 3 * 3600, [50] * 10, 1000, [1.0] * 4)
+    # Every draw completes all 500 remaining miles: TRAIN_GAIN × 500/1000 faster
+    assert trained["pct"][50] == pytest.approx(idle["pct"][50] * np.exp(-TRAIN_GAIN / 2), rel=1e-3)
+    assert trained["p_goal"] > idle["p_goal"] == pytest.approx(0.5, abs=0.02)
+    assert trained["adherence"] == 1.0
+
+
+def test_adherence_is_capped_and_prior_used_without_history():
+    capped = simulate(FIT, None, [50] * 10, 1000, [3.0])
+    assert capped["adherence"] == ADHERENCE_CAP
+    full = simulate(FIT, None, [50] * 10, 1000, [ADHERENCE_CAP])
+    assert capped["pct"] == full["pct"]
+    prior = simulate(FIT, None, [50] * 10, 1000, [])
+    assert full["pct"][50] < prior["pct"][50] < simulate(FIT, None, [], 1000, [])["pct"][50]
@@ -0,0 +1,48 @@
+from datetime import date
+
+import numpy as np
+
+from rollups import MileageRollups, downsample, week_index, week_start
+
+
+def rollups(act_runs):
+    r = MileageRollups()
+    r.add_runs(act_runs)
+    return r
+
+
+def test_weekly_and_monthly_totals():
+    r = rollups({"2026-03-02": [dict(id=1, miles=5)], "2026-03-08": [dict(id=2, miles=12)],
+                 "2026-03-31": [dict(id=3, miles=6)], "2026-04-01": [dict(id=4, miles=4)]})
+    assert week_start(week_index(date(2026, 3, 8))) == date(2026, 3, 2)
+    np.testing.assert_array_equal(r.weekly(date(2026, 3, 2), 5), [17, 0, 0, 0, 10])
+    assert r.monthly == {(2026, 3): 23, (2026, 4): 4} and r.year_totals() == {2026: 27}
+    assert r.add_runs({"2026-03-02": [dict(id=1, miles=5)]}) == 0
+
+
+def test_backfill_grows_the_front():
+    r = rollups({"2026-03-02": [dict(id=1, miles=5)]})
+    r.add_runs({"2016-03-02": [dict(id=2, miles=7)]})
+    assert r.first_week == date(2016, 2, 29) and r.last_week == date(2026, 3, 2)
+    assert r.weekly(date(2016, 2, 29), 1)[0] == 7 and r.weekly(date(2026, 3, 2), 1)[0] == 5
+
+
+def test_digest_follows_the_totals_not_the_fold_count():
+    a = rollups({"2026-03-02": [dict(id=1, miles=5)], "2026-03-09": [dict(id=2, miles=8)]})
+    b = rollups({"2026-03-02": [dict(id=7, miles=5)], "2026-03-10": [dict(id=8, miles=8)]})
+    c = rollups({"2026-03-02": [dict(id=1, miles=5)], "2026-03-09": [dict(id=2, miles=9)]})
+    assert a.version == b.version == c.version
+    assert a.digest == b.digest != c.digest
+    before = a.digest
+    a.add("2026-03-10", 3, key=3)
+    assert a.digest != before
+    assert MileageRollups().digest != a.digest
+
+
+def test_downsample_keeps_miles_per_week():
+    values = np.arange(10, dtype=np.float64)
+    same, size = downsample(values, 20)
+    assert size == 1 and (same == values).all()
+    bins, size = downsample(values, 4)
+    assert size == 3 and len(bins) == 4
+    np.testing.assert_allclose(bins, [0, 2, 5, 8])
@@ -0,0 +1,100 @@
+from types import MappingProxyType, SimpleNamespace
+
+import pytest
+
+import session_memory
+from session_memory import EVICTABLE, SessionRegistry, approx_bytes, measure
+
+
+class FakeState(dict):
+    """The bits of Streamlit's SessionState the registry uses."""
+
+    @property
+    def filtered_state(self):
+        return dict(self)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_memory, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def state(n=1000):
+    return FakeState(activities={"2026-05-04": [dict(miles=5)] * n}, rollups=list(range(n)),
+                     race_date="2026-10-04")
+
+
+def run(reg, sid, st):
+    reg.begin(sid, st)
+    return reg.end(sid)
+
+
+def test_measure_leaves_shared_views_out():
+    shared = MappingProxyType({"plan": list(range(1000))})
+    own, views = measure(FakeState(base=shared, model={"ref": shared}, n=[1, 2]))
+    assert set(views) == {"base"} and set(own) == {"model", "n"}
+    assert views["base"] > own["model"]            # the model's reference isn't followed
+    assert approx_bytes([1, 2], set()) < approx_bytes(list(range(100)), set())
+
+
+def test_idle_session_is_evicted(clock):
+    reg = SessionRegistry(idle_secs=60)
+    a, b = state(), state()
+    run(reg, "a", a)
+    clock[0] += 30
+    assert run(reg, "b", b) == []
+    assert reg.idle_for("a") == 30
+    clock[0] += 40
+    assert run(reg, "b", b) == ["a"]
+    assert not any(k in a for k in EVICTABLE) and a["race_date"] == "2026-10-04"
+    assert "activities" in b and reg.evicted == 1
+    assert run(reg, "b", b) == []                  # nothing left to drop
+
+
+def test_running_session_is_never_swept(clock):
+    reg = SessionRegistry(idle_secs=60)
+    a, b = state(), state()
+    run(reg, "a", a)
+    reg.begin("a", a)
+    assert reg.idle_for("a") == 0
+    clock[0] += 120
+    assert run(reg, "b", b) == [] and "activities" in a
+
+
+def test_cap_sweeps_least_recent_first(clock):
+    one = sum(measure(state())[0].values())
+    reg = SessionRegistry(idle_secs=3600, cap_bytes=int(2.5 * one))
+    states = {sid: state() for sid in "abcd"}
+    evicted = []
+    for sid, st in states.items():
+        clock[0] += 1
+        evicted += run(reg, sid, st)
+    assert evicted == ["a", "b"]                   # c and then d each took it over the cap
+    assert not any("activities" in states[s] for s in "ab")
+    assert all("activities" in states[s] for s in "cd")
+    assert reg.snapshot()["own"] <= reg.cap_bytes
+
+
+def test_forgotten_after_forget_secs(clock):
+    reg = SessionRegistry(idle_secs=60)
+    assert reg.forget_secs == 240
+    run(reg, "a", state())
+    clock[0] += 241
+    run(reg, "b", state())
+    snap = reg.snapshot()
+    assert snap["sessions"] == 1 and snap["active"] == 1 and reg.idle_for("a") == 0
+
+
+def test_active_nests_for_fragments(clock):
+    reg = SessionRegistry(idle_secs=60)
+    st = state()
+    with reg.active("a", st):
+        with reg.active("a", st):                  # fragment inside a full run
+            assert reg.idle_for("a") == 0
+        assert reg.idle_for("a") == 0
+    clock[0] += 5
+    assert reg.idle_for("a") == 5
+    row = reg.snapshot()["rows"][0]
+    assert row["own"] > 0 and set(row["keys"]) == set(st)
@@ -0,0 +1,66 @@
+import json
+from datetime import date
+
+import pytest
+
+from state_codec import SWAP_PREFIX, WORKOUT_TYPES, decode_run, dumps, encode_run, from_rows, loads, to_rows
+
+STATE = dict(
+    goal_time="3:05:00", race_date=date(2026, 10, 4), selected_plan="plans/pfitz-18-55.csv",
+    long_dow=6, quality_dow=[1, 3], rest_dows=[0],
+    swaps={
+        "2026-06-06": dict(t="easy", m=5.0, note="GA 5"),
+        "2026-06-07": dict(t="long", m=18.0, note="LR 18", d="2026-06-07"),
+        "2026-06-10": None,
+        "2026-06-11": dict(t="cross", m=0, note="Bike 60"),   # not a known type: kept as text
+    },
+)
+
+
+def test_round_trip():
+    rows = to_rows(STATE)
+    assert all(v.startswith(("2|", "2z|")) for v in rows.values())
+    assert "swaps" not in rows
+    assert {k for k in rows if k.startswith(SWAP_PREFIX)} == {
+        f"{SWAP_PREFIX}{date.fromisoformat(ds).toordinal()}" for ds in STATE["swaps"]}
+    assert from_rows(rows) == STATE
+
+
+def test_none_values_are_left_out():
+    assert to_rows(dict(goal_time=None, long_dow=6)) == {"long_dow": "2|6"}
+
+
+@pytest.mark.parametrize("run", [None, dict(t="tempo", m=10), dict(t="vo2", m=8, d="2026-06-01", note="V8")])
+def test_run_round_trip(run):
+    assert decode_run(loads(dumps(encode_run(run)))) == run
+
+
+def test_workout_types_are_stored_by_index():
+    assert encode_run(dict(t="long", m=18)) == [WORKOUT_TYPES.index("long"), 18, None]
+
+
+def test_long_values_are_compressed():
+    value = {f"2026-06-{d:02d}": dict(t="easy", m=5, note="GA 5 w/ 10x100m strides") for d in range(1, 29)}
+    s = dumps(value)
+    assert s.startswith("2z|") and len(s) < len(json.dumps(value))
+    assert loads(s) == value
+    assert dumps("3:05:00") == '2|"3:05:00"'
+
+
+def test_reads_format_1_rows():
+    v1 = {k: json.dumps(v.isoformat() if isinstance(v, date) else v) for k, v in STATE.items()}
+    assert from_rows(v1) == STATE
+
+
+def test_format_1_rows_are_replaced_on_save():
+    v1 = dict(goal_time=json.dumps("3:05:00"), swaps=json.dumps({"2026-06-06": dict(t="easy", m=5)}))
+    rows = to_rows(from_rows(v1))
+    assert rows == {"goal_time": '2|"3:05:00"',
+                    f"{SWAP_PREFIX}{date(2026, 6, 6).toordinal()}": "2|[0,5,null]"}
+    # A store diffing these against the saved format-1 rows deletes the old "swaps" row
+    assert "swaps" in v1.keys() - rows.keys()
+
+
+def test_empty_format_1_swaps():
+    assert from_rows({"swaps": "{}"}) == {"swaps": {}}
+    assert from_rows({"swaps": "null"}) == {"swaps": {}}
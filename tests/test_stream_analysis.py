@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from stream_analysis import HR_LO, combine, gap_pace, minetti_cost, summarize, time_in_zones
+
+
+def test_minetti_flat_and_slopes():
+    assert minetti_cost(0.0) == pytest.approx(3.6)
+    assert minetti_cost(0.1) > 3.6 and minetti_cost(-0.1) < 3.6
+    assert minetti_cost(0.9) == minetti_cost(0.45)          # clipped
+
+
+def test_summarize_skips_pauses():
+    # 10 s samples, 40 m each, with a 5 min stop between the 4th and 5th sample
+    t = [0, 10, 20, 30, 330, 340, 350]
+    d = [0, 40, 80, 120, 120, 160, 200]
+    hr = [100, 140, 140, 150, 90, 160, 160]
+    s = summarize(d, t, heartrate=hr)
+    assert s["secs"] == 50 and s["meters"] == 200 and s["gap_meters"] is None
+    hist = s["hr_hist"]
+    # each interval's HR is the sample at its end; the paused interval is dropped
+    assert hist[140 - HR_LO] == 20 and hist[150 - HR_LO] == 10 and hist[160 - HR_LO] == 20
+    assert hist[90 - HR_LO] == 0 and sum(hist) == 50
+
+
+def test_summarize_grade_adjusts():
+    t = np.arange(0, 110, 10)
+    d = np.arange(0, 1100, 100)
+    flat = summarize(d, t, altitude=np.zeros(11))
+    assert flat["gap_meters"] == pytest.approx(1000)
+    climb = summarize(d, t, altitude=np.arange(0, 55, 5))  # steady 5% grade
+    assert climb["gap_meters"] > 1000
+    descent = summarize(d, t, altitude=np.arange(50, -5, -5))
+    assert descent["gap_meters"] < 1000
+    assert summarize(d, t, altitude=[0, 1])["gap_meters"] is None  # length mismatch
+
+
+def test_combine_and_gap_pace():
+    a = dict(secs=600, meters=2000, gap_meters=2100, hr_hist=[1] * 180)
+    b = dict(secs=300, meters=1000, gap_meters=None, hr_hist=None)
+    c = combine([a, b])
+    assert (c["secs"], c["meters"], c["gap_secs"], c["gap_meters"]) == (900, 3000, 600, 2100)
+    assert c["hr_hist"].sum() == 180
+    assert gap_pace(c) == pytest.approx(600 / (2100 / 1609.34))
+    assert gap_pace(b) is None
+
+
+def test_time_in_zones():
+    hist = np.zeros(180)
+    for bpm, secs in ((130, 100), (150, 50), (160, 40), (168, 30), (175, 20)):
+        hist[bpm - HR_LO] = secs
+    # LTHR 170: zone floors at 145, 153, 162, 170 bpm
+    np.testing.assert_array_equal(time_in_zones(hist, 170), [100, 50, 40, 30, 20])
+    assert time_in_zones(hist, 400).tolist() == [240, 0, 0, 0, 0]
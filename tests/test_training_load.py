@@ -0,0 +1,127 @@
+import random
+from datetime import date, timedelta
+from math import exp
+
+import numpy as np
+import pytest
+
+from training_load import TrainingLoad, ewma, run_load
+
+GPS = 480   # 3:29:45 goal, 8:00/mi
+
+
+def naive_ewma(loads, tau, start=0.0):
+    k = 1 - exp(-1 / tau)
+    out, y = [], start
+    for x in loads:
+        y = (1 - k) * y + k * x
+        out.append(y)
+    return np.array(out)
+
+
+def make_runs(days=300, seed=7, hr=False):
+    rng = random.Random(seed)
+    first = date(2025, 1, 1)
+    runs = {}
+    for i in range(days):
+        if rng.random() < 0.2:
+            continue
+        ds = (first + timedelta(days=i)).isoformat()
+        for j in range(2 if rng.random() < 0.1 else 1):
+            miles = rng.uniform(3, 20)
+            pace = rng.uniform(GPS - 40, GPS + 90)
+            runs.setdefault(ds, []).append(dict(
+                id=i * 10 + j, miles=miles, moving_time=miles * pace, pace=pace,
+                hr=rng.uniform(130, 175) if hr else None))
+    return runs
+
+
+@pytest.mark.parametrize("tau", [2, 7, 42])
+@pytest.mark.parametrize("start", [0.0, 55.0])
+def test_ewma_matches_naive_loop(tau, start):
+    loads = np.random.default_rng(1).uniform(0, 150, size=1000)   # several _EWMA_BLOCKs
+    np.testing.assert_allclose(ewma(loads, tau, start), naive_ewma(loads, tau, start), rtol=1e-9, atol=1e-9)
+
+
+def test_ewma_long_history_stays_finite():
+    out = ewma(np.full(20 * 365, 60.0), 2)
+    assert np.isfinite(out).all()
+    assert out[-1] == pytest.approx(60.0)
+
+
+def test_from_runs_matches_naive_daily_series():
+    act_runs = make_runs()
+    model = TrainingLoad.from_runs(act_runs, GPS)
+    first, last = min(act_runs), max(act_runs)
+    n = date.fromisoformat(last).toordinal() - date.fromisoformat(first).toordinal() + 1
+    daily = np.zeros(n)
+    for ds, runs in act_runs.items():
+        for r in runs:
+            daily[date.fromisoformat(ds).toordinal() - model.origin] += run_load(r["moving_time"], r["pace"], GPS)
+    np.testing.assert_allclose(model.daily, daily)
+    np.testing.assert_allclose(model.atl, naive_ewma(daily, 7), rtol=1e-9)
+    np.testing.assert_allclose(model.ctl, naive_ewma(daily, 42), rtol=1e-9)
+    assert model.watermark == last
+
+
+@pytest.mark.parametrize("hr", [False, True])
+def test_incremental_add_matches_full_build(hr):
+    act_runs = make_runs(hr=hr)
+    full = TrainingLoad.from_runs(act_runs, GPS)
+    inc = TrainingLoad(GPS, lthr=full.lthr)
+    for ds in sorted(act_runs):
+        for r in act_runs[ds]:
+            assert inc.add(ds, r)
+    assert inc.origin == full.origin
+    np.testing.assert_allclose(inc.atl, full.atl, rtol=1e-9)
+    np.testing.assert_allclose(inc.ctl, full.ctl, rtol=1e-9)
+    assert inc.watermark == full.watermark
+
+
+def test_backfill_matches_full_build():
+    act_runs = make_runs()
+    days = sorted(act_runs)
+    recent = {ds: act_runs[ds] for ds in days[len(days) // 2:]}
+    model = TrainingLoad.from_runs(recent, GPS)
+    assert model.add_runs(act_runs) == sum(len(act_runs[ds]) for ds in days[:len(days) // 2])
+    full = TrainingLoad.from_runs(act_runs, GPS)
+    np.testing.assert_allclose(model.atl, full.atl, rtol=1e-9)
+    np.testing.assert_allclose(model.ctl, full.ctl, rtol=1e-9)
+    assert model.add_runs(act_runs) == 0
+
+
+def test_add_new_folds_runs_from_the_watermark_on():
+    act_runs = make_runs()
+    days = sorted(act_runs)
+    model = TrainingLoad.from_runs({ds: act_runs[ds] for ds in days[:-5]}, GPS)
+    assert model.add_new(act_runs) == sum(len(act_runs[ds]) for ds in days[-5:])
+    assert model.add_new(act_runs) == 0
+    assert model.watermark == days[-1]
+    full = TrainingLoad.from_runs(act_runs, GPS)
+    np.testing.assert_allclose(model.ctl, full.ctl, rtol=1e-9)
+
+
+def test_add_new_folds_a_late_upload():
+    # Yesterday's watch sync lands after today's run is already folded in
+    act_runs = make_runs()
+    days = sorted(act_runs)
+    late_day = days[-2]
+    late = dict(id=-1, miles=8, moving_time=3900, pace=487)
+    model = TrainingLoad.from_runs(act_runs, GPS)
+    assert model.add_new({**act_runs, late_day: act_runs[late_day] + [late]}) == 1
+    assert model.watermark == days[-1]
+    full = TrainingLoad.from_runs({**act_runs, late_day: act_runs[late_day] + [late]}, GPS)
+    np.testing.assert_allclose(model.atl, full.atl, rtol=1e-9)
+    np.testing.assert_allclose(model.ctl, full.ctl, rtol=1e-9)
+    assert model.add_new({late_day: [late]}) == 0
+
+
+def test_on_decays_past_the_last_run():
+    model = TrainingLoad.from_runs(make_runs(), GPS)
+    last = date.fromordinal(model.last_day)
+    ctl, atl, tsb = model.on(last)
+    ctl10, atl10, tsb10 = model.on(last + timedelta(days=10))
+    assert ctl10 == pytest.approx(ctl * exp(-10 / 42))
+    assert atl10 == pytest.approx(atl * exp(-10 / 7))
+    assert tsb10 == pytest.approx(ctl10 - atl10)
+    assert model.on(date.fromordinal(model.origin - 1)) == (0.0, 0.0, 0.0)
@@ -0,0 +1,235 @@
+"""Training load (fitness / fatigue / form) from activity history.
+
+Each run gets a stress score of hours × intensity² × 100, the same shape as
+running-TSS. Intensity is threshold pace ÷ actual pace. Threshold (LT) pace is taken
+as goal marathon pace − 20 s/mi, the middle of the tempo range used in
+workout_segments. When heart rate is available, intensity is averaged with HR ÷ LTHR.
+LTHR is calibrated from runs done near threshold pace, so HR intensity is tied to
+the goal pace too.
+
+ATL (acute, 7-day) and CTL (chronic, 42-day) are exponentially weighted daily loads;
+TSB (form) = CTL − ATL. New activities update the running state in O(1): add_new()
+appends days from the watermark (latest day folded in) on, and recomputes from the
+earliest late upload only when there is one. A change of parameters (goal pace, time
+constants) recomputes the whole history with a blocked, closed-form EWMA in NumPy.
+"""
+from datetime import date
+from math import exp
+
+import numpy as np
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+LT_OFFSET = 20      # sec/mi faster than goal marathon pace
+_EWMA_BLOCK = 128   # keeps decay^-i well inside float64 range for any time constant ≥ 2 days
+
+
+def run_intensity(pace, gps, hr=None, lthr=None):
+    """Intensity factor for one run: LT pace / run pace, blended with HR / LTHR when known."""
+    threshold = gps - LT_OFFSET
+    intensity = threshold / pace if pace else 0.0
+    if hr and lthr:
+        intensity = (intensity + hr / lthr) / 2
+    return intensity
+
+
+def run_load(moving_time, pace, gps, hr=None, lthr=None):
+    """Stress score for one run (rTSS-style): hours × IF² × 100."""
+    return moving_time / 3600 * run_intensity(pace, gps, hr, lthr) ** 2 * 100
+
+
+def estimate_lthr(paces, hrs, gps, window=15):
+    """Median HR of runs within ±window s/mi of threshold pace, or None if fewer than 3."""
+    paces = np.asarray(paces, dtype=np.float64)
+    hrs = np.asarray([h or 0 for h in hrs], dtype=np.float64)
+    near = (np.abs(paces - (gps - LT_OFFSET)) <= window) & (hrs > 0)
+    return float(np.median(hrs[near])) if near.sum() >= 3 else None
+
+
+def ewma(loads, tau, start=0.0):
+    """Vectorized y[i] = (1-k)·y[i-1] + k·loads[i], with k = 1 - e^(-1/tau).
+
+    Solved in closed form per block — y = d^(i+1)·y0 + k·d^i·cumsum(L / d^j) — and
+    chained across blocks so d^-i never overflows, however long the history.
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    k = 1 - exp(-1 / tau)
+    d = 1 - k
+    out = np.empty_like(loads)
+    for s in range(0, len(loads), _EWMA_BLOCK):
+        seg = loads[s:s + _EWMA_BLOCK]
+        p = d ** np.arange(len(seg))
+        y = d * p * start + k * p * np.cumsum(seg / p)
+        out[s:s + len(seg)] = y
+        start = y[-1]
+    return out
+
+
+class TrainingLoad:
+    """Daily ATL/CTL series for one athlete.
+
+    Daily loads are kept so out-of-order activities (e.g. a history backfill) can be
+    absorbed by recomputing only from the earliest affected day. Arrays are over-allocated
+    so appending a day is amortized O(1).
+    """
+
+    def __init__(self, gps, lthr=None, atl_days=ATL_DAYS, ctl_days=CTL_DAYS):
+        self.params = (gps, lthr, atl_days, ctl_days)
+        self.gps, self.lthr = gps, lthr
+        self.atl_days, self.ctl_days = atl_days, ctl_days
+        self._k_atl = 1 - exp(-1 / atl_days)
+        self._k_ctl = 1 - exp(-1 / ctl_days)
+        self.origin = None                  # ordinal of index 0
+        self._n = 0                         # days in use
+        self._buf = np.zeros((3, 0))        # rows: daily load, end-of-day ATL, end-of-day CTL
+        self._seen = set()
+        self.watermark = None               # latest run date folded in (YYYY-MM-DD)
+
+    @staticmethod
+    def _key(ds, run):
+        return run.get("id") or (ds, round(run["miles"], 3))
+
+    @classmethod
+    def from_runs(cls, act_runs, gps, atl_days=ATL_DAYS, ctl_days=CTL_DAYS):
+        """Full vectorized build from an act_runs map (date string → list of run dicts)."""
+        rows = [(ds, r) for ds, runs in act_runs.items() for r in runs]
+        lthr = estimate_lthr([r["pace"] for _, r in rows], [r.get("hr") for _, r in rows], gps)
+        model = cls(gps, lthr=lthr, atl_days=atl_days, ctl_days=ctl_days)
+        if not rows:
+            return model
+        days = np.array([date.fromisoformat(ds[:10]).toordinal() for ds, _ in rows])
+        secs = np.array([r["moving_time"] for _, r in rows], dtype=np.float64)
+        paces = np.array([r["pace"] for _, r in rows], dtype=np.float64)
+        intensity = np.divide(gps - LT_OFFSET, paces, out=np.zeros_like(paces), where=paces > 0)
+        if lthr:
+            hrs = np.array([r.get("hr") or 0 for _, r in rows], dtype=np.float64)
+            intensity = np.where(hrs > 0, (intensity + hrs / lthr) / 2, intensity)
+        loads = secs / 3600 * intensity ** 2 * 100
+        model.origin = int(days.min())
+        model._n = int(days.max()) - model.origin + 1
+        model._buf = np.zeros((3, model._n))
+        model._buf[0] = np.bincount(days - model.origin, weights=loads, minlength=model._n)
+        model._recompute_from(0)
+        model._seen = {cls._key(ds, r) for ds, r in rows}
+        model.watermark = max(ds[:10] for ds, _ in rows)
+        return model
+
+    @property
+    def daily(self): return self._buf[0, :self._n]
+    @property
+    def atl(self): return self._buf[1, :self._n]
+    @property
+    def ctl(self): return self._buf[2, :self._n]
+
+    @property
+    def last_day(self):
+        return None if self.origin is None else self.origin + self._n - 1
+
+    def _reserve(self, n):
+        if n > self._buf.shape[1]:
+            grown = np.zeros((3, max(n, 2 * self._buf.shape[1], 64)))
+            grown[:, :self._n] = self._buf[:, :self._n]
+            self._buf = grown
+
+    def _prepend(self, days):
+        grown = np.zeros((3, self._n + days + 64))
+        grown[:, days:days + self._n] = self._buf[:, :self._n]
+        self._buf, self._n, self.origin = grown, self._n + days, self.origin - days
+
+    def _extend_to(self, ordinal):
+        """Grow the series so it covers `ordinal`, decaying ATL/CTL through the empty days."""
+        if self.origin is None:
+            self._reserve(1)
+            self.origin, self._n = ordinal, 1
+            return
+        gap = ordinal - self.last_day
+        if gap <= 0:
+            return
+        self._reserve(self._n + gap)
+        steps = np.arange(1, gap + 1)
+        n = self._n
+        self._buf[:, n:n + gap] = 0
+        self._buf[1, n:n + gap] = self._buf[1, n - 1] * (1 - self._k_atl) ** steps
+        self._buf[2, n:n + gap] = self._buf[2, n - 1] * (1 - self._k_ctl) ** steps
+        self._n += gap
+
+    def _recompute_from(self, pos):
+        n = self._n
+        atl0 = self._buf[1, pos - 1] if pos else 0.0
+        ctl0 = self._buf[2, pos - 1] if pos else 0.0
+        self._buf[1, pos:n] = ewma(self._buf[0, pos:n], self.atl_days, atl0)
+        self._buf[2, pos:n] = ewma(self._buf[0, pos:n], self.ctl_days, ctl0)
+
+    def _place(self, ds, load):
+        """Add a load to its day, growing the series as needed; returns the day's index."""
+        day = date.fromisoformat(ds[:10]).toordinal()
+        if self.origin is not None and day < self.origin:
+            self._prepend(self.origin - day)
+        self._extend_to(day)
+        pos = day - self.origin
+        self._buf[0, pos] += load
+        return pos
+
+    def _run_load(self, run):
+        return run_load(run["moving_time"], run["pace"], self.gps, run.get("hr"), self.lthr)
+
+    def add(self, ds, run):
+        """Fold one run in. O(1) (amortized) when it lands on or after the latest day seen."""
+        key = self._key(ds, run)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self.watermark = max(self.watermark or "", ds[:10])
+        load = self._run_load(run)
+        pos = self._place(ds, load)
+        if pos == self._n - 1:
+            # EWMA is linear in the day's load, so the latest values just shift by k·load
+            self._buf[1, pos] += self._k_atl * load
+            self._buf[2, pos] += self._k_ctl * load
+        else:
+            self._recompute_from(pos)
+        return True
+
+    def add_runs(self, act_runs):
+        """Fold an act_runs map. Batches that reach back in time recompute once, not per run."""
+        fresh = [(ds, r) for ds in sorted(act_runs) for r in act_runs[ds]
+                 if self._key(ds, r) not in self._seen]
+        if not fresh:
+            return 0
+        if self.origin is not None and fresh[0][0][:10] >= date.fromordinal(self.last_day).isoformat():
+            return sum(self.add(ds, r) for ds, r in fresh)
+        # Backfill: accumulate daily loads directly, then one vectorized pass
+        for ds, r in fresh:
+            self._seen.add(self._key(ds, r))
+            self._place(ds, self._run_load(r))
+        self.watermark = max(self.watermark or "", fresh[-1][0][:10])
+        self._recompute_from(date.fromisoformat(fresh[0][0][:10]).toordinal() - self.origin)
+        return len(fresh)
+
+    def add_new(self, act_runs):
+        """Fold the runs in act_runs not seen yet. Days from the watermark on are appended
+        (O(1) each); unseen runs dated before it, such as yesterday's watch sync landing
+        after today's run, go through add_runs, which recomputes once from the earliest."""
+        if self.watermark is None:
+            return self.add_runs(act_runs)
+        late = {}
+        for ds, runs in act_runs.items():
+            if ds[:10] < self.watermark:
+                unseen = [r for r in runs if self._key(ds, r) not in self._seen]
+                if unseen:
+                    late[ds] = unseen
+        added = self.add_runs({ds: act_runs[ds] for ds in act_runs if ds[:10] >= self.watermark})
+        return added + (self.add_runs(late) if late else 0)
+
+    def on(self, d: date):
+        """(ctl, atl, tsb) at the end of day d, decaying forward past the last activity."""
+        if self.origin is None or d.toordinal() < self.origin:
+            return 0.0, 0.0, 0.0
+        day = d.toordinal()
+        if day <= self.last_day:
+            ctl, atl = self.ctl[day - self.origin], self.atl[day - self.origin]
+        else:
+            gap = day - self.last_day
+            ctl = self.ctl[-1] * (1 - self._k_ctl) ** gap
+            atl = self.atl[-1] * (1 - self._k_atl) ** gap
+        return float(ctl), float(atl), float(ctl - atl)